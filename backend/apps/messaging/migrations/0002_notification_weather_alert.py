@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="notification_type",
+            field=models.CharField(
+                choices=[
+                    ("trip_reminder", "Trip Reminder"),
+                    ("trip_shared", "Trip Shared"),
+                    ("weather_alert", "Weather Alert"),
+                    ("general", "General"),
+                ],
+                default="general",
+                max_length=30,
+            ),
+        ),
+    ]
@@ -8,6 +8,7 @@ class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ("trip_reminder", "Trip Reminder"),
         ("trip_shared", "Trip Shared"),
+        ("weather_alert", "Weather Alert"),
         ("general", "General"),
     ]
 
@@ -0,0 +1,356 @@
+"""
+Scored, diversified place recommendations.
+
+Candidates for each category are the places the upstream search returns plus
+every cached ``Place`` of that category within the search radius, so a
+request can weigh thousands of places rather than the first page of results.
+Each candidate's relevance is a weighted sum of three scores in ``[0, 1]``:
+
+- ``rating``: the star rating with Bayesian smoothing. A place with few
+  reviews is pulled towards the candidates' review-weighted mean rating, as
+  if it had ``PRIOR_REVIEWS`` extra reviews at that mean, so three five-star
+  reviews do not outrank a thousand at 4.6.
+- ``distance``: decays exponentially with the distance from the search
+  point, halving every ``HALF_DISTANCE`` of the category's radius.
+- ``price``: how close the price level is to the user's ``price_level``
+  preference (0 free to 4 very expensive). Unpriced places, and everyone
+  when the user has no preference, get ``UNKNOWN_PRICE_SCORE``.
+
+The list is then picked by maximal marginal relevance (MMR). Each pick
+maximizes ``DIVERSITY_LAMBDA`` times the relevance, less the rest times the
+candidate's similarity to the closest place already picked. Similarity
+mixes how close two places are with how many Google types they share, so
+five restaurants on one block give way to a spread of places.
+
+All scores, and each MMR step, are whole-array operations over the
+candidates.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from apps.places.models import Place
+from apps.routes.graph import haversine_m
+
+# Reviews at the mean rating every candidate's rating is smoothed with
+PRIOR_REVIEWS = 25
+
+# Mean rating used when no candidate has one
+DEFAULT_MEAN_RATING = 3.5
+
+# Weight of each score in a candidate's relevance
+WEIGHTS = {"rating": 0.5, "distance": 0.3, "price": 0.2}
+
+# Share of the category radius over which the distance score halves
+HALF_DISTANCE = 0.25
+
+# Price score of unpriced places, or of all places without a preference
+UNKNOWN_PRICE_SCORE = 0.5
+
+# Relevance against diversity in MMR: 1 ranks by relevance alone
+DIVERSITY_LAMBDA = 0.7
+
+# Distance in metres at which two places' location similarity halves
+SIMILAR_DISTANCE_M = 500
+
+# Most cached places weighed per category
+MAX_CANDIDATES = 5000
+
+
+@dataclass(frozen=True)
+class Category:
+    """A kind of recommendation and how it is searched for."""
+
+    key: str  # response key
+    google_type: str
+    place_type: str  # ``Place.place_type`` of cached candidates
+    radius: int  # metres
+    count: int
+
+
+CATEGORIES = (
+    Category("attractions", "tourist_attraction", "attraction", 10000, 5),
+    Category("restaurants", "restaurant", "restaurant", 5000, 5),
+    Category("accommodations", "lodging", "accommodation", 15000, 3),
+)
+
+PLACE_FIELDS = (
+    "place_id",
+    "name",
+    "address",
+    "latitude",
+    "longitude",
+    "rating",
+    "user_ratings_total",
+    "price_level",
+    "types",
+    "business_status",
+)
+
+
+def cached_candidates(category, latitude, longitude):
+    """
+    Cached open places of a category within its radius of a point.
+
+    Returns:
+        list: Place dicts shaped like upstream search results
+    """
+    margin_lat = category.radius / 111_320
+    margin_lon = margin_lat / max(np.cos(np.radians(min(abs(latitude), 85.0))), 0.01)
+    rows = (
+        Place.objects.filter(
+            place_type=category.place_type,
+            permanently_closed=False,
+            latitude__range=(latitude - margin_lat, latitude + margin_lat),
+            longitude__range=(longitude - margin_lon, longitude + margin_lon),
+        )
+        .exclude(business_status="CLOSED_PERMANENTLY")
+        .values_list(*PLACE_FIELDS)[:MAX_CANDIDATES]
+    )
+    places = [dict(zip(PLACE_FIELDS, row)) for row in rows]
+    distance = haversine_m(
+        latitude,
+        longitude,
+        np.array([p["latitude"] for p in places], dtype=np.float64),
+        np.array([p["longitude"] for p in places], dtype=np.float64),
+    )
+    return [place for place, d in zip(places, distance) if d <= category.radius]
+
+
+def merge_candidates(searched, cached):
+    """Search results then cached places, once per ``place_id``."""
+    merged = {}
+    for place in [*searched, *cached]:
+        if place.get("latitude") is None or place.get("longitude") is None:
+            continue
+        if place.get("business_status") == "CLOSED_PERMANENTLY":
+            continue
+        merged.setdefault(place.get("place_id") or id(place), place)
+    return list(merged.values())
+
+
+def _column(places, key):
+    """A numeric field of every place as floats, NaN where missing."""
+    return np.array(
+        [np.nan if p.get(key) is None else p[key] for p in places], dtype=np.float64
+    )
+
+
+def bayesian_rating(rating, reviews, prior_reviews=PRIOR_REVIEWS):
+    """
+    Ratings smoothed towards the review-weighted mean of all of them.
+
+    Args:
+        rating (ndarray): Star ratings, NaN if unrated
+        reviews (ndarray): Review counts, NaN if unknown
+        prior_reviews (float): Weight of the mean, in reviews
+
+    Returns:
+        ndarray: Smoothed ratings; unrated places get the mean
+    """
+    rated = ~np.isnan(rating)
+    reviews = np.where(rated, np.nan_to_num(reviews), 0.0)
+    # Ratings without a review count still count as one review
+    reviews = np.where(rated, np.maximum(reviews, 1.0), 0.0)
+    total = reviews.sum()
+    mean = (
+        float((np.nan_to_num(rating) * reviews).sum() / total)
+        if total
+        else DEFAULT_MEAN_RATING
+    )
+    return (prior_reviews * mean + reviews * np.nan_to_num(rating)) / (
+        prior_reviews + reviews
+    )
+
+
+def score_candidates(places, latitude, longitude, radius, preferred_price=None):
+    """
+    Score breakdown of every candidate.
+
+    Args:
+        places (list): Candidate place dicts
+        latitude, longitude (float): Search point
+        radius (float): Search radius in metres
+        preferred_price (int): User's preferred price level, or ``None``
+
+    Returns:
+        dict: Arrays ``rating``, ``distance`` and ``price`` (scores in
+        ``[0, 1]``), ``relevance``, ``smoothed_rating`` and ``distance_m``
+    """
+    lat = _column(places, "latitude")
+    lon = _column(places, "longitude")
+    smoothed = bayesian_rating(
+        _column(places, "rating"), _column(places, "user_ratings_total")
+    )
+    distance = haversine_m(latitude, longitude, lat, lon)
+    price = _column(places, "price_level")
+
+    scores = {
+        "rating": np.clip(smoothed / 5.0, 0.0, 1.0),
+        "distance": 0.5 ** (distance / (HALF_DISTANCE * radius)),
+        "price": np.full(len(places), UNKNOWN_PRICE_SCORE),
+    }
+    if preferred_price is not None:
+        priced = ~np.isnan(price)
+        scores["price"][priced] = 1.0 - np.abs(price[priced] - preferred_price) / 4.0
+    scores["relevance"] = sum(WEIGHTS[name] * scores[name] for name in WEIGHTS)
+    scores["smoothed_rating"] = smoothed
+    scores["distance_m"] = distance
+    return scores
+
+
+def _type_matrix(places):
+    """0/1 ``(places, types)`` matrix of each place's Google types."""
+    vocabulary = {}
+    pairs = [
+        (row, vocabulary.setdefault(kind, len(vocabulary)))
+        for row, place in enumerate(places)
+        for kind in set(place.get("types") or ())
+    ]
+    matrix = np.zeros((len(places), max(len(vocabulary), 1)), dtype=np.float64)
+    if pairs:
+        rows, columns = np.array(pairs).T
+        matrix[rows, columns] = 1.0
+    return matrix
+
+
+def mmr_select(relevance, lat, lon, types, count, diversity=DIVERSITY_LAMBDA):
+    """
+    Pick places by maximal marginal relevance.
+
+    Similarity is the mean of a location term, halving every
+    ``SIMILAR_DISTANCE_M``, and the Jaccard overlap of the places' types.
+
+    Args:
+        relevance (ndarray): Relevance of each candidate
+        lat, lon (ndarray): Candidate locations
+        types (ndarray): Output of ``_type_matrix``
+        count (int): Places to pick
+        diversity (float): Weight of relevance against novelty, ``[0, 1]``
+
+    Returns:
+        tuple: ``(picked, penalty)``: candidate indexes in pick order, and
+        each pick's similarity to the most similar earlier pick
+    """
+    size = len(relevance)
+    type_counts = types.sum(axis=1)
+    closest = np.zeros(size)  # similarity to the most similar pick so far
+    available = np.ones(size, dtype=bool)
+    picked, penalty = [], []
+    for _ in range(min(count, size)):
+        marginal = diversity * relevance - (1 - diversity) * closest
+        best = int(np.argmax(np.where(available, marginal, -np.inf)))
+        picked.append(best)
+        penalty.append(float(closest[best]))
+        available[best] = False
+
+        shared = types @ types[best]
+        union = type_counts + type_counts[best] - shared
+        overlap = np.divide(shared, union, out=np.zeros(size), where=union > 0)
+        apart = haversine_m(lat[best], lon[best], lat, lon)
+        nearby = 0.5 ** (apart / SIMILAR_DISTANCE_M)
+        np.maximum(closest, (nearby + overlap) / 2, out=closest)
+    return picked, penalty
+
+
+def rank(places, latitude, longitude, radius, count, preferred_price=None):
+    """
+    The best ``count`` places, diversified, with their score breakdowns.
+
+    Args:
+        places (list): Candidate place dicts
+        latitude, longitude (float): Search point
+        radius (float): Search radius in metres
+        count (int): Places to return
+        preferred_price (int): User's preferred price level, or ``None``
+
+    Returns:
+        list: Place dicts in rank order, each with a ``score`` and a
+        ``score_breakdown``
+    """
+    if not places or count <= 0:
+        return []
+    scores = score_candidates(places, latitude, longitude, radius, preferred_price)
+    picked, penalty = mmr_select(
+        scores["relevance"],
+        _column(places, "latitude"),
+        _column(places, "longitude"),
+        _type_matrix(places),
+        count,
+    )
+
+    ranked = []
+    for index, similarity in zip(picked, penalty):
+        relevance = float(scores["relevance"][index])
+        smoothed = float(scores["smoothed_rating"][index])
+        ranked.append(
+            {
+                **places[index],
+                "score": round(
+                    DIVERSITY_LAMBDA * relevance - (1 - DIVERSITY_LAMBDA) * similarity,
+                    4,
+                ),
+                "score_breakdown": {
+                    "rating": round(float(scores["rating"][index]), 4),
+                    "distance": round(float(scores["distance"][index]), 4),
+                    "price": round(float(scores["price"][index]), 4),
+                    "relevance": round(relevance, 4),
+                    "similarity": round(similarity, 4),
+                    "smoothed_rating": round(smoothed, 2),
+                    "distance_m": round(float(scores["distance_m"][index])),
+                },
+            }
+        )
+    return ranked
+
+
+def preferred_price_level(user):
+    """The user's ``price_level`` preference as 0-4, or ``None`` if unset."""
+    value = user.get_preference("price_level")
+    try:
+        return min(max(int(value), 0), 4) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def recommend(user, latitude, longitude, search=None):
+    """
+    Ranked recommendations in every category.
+
+    Args:
+        user (User): User whose preferences apply
+        latitude, longitude (float): Search point
+        search (callable): Upstream nearby search taking ``latitude``,
+            ``longitude``, ``radius`` and ``place_type`` keywords, like
+            ``GooglePlacesService.get_nearby_places``; ``None`` to rank
+            cached places only
+
+    Returns:
+        dict: Ranked place list per ``Category.key``
+    """
+    preferred_price = preferred_price_level(user)
+    recommendations = {}
+    for category in CATEGORIES:
+        searched = (
+            search(
+                latitude=latitude,
+                longitude=longitude,
+                radius=category.radius,
+                place_type=category.google_type,
+            )
+            if search
+            else []
+        )
+        candidates = merge_candidates(
+            searched, cached_candidates(category, latitude, longitude)
+        )
+        recommendations[category.key] = rank(
+            candidates,
+            latitude,
+            longitude,
+            category.radius,
+            category.count,
+            preferred_price,
+        )
+    return recommendations
@@ -3,6 +3,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 import logging
 
+from .engine import recommend
+
 logger = logging.getLogger(__name__)
 
 # Try to import the Google Places service, but provide fallback if it fails
@@ -17,7 +19,7 @@ except ImportError as e:
 
 
 class RecommendationsView(generics.GenericAPIView):
-    """Get general recommendations for a location"""
+    """Get ranked recommendations in each category for a location."""
 
     permission_classes = [IsAuthenticated]
 
@@ -32,35 +34,21 @@ class RecommendationsView(generics.GenericAPIView):
             )
 
         try:
-            # Get nearby places of different types
-            attractions = google_places_service.get_nearby_places(
-                latitude=float(lat),
-                longitude=float(lng),
-                radius=10000,
-                place_type="tourist_attraction",
-            )
-
-            restaurants = google_places_service.get_nearby_places(
-                latitude=float(lat),
-                longitude=float(lng),
-                radius=5000,
-                place_type="restaurant",
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            return Response(
+                {"error": "Latitude and longitude must be numbers."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-            accommodations = google_places_service.get_nearby_places(
-                latitude=float(lat),
-                longitude=float(lng),
-                radius=15000,
-                place_type="lodging",
+        try:
+            # Upstream results are ranked together with cached places
+            search = (
+                google_places_service.get_nearby_places
+                if GOOGLE_PLACES_AVAILABLE
+                else None
             )
-
-            # Combine and limit results
-            recommendations = {
-                "attractions": attractions[:5],
-                "restaurants": restaurants[:5],
-                "accommodations": accommodations[:3],
-            }
-
+            recommendations = recommend(request.user, lat, lng, search)
             return Response(recommendations)
 
         except Exception as e:
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import Route, RouteLeg
 
-# Register your models here.
+
+class RouteLegInline(admin.TabularInline):
+    """Inline admin for the legs of a stored route."""
+
+    model = RouteLeg
+    extra = 0
+    fields = ("index", "distance", "duration")
+    readonly_fields = fields
+
+
+@admin.register(Route)
+class RouteAdmin(admin.ModelAdmin):
+    """Admin interface for stored routes."""
+
+    list_display = ("key", "weight", "total_distance", "hits", "last_used_at")
+    list_filter = ("weight",)
+    readonly_fields = ("key", "graph_token", "hits", "created_at", "last_used_at")
+    ordering = ("-last_used_at",)
+    inlines = [RouteLegInline]
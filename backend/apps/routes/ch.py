@@ -0,0 +1,518 @@
+"""
+Contraction hierarchy (CH) over a ``RoadGraph``.
+
+Preprocessing contracts nodes one at a time in order of importance (edge
+difference plus already-contracted neighbours, updated lazily), adding a
+shortcut ``u -> w`` through ``v`` whenever a bounded witness search finds
+no path from ``u`` to ``w`` that avoids ``v`` and is at least as cheap.
+Every edge ends up stored at its lower-ranked endpoint: as an upward
+forward edge if it leaves that node, or an upward backward edge if it
+enters it. A query then runs two small Dijkstra searches that only ever
+climb in rank, with stall-on-demand pruning, joins them at the cheapest
+common node and unpacks shortcuts to recover the original node path.
+
+The result is written to a single flat file that ``load`` maps into memory
+with ``numpy.memmap``, so worker processes share the pages and startup does
+not parse anything.
+"""
+
+import heapq
+import json
+import logging
+import math
+
+import numpy as np
+
+from .graph import Leg, NodeLocator
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TRIPCH01"
+ALIGNMENT = 64
+
+# Settled-node cap for witness searches; lower builds faster, higher
+# adds fewer redundant shortcuts
+WITNESS_SETTLE_LIMIT = 60
+
+ARRAY_DTYPES = {
+    "lat": np.float64,
+    "lon": np.float64,
+    "rank": np.int32,
+    "fwd_offsets": np.int64,
+    "fwd_targets": np.int32,
+    "fwd_distance": np.float32,
+    "fwd_duration": np.float32,
+    "fwd_middle": np.int32,
+    "bwd_offsets": np.int64,
+    "bwd_targets": np.int32,
+    "bwd_distance": np.float32,
+    "bwd_duration": np.float32,
+    "bwd_middle": np.int32,
+}
+
+
+class _Contractor:
+    """Mutable working state for ``build_hierarchy``."""
+
+    def __init__(self, graph, weight):
+        n = graph.num_nodes
+        self.weight_index = 0 if weight == "distance" else 1
+        # Edge tuples are (distance, duration, middle node or -1)
+        self.out = [{} for _ in range(n)]
+        self.inn = [{} for _ in range(n)]
+        self.contracted_neighbours = [0] * n
+        # Hierarchy depth below each node, which keeps the search spaces shallow
+        self.level = [0] * n
+
+        offsets = graph.offsets.tolist()
+        targets = graph.targets.tolist()
+        distance = graph.distance.tolist()
+        duration = graph.duration.tolist()
+        for u in range(n):
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                if v != u:
+                    self._add(u, v, (distance[e], duration[e], -1))
+
+    def _add(self, u, v, edge):
+        current = self.out[u].get(v)
+        if current is None or edge[self.weight_index] < current[self.weight_index]:
+            self.out[u][v] = edge
+            self.inn[v][u] = edge
+
+    def _witness_costs(self, source, excluded, limit, targets):
+        """Costs from ``source`` avoiding ``excluded``, until ``targets`` settle."""
+        w = self.weight_index
+        costs = {source: 0.0}
+        heap = [(0.0, source)]
+        remaining = len(targets)
+        settled = 0
+        while heap and settled < WITNESS_SETTLE_LIMIT:
+            cost, node = heapq.heappop(heap)
+            if cost > costs[node]:
+                continue
+            if cost > limit:
+                break
+            settled += 1
+            if node in targets:
+                remaining -= 1
+                if not remaining:
+                    break
+            for neighbour, edge in self.out[node].items():
+                if neighbour == excluded:
+                    continue
+                new_cost = cost + edge[w]
+                if new_cost < costs.get(neighbour, math.inf):
+                    costs[neighbour] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbour))
+        return costs
+
+    def shortcuts(self, v):
+        """Shortcuts needed to contract ``v`` as ``(u, w, edge)`` triples."""
+        w_index = self.weight_index
+        outgoing = self.out[v]
+        needed = []
+        for u, in_edge in self.inn[v].items():
+            limit = in_edge[w_index] + max(
+                (edge[w_index] for t, edge in outgoing.items() if t != u),
+                default=-1,
+            )
+            if limit < 0:
+                continue
+            witness = self._witness_costs(u, v, limit, outgoing.keys() - {u})
+            for t, out_edge in outgoing.items():
+                if t == u:
+                    continue
+                cost = in_edge[w_index] + out_edge[w_index]
+                if witness.get(t, math.inf) > cost:
+                    needed.append(
+                        (
+                            u,
+                            t,
+                            (in_edge[0] + out_edge[0], in_edge[1] + out_edge[1], v),
+                        )
+                    )
+        return needed
+
+    def priority(self, v, shortcuts=None):
+        if shortcuts is None:
+            shortcuts = self.shortcuts(v)
+        removed = len(self.inn[v]) + len(self.out[v])
+        return (
+            2 * (len(shortcuts) - removed)
+            + self.contracted_neighbours[v]
+            + self.level[v]
+        )
+
+    def contract(self, v, shortcuts):
+        """Remove ``v`` and add ``shortcuts``, returning its upward edges."""
+        upward_out = self.out[v]
+        upward_in = self.inn[v]
+        for u in upward_in:
+            del self.out[u][v]
+            self.contracted_neighbours[u] += 1
+            self.level[u] = max(self.level[u], self.level[v] + 1)
+        for t in upward_out:
+            del self.inn[t][v]
+            self.contracted_neighbours[t] += 1
+            self.level[t] = max(self.level[t], self.level[v] + 1)
+        for u, t, edge in shortcuts:
+            self._add(u, t, edge)
+        self.out[v] = {}
+        self.inn[v] = {}
+        return upward_out, upward_in
+
+
+def _pack(adjacency):
+    """Flatten per-node ``{target: edge}`` dicts into CSR arrays."""
+    counts = [len(edges) for edges in adjacency]
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    flat = [(t, *edge) for edges in adjacency for t, edge in edges.items()]
+    if flat:
+        targets, distance, duration, middle = zip(*flat)
+    else:
+        targets = distance = duration = middle = ()
+    return (
+        offsets,
+        np.array(targets, dtype=np.int32),
+        np.array(distance, dtype=np.float32),
+        np.array(duration, dtype=np.float32),
+        np.array(middle, dtype=np.int32),
+    )
+
+
+def build_hierarchy(graph, weight="duration", progress=None):
+    """
+    Contract ``graph`` into a hierarchy optimised for ``weight``.
+
+    Args:
+        graph (RoadGraph): Graph to preprocess
+        weight (str): ``"duration"`` or ``"distance"``
+        progress (callable): Called with the contracted count every 10,000 nodes
+
+    Returns:
+        ContractionHierarchy: In-memory hierarchy ready to query or ``save``
+    """
+    n = graph.num_nodes
+    state = _Contractor(graph, weight)
+    heap = [(state.priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+
+    rank = np.zeros(n, dtype=np.int32)
+    forward = [None] * n
+    backward = [None] * n
+    contracted = [False] * n
+    next_rank = 0
+
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # Lazy update: re-queue if the priority went stale and v is no longer best
+        shortcuts = state.shortcuts(v)
+        current = state.priority(v, shortcuts)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        forward[v], backward[v] = state.contract(v, shortcuts)
+        contracted[v] = True
+        rank[v] = next_rank
+        next_rank += 1
+        if progress and next_rank % 10000 == 0:
+            progress(next_rank)
+
+    arrays = {"lat": graph.lat, "lon": graph.lon, "rank": rank}
+    for prefix, adjacency in (("fwd", forward), ("bwd", backward)):
+        offsets, targets, distance, duration, middle = _pack(adjacency)
+        arrays[f"{prefix}_offsets"] = offsets
+        arrays[f"{prefix}_targets"] = targets
+        arrays[f"{prefix}_distance"] = distance
+        arrays[f"{prefix}_duration"] = duration
+        arrays[f"{prefix}_middle"] = middle
+
+    hierarchy = ContractionHierarchy(arrays, weight)
+    logger.info(
+        f"Contraction hierarchy: {n} nodes, {graph.num_edges} edges -> "
+        f"{hierarchy.num_edges} upward edges"
+    )
+    return hierarchy
+
+
+class ContractionHierarchy(NodeLocator):
+    """Queryable hierarchy, either freshly built or memory-mapped from disk."""
+
+    def __init__(self, arrays, weight):
+        self.weight = weight
+        for name, dtype in ARRAY_DTYPES.items():
+            setattr(self, name, np.asanyarray(arrays[name], dtype=dtype))
+
+        # Python-level views; indexing a memoryview is much cheaper than numpy
+        self._rank = self.rank.data
+        self._views = {
+            prefix: {
+                field: getattr(self, f"{prefix}_{field}").data
+                for field in ("offsets", "targets", "distance", "duration", "middle")
+            }
+            for prefix in ("fwd", "bwd")
+        }
+        self._adjacency_cache = {"fwd": {}, "bwd": {}}
+
+    @property
+    def num_nodes(self):
+        return len(self.lat)
+
+    @property
+    def num_edges(self):
+        return len(self.fwd_targets) + len(self.bwd_targets)
+
+    def save(self, path):
+        """Write all arrays to one file laid out for ``numpy.memmap``."""
+        layout = {}
+        offset = 0
+        for name, dtype in ARRAY_DTYPES.items():
+            array = getattr(self, name)
+            layout[name] = {"dtype": np.dtype(dtype).str, "length": len(array)}
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout[name]["offset"] = offset
+            offset += array.nbytes
+
+        header = json.dumps({"weight": self.weight, "arrays": layout}).encode()
+        data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+        with open(path, "wb") as fh:
+            fh.write(MAGIC)
+            fh.write(len(header).to_bytes(8, "little"))
+            fh.write(header)
+            for name in ARRAY_DTYPES:
+                fh.seek(data_start + layout[name]["offset"])
+                fh.write(getattr(self, name).tobytes())
+            fh.truncate(data_start + offset)
+
+    @classmethod
+    def load(cls, path):
+        """Map a file written by ``save`` into memory without copying it."""
+        with open(path, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a contraction hierarchy file")
+            header_length = int.from_bytes(fh.read(8), "little")
+            header = json.loads(fh.read(header_length))
+
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            if spec["length"] == 0:
+                arrays[name] = np.zeros(0, dtype=spec["dtype"])
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=spec["dtype"],
+                mode="r",
+                offset=data_start + spec["offset"],
+                shape=(spec["length"],),
+            )
+        return cls(arrays, header["weight"])
+
+    def _adjacency(self, prefix, node):
+        """
+        Upward edges of ``node`` as ``(neighbour, cost, edge index)`` tuples.
+
+        Lists are built from the mapped arrays on first use and kept, since
+        iterating tuples is several times cheaper than indexing the arrays.
+        """
+        cache = self._adjacency_cache[prefix]
+        edges = cache.get(node)
+        if edges is None:
+            views = self._views[prefix]
+            targets = views["targets"]
+            costs = views[self.weight]
+            edges = cache[node] = [
+                (targets[e], costs[e], e)
+                for e in range(views["offsets"][node], views["offsets"][node + 1])
+            ]
+        return edges
+
+    def _upward_search(self, origin, up, down):
+        """
+        Exhaustive Dijkstra over upward edges with stall-on-demand.
+
+        A node is stalled, and not expanded, when a higher node reached over
+        an edge in the opposite direction already gives it a lower cost.
+        """
+        adjacency = self._adjacency
+        costs = {origin: 0.0}
+        parents = {origin: None}
+        heap = [(0.0, origin)]
+        get = costs.get
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > costs[node]:
+                continue
+            for above, weight, _ in adjacency(down, node):
+                if get(above, math.inf) + weight < cost:
+                    break
+            else:
+                for neighbour, weight, edge in adjacency(up, node):
+                    new_cost = cost + weight
+                    if new_cost < get(neighbour, math.inf):
+                        costs[neighbour] = new_cost
+                        parents[neighbour] = (node, edge)
+                        heapq.heappush(heap, (new_cost, neighbour))
+        return costs, parents
+
+    def _meet(self, source, target):
+        """
+        Run the forward and backward upward searches and join them.
+
+        Returns:
+            tuple: ``(cost, meeting node, forward parents, backward parents)``;
+            the meeting node is None when ``target`` is unreachable. Parents
+            map a node to ``(previous node, edge index)``.
+        """
+        forward_costs, forward = self._upward_search(source, "fwd", "bwd")
+        backward_costs, backward = self._upward_search(target, "bwd", "fwd")
+
+        best = math.inf
+        meeting = None
+        for node, cost in forward_costs.items():
+            other = backward_costs.get(node)
+            if other is not None and cost + other < best:
+                best = cost + other
+                meeting = node
+        return best, meeting, forward, backward
+
+    def _search_totals(self, origin, up, down):
+        """
+        Upward search that also totals distance and duration to every node.
+
+        Returns:
+            dict: ``{node: (cost, distance, duration)}``
+        """
+        costs, parents = self._upward_search(origin, up, down)
+        views = self._views[up]
+        distance, duration = views["distance"], views["duration"]
+        totals = {origin: (0.0, 0.0, 0.0)}
+        for node in costs:
+            chain = []
+            while node not in totals:
+                chain.append(node)
+                node = parents[node][0]
+            _, dist, time = totals[node]
+            for node in reversed(chain):
+                edge = parents[node][1]
+                dist += distance[edge]
+                time += duration[edge]
+                totals[node] = (costs[node], dist, time)
+        return totals
+
+    def many_to_many(self, sources, targets):
+        """
+        Cheapest legs between every source and every target node.
+
+        Runs one backward search per target, leaving ``(target, cost)``
+        entries in buckets at the nodes it reaches, then one forward search
+        per source that scans the buckets of the nodes it settles: ``n + m``
+        searches instead of ``n * m`` point-to-point queries.
+
+        Returns:
+            tuple: ``(distance, duration)`` arrays of shape ``(n, m)`` in
+            metres and seconds, NaN where a target is unreachable
+        """
+        buckets = {}
+        for column, target in enumerate(targets):
+            totals = self._search_totals(target, "bwd", "fwd")
+            for node, entry in totals.items():
+                buckets.setdefault(node, []).append((column, *entry))
+
+        distance = np.full((len(sources), len(targets)), np.nan)
+        duration = np.full((len(sources), len(targets)), np.nan)
+        for row, source in enumerate(sources):
+            best = [math.inf] * len(targets)
+            for node, (cost, dist, time) in self._search_totals(
+                source, "fwd", "bwd"
+            ).items():
+                for column, other, other_dist, other_time in buckets.get(node, ()):
+                    if cost + other < best[column]:
+                        best[column] = cost + other
+                        distance[row, column] = dist + other_dist
+                        duration[row, column] = time + other_time
+        return distance, duration
+
+    def _find_edge(self, u, v):
+        """Locate the stored edge ``u -> v`` as ``(prefix, index)``."""
+        if self._rank[u] < self._rank[v]:
+            prefix, owner, other = "fwd", u, v
+        else:
+            prefix, owner, other = "bwd", v, u
+        views = self._views[prefix]
+        targets = views["targets"]
+        for index in range(views["offsets"][owner], views["offsets"][owner + 1]):
+            if targets[index] == other:
+                return prefix, index
+        raise ValueError(f"Hierarchy has no edge {u} -> {v}")
+
+    def _unpack(self, edges):
+        """Expand ``(u, v, prefix, index)`` edges into original-edge node pairs."""
+        stack = list(reversed(edges))
+        nodes = [edges[0][0]]
+        while stack:
+            u, v, prefix, index = stack.pop()
+            middle = self._views[prefix]["middle"][index]
+            if middle < 0:
+                nodes.append(v)
+                continue
+            second = self._find_edge(middle, v)
+            first = self._find_edge(u, middle)
+            stack.append((middle, v, *second))
+            stack.append((u, middle, *first))
+        return nodes
+
+    def _geometry(self, nodes):
+        lat = self.lat.data
+        lon = self.lon.data
+        return [[lon[n], lat[n]] for n in nodes]
+
+    def route_leg(self, source, target):
+        """
+        Shortest path between two nodes.
+
+        Returns:
+            Leg: Distance, duration and unpacked geometry, or None if unreachable
+        """
+        if source == target:
+            return Leg(
+                distance=0.0,
+                duration=0.0,
+                nodes=[source],
+                geometry=[[float(self.lon[source]), float(self.lat[source])]],
+            )
+
+        _, meeting, forward, backward = self._meet(source, target)
+        if meeting is None:
+            return None
+
+        edges = []
+        node = meeting
+        while forward[node] is not None:
+            previous, index = forward[node]
+            edges.append((previous, node, "fwd", index))
+            node = previous
+        edges.reverse()
+        node = meeting
+        while backward[node] is not None:
+            following, index = backward[node]
+            edges.append((node, following, "bwd", index))
+            node = following
+
+        # Shortcuts carry the totals of the edges they replace
+        views = self._views
+        distance = sum(views[p]["distance"][i] for *_, p, i in edges)
+        duration = sum(views[p]["duration"][i] for *_, p, i in edges)
+        nodes = self._unpack(edges)
+        return Leg(
+            distance=distance,
+            duration=duration,
+            nodes=nodes,
+            geometry=self._geometry(nodes),
+        )
@@ -0,0 +1,345 @@
+"""
+Point-to-point routing over a ``RoadGraph`` or ``ContractionHierarchy``.
+
+On a plain graph, queries run A* with a great-circle heuristic:
+straight-line distance when minimising distance, and straight-line distance
+at the graph's top speed when minimising travel time, so the heuristic
+never overestimates. A ``.ch`` file built by ``build_contraction_hierarchy``
+answers the same queries far faster for the weight it was built for.
+``route_matrix`` answers many-to-many queries with one search per source
+(or per endpoint on a hierarchy) rather than one per pair. The graph is
+loaded once per process from ``settings.ROUTING_GRAPH_PATH``.
+"""
+
+import heapq
+import logging
+import math
+import os
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .ch import ContractionHierarchy
+from .graph import EARTH_RADIUS_M, Leg, RoadGraph
+from .scenic import normalize_scenery, path_scenic_score, scenic_costs
+
+logger = logging.getLogger(__name__)
+
+_load_lock = threading.Lock()
+
+
+class RoutingError(Exception):
+    """Base class for routing failures."""
+
+
+class RoutingUnavailable(RoutingError):
+    """No road graph is configured or it could not be loaded."""
+
+
+class WaypointNotRoutable(RoutingError):
+    """A waypoint is too far from any road in the graph."""
+
+
+class NoRouteFound(RoutingError):
+    """Two waypoints are not connected in the graph."""
+
+
+@lru_cache(maxsize=2)
+def _load(path, modified):
+    logger.info(f"Loading road graph from {path}")
+    if path.endswith(".ch"):
+        return ContractionHierarchy.load(path)
+    return RoadGraph.load(path)
+
+
+def get_road_graph():
+    """
+    Return the process-wide road graph.
+
+    Raises:
+        RoutingUnavailable: If ``ROUTING_GRAPH_PATH`` is unset or unreadable
+    """
+    path = settings.ROUTING_GRAPH_PATH
+    if not path:
+        raise RoutingUnavailable("Routing graph is not configured")
+    with _load_lock:
+        try:
+            # Keyed by modification time so a rewritten file is picked up
+            return _load(path, os.stat(path).st_mtime_ns)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.error(f"Could not load road graph from {path}: {exc}")
+            raise RoutingUnavailable("Routing graph could not be loaded") from exc
+
+
+def graph_token():
+    """Identify the configured graph file, changing whenever it is rebuilt."""
+    path = settings.ROUTING_GRAPH_PATH
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        modified = 0
+    return f"{zlib.crc32(path.encode()):08x}{modified:x}"
+
+
+def _heuristic(graph, target, weight):
+    """Build an admissible lower bound on the remaining cost to ``target``."""
+    lat = graph.lat.data
+    lon = graph.lon.data
+    target_lat = math.radians(lat[target])
+    target_lon = math.radians(lon[target])
+    cos_target = math.cos(target_lat)
+    scale = 2 * EARTH_RADIUS_M
+    if weight == "duration":
+        scale /= graph.max_speed
+
+    def estimate(node):
+        node_lat = math.radians(lat[node])
+        a = (
+            math.sin((target_lat - node_lat) / 2) ** 2
+            + math.cos(node_lat)
+            * cos_target
+            * math.sin((target_lon - math.radians(lon[node])) / 2) ** 2
+        )
+        return scale * math.asin(math.sqrt(min(a, 1.0)))
+
+    return estimate
+
+
+def edge_costs(graph, weight="duration", scenery=0):
+    """
+    Cost of every edge for a query.
+
+    Args:
+        graph (RoadGraph): Graph to search
+        weight (str): ``"duration"`` or ``"distance"``
+        scenery (float): 0-1 preference for scenic roads over travel time
+
+    Raises:
+        RoutingError: If scenery is asked for on a distance query
+        RoutingUnavailable: If the graph has no scenic scores yet
+    """
+    scenery = normalize_scenery(scenery)
+    if not scenery:
+        return getattr(graph, weight)
+    if weight != "duration":
+        raise RoutingError("Scenic routes trade scenery against travel time")
+    if graph.scenic is None:
+        raise RoutingUnavailable("Routing graph has no scenic scores yet")
+    return scenic_costs(graph, scenery)
+
+
+def shortest_path(graph, source, target, weight="duration", costs=None):
+    """
+    Find the cheapest path between two nodes with A*.
+
+    Args:
+        graph (RoadGraph): Graph to search
+        source, target (int): Node ids
+        weight (str): ``"duration"`` or ``"distance"``
+        costs (ndarray): Edge costs from ``edge_costs``; defaults to ``weight``.
+            They must never be below ``weight`` so the heuristic stays valid
+
+    Returns:
+        list: Node ids from ``source`` to ``target``, or None if unreachable
+    """
+    if source == target:
+        return [source]
+
+    offsets = graph.offsets.data
+    targets = graph.targets.data
+    costs = (getattr(graph, weight) if costs is None else costs).data
+    estimate = _heuristic(graph, target, weight)
+
+    best = {source: 0.0}
+    parent = {source: None}
+    closed = set()
+    heap = [(estimate(source), 0.0, source)]
+
+    while heap:
+        _, cost, node = heapq.heappop(heap)
+        if node == target:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parent[node]
+            return path[::-1]
+        if node in closed:
+            continue
+        closed.add(node)
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            neighbour = targets[edge]
+            if neighbour in closed:
+                continue
+            new_cost = cost + costs[edge]
+            if new_cost < best.get(neighbour, math.inf):
+                best[neighbour] = new_cost
+                parent[neighbour] = node
+                heapq.heappush(
+                    heap, (new_cost + estimate(neighbour), new_cost, neighbour)
+                )
+
+    return None
+
+
+def _edge(graph, source, target, costs):
+    """Index of the cheapest edge from ``source`` to ``target``."""
+    start, end = graph.offsets[source], graph.offsets[source + 1]
+    edges = start + (graph.targets[start:end] == target).nonzero()[0]
+    return edges[costs[edges].argmin()]
+
+
+def path_leg(graph, path, weight="duration", costs=None):
+    """Total up distance, duration and geometry along a node path."""
+    costs = getattr(graph, weight) if costs is None else costs
+    edges = [_edge(graph, a, b, costs) for a, b in zip(path, path[1:])]
+    return Leg(
+        distance=float(graph.distance[edges].sum(dtype=float)) if edges else 0.0,
+        duration=float(graph.duration[edges].sum(dtype=float)) if edges else 0.0,
+        nodes=path,
+        geometry=[[float(graph.lon[n]), float(graph.lat[n])] for n in path],
+        scenic_score=path_scenic_score(graph, edges),
+    )
+
+
+def route_leg(graph, source, target, weight="duration", scenery=0):
+    """
+    Route between two nodes on either kind of graph.
+
+    Args:
+        scenery (float): 0-1 preference for scenic roads; needs a scored
+            ``RoadGraph``, since a hierarchy is fixed to one cost
+
+    Returns:
+        Leg: The cheapest leg, or None if ``target`` is unreachable
+    """
+    if isinstance(graph, ContractionHierarchy):
+        if normalize_scenery(scenery):
+            raise RoutingUnavailable("Scenic routes need a .npz road graph")
+        if weight != graph.weight:
+            raise RoutingError(
+                f"Routing graph was built for {graph.weight}, not {weight}"
+            )
+        return graph.route_leg(source, target)
+
+    costs = edge_costs(graph, weight, scenery)
+    path = shortest_path(graph, source, target, weight, costs)
+    return None if path is None else path_leg(graph, path, weight, costs)
+
+
+def _one_to_many(graph, source, targets, weight):
+    """
+    Dijkstra from ``source`` until every node in ``targets`` is settled.
+
+    Returns:
+        dict: ``{target: (distance, duration)}`` for the reachable targets
+    """
+    offsets = graph.offsets.data
+    edge_targets = graph.targets.data
+    costs = getattr(graph, weight).data
+    distance = graph.distance.data
+    duration = graph.duration.data
+
+    remaining = set(targets)
+    found = {}
+    best = {source: 0.0}
+    totals = {source: (0.0, 0.0)}
+    heap = [(0.0, source)]
+    while heap and remaining:
+        cost, node = heapq.heappop(heap)
+        if cost > best[node]:
+            continue
+        dist, time = totals[node]
+        if node in remaining:
+            remaining.discard(node)
+            found[node] = (dist, time)
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            neighbour = edge_targets[edge]
+            new_cost = cost + costs[edge]
+            if new_cost < best.get(neighbour, math.inf):
+                best[neighbour] = new_cost
+                totals[neighbour] = (dist + distance[edge], time + duration[edge])
+                heapq.heappush(heap, (new_cost, neighbour))
+    return found
+
+
+def route_matrix(graph, sources, targets, weight="duration"):
+    """
+    Cheapest legs between every pair of ``sources`` and ``targets`` nodes.
+
+    A hierarchy answers with its many-to-many search; a plain graph runs one
+    Dijkstra per distinct source that stops once every target is settled.
+
+    Returns:
+        tuple: ``(distance, duration)`` arrays of shape ``(n, m)`` in metres
+        and seconds, NaN where a target is unreachable
+    """
+    if isinstance(graph, ContractionHierarchy):
+        if weight != graph.weight:
+            raise RoutingError(
+                f"Routing graph was built for {graph.weight}, not {weight}"
+            )
+        return graph.many_to_many(sources, targets)
+
+    distance = np.full((len(sources), len(targets)), np.nan)
+    duration = np.full((len(sources), len(targets)), np.nan)
+    rows = {}
+    for row, source in enumerate(sources):
+        if source not in rows:
+            rows[source] = _one_to_many(graph, source, targets, weight)
+        found = rows[source]
+        for column, target in enumerate(targets):
+            if target in found:
+                distance[row, column], duration[row, column] = found[target]
+    return distance, duration
+
+
+def snap_waypoints(graph, waypoints):
+    """
+    Snap ``(lat, lon)`` waypoints to their nearest graph nodes.
+
+    Raises:
+        WaypointNotRoutable: If a waypoint is farther than
+            ``ROUTING_MAX_SNAP_DISTANCE`` metres from every road
+    """
+    nodes = []
+    for index, (lat, lon) in enumerate(waypoints):
+        node, _ = graph.nearest_node(lat, lon, settings.ROUTING_MAX_SNAP_DISTANCE)
+        if node is None:
+            raise WaypointNotRoutable(f"Waypoint {index + 1} is not near a road")
+        nodes.append(node)
+    return nodes
+
+
+def route(waypoints, weight="duration", graph=None, scenery=0):
+    """
+    Route through ``waypoints`` in order.
+
+    Args:
+        waypoints (list): ``(lat, lon)`` pairs, at least two
+        weight (str): ``"duration"`` (fastest) or ``"distance"`` (shortest)
+        graph (RoadGraph or ContractionHierarchy): Overrides the configured graph
+        scenery (float): 0-1 preference for scenic roads over travel time
+
+    Returns:
+        list: One ``Leg`` per consecutive pair of waypoints
+
+    Raises:
+        RoutingError: If the graph is unavailable or a leg cannot be routed
+    """
+    graph = graph or get_road_graph()
+    nodes = snap_waypoints(graph, waypoints)
+
+    legs = []
+    for index, (source, target) in enumerate(zip(nodes, nodes[1:])):
+        leg = route_leg(graph, source, target, weight, scenery)
+        if leg is None:
+            raise NoRouteFound(
+                f"No route between waypoints {index + 1} and {index + 2}"
+            )
+        legs.append(leg)
+    return legs
@@ -0,0 +1,187 @@
+"""
+Route line geometry: encoded polylines, simplification and levels of detail.
+
+Polylines use the Google/Mapbox encoding with 5 decimal places (Mapbox's
+``polyline`` geometry) and decode to ``(lat, lon)`` rows. Encoding and
+decoding work on whole numpy arrays rather than character by character.
+
+A level of detail for zoom ``z`` is the line simplified with Douglas-Peucker
+to a tolerance of one 256-pixel web map tile pixel at that zoom, so it draws
+the same as the full line at ``z`` and below while holding a fraction of the
+points.
+"""
+
+import zlib
+
+import numpy as np
+
+POLYLINE_PRECISION = 5
+
+# Zooms that get a simplified copy of a route; deeper zooms use the full line
+LEVEL_ZOOMS = (4, 7, 10, 13)
+
+
+def decode_polyline(text, precision=POLYLINE_PRECISION):
+    """
+    Decode an encoded polyline.
+
+    Returns:
+        ndarray: ``(n, 2)`` array of ``(lat, lon)``
+
+    Raises:
+        ValueError: If ``text`` is not a well-formed polyline
+    """
+    try:
+        data = np.frombuffer(text.encode("ascii"), dtype=np.uint8).astype(np.int64)
+    except UnicodeEncodeError:
+        raise ValueError("Polyline must be ASCII") from None
+    if not data.size:
+        return np.zeros((0, 2))
+    data -= 63
+    if data.min() < 0 or data.max() > 63:
+        raise ValueError("Polyline contains invalid characters")
+
+    # Each value is a run of 5-bit chunks, least significant first; the 0x20
+    # bit is set on every chunk but the last
+    ends = (data & 0x20) == 0
+    if not ends[-1]:
+        raise ValueError("Polyline is truncated")
+    starts = np.flatnonzero(np.concatenate([[True], ends[:-1]]))
+    value_index = np.cumsum(np.concatenate([[0], ends[:-1]]))
+    position = np.arange(len(data)) - starts[value_index]
+    values = np.add.reduceat((data & 0x1F) << (5 * position), starts)
+    if len(values) % 2:
+        raise ValueError("Polyline has an odd number of values")
+
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10**precision
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    """Encode ``(lat, lon)`` points as a polyline string."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return ""
+
+    # Round half up like the reference encoder's Math.round
+    ints = np.floor(points * 10**precision + 0.5).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chunks = max(1, -(-int(values.max()).bit_length() // 5))
+    remaining = values[:, None] >> (5 * np.arange(chunks))
+    present = remaining > 0
+    present[:, 0] = True
+    chars = (remaining & 0x1F) + np.where(remaining >= 0x20, 0x20, 0) + 63
+    return chars[present].astype(np.uint8).tobytes().decode("ascii")
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of a ``(lat, lon)`` line.
+
+    Distances are measured on an equirectangular projection around the
+    line's mean latitude, in degrees of latitude.
+
+    Args:
+        points (ndarray): ``(n, 2)`` array of ``(lat, lon)``
+        tolerance (float): Largest allowed deviation, in degrees
+
+    Returns:
+        ndarray: The retained points, always including both ends
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points.copy()
+
+    scale = np.cos(np.radians(points[:, 0].mean()))
+    xy = np.column_stack([points[:, 1] * scale, points[:, 0]])
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = xy[first]
+        segment = xy[last] - start
+        offsets = xy[first + 1:last] - start
+        # Distance to the segment, not the infinite line, so hairpins survive
+        length = segment @ segment
+        if length:
+            t = np.clip(offsets @ segment / length, 0.0, 1.0)
+            offsets = offsets - t[:, None] * segment
+        distance = np.einsum("ij,ij->i", offsets, offsets)
+        farthest = int(distance.argmax())
+        if distance[farthest] > tolerance * tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+
+def pixel_tolerance(zoom):
+    """Degrees covered by one 256-pixel tile pixel at ``zoom``."""
+    return 360 / (256 * 2**zoom)
+
+
+def route_bounds(points):
+    """Bounding box of ``(lat, lon)`` points for map fitting, or None."""
+    if not len(points):
+        return None
+    north, east = points.max(axis=0).tolist()
+    south, west = points.min(axis=0).tolist()
+    return {
+        "northeast": {"lat": north, "lng": east},
+        "southwest": {"lat": south, "lng": west},
+    }
+
+
+def checksum(text):
+    return zlib.crc32(text.encode())
+
+
+def build_levels(text):
+    """
+    Simplify an encoded route for each of ``LEVEL_ZOOMS``.
+
+    Levels that would keep as many points as the next finer one are left
+    out, since that finer line serves them just as well.
+
+    Returns:
+        tuple: ``(levels, bounds)``; ``levels`` maps zoom strings to encoded
+        polylines
+
+    Raises:
+        ValueError: If ``text`` is not a well-formed polyline
+    """
+    points = decode_polyline(text)
+    levels = {}
+    finer = len(points)
+    for zoom in sorted(LEVEL_ZOOMS, reverse=True):
+        simplified = simplify(points, pixel_tolerance(zoom))
+        if len(simplified) < finer:
+            levels[str(zoom)] = encode_polyline(simplified)
+            finer = len(simplified)
+    return levels, route_bounds(points)
+
+
+def level_for_zoom(levels, full, zoom=None):
+    """
+    Pick the coarsest stored line that still draws accurately at ``zoom``.
+
+    Args:
+        levels (dict): Zoom strings to encoded polylines, from ``build_levels``
+        full (str): The full-resolution encoded line
+        zoom (int): Map zoom; None asks for the full line
+
+    Returns:
+        tuple: ``(level zoom or None for the full line, encoded polyline)``
+    """
+    if zoom is not None:
+        for level in sorted(int(key) for key in levels):
+            if level >= zoom:
+                return level, levels[str(level)]
+    return None, full
@@ -0,0 +1,394 @@
+"""
+Road graph in compressed sparse row (CSR) form.
+
+Nodes are the distinct vertices of the OSM ways in a GeoJSON extract (as
+written by ``osmium export`` or ``ogr2ogr``); every consecutive pair of
+vertices becomes a directed edge carrying its length in metres and its
+free-flow travel time in seconds. The outgoing edges of node ``n`` are
+``targets[offsets[n]:offsets[n + 1]]``, so the whole graph lives in a
+handful of flat numpy arrays that can be saved to and loaded from a single
+``.npz`` file.
+"""
+
+import json
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Free-flow speeds in km/h by OSM ``highway`` class; other classes
+# (footway, cycleway, steps, ...) are not routable by car
+HIGHWAY_SPEEDS = {
+    "motorway": 100,
+    "motorway_link": 60,
+    "trunk": 80,
+    "trunk_link": 50,
+    "primary": 65,
+    "primary_link": 45,
+    "secondary": 55,
+    "secondary_link": 40,
+    "tertiary": 45,
+    "tertiary_link": 35,
+    "unclassified": 35,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15,
+    "road": 30,
+    "track": 15,
+}
+
+# Edge road classes are stored as indexes into this tuple
+ROAD_CLASSES = tuple(HIGHWAY_SPEEDS)
+UNKNOWN_ROAD_CLASS = 255
+
+ONEWAY_VALUES = {"yes", "true", "1"}
+REVERSE_VALUES = {"-1", "reverse"}
+
+# Coordinates are merged into one node when they agree to 1e-7 degrees
+COORDINATE_PRECISION = 7
+
+# Snapping grid cell size in degrees (roughly 1.1 km at the equator)
+GRID_CELL_DEGREES = 0.01
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; accepts scalars or numpy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def parse_maxspeed(value):
+    """
+    Parse an OSM ``maxspeed`` tag into km/h.
+
+    Returns:
+        float or None: Speed in km/h, or None for symbolic values like ``KE:urban``
+    """
+    if value is None:
+        return None
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*(mph)?\s*$", str(value))
+    if not match:
+        return None
+    speed = float(match.group(1))
+    if match.group(2):
+        speed *= 1.609344
+    return speed if speed > 0 else None
+
+
+def _way_speed(properties):
+    speed = parse_maxspeed(properties.get("maxspeed"))
+    return speed or HIGHWAY_SPEEDS[properties["highway"]]
+
+
+def _way_direction(properties):
+    """Return ``(forward, backward)`` for a way's oneway tagging."""
+    oneway = str(properties.get("oneway", "")).lower()
+    if oneway in REVERSE_VALUES:
+        return False, True
+    if oneway in ONEWAY_VALUES:
+        return True, False
+    if oneway == "no":
+        return True, True
+    # Roundabouts and motorways are implicitly oneway
+    implied = properties.get("junction") == "roundabout" or properties[
+        "highway"
+    ] in ("motorway", "motorway_link")
+    return True, not implied
+
+
+def _iter_lines(geometry):
+    if not geometry:
+        return
+    if geometry["type"] == "LineString":
+        yield geometry["coordinates"]
+    elif geometry["type"] == "MultiLineString":
+        yield from geometry["coordinates"]
+
+
+@dataclass
+class Leg:
+    """Route between two consecutive waypoints."""
+
+    distance: float  # metres
+    duration: float  # seconds
+    nodes: list = field(default_factory=list)
+    geometry: list = field(default_factory=list)  # [lon, lat] pairs
+    scenic_score: float = None  # length-weighted, when the graph is scored
+
+
+class NodeLocator:
+    """
+    Nearest-node lookup for graphs with ``lat`` and ``lon`` node arrays.
+
+    Nodes are bucketed into a coarse lat/lon grid on first use, so a lookup
+    only measures the nodes in the cells around the query point.
+    """
+
+    _grid = None
+
+    def _build_grid(self):
+        cells = self._cell_keys(self.lat, self.lon)
+        order = np.argsort(cells, kind="stable")
+        keys, starts = np.unique(cells[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self._grid = (
+            order,
+            {key: (start, end) for key, start, end in zip(keys.tolist(), starts, ends)},
+        )
+
+    @staticmethod
+    def _cell_keys(lat, lon):
+        rows = np.floor(np.asarray(lat) / GRID_CELL_DEGREES).astype(np.int64)
+        cols = np.floor(np.asarray(lon) / GRID_CELL_DEGREES).astype(np.int64)
+        return rows * 100000 + cols
+
+    def nearest_node(self, lat, lon, max_distance):
+        """
+        Find the graph node closest to a coordinate.
+
+        Args:
+            lat, lon (float): Coordinate to snap
+            max_distance (float): Search radius in metres
+
+        Returns:
+            tuple: ``(node, distance_m)``, or ``(None, None)`` if nothing is in range
+        """
+        if self._grid is None:
+            self._build_grid()
+        order, cells = self._grid
+
+        row = math.floor(lat / GRID_CELL_DEGREES)
+        col = math.floor(lon / GRID_CELL_DEGREES)
+        # Cells shrink east-west away from the equator
+        lat_span = GRID_CELL_DEGREES * 111_000
+        lon_span = lat_span * max(math.cos(math.radians(lat)), 0.01)
+        row_rings = math.ceil(max_distance / lat_span)
+        col_rings = math.ceil(max_distance / lon_span)
+
+        candidates = [
+            order[cells[key][0]:cells[key][1]]
+            for r in range(row - row_rings, row + row_rings + 1)
+            for c in range(col - col_rings, col + col_rings + 1)
+            if (key := r * 100000 + c) in cells
+        ]
+        if not candidates:
+            return None, None
+
+        nodes = np.concatenate(candidates)
+        distances = haversine_m(lat, lon, self.lat[nodes], self.lon[nodes])
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None, None
+        return int(nodes[best]), float(distances[best])
+
+
+class RoadGraph(NodeLocator):
+    """
+    Directed road graph with per-edge distance and duration.
+
+    Edges also carry their OSM road class (``ROAD_CLASSES`` index, or
+    ``UNKNOWN_ROAD_CLASS``) and, once ``build_scenic_scores`` has run, a
+    0-1 ``scenic`` score; ``scenic`` is None until then.
+    """
+
+    def __init__(
+        self,
+        lat,
+        lon,
+        offsets,
+        targets,
+        distance,
+        duration,
+        road_class=None,
+        scenic=None,
+    ):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.distance = np.asarray(distance, dtype=np.float32)
+        self.duration = np.asarray(duration, dtype=np.float32)
+        if road_class is None:
+            road_class = np.full(len(self.targets), UNKNOWN_ROAD_CLASS)
+        self.road_class = np.asarray(road_class, dtype=np.uint8)
+        self.scenic = None if scenic is None else np.asarray(scenic, dtype=np.float32)
+        # Scenic edge costs by scenery preference, filled by ``scenic_costs``
+        self.cost_cache = {}
+
+        # Fastest edge speed (m/s), the bound that keeps A* admissible
+        moving = self.duration > 0
+        self.max_speed = (
+            float((self.distance[moving] / self.duration[moving]).max())
+            if moving.any()
+            else 1.0
+        )
+
+    @property
+    def num_nodes(self):
+        return len(self.lat)
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_geojson(cls, source):
+        """
+        Build a graph from a GeoJSON FeatureCollection of OSM ways.
+
+        Args:
+            source (str or dict): Path to a ``.geojson`` file, or the parsed document
+
+        Returns:
+            RoadGraph: The routable part of the extract
+        """
+        if isinstance(source, dict):
+            document = source
+        else:
+            with open(source) as fh:
+                document = json.load(fh)
+
+        node_ids = {}
+        lat, lon = [], []
+        sources, targets, speeds, classes = [], [], [], []
+
+        def node_for(coordinate):
+            key = (
+                round(coordinate[0], COORDINATE_PRECISION),
+                round(coordinate[1], COORDINATE_PRECISION),
+            )
+            node = node_ids.get(key)
+            if node is None:
+                node = node_ids[key] = len(lat)
+                lon.append(key[0])
+                lat.append(key[1])
+            return node
+
+        skipped = 0
+        for feature in document.get("features", []):
+            properties = feature.get("properties") or {}
+            if properties.get("highway") not in HIGHWAY_SPEEDS:
+                skipped += 1
+                continue
+
+            speed = _way_speed(properties) / 3.6
+            road_class = ROAD_CLASSES.index(properties["highway"])
+            forward, backward = _way_direction(properties)
+            for line in _iter_lines(feature.get("geometry")):
+                nodes = [node_for(coordinate) for coordinate in line]
+                for a, b in zip(nodes, nodes[1:]):
+                    if a == b:
+                        continue
+                    if forward:
+                        sources.append(a)
+                        targets.append(b)
+                        speeds.append(speed)
+                        classes.append(road_class)
+                    if backward:
+                        sources.append(b)
+                        targets.append(a)
+                        speeds.append(speed)
+                        classes.append(road_class)
+
+        logger.info(
+            f"Road graph: {len(lat)} nodes, {len(sources)} edges "
+            f"({skipped} non-road features skipped)"
+        )
+        return cls.from_edges(
+            lat, lon, sources, targets, speeds=speeds, road_class=classes
+        )
+
+    @classmethod
+    def from_edges(
+        cls, lat, lon, sources, targets, speeds=None, distance=None, road_class=None
+    ):
+        """
+        Build a graph from an edge list.
+
+        Args:
+            lat, lon (sequence): Node coordinates
+            sources, targets (sequence): Edge endpoints
+            speeds (sequence): Edge speeds in m/s
+            distance (sequence): Edge lengths in metres; straight-line if omitted
+            road_class (sequence): Edge ``ROAD_CLASSES`` indexes; unknown if omitted
+
+        Returns:
+            RoadGraph: Graph with edges grouped by source node
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+
+        if distance is None:
+            distance = haversine_m(
+                lat[sources], lon[sources], lat[targets], lon[targets]
+            )
+        distance = np.asarray(distance, dtype=np.float64)
+        duration = distance / np.asarray(speeds, dtype=np.float64)
+
+        if road_class is None:
+            road_class = np.full(len(sources), UNKNOWN_ROAD_CLASS)
+        road_class = np.asarray(road_class, dtype=np.uint8)
+
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(lat)), out=offsets[1:])
+        return cls(
+            lat,
+            lon,
+            offsets,
+            targets[order],
+            distance[order],
+            duration[order],
+            road_class=road_class[order],
+        )
+
+    @property
+    def sources(self):
+        """Source node of every edge, expanded from ``offsets``."""
+        return np.repeat(
+            np.arange(self.num_nodes, dtype=np.int32), np.diff(self.offsets)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph written by ``save``, or build one from GeoJSON."""
+        if not str(path).endswith(".npz"):
+            return cls.from_geojson(path)
+        with np.load(path) as data:
+            # Graphs saved before road classes and scenic scores lack them
+            return cls(
+                data["lat"],
+                data["lon"],
+                data["offsets"],
+                data["targets"],
+                data["distance"],
+                data["duration"],
+                road_class=data["road_class"] if "road_class" in data else None,
+                scenic=data["scenic"] if "scenic" in data else None,
+            )
+
+    def save(self, path):
+        arrays = {
+            "lat": self.lat,
+            "lon": self.lon,
+            "offsets": self.offsets,
+            "targets": self.targets,
+            "distance": self.distance,
+            "duration": self.duration,
+            "road_class": self.road_class,
+        }
+        if self.scenic is not None:
+            arrays["scenic"] = self.scenic
+        np.savez(path, **arrays)
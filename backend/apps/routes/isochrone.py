@@ -0,0 +1,350 @@
+"""
+Isochrones: the area reachable from an origin within some driving times.
+
+One Dijkstra search from the origin, bounded by the largest requested time,
+gives the travel time to every node it reaches. Each time threshold then
+becomes a polygon in a few vectorized steps:
+
+1. Sample points along every road reachable within the threshold, including
+   the reachable part of the roads that leave the area.
+2. Rasterize them onto a grid about ``GRID_SIZE`` cells across.
+3. Grow the marked cells by one cell, so neighbouring roads join into an
+   area, and fill the holes between them.
+4. Trace the outline of the marked cells into counter-clockwise rings.
+
+Each threshold's grid depends only on what it reaches, so a threshold's
+polygon is the same whichever other thresholds it was requested with. That
+lets ``get_isochrones`` cache every threshold on its own, keyed by the origin
+rounded to ``ORIGIN_PRECISION`` decimal places and the graph token. Nearby
+requests therefore share results, and rebuilding the graph retires them.
+"""
+
+import heapq
+import logging
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .ch import ContractionHierarchy
+from .engine import (
+    RoutingUnavailable,
+    WaypointNotRoutable,
+    get_road_graph,
+    graph_token,
+)
+
+logger = logging.getLogger(__name__)
+
+# Decimal places kept when keying cached isochrones (2 ~= 1.1 km)
+ORIGIN_PRECISION = 2
+
+# Cells across the larger side of an isochrone's grid
+GRID_SIZE = 200
+
+# Smallest grid cell, in metres
+MIN_CELL_M = 100
+
+# Most sample points placed along one road edge
+MAX_EDGE_SAMPLES = 1000
+
+METRES_PER_DEGREE = 111_320
+
+
+def travel_times(graph, source, limit):
+    """
+    Travel time from ``source`` to every node reachable within ``limit``.
+
+    Args:
+        graph (RoadGraph): Graph to search
+        source (int): Origin node
+        limit (float): Largest travel time of interest, in seconds
+
+    Returns:
+        ndarray: Seconds per node, ``inf`` where unreachable within ``limit``
+    """
+    offsets = graph.offsets.data
+    targets = graph.targets.data
+    duration = graph.duration.data
+
+    best = {source: 0.0}
+    settled = {}
+    heap = [(0.0, source)]
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled[node] = cost
+        for edge in range(offsets[node], offsets[node + 1]):
+            neighbour = targets[edge]
+            new_cost = cost + duration[edge]
+            if new_cost <= limit and new_cost < best.get(neighbour, math.inf):
+                best[neighbour] = new_cost
+                heapq.heappush(heap, (new_cost, neighbour))
+
+    times = np.full(graph.num_nodes, np.inf)
+    times[list(settled)] = list(settled.values())
+    return times
+
+
+def _reachable_points(graph, times, limit, cell):
+    """
+    ``(lat, lon)`` of the nodes reachable within ``limit``, plus points at
+    most ``cell`` metres apart along the roads driven from them, including
+    the reachable part of roads that leave the area.
+    """
+    reached = np.flatnonzero(times <= limit)
+    sources = graph.sources
+    start = times[sources]
+    edges = np.flatnonzero(start <= limit)
+    if not len(edges):
+        return graph.lat[reached], graph.lon[reached]
+
+    # Share of each edge that can be driven before the time runs out
+    duration = graph.duration[edges].astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(duration > 0, (limit - start[edges]) / duration, 1.0)
+    share = np.clip(share, 0.0, 1.0)
+    counts = np.ceil(graph.distance[edges] * share / cell).astype(np.int64) + 1
+    counts = np.minimum(counts, MAX_EDGE_SAMPLES)
+
+    edge = np.repeat(np.arange(len(edges)), counts)
+    ends = np.cumsum(counts)
+    step = np.arange(ends[-1]) - np.repeat(ends - counts, counts)
+    fraction = share[edge] * step / np.maximum(counts[edge] - 1, 1)
+
+    a = sources[edges][edge]
+    b = graph.targets[edges][edge]
+    lat = graph.lat[a] + (graph.lat[b] - graph.lat[a]) * fraction
+    lon = graph.lon[a] + (graph.lon[b] - graph.lon[a]) * fraction
+    return (
+        np.concatenate([graph.lat[reached], lat]),
+        np.concatenate([graph.lon[reached], lon]),
+    )
+
+
+def _extent_m(lat, lon):
+    """Larger side of the bounding box of some points, in metres."""
+    if not len(lat):
+        return 0.0
+    scale = math.cos(math.radians(float(np.mean(lat))))
+    height = (lat.max() - lat.min()) * METRES_PER_DEGREE
+    width = (lon.max() - lon.min()) * METRES_PER_DEGREE * scale
+    return float(max(height, width))
+
+
+def _grow(filled):
+    """Mark every cell next to (or diagonal to) a marked cell."""
+    grown = filled.copy()
+    grown[1:] |= filled[:-1]
+    grown[:-1] |= filled[1:]
+    rows = grown.copy()
+    grown[:, 1:] |= rows[:, :-1]
+    grown[:, :-1] |= rows[:, 1:]
+    return grown
+
+
+def _join_diagonals(filled):
+    """Fill a cell wherever two marked cells only touch at a corner."""
+    while True:
+        a, b = filled[:-1, :-1], filled[:-1, 1:]
+        c, d = filled[1:, :-1], filled[1:, 1:]
+        diagonal = a & d & ~b & ~c
+        anti_diagonal = b & c & ~a & ~d
+        if not (diagonal.any() or anti_diagonal.any()):
+            return filled
+        filled[:-1, 1:] |= diagonal
+        filled[:-1, :-1] |= anti_diagonal
+
+
+def _fill_holes(filled):
+    """Mark every empty cell that is not connected to the grid's border."""
+    outside = ~filled
+    reached = np.zeros_like(filled)
+    reached[[0, -1], :] = outside[[0, -1], :]
+    reached[:, [0, -1]] |= outside[:, [0, -1]]
+    while True:
+        grown = reached.copy()
+        grown[1:] |= reached[:-1]
+        grown[:-1] |= reached[1:]
+        grown[:, 1:] |= reached[:, :-1]
+        grown[:, :-1] |= reached[:, 1:]
+        grown &= outside
+        if np.array_equal(grown, reached):
+            return ~reached
+        reached = grown
+
+
+def _trace_rings(filled):
+    """
+    Outline the marked cells as rings of ``(row, col)`` grid corners.
+
+    Boundary edges are directed with the marked cell on their left, so
+    rings come out counter-clockwise. Cells must not touch only at corners,
+    so that every corner starts at most one boundary edge.
+    """
+    padded = np.pad(filled, 1)
+    rows, cols = np.nonzero(padded[1:-1, 1:-1])
+    rows += 1
+    cols += 1
+    width = padded.shape[1] + 1
+
+    sides = (
+        # (missing neighbour, start corner, end corner) as row/col offsets
+        ((-1, 0), (0, 0), (0, 1)),
+        ((0, 1), (0, 1), (1, 1)),
+        ((1, 0), (1, 1), (1, 0)),
+        ((0, -1), (1, 0), (0, 0)),
+    )
+    following = {}
+    for (dr, dc), (sr, sc), (er, ec) in sides:
+        open_side = ~padded[rows + dr, cols + dc]
+        starts = (rows[open_side] + sr) * width + cols[open_side] + sc
+        ends = (rows[open_side] + er) * width + cols[open_side] + ec
+        following.update(zip(starts.tolist(), ends.tolist()))
+
+    rings = []
+    while following:
+        start, corner = following.popitem()
+        ring = [start]
+        while corner != start:
+            ring.append(corner)
+            corner = following.pop(corner)
+        # Keep only the corners where the outline turns
+        points = np.array([divmod(corner, width) for corner in ring]) - 1
+        before = points - np.roll(points, 1, axis=0)
+        after = np.roll(points, -1, axis=0) - points
+        turns = np.any(before != after, axis=1)
+        rings.append(points[turns])
+    return rings
+
+
+def isochrone_polygon(graph, times, limit):
+    """
+    Area reachable within ``limit`` seconds as GeoJSON MultiPolygon coordinates.
+
+    Args:
+        graph (RoadGraph): Graph ``times`` was computed on
+        times (ndarray): Output of ``travel_times`` for at least ``limit``
+        limit (float): Threshold in seconds
+
+    Returns:
+        list: Polygons of one closed, counter-clockwise ``[lon, lat]`` ring
+    """
+    reached = np.flatnonzero(times <= limit)
+    if not len(reached):
+        return []
+    extent = _extent_m(graph.lat[reached], graph.lon[reached])
+    cell = max(extent / GRID_SIZE, MIN_CELL_M)
+    lat, lon = _reachable_points(graph, times, limit, cell)
+
+    cell_lat = cell / METRES_PER_DEGREE
+    cell_lon = cell_lat / max(math.cos(math.radians(float(np.mean(lat)))), 0.01)
+    # A spare cell on every side leaves room to grow
+    south = lat.min() - cell_lat
+    west = lon.min() - cell_lon
+    rows = np.floor((lat - south) / cell_lat).astype(np.int64)
+    cols = np.floor((lon - west) / cell_lon).astype(np.int64)
+
+    filled = np.zeros((rows.max() + 2, cols.max() + 2), dtype=bool)
+    filled[rows, cols] = True
+    filled = _fill_holes(_join_diagonals(_grow(filled)))
+
+    polygons = []
+    for ring in _trace_rings(filled):
+        coordinates = np.column_stack(
+            [west + ring[:, 1] * cell_lon, south + ring[:, 0] * cell_lat]
+        )
+        coordinates = np.round(coordinates, 5).tolist()
+        polygons.append([coordinates + coordinates[:1]])
+    return polygons
+
+
+def compute_isochrones(graph, lat, lon, minutes):
+    """
+    Isochrone features for several thresholds from one search.
+
+    Args:
+        graph (RoadGraph): Graph to search
+        lat, lon (float): Origin
+        minutes (list): Thresholds in minutes
+
+    Returns:
+        dict: GeoJSON Feature per threshold, keyed by minutes
+
+    Raises:
+        RoutingUnavailable: If ``graph`` is a contraction hierarchy
+        WaypointNotRoutable: If the origin is too far from any road
+    """
+    if isinstance(graph, ContractionHierarchy):
+        raise RoutingUnavailable("Isochrones need a .npz road graph")
+    source, _ = graph.nearest_node(lat, lon, settings.ROUTING_MAX_SNAP_DISTANCE)
+    if source is None:
+        raise WaypointNotRoutable("Origin is not near a road")
+
+    times = travel_times(graph, source, max(minutes) * 60)
+    features = {}
+    for threshold in minutes:
+        limit = threshold * 60
+        features[threshold] = {
+            "type": "Feature",
+            "properties": {
+                "minutes": threshold,
+                "reachable_nodes": int(np.count_nonzero(times <= limit)),
+            },
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": isochrone_polygon(graph, times, limit),
+            },
+        }
+    return features
+
+
+def quantize_origin(lat, lon):
+    """Round an origin to ``ORIGIN_PRECISION`` decimal places."""
+    return round(lat, ORIGIN_PRECISION), round(lon, ORIGIN_PRECISION)
+
+
+def get_isochrones(lat, lon, minutes):
+    """
+    Isochrones around an origin, from the cache where possible.
+
+    The origin is rounded with ``quantize_origin`` before searching, so a
+    cached result is exactly what a fresh search would return.
+
+    Args:
+        lat, lon (float): Origin
+        minutes (list): Distinct thresholds in minutes
+
+    Returns:
+        tuple: ``(features, cached)``: Features in the order of ``minutes``,
+        and how many came from the cache
+
+    Raises:
+        RoutingError: If the graph is unavailable or the origin is off-road
+    """
+    lat, lon = quantize_origin(lat, lon)
+    origin = f"{lat:.{ORIGIN_PRECISION}f},{lon:.{ORIGIN_PRECISION}f}"
+    prefix = f"isochrone:{graph_token()}:{origin}"
+    keys = {threshold: f"{prefix}:{threshold}" for threshold in minutes}
+    found = cache.get_many(list(keys.values()))
+
+    missing = [threshold for threshold in minutes if keys[threshold] not in found]
+    computed = {}
+    if missing:
+        computed = compute_isochrones(get_road_graph(), lat, lon, missing)
+        cache.set_many(
+            {keys[threshold]: feature for threshold, feature in computed.items()},
+            settings.ISOCHRONE_CACHE_TIMEOUT,
+        )
+        logger.debug(
+            f"Isochrones at {lat},{lon}: {len(minutes) - len(missing)} cached, "
+            f"{len(missing)} computed"
+        )
+
+    features = [
+        computed[threshold] if threshold in computed else found[keys[threshold]]
+        for threshold in minutes
+    ]
+    return features, len(minutes) - len(missing)
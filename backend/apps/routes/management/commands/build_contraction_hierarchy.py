@@ -0,0 +1,60 @@
+"""
+Management command: build_contraction_hierarchy
+Preprocesses a road graph into a contraction hierarchy file for fast routing.
+
+Point ROUTING_GRAPH_PATH at the resulting .ch file to serve queries from it.
+
+Usage:
+    python manage.py build_contraction_hierarchy road_graph.npz road_graph.ch
+    python manage.py build_contraction_hierarchy roads.geojson road_graph.ch --weight distance
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.routes.ch import build_hierarchy
+from apps.routes.graph import RoadGraph
+
+
+class Command(BaseCommand):
+    help = "Build a contraction hierarchy file from a road graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source", help="Road graph (.npz from build_road_graph, or OSM GeoJSON)."
+        )
+        parser.add_argument("output", help="Path of the .ch file to write.")
+        parser.add_argument(
+            "--weight",
+            choices=["duration", "distance"],
+            default="duration",
+            help="Edge cost to optimise: duration (fastest) or distance (shortest).",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if not output.endswith(".ch"):
+            raise CommandError("Output path must end in .ch")
+
+        started = time.perf_counter()
+        try:
+            graph = RoadGraph.load(options["source"])
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Could not read {options['source']}: {exc}")
+
+        self.stdout.write(
+            f"Contracting {graph.num_nodes} nodes, {graph.num_edges} edges..."
+        )
+        hierarchy = build_hierarchy(
+            graph,
+            weight=options["weight"],
+            progress=lambda done: self.stdout.write(f"  {done} nodes contracted"),
+        )
+        hierarchy.save(output)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {output}: {hierarchy.num_edges} upward edges "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,47 @@
+"""
+Management command: build_road_graph
+Converts an OSM GeoJSON extract into the compact graph file used for routing.
+
+PBF extracts need converting to GeoJSON first, e.g.:
+    osmium tags-filter kenya-latest.osm.pbf w/highway -o roads.osm.pbf
+    osmium export roads.osm.pbf -o roads.geojson
+
+Usage:
+    python manage.py build_road_graph roads.geojson road_graph.npz
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.routes.graph import RoadGraph
+
+
+class Command(BaseCommand):
+    help = "Build a routing graph file from an OSM GeoJSON extract."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Path to the OSM GeoJSON extract.")
+        parser.add_argument("output", help="Path of the .npz graph file to write.")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if not output.endswith(".npz"):
+            raise CommandError("Output path must end in .npz")
+
+        started = time.perf_counter()
+        try:
+            graph = RoadGraph.from_geojson(options["source"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {options['source']}: {exc}")
+
+        if not graph.num_edges:
+            raise CommandError("The extract contains no routable roads.")
+
+        graph.save(output)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {output}: {graph.num_nodes} nodes, {graph.num_edges} edges "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,46 @@
+"""
+Management command: build_scenic_scores
+Scores every edge of a road graph for scenery from its road class and the
+parks and attractions in the place cache, and saves the scores in the graph.
+
+Rerun it after the place cache has grown; the refresh_scenic_scores task
+does the same for ROUTING_GRAPH_PATH on a schedule.
+
+Usage:
+    python manage.py build_scenic_scores road_graph.npz
+    python manage.py build_scenic_scores road_graph.npz --output scenic_graph.npz
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.routes.scenic import score_graph_file
+
+
+class Command(BaseCommand):
+    help = "Add scenic scores to a road graph file for scenic routing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("graph", help="Road graph (.npz from build_road_graph).")
+        parser.add_argument(
+            "--output", help="Path of the .npz file to write; defaults to the input."
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"] or options["graph"]
+        if not options["graph"].endswith(".npz") or not output.endswith(".npz"):
+            raise CommandError("Scenic scores are stored in .npz road graphs")
+
+        started = time.perf_counter()
+        try:
+            graph = score_graph_file(options["graph"], output)
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Could not score {options['graph']}: {exc}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {output}: {graph.num_edges} edges scored, mean "
+                f"{graph.scenic.mean():.2f}, in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,202 @@
+"""
+Distance and duration matrices between sets of points.
+
+``estimate`` matrices are great-circle distances with durations at a flat
+average speed, computed in one vectorized pass; they are cheaper to
+recompute than to fetch, so they are never cached. ``road`` matrices come
+from the routing engine. Each road cell is cached under its origin and
+destination rounded to ``COORDINATE_PRECISION`` decimal places (about 11 m)
+plus a token for the loaded graph file, so requests for nearby points share
+cells and rebuilding the graph retires every old cell. Only the rows and
+columns that still have missing cells are routed.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .engine import get_road_graph, graph_token, route_matrix
+from .graph import haversine_m
+
+logger = logging.getLogger(__name__)
+
+MODES = ("estimate", "road")
+
+# Average road speed assumed for estimated durations
+ESTIMATE_SPEED_KMH = 60
+
+# Decimal places kept when keying cached cells (4 ~= 11 m)
+COORDINATE_PRECISION = 4
+
+
+@dataclass
+class Matrix:
+    """Pairwise distances and durations from origins (rows) to destinations."""
+
+    distance: np.ndarray  # metres, NaN where unreachable
+    duration: np.ndarray  # seconds, NaN where unreachable
+    cached_cells: int = 0
+    computed_cells: int = 0
+
+
+def _as_points(points):
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+def great_circle_matrix(origins, destinations=None):
+    """
+    Great-circle distances in metres between ``(lat, lon)`` points.
+
+    Args:
+        origins (list): ``(lat, lon)`` pairs, one row each
+        destinations (list): ``(lat, lon)`` pairs, one column each; defaults
+            to ``origins``
+
+    Returns:
+        ndarray: ``(n, m)`` distances in metres
+    """
+    origins = _as_points(origins)
+    destinations = origins if destinations is None else _as_points(destinations)
+    return haversine_m(
+        origins[:, 0, None],
+        origins[:, 1, None],
+        destinations[None, :, 0],
+        destinations[None, :, 1],
+    )
+
+
+def estimate_matrix(origins, destinations=None):
+    """Straight-line distances with durations at ``ESTIMATE_SPEED_KMH``."""
+    distance = great_circle_matrix(origins, destinations)
+    duration = distance / (ESTIMATE_SPEED_KMH / 3.6)
+    return Matrix(distance=distance, duration=duration, computed_cells=distance.size)
+
+
+def _point_keys(points):
+    return [
+        f"{lat:.{COORDINATE_PRECISION}f},{lon:.{COORDINATE_PRECISION}f}"
+        for lat, lon in points.tolist()
+    ]
+
+
+def _snap(graph, points):
+    """Nearest node for each point, or None when it is too far from a road."""
+    return [
+        graph.nearest_node(lat, lon, settings.ROUTING_MAX_SNAP_DISTANCE)[0]
+        for lat, lon in points.tolist()
+    ]
+
+
+def road_matrix(origins, destinations=None, weight="duration"):
+    """
+    Road distances and durations over the configured routing graph.
+
+    Args:
+        origins (list): ``(lat, lon)`` pairs, one row each
+        destinations (list): ``(lat, lon)`` pairs, one column each; defaults
+            to ``origins``
+        weight (str): ``"duration"`` (fastest) or ``"distance"`` (shortest)
+
+    Returns:
+        Matrix: NaN cells where a point is off the road network or unreachable
+
+    Raises:
+        RoutingError: If the graph is unavailable or built for another weight
+    """
+    origins = np.round(_as_points(origins), COORDINATE_PRECISION)
+    destinations = (
+        origins
+        if destinations is None
+        else np.round(_as_points(destinations), COORDINATE_PRECISION)
+    )
+    distance = np.full((len(origins), len(destinations)), np.nan)
+    duration = np.full((len(origins), len(destinations)), np.nan)
+    if not distance.size:
+        return Matrix(distance=distance, duration=duration)
+
+    prefix = f"route_matrix:{graph_token()}:{weight}"
+    origin_keys = _point_keys(origins)
+    destination_keys = _point_keys(destinations)
+    keys = {
+        (row, column): f"{prefix}:{origin_key}:{destination_key}"
+        for row, origin_key in enumerate(origin_keys)
+        for column, destination_key in enumerate(destination_keys)
+    }
+    found = cache.get_many(set(keys.values()))
+
+    missing_rows = set()
+    missing_columns = set()
+    for (row, column), key in keys.items():
+        if key not in found:
+            missing_rows.add(row)
+            missing_columns.add(column)
+        elif found[key] is not None:
+            distance[row, column], duration[row, column] = found[key]
+    cached = sum(1 for key in keys.values() if key in found)
+
+    new_cells = {}
+    if missing_rows:
+        rows = sorted(missing_rows)
+        columns = sorted(missing_columns)
+        graph = get_road_graph()
+        row_nodes = _snap(graph, origins[rows])
+        column_nodes = _snap(graph, destinations[columns])
+        routable_rows = [i for i, node in enumerate(row_nodes) if node is not None]
+        routable_columns = [
+            j for j, node in enumerate(column_nodes) if node is not None
+        ]
+        routed_distance, routed_duration = route_matrix(
+            graph,
+            [row_nodes[i] for i in routable_rows],
+            [column_nodes[j] for j in routable_columns],
+            weight,
+        )
+
+        for a, i in enumerate(routable_rows):
+            for b, j in enumerate(routable_columns):
+                distance[rows[i], columns[j]] = routed_distance[a, b]
+                duration[rows[i], columns[j]] = routed_duration[a, b]
+        for row in rows:
+            for column in columns:
+                key = keys[(row, column)]
+                if key in found or key in new_cells:
+                    continue
+                value = (
+                    float(distance[row, column]),
+                    float(duration[row, column]),
+                )
+                new_cells[key] = None if np.isnan(value[0]) else value
+        cache.set_many(new_cells, settings.ROUTE_MATRIX_CACHE_TIMEOUT)
+        logger.debug(
+            f"Route matrix {distance.shape}: {cached} cached, "
+            f"{len(new_cells)} routed"
+        )
+
+    return Matrix(
+        distance=distance,
+        duration=duration,
+        cached_cells=cached,
+        computed_cells=len(new_cells),
+    )
+
+
+def compute_matrix(origins, destinations=None, mode="estimate", weight="duration"):
+    """
+    Distance and duration matrix in the requested ``mode``.
+
+    Args:
+        origins (list): ``(lat, lon)`` pairs, one row each
+        destinations (list): ``(lat, lon)`` pairs, one column each; defaults
+            to ``origins``
+        mode (str): ``"estimate"`` (straight line) or ``"road"``
+        weight (str): Road cost to minimise; ignored for estimates
+
+    Returns:
+        Matrix: Distances in metres and durations in seconds
+    """
+    if mode == "road":
+        return road_matrix(origins, destinations, weight)
+    return estimate_matrix(origins, destinations)
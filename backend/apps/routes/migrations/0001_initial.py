@@ -0,0 +1,99 @@
+# Generated by Django 6.0 on 2026-10-19 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Route",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                (
+                    "waypoints",
+                    models.JSONField(help_text="Normalized [lat, lng] waypoints"),
+                ),
+                (
+                    "weight",
+                    models.CharField(
+                        choices=[("duration", "Fastest"), ("distance", "Shortest")],
+                        default="duration",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "graph_token",
+                    models.CharField(
+                        help_text="Routing graph the route was computed on",
+                        max_length=40,
+                    ),
+                ),
+                (
+                    "total_distance",
+                    models.FloatField(help_text="Total distance in metres"),
+                ),
+                (
+                    "total_duration",
+                    models.FloatField(help_text="Total duration in seconds"),
+                ),
+                (
+                    "geometry",
+                    models.TextField(help_text="Encoded polyline of the whole route"),
+                ),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RouteLeg",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                ("distance", models.FloatField(help_text="Distance in metres")),
+                ("duration", models.FloatField(help_text="Duration in seconds")),
+                (
+                    "geometry",
+                    models.TextField(help_text="Encoded polyline of the leg"),
+                ),
+                (
+                    "route",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="legs",
+                        to="routes.route",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["index"],
+                "unique_together": {("route", "index")},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="route",
+            name="scenery",
+            field=models.FloatField(
+                default=0, help_text="0-1 preference for scenic roads over travel time"
+            ),
+        ),
+        migrations.AddField(
+            model_name="route",
+            name="scenic_score",
+            field=models.FloatField(
+                blank=True, help_text="Length-weighted 0-1 scenic score", null=True
+            ),
+        ),
+    ]
@@ -1,3 +1,53 @@
 from django.db import models
 
-# Create your models here.
+
+class Route(models.Model):
+    """A computed route, stored so identical route requests are not re-run."""
+
+    WEIGHTS = [
+        ("duration", "Fastest"),
+        ("distance", "Shortest"),
+    ]
+
+    # Hash of the normalized waypoints, weight and routing graph; see store.py
+    key = models.CharField(max_length=64, unique=True)
+    waypoints = models.JSONField(help_text="Normalized [lat, lng] waypoints")
+    weight = models.CharField(max_length=10, choices=WEIGHTS, default="duration")
+    scenery = models.FloatField(
+        default=0, help_text="0-1 preference for scenic roads over travel time"
+    )
+    graph_token = models.CharField(
+        max_length=40, help_text="Routing graph the route was computed on"
+    )
+
+    total_distance = models.FloatField(help_text="Total distance in metres")
+    total_duration = models.FloatField(help_text="Total duration in seconds")
+    geometry = models.TextField(help_text="Encoded polyline of the whole route")
+    scenic_score = models.FloatField(
+        null=True, blank=True, help_text="Length-weighted 0-1 scenic score"
+    )
+
+    # Usage, for the hit counters and eviction
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Route {self.key[:12]} ({len(self.waypoints)} waypoints)"
+
+
+class RouteLeg(models.Model):
+    """The part of a stored route between two consecutive waypoints."""
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="legs")
+    index = models.PositiveSmallIntegerField()
+    distance = models.FloatField(help_text="Distance in metres")
+    duration = models.FloatField(help_text="Duration in seconds")
+    geometry = models.TextField(help_text="Encoded polyline of the leg")
+
+    class Meta:
+        ordering = ["index"]
+        unique_together = ["route", "index"]
+
+    def __str__(self):
+        return f"Leg {self.index + 1} of {self.route}"
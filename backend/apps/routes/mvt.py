@@ -0,0 +1,416 @@
+"""
+Mapbox Vector Tile encoding.
+
+Covers the parts of the MVT 2.1 spec needed to draw routes and stops: Web
+Mercator tile coordinates, clipping lines to a buffered tile, geometry
+commands and the protobuf wire format. Everything is written out here, so no
+protobuf, GEOS or mapbox-vector-tile build is needed, and coordinate work is
+done on whole numpy arrays per feature.
+"""
+
+import math
+import struct
+
+import numpy as np
+
+# Tile coordinate range and the margin kept around it so lines and point
+# symbols crossing a tile edge join up with the neighbouring tile
+EXTENT = 4096
+BUFFER = 64
+
+MAX_ZOOM = 22
+
+# Web Mercator is square between these latitudes
+MAX_LATITUDE = 85.0511287798
+
+POINT = 1
+LINESTRING = 2
+
+_MOVE_TO = 1
+_LINE_TO = 2
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH = 2
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def _latitude(y, z):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2**z))))
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """
+    Longitude/latitude box covered by a tile.
+
+    Args:
+        z, x, y (int): Tile address
+        buffer (int): Extra margin in tile units (of ``EXTENT``) on each side
+
+    Returns:
+        tuple: ``(west, south, east, north)`` in degrees
+    """
+    margin = buffer / EXTENT
+    n = 2**z
+    west = (x - margin) / n * 360 - 180
+    east = (x + 1 + margin) / n * 360 - 180
+    north = _latitude(max(y - margin, 0), z)
+    south = _latitude(min(y + 1 + margin, n), z)
+    return west, south, east, north
+
+
+def project(points, z, x, y):
+    """
+    Convert ``(lat, lon)`` points to coordinates within tile ``z/x/y``.
+
+    Returns:
+        ndarray: ``(n, 2)`` float array, x to the right and y down, with the
+        tile spanning ``0..EXTENT`` on both axes
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = 2**z
+    lat = np.radians(np.clip(points[:, 0], -MAX_LATITUDE, MAX_LATITUDE))
+    px = (points[:, 1] + 180) / 360 * n - x
+    py = (0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)) * n - y
+    return np.column_stack([px, py]) * EXTENT
+
+
+def clip_line(xy, low=-BUFFER, high=EXTENT + BUFFER):
+    """
+    Clip a projected line to the square ``low..high``.
+
+    Each segment is clipped on its own (Liang-Barsky) and consecutive
+    segments that stay joined are merged back into one part.
+
+    Returns:
+        list: ``(k, 2)`` arrays, one per part of the line inside the square
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    if len(xy) < 2:
+        return []
+    if xy.min() >= low and xy.max() <= high:
+        return [xy]
+
+    start = xy[:-1]
+    delta = xy[1:] - start
+    enter = np.zeros(len(delta))
+    leave = np.ones(len(delta))
+    visible = np.ones(len(delta), dtype=bool)
+    for axis in (0, 1):
+        for p, q in (
+            (-delta[:, axis], start[:, axis] - low),
+            (delta[:, axis], high - start[:, axis]),
+        ):
+            visible &= (p != 0) | (q >= 0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = q / p
+            enter = np.where(p < 0, np.maximum(enter, ratio), enter)
+            leave = np.where(p > 0, np.minimum(leave, ratio), leave)
+    visible &= enter <= leave
+
+    segments = np.flatnonzero(visible)
+    if not len(segments):
+        return []
+    # A segment continues the previous part if neither was cut between them
+    joined = np.zeros(len(segments), dtype=bool)
+    joined[1:] = (
+        (np.diff(segments) == 1)
+        & (leave[segments[:-1]] == 1)
+        & (enter[segments[1:]] == 0)
+    )
+    firsts = start + enter[:, None] * delta
+    lasts = start + leave[:, None] * delta
+
+    breaks = [*np.flatnonzero(~joined), len(segments)]
+    return [
+        np.vstack([firsts[segments[a]], lasts[segments[a:b]]])
+        for a, b in zip(breaks, breaks[1:])
+    ]
+
+
+def _zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def _command(command, count):
+    return command | (count << 3)
+
+
+def _quantize(xy):
+    """Round to integer tile coordinates, dropping repeated points."""
+    xy = np.rint(xy).astype(np.int64)
+    keep = np.ones(len(xy), dtype=bool)
+    keep[1:] = (np.diff(xy, axis=0) != 0).any(axis=1)
+    return xy[keep]
+
+
+def line_commands(parts):
+    """
+    Geometry commands for a line made of one or more projected parts.
+
+    Returns:
+        ndarray: Command integers, empty if no part survives rounding
+    """
+    commands = []
+    cursor = np.zeros((1, 2), dtype=np.int64)
+    for part in parts:
+        part = _quantize(part)
+        if len(part) < 2:
+            continue
+        deltas = _zigzag(np.diff(part, axis=0, prepend=cursor))
+        commands += [
+            [_command(_MOVE_TO, 1)],
+            deltas[0],
+            [_command(_LINE_TO, len(part) - 1)],
+            deltas[1:].ravel(),
+        ]
+        cursor = part[-1:]
+    if not commands:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(commands).astype(np.int64)
+
+
+def point_commands(xy):
+    """Geometry commands for one or more projected points."""
+    xy = np.rint(np.asarray(xy, dtype=np.float64).reshape(-1, 2)).astype(np.int64)
+    deltas = _zigzag(np.diff(xy, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)))
+    return np.concatenate([[_command(_MOVE_TO, len(xy))], deltas.ravel()])
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _varints(values):
+    """Encode non-negative integers as consecutive varints, all at once."""
+    values = np.asarray(values, dtype=np.uint64)
+    if not values.size:
+        return b""
+    chunks = max(1, -(-int(values.max()).bit_length() // 7))
+    remaining = values[:, None] >> (np.uint64(7) * np.arange(chunks, dtype=np.uint64))
+    present = remaining > 0
+    present[:, 0] = True
+    data = (remaining & np.uint64(0x7F)) | np.where(
+        remaining >= 0x80, np.uint64(0x80), np.uint64(0)
+    )
+    return data[present].astype(np.uint8).tobytes()
+
+
+def _field(number, wire_type):
+    return _varint(number << 3 | wire_type)
+
+
+def _message(number, payload):
+    return _field(number, _LENGTH) + _varint(len(payload)) + payload
+
+
+def _uint(number, value):
+    return _field(number, _VARINT) + _varint(value)
+
+
+def _value(value):
+    """Encode a property value as an MVT ``Value`` message."""
+    if isinstance(value, str):
+        return _message(1, value.encode())
+    if isinstance(value, bool):
+        return _uint(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _uint(5, value)
+        return _uint(6, (value << 1) ^ (value >> 63))
+    return _field(3, _FIXED64) + struct.pack("<d", float(value))
+
+
+class Layer:
+    """
+    One named layer of a vector tile.
+
+    Property keys and values are interned as they are added, so features
+    sharing a value store it once.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def __len__(self):
+        return len(self.features)
+
+    def _tags(self, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            # Keyed by type too, so True and 1 stay distinct values
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        return tags
+
+    def add_feature(self, geometry_type, commands, properties=None, feature_id=None):
+        """
+        Add a feature from geometry commands; empty geometry is skipped.
+
+        Args:
+            geometry_type (int): ``POINT`` or ``LINESTRING``
+            commands (ndarray): From ``point_commands`` or ``line_commands``
+            properties (dict): Attributes; None values are left out
+            feature_id (int): Optional non-negative feature id
+        """
+        if not len(commands):
+            return
+        feature = b""
+        if feature_id is not None:
+            feature += _uint(1, feature_id)
+        tags = self._tags(properties or {})
+        if tags:
+            feature += _message(2, _varints(tags))
+        feature += _uint(3, geometry_type)
+        feature += _message(4, _varints(commands))
+        self.features.append(feature)
+
+    def encode(self):
+        payload = _uint(15, 2) + _message(1, self.name.encode())
+        payload += b"".join(_message(2, feature) for feature in self.features)
+        payload += b"".join(_message(3, key.encode()) for key in self.keys)
+        payload += b"".join(_message(4, _value(value)) for _, value in self.values)
+        payload += _uint(5, EXTENT)
+        return payload
+
+
+def encode_tile(layers):
+    """Encode layers as a tile, leaving out empty ones."""
+    return b"".join(_message(3, layer.encode()) for layer in layers if len(layer))
+
+
+# Decoding, for tests and debugging
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _read_fields(data):
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == _VARINT:
+            value, position = _read_varint(data, position)
+        elif wire_type == _FIXED64:
+            value = data[position:position + 8]
+            position += 8
+        elif wire_type == _LENGTH:
+            length, position = _read_varint(data, position)
+            value = data[position:position + length]
+            position += length
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        yield number, wire_type, value
+
+
+def _read_packed(data):
+    values = []
+    position = 0
+    while position < len(data):
+        value, position = _read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _read_value(data):
+    for number, _, value in _read_fields(data):
+        if number == 1:
+            return value.decode()
+        if number == 3:
+            return struct.unpack("<d", value)[0]
+        if number == 5:
+            return value
+        if number == 6:
+            return _unzigzag(value)
+        if number == 7:
+            return bool(value)
+    return None
+
+
+def _read_geometry(commands):
+    """Turn geometry commands into lists of ``(x, y)`` parts."""
+    parts = []
+    x = y = position = 0
+    while position < len(commands):
+        command, count = commands[position] & 7, commands[position] >> 3
+        position += 1
+        for _ in range(count):
+            x += _unzigzag(commands[position])
+            y += _unzigzag(commands[position + 1])
+            position += 2
+            if command == _MOVE_TO:
+                parts.append([(x, y)])
+            else:
+                parts[-1].append((x, y))
+    return parts
+
+
+def decode_tile(data):
+    """
+    Decode a tile into plain Python structures.
+
+    Returns:
+        dict: Layer name to a list of features, each a dict with ``id``,
+        ``type``, ``properties`` and ``geometry`` (a list of parts, each a
+        list of ``(x, y)``; points are one-point parts)
+    """
+    layers = {}
+    for number, _, layer_data in _read_fields(data):
+        if number != 3:
+            continue
+        name, keys, values, features = None, [], [], []
+        for field, _, value in _read_fields(layer_data):
+            if field == 1:
+                name = value.decode()
+            elif field == 2:
+                features.append(value)
+            elif field == 3:
+                keys.append(value.decode())
+            elif field == 4:
+                values.append(_read_value(value))
+
+        decoded = []
+        for feature_data in features:
+            feature = {"id": None, "type": None, "properties": {}, "geometry": []}
+            for field, _, value in _read_fields(feature_data):
+                if field == 1:
+                    feature["id"] = value
+                elif field == 2:
+                    tags = _read_packed(value)
+                    feature["properties"] = {
+                        keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])
+                    }
+                elif field == 3:
+                    feature["type"] = value
+                elif field == 4:
+                    feature["geometry"] = _read_geometry(_read_packed(value))
+            decoded.append(feature)
+        layers[name] = decoded
+    return layers
@@ -0,0 +1,234 @@
+"""
+Scenic cost model for ``route_type="scenic"``.
+
+Every edge of a road graph gets a 0-1 scenic score that blends two parts:
+how scenic its road class tends to be (tracks and country lanes over
+motorways) and how close it runs to cached parks and attractions
+(``Place`` rows), each place weighted by its rating and fading out linearly
+over ``PLACE_RADIUS_M``. Scoring every edge against every place is a batch
+job (``build_scenic_scores``) whose result is saved in the graph file, so
+queries only read one more array.
+
+A scenic query minimises ``duration * (1 + MAX_SCENIC_PENALTY * scenery *
+(1 - score))``, where ``scenery`` (0-1) is how much the user will trade
+travel time for scenery. The cost never drops below the travel time, so the
+engine's travel-time heuristic stays admissible.
+"""
+
+import logging
+import math
+import os
+
+import numpy as np
+
+from apps.places.models import Place
+
+from .graph import ROAD_CLASSES, RoadGraph, haversine_m
+
+logger = logging.getLogger(__name__)
+
+SCENIC_PLACE_TYPES = ("park", "attraction")
+
+# How scenic each road class is on its own, from 0 (dull) to 1
+ROAD_CLASS_SCENERY = {
+    "motorway": 0.0,
+    "motorway_link": 0.0,
+    "trunk": 0.1,
+    "trunk_link": 0.1,
+    "primary": 0.3,
+    "primary_link": 0.2,
+    "secondary": 0.5,
+    "secondary_link": 0.4,
+    "tertiary": 0.7,
+    "tertiary_link": 0.5,
+    "unclassified": 0.8,
+    "residential": 0.3,
+    "living_street": 0.3,
+    "service": 0.2,
+    "road": 0.5,
+    "track": 0.9,
+}
+UNKNOWN_ROAD_SCENERY = 0.4
+
+# Share of an edge's score that comes from its road class; the rest comes
+# from nearby places
+ROAD_CLASS_SHARE = 0.4
+
+# Places stop counting towards an edge beyond this distance
+PLACE_RADIUS_M = 2000
+
+# At full scenery preference, a completely dull edge costs this many times
+# its travel time more than a completely scenic one
+MAX_SCENIC_PENALTY = 2.0
+
+# Preferences are rounded to this step so cost arrays can be reused
+SCENERY_STEP = 0.05
+
+# Scenery preference used for scenic trips that do not set one
+DEFAULT_SCENERY = 0.5
+
+_ROAD_SCORES = np.full(256, UNKNOWN_ROAD_SCENERY, dtype=np.float32)
+_ROAD_SCORES[: len(ROAD_CLASSES)] = [
+    ROAD_CLASS_SCENERY[road_class] for road_class in ROAD_CLASSES
+]
+
+
+def scenic_places():
+    """
+    Parks and attractions from the place cache.
+
+    Returns:
+        ndarray: ``(n, 3)`` rows of ``(lat, lon, weight)``, weight 0.2-1 by rating
+    """
+    rows = Place.objects.filter(
+        place_type__in=SCENIC_PLACE_TYPES, permanently_closed=False
+    ).values_list("latitude", "longitude", "rating")
+    places = np.array(
+        [(lat, lon, 3.0 if rating is None else rating) for lat, lon, rating in rows],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    places[:, 2] = np.maximum(places[:, 2], 1.0) / 5
+    return places
+
+
+def _cell_keys(rows, cols):
+    # Offset so negative cells still give unique non-negative keys
+    return (rows + 2**24) * 2**25 + (cols + 2**24)
+
+
+def place_proximity(lat, lon, places, radius=PLACE_RADIUS_M):
+    """
+    How close each point is to weighted places, from 0 (none nearby) to 1.
+
+    Points are bucketed into a grid of ``radius``-sized cells, so each place
+    is only measured against the points in the 3x3 cells around it.
+
+    Args:
+        lat, lon (ndarray): Point coordinates
+        places (ndarray): ``(n, 3)`` rows of ``(lat, lon, weight)``
+        radius (float): Metres beyond which a place does not count
+
+    Returns:
+        ndarray: Proximity per point
+    """
+    total = np.zeros(len(lat))
+    if not len(lat) or not len(places):
+        return total
+
+    cell_lat = radius / 111_320
+    widest = min(np.abs(lat).max(), 85.0)
+    cell_lon = cell_lat / math.cos(math.radians(widest))
+    keys = _cell_keys(np.floor(lat / cell_lat), np.floor(lon / cell_lon)).astype(
+        np.int64
+    )
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    place_rows = np.floor(places[:, 0] / cell_lat)
+    place_cols = np.floor(places[:, 1] / cell_lon)
+    for row_offset in (-1, 0, 1):
+        for col_offset in (-1, 0, 1):
+            cell = _cell_keys(place_rows + row_offset, place_cols + col_offset)
+            cell = cell.astype(np.int64)
+            first = np.searchsorted(sorted_keys, cell, side="left")
+            counts = np.searchsorted(sorted_keys, cell, side="right") - first
+            if not counts.sum():
+                continue
+            # Expand every place into the positions of the points in its cell
+            place = np.repeat(np.arange(len(places)), counts)
+            ends = np.cumsum(counts)
+            position = np.arange(ends[-1]) - np.repeat(ends - counts - first, counts)
+            point = order[position]
+            distance = haversine_m(
+                lat[point], lon[point], places[place, 0], places[place, 1]
+            )
+            falloff = np.clip(1 - distance / radius, 0, None) * places[place, 2]
+            total += np.bincount(point, weights=falloff, minlength=len(lat))
+
+    return 1 - np.exp(-total)
+
+
+def compute_scenic_scores(graph, places):
+    """
+    Score every edge of ``graph`` for scenery.
+
+    Args:
+        graph (RoadGraph): Graph to score
+        places (ndarray): ``(n, 3)`` rows of ``(lat, lon, weight)``
+
+    Returns:
+        ndarray: float32 score per edge, 0 (dull) to 1
+    """
+    sources = graph.sources
+    mid_lat = (graph.lat[sources] + graph.lat[graph.targets]) / 2
+    mid_lon = (graph.lon[sources] + graph.lon[graph.targets]) / 2
+    proximity = place_proximity(mid_lat, mid_lon, places)
+    road = _ROAD_SCORES[graph.road_class]
+    scores = ROAD_CLASS_SHARE * road + (1 - ROAD_CLASS_SHARE) * proximity
+    return scores.astype(np.float32)
+
+
+def normalize_scenery(scenery):
+    """Clamp a scenery preference to 0-1 and round it to ``SCENERY_STEP``."""
+    scenery = min(max(float(scenery), 0.0), 1.0)
+    return round(round(scenery / SCENERY_STEP) * SCENERY_STEP, 2)
+
+
+def scenic_costs(graph, scenery):
+    """
+    Edge costs for a scenic query on a scored graph.
+
+    Costs are kept in the graph's ``cost_cache``, one array per scenery step,
+    so they are freed with the graph when a newer file replaces it.
+
+    Args:
+        graph (RoadGraph): Graph with ``scenic`` scores
+        scenery (float): Preference from ``normalize_scenery``
+
+    Returns:
+        ndarray: Cost per edge, in seconds of travel time plus penalty
+    """
+    costs = graph.cost_cache.get(scenery)
+    if costs is None:
+        penalty = 1 + MAX_SCENIC_PENALTY * scenery * (1 - graph.scenic)
+        costs = (graph.duration * penalty).astype(np.float64)
+        graph.cost_cache[scenery] = costs
+    return costs
+
+
+def path_scenic_score(graph, edges):
+    """Length-weighted mean scenic score along ``edges``, or None if unscored."""
+    if graph.scenic is None or not len(edges):
+        return None
+    lengths = graph.distance[edges].astype(np.float64)
+    if not lengths.sum():
+        return None
+    return float((graph.scenic[edges] * lengths).sum() / lengths.sum())
+
+
+def score_graph_file(path, output=None):
+    """
+    Score a saved road graph against the place cache and write it back.
+
+    The new file replaces the old one in a single rename, so workers never
+    load a half-written graph, and the changed file retires cached routes.
+
+    Args:
+        path (str): ``.npz`` graph from ``build_road_graph``
+        output (str): Where to write the scored graph; defaults to ``path``
+
+    Returns:
+        RoadGraph: The scored graph
+    """
+    output = str(output or path)
+    graph = RoadGraph.load(path)
+    places = scenic_places()
+    graph.scenic = compute_scenic_scores(graph, places)
+
+    temporary = f"{output[: -len('.npz')]}.tmp.npz"
+    graph.save(temporary)
+    os.replace(temporary, output)
+    logger.info(
+        f"Scored {graph.num_edges} edges against {len(places)} places into {output}"
+    )
+    return graph
@@ -0,0 +1,170 @@
+"""
+Stored route results.
+
+A route request is normalized (waypoints rounded to ``COORDINATE_PRECISION``
+decimal places, plus the weight and scenery preference) and hashed with the
+routing graph token into ``Route.key``. Repeating a request, or sending one a
+few metres away, reads the stored route instead of searching the graph again,
+and rebuilding the graph retires every stored route. Route geometry is stored
+as an encoded polyline.
+
+Hits and misses are counted with ``services.cache_stats``; see
+``get_route_store_stats``. ``evict_routes`` removes routes computed on another
+graph, unused for ``ROUTE_STORE_MAX_AGE_DAYS``, or beyond the
+``ROUTE_STORE_MAX_ROUTES`` most recently used.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from services.cache_stats import HitCounter
+
+from .engine import graph_token, route
+from .geometry import decode_polyline, encode_polyline
+from .matrix import COORDINATE_PRECISION
+from .models import Route, RouteLeg
+from .scenic import normalize_scenery
+
+logger = logging.getLogger(__name__)
+
+hit_counter = HitCounter("route_store")
+
+
+def normalize_waypoints(points):
+    """Round ``(lat, lon)`` points to ``COORDINATE_PRECISION`` decimal places."""
+    rounded = np.round(np.asarray(points, dtype=np.float64), COORDINATE_PRECISION)
+    return rounded.reshape(-1, 2).tolist()
+
+
+def route_key(waypoints, weight, token, scenery=0):
+    """Hash a normalized request and the graph token into a ``Route.key``."""
+    payload = json.dumps([token, weight, scenery, waypoints], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _polyline(coordinates):
+    """Encode ``[lon, lat]`` coordinates, as legs carry them, as a polyline."""
+    return encode_polyline(np.asarray(coordinates, dtype=np.float64)[:, ::-1])
+
+
+def line_coordinates(text):
+    """Decode a stored polyline back to GeoJSON ``[lon, lat]`` coordinates."""
+    return decode_polyline(text)[:, ::-1].tolist()
+
+
+def _scenic_score(legs):
+    scored = [leg for leg in legs if leg.scenic_score is not None]
+    length = sum(leg.distance for leg in scored)
+    if not scored or not length:
+        return None
+    return sum(leg.scenic_score * leg.distance for leg in scored) / length
+
+
+def _store(key, waypoints, weight, scenery, token, legs):
+    coordinates = legs[0].geometry[:1]
+    for leg in legs:
+        coordinates.extend(leg.geometry[1:])
+
+    try:
+        with transaction.atomic():
+            stored = Route.objects.create(
+                key=key,
+                waypoints=waypoints,
+                weight=weight,
+                scenery=scenery,
+                graph_token=token,
+                total_distance=sum(leg.distance for leg in legs),
+                total_duration=sum(leg.duration for leg in legs),
+                geometry=_polyline(coordinates),
+                scenic_score=_scenic_score(legs),
+            )
+            RouteLeg.objects.bulk_create(
+                RouteLeg(
+                    route=stored,
+                    index=index,
+                    distance=leg.distance,
+                    duration=leg.duration,
+                    geometry=_polyline(leg.geometry),
+                )
+                for index, leg in enumerate(legs)
+            )
+    except IntegrityError:
+        # A concurrent request stored the same route first
+        stored = Route.objects.get(key=key)
+    return stored
+
+
+def get_or_compute_route(points, weight="duration", scenery=0):
+    """
+    Return the stored route through ``points``, routing it on a miss.
+
+    Args:
+        points (list): ``(lat, lon)`` waypoints, at least two
+        weight (str): ``"duration"`` (fastest) or ``"distance"`` (shortest)
+        scenery (float): 0-1 preference for scenic roads over travel time
+
+    Returns:
+        tuple: ``(Route, hit)``
+
+    Raises:
+        RoutingError: If the graph is unavailable or a leg cannot be routed
+    """
+    token = graph_token()
+    waypoints = normalize_waypoints(points)
+    scenery = normalize_scenery(scenery)
+    key = route_key(waypoints, weight, token, scenery)
+
+    stored = Route.objects.filter(key=key).first()
+    if stored is not None:
+        Route.objects.filter(id=stored.id).update(
+            hits=F("hits") + 1, last_used_at=timezone.now()
+        )
+        hit_counter.record(hits=1)
+        return stored, True
+
+    legs = route([tuple(point) for point in waypoints], weight, scenery=scenery)
+    stored = _store(key, waypoints, weight, scenery, token, legs)
+    hit_counter.record(misses=1)
+    return stored, False
+
+
+def evict_routes():
+    """
+    Delete stored routes that can no longer be served or are rarely used.
+
+    Returns:
+        int: Number of routes deleted
+    """
+    cutoff = timezone.now() - timedelta(days=settings.ROUTE_STORE_MAX_AGE_DAYS)
+    stale = Q(last_used_at__lt=cutoff)
+    # Without a configured graph there is no current token to compare with
+    if settings.ROUTING_GRAPH_PATH:
+        stale |= ~Q(graph_token=graph_token())
+    deleted = Route.objects.filter(stale).delete()[1].get("routes.Route", 0)
+
+    excess = Route.objects.count() - settings.ROUTE_STORE_MAX_ROUTES
+    if excess > 0:
+        least_used = Route.objects.order_by("last_used_at").values_list(
+            "id", flat=True
+        )[:excess]
+        deleted += (
+            Route.objects.filter(id__in=list(least_used))
+            .delete()[1]
+            .get("routes.Route", 0)
+        )
+
+    logger.info(f"Evicted {deleted} stored route(s)")
+    return deleted
+
+
+def get_route_store_stats():
+    """Return hit/miss counters, the hit rate and the number of stored routes."""
+    return {**hit_counter.stats(), "stored_routes": Route.objects.count()}
@@ -0,0 +1,24 @@
+from celery import shared_task
+
+
+@shared_task
+def evict_stale_routes():
+    """Delete stored routes from old graphs, unused or over the size cap."""
+    from .store import evict_routes
+
+    deleted = evict_routes()
+    return f"Evicted {deleted} stored route(s)"
+
+
+@shared_task
+def refresh_scenic_scores():
+    """Rescore the configured road graph against the current place cache."""
+    from django.conf import settings
+
+    from .scenic import score_graph_file
+
+    path = settings.ROUTING_GRAPH_PATH
+    if not path.endswith(".npz"):
+        return "Scenic scores need a .npz road graph; skipped"
+    graph = score_graph_file(path)
+    return f"Scored {graph.num_edges} edges in {path}"
@@ -6,5 +6,8 @@ app_name = "routes"
 
 urlpatterns = [
     path("calculate/", views.CalculateRouteView.as_view(), name="calculate_route"),
+    path("matrix/", views.RouteMatrixView.as_view(), name="route_matrix"),
+    path("isochrone/", views.IsochroneView.as_view(), name="isochrone"),
+    path("stats/", views.RouteStoreStatsView.as_view(), name="route_store_stats"),
     path("<int:route_id>/", views.RouteDetailView.as_view(), name="route_detail"),
 ]
@@ -1,7 +1,75 @@
+import numpy as np
+from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+from .engine import (
+    NoRouteFound,
+    RoutingError,
+    RoutingUnavailable,
+    WaypointNotRoutable,
+)
+from .isochrone import get_isochrones, quantize_origin
+from .matrix import MODES, compute_matrix
+from .models import Route
+from .scenic import DEFAULT_SCENERY
+from .store import get_or_compute_route, get_route_store_stats, line_coordinates
+
+WEIGHTS = [weight for weight, _ in Route.WEIGHTS]
+
+# Largest origins x destinations matrix served in one request
+MAX_MATRIX_CELLS = 10000
+
+# Most isochrone thresholds per request, and the longest one in minutes
+MAX_ISOCHRONES = 6
+MAX_ISOCHRONE_MINUTES = 12 * 60
+
+
+def _parse_waypoints(waypoints):
+    """Return ``(lat, lon)`` pairs, or None if any waypoint is malformed."""
+    try:
+        points = [(float(w["lat"]), float(w["lng"])) for w in waypoints]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not all(-90 <= lat <= 90 and -180 <= lng <= 180 for lat, lng in points):
+        return None
+    return points
+
+
+def _format_leg(leg):
+    km = leg.distance / 1000
+    hours = leg.duration / 3600
+    return {
+        "distance": {"text": f"{km:.1f} km", "value": round(km, 3)},
+        "duration": {"text": f"{hours:.1f} hours", "value": round(hours, 3)},
+        "geometry": {
+            "type": "LineString",
+            "coordinates": line_coordinates(leg.geometry),
+        },
+    }
+
+
+def _route_data(stored):
+    """Represent a stored ``Route`` and its legs."""
+    return {
+        "id": stored.id,
+        "status": "calculated",
+        "weight": stored.weight,
+        "scenery": stored.scenery,
+        "scenic_score": (
+            None if stored.scenic_score is None else round(stored.scenic_score, 3)
+        ),
+        "total_distance": round(stored.total_distance / 1000, 3),
+        "total_time": round(stored.total_duration / 3600, 3),
+        "waypoints": [{"lat": lat, "lng": lng} for lat, lng in stored.waypoints],
+        "geometry": {
+            "type": "LineString",
+            "coordinates": line_coordinates(stored.geometry),
+        },
+        "legs": [_format_leg(leg) for leg in stored.legs.all()],
+    }
 
 
 class CalculateRouteView(APIView):
@@ -18,23 +86,164 @@ class CalculateRouteView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        total_distance = len(waypoints) * 150
-        total_time = total_distance / 60
+        points = _parse_waypoints(waypoints)
+        if points is None:
+            return Response(
+                {"error": "Each waypoint needs numeric lat and lng"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        weight = request.data.get("weight", "duration")
+        if weight not in WEIGHTS:
+            return Response(
+                {"error": f"weight must be one of: {', '.join(WEIGHTS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Scenic trips trade some travel time for scenery unless told how much
+        default_scenery = (
+            DEFAULT_SCENERY if request.data.get("route_type") == "scenic" else 0
+        )
+        try:
+            scenery = float(request.data.get("scenery", default_scenery))
+        except (TypeError, ValueError):
+            scenery = -1
+        if not 0 <= scenery <= 1:
+            return Response(
+                {"error": "scenery must be a number from 0 to 1"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if scenery and weight != "duration":
+            return Response(
+                {"error": "scenery can only be combined with the duration weight"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            stored, hit = get_or_compute_route(points, weight, scenery)
+        except RoutingUnavailable as exc:
+            return Response(
+                {"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except (WaypointNotRoutable, NoRouteFound, RoutingError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Echo the waypoints as sent rather than as normalized for storage
+        return Response(
+            {**_route_data(stored), "waypoints": waypoints},
+            headers={"X-Cache": "HIT" if hit else "MISS"},
+        )
+
+
+def _matrix_values(values, scale):
+    """Scale a matrix and round it for JSON, with None for unreachable cells."""
+    values = np.round(values / scale, 3)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+class RouteMatrixView(APIView):
+    """Calculate distances and travel times between origins and destinations"""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        origins = _parse_waypoints(request.data.get("origins") or [])
+        # Destinations default to the origins
+        destinations = request.data.get("destinations")
+        if destinations is not None:
+            destinations = _parse_waypoints(destinations) or []
+        if not origins or destinations == []:
+            return Response(
+                {"error": "origins and destinations need numeric lat and lng"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        mode = request.data.get("mode", "estimate")
+        if mode not in MODES:
+            return Response(
+                {"error": f"mode must be one of: {', '.join(MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cells = len(origins) * len(destinations or origins)
+        if cells > MAX_MATRIX_CELLS:
+            return Response(
+                {"error": f"At most {MAX_MATRIX_CELLS} cells per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            matrix = compute_matrix(origins, destinations, mode=mode)
+        except RoutingUnavailable as exc:
+            return Response(
+                {"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except RoutingError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "mode": mode,
+                "distances": _matrix_values(matrix.distance, 1000),
+                "durations": _matrix_values(matrix.duration, 3600),
+                "cached_cells": matrix.cached_cells,
+                "computed_cells": matrix.computed_cells,
+            }
+        )
+
+
+class IsochroneView(APIView):
+    """Calculate the areas reachable from an origin within some driving times"""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        origin = _parse_waypoints([request.data.get("origin")])
+        if origin is None:
+            return Response(
+                {"error": "origin needs numeric lat and lng"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        route_data = {
-            "total_distance": total_distance,
-            "total_time": total_time,
-            "waypoints": waypoints,
-            "legs": [
+        minutes = request.data.get("minutes", [60])
+        if not isinstance(minutes, list):
+            minutes = [minutes]
+        try:
+            minutes = sorted({int(value) for value in minutes})
+        except (TypeError, ValueError):
+            minutes = []
+        if (
+            not 0 < len(minutes) <= MAX_ISOCHRONES
+            or not 0 < minutes[0] <= minutes[-1] <= MAX_ISOCHRONE_MINUTES
+        ):
+            return Response(
                 {
-                    "distance": {"text": "150 km", "value": 150},
-                    "duration": {"text": "2.5 hours", "value": 2.5},
-                }
-                for _ in range(len(waypoints) - 1)
-            ],
-        }
+                    "error": f"minutes must be 1 to {MAX_ISOCHRONES} whole numbers "
+                    f"from 1 to {MAX_ISOCHRONE_MINUTES}"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response(route_data)
+        lat, lng = origin[0]
+        try:
+            features, cached = get_isochrones(lat, lng, minutes)
+        except RoutingUnavailable as exc:
+            return Response(
+                {"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except RoutingError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Results are shared by every origin that rounds to the same point
+        lat, lng = quantize_origin(lat, lng)
+        return Response(
+            {
+                "type": "FeatureCollection",
+                "origin": {"lat": lat, "lng": lng},
+                "features": features,
+                "cached": cached,
+            }
+        )
 
 
 class RouteDetailView(APIView):
@@ -43,12 +252,16 @@ class RouteDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, route_id):
-        # Mock route details for now
-        return Response(
-            {
-                "id": route_id,
-                "total_distance": 450,
-                "total_time": 7.5,
-                "status": "calculated",
-            }
+        stored = get_object_or_404(
+            Route.objects.prefetch_related("legs"), id=route_id
         )
+        return Response(_route_data(stored))
+
+
+class RouteStoreStatsView(APIView):
+    """Get hit/miss counters for stored routes"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_route_store_stats())
@@ -0,0 +1,200 @@
+"""
+Trip access resolution shared by the trip permissions and views.
+
+A user's effective permission on a trip is resolved with one query (the
+trip row annotated with the user's active share level), memoized on the
+request and, when ``TRIP_ACCESS_CACHE_TIMEOUT`` is set, cached across
+requests. Cache entries are versioned per trip and the version is bumped
+by the signals in ``signals.py`` whenever the trip or one of its shares
+changes.
+"""
+
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+from rest_framework import permissions
+
+from .models import Trip, TripShare
+
+EDIT_LEVELS = ("edit", "admin")
+
+
+@dataclass(frozen=True)
+class TripAccess:
+    """A user's effective access to a single trip."""
+
+    trip_id: int
+    user_id: int = None
+    owner_id: int = None
+    is_public: bool = False
+    share_level: str = None
+
+    @property
+    def exists(self):
+        """Whether the trip exists at all."""
+        return self.owner_id is not None
+
+    @property
+    def is_owner(self):
+        return self.exists and self.owner_id == self.user_id
+
+    @property
+    def is_member(self):
+        """Owner or holder of an active share, regardless of level."""
+        return self.is_owner or self.share_level is not None
+
+    @property
+    def can_edit(self):
+        return self.is_owner or self.share_level in EDIT_LEVELS
+
+    def allows(self, method):
+        """Apply the trip permission rules to an HTTP method."""
+        if self.is_owner:
+            return True
+
+        # Read permissions for all shared users, write for edit/admin
+        if self.share_level is not None:
+            return method in permissions.SAFE_METHODS or self.can_edit
+
+        # Public trips are readable by everyone
+        return self.is_public and method in permissions.SAFE_METHODS
+
+
+def _user_id(request):
+    user = getattr(request, "user", None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+def _version_key(trip_id):
+    return f"trip_access_version:{trip_id}"
+
+
+def _cache_key(trip_id, user_id, version):
+    return f"trip_access:{trip_id}:{user_id}:{version}"
+
+
+def _memo(request):
+    memo = getattr(request, "_trip_access", None)
+    if memo is None:
+        memo = {}
+        request._trip_access = memo
+    return memo
+
+
+def _annotated_trips(user_id):
+    """Trip queryset annotated with ``share_level`` for ``user_id``."""
+    queryset = Trip.objects.all()
+    if user_id is None:
+        return queryset
+
+    share_level = TripShare.objects.filter(
+        trip=OuterRef("pk"), shared_with_id=user_id, is_active=True
+    ).values("permission_level")[:1]
+    return queryset.annotate(share_level=Subquery(share_level))
+
+
+def _remember(request, access, version):
+    _memo(request)[access.trip_id] = access
+
+    timeout = settings.TRIP_ACCESS_CACHE_TIMEOUT
+    if timeout and access.exists:
+        cache.set(
+            _cache_key(access.trip_id, access.user_id, version),
+            (access.owner_id, access.is_public, access.share_level),
+            timeout,
+        )
+
+
+def get_trip_access(request, trip_id):
+    """
+    Resolve the requesting user's access to a trip.
+
+    Args:
+        request: Django or DRF request carrying the user
+        trip_id (int): Trip id
+
+    Returns:
+        TripAccess: Effective access; ``exists`` is False for unknown trips
+    """
+    trip_id = int(trip_id)
+    memo = _memo(request)
+    if trip_id in memo:
+        return memo[trip_id]
+
+    user_id = _user_id(request)
+    version = None
+    if settings.TRIP_ACCESS_CACHE_TIMEOUT:
+        version = cache.get(_version_key(trip_id), 0)
+        cached = cache.get(_cache_key(trip_id, user_id, version))
+        if cached is not None:
+            access = TripAccess(trip_id, user_id, *cached)
+            memo[trip_id] = access
+            return access
+
+    row = (
+        _annotated_trips(user_id)
+        .filter(id=trip_id)
+        .values("user_id", "is_public", *(["share_level"] if user_id else []))
+        .first()
+    )
+    if row is None:
+        access = TripAccess(trip_id, user_id)
+    else:
+        access = TripAccess(
+            trip_id,
+            user_id,
+            owner_id=row["user_id"],
+            is_public=row["is_public"],
+            share_level=row.get("share_level"),
+        )
+
+    _remember(request, access, version)
+    return access
+
+
+def get_trip_access_or_404(request, trip_id):
+    """Like ``get_trip_access`` but raise ``Http404`` for unknown trips."""
+    access = get_trip_access(request, trip_id)
+    if not access.exists:
+        raise Http404("No Trip matches the given query.")
+    return access
+
+
+def get_trip_with_access(request, trip_id):
+    """
+    Load a trip together with the requesting user's access in one query.
+
+    Returns:
+        tuple: ``(trip, access)``; raises ``Http404`` for unknown trips
+    """
+    user_id = _user_id(request)
+    trip = _annotated_trips(user_id).filter(id=trip_id).first()
+    if trip is None:
+        raise Http404("No Trip matches the given query.")
+
+    access = TripAccess(
+        trip.id,
+        user_id,
+        owner_id=trip.user_id,
+        is_public=trip.is_public,
+        share_level=getattr(trip, "share_level", None),
+    )
+    version = cache.get(_version_key(trip.id), 0) if settings.TRIP_ACCESS_CACHE_TIMEOUT else None
+    _remember(request, access, version)
+    return trip, access
+
+
+def invalidate_trip_access(trip_id):
+    """Drop every cached access entry for a trip by bumping its version."""
+    if not settings.TRIP_ACCESS_CACHE_TIMEOUT:
+        return
+
+    key = _version_key(trip_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
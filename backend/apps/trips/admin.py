@@ -64,7 +64,17 @@ class TripAdmin(admin.ModelAdmin):
             "Basic Information",
             {"fields": ("user", "name", "description", "route_type")},
         ),
-        ("Trip Dates", {"fields": ("start_date", "end_date")}),
+        (
+            "Trip Dates",
+            {
+                "fields": (
+                    "start_date",
+                    "end_date",
+                    "start_time",
+                    "daily_driving_hours",
+                )
+            },
+        ),
         (
             "Statistics",
             {
@@ -127,7 +137,14 @@ class StopAdmin(admin.ModelAdmin):
         (
             "Timing",
             {
-                "fields": ("arrival_time", "departure_time", "duration_minutes"),
+                "fields": (
+                    "arrival_time",
+                    "arrival_day",
+                    "departure_time",
+                    "departure_day",
+                    "duration_minutes",
+                    "is_overnight",
+                ),
                 "classes": ("collapse",),
             },
         ),
@@ -149,6 +166,11 @@ class StopAdmin(admin.ModelAdmin):
     )
 
     readonly_fields = (
+        "arrival_time",
+        "arrival_day",
+        "departure_time",
+        "departure_day",
+        "is_overnight",
         "travel_time_to_next",
         "travel_distance_to_next",
         "created_at",
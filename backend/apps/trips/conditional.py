@@ -0,0 +1,70 @@
+"""
+Conditional request handling for trip representations.
+
+A trip's ETag is derived from its id and ``updated_at``, which changes on
+every trip or stop write. ``If-None-Match`` lets polling clients get a 304
+before any stops are loaded or serialized; ``If-Match`` gives writers
+optimistic concurrency on the trip and its stops.
+"""
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import Trip
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The trip has changed since it was last fetched."
+    default_code = "precondition_failed"
+
+
+def trip_etag(trip):
+    """Build the ETag for a loaded trip."""
+    return f'"{trip.id}-{trip.updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def get_trip_etag(trip_id):
+    """Build a trip's ETag from its ``updated_at`` without loading the row."""
+    updated_at = (
+        Trip.objects.filter(id=trip_id).values_list("updated_at", flat=True).first()
+    )
+    if updated_at is None:
+        return None
+    return f'"{trip_id}-{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def not_modified(request, etag):
+    """
+    Return a 304 response if ``If-None-Match`` matches ``etag``.
+
+    Returns:
+        Response or None: 304 response, or None when the body must be sent
+    """
+    header = request.headers.get("If-None-Match")
+    if not header or etag is None:
+        return None
+
+    etags = parse_etags(header)
+    if "*" in etags or _strip_weak(etag) in {_strip_weak(e) for e in etags}:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+def check_if_match(request, etag):
+    """Raise ``PreconditionFailed`` if ``If-Match`` is sent and does not match."""
+    header = request.headers.get("If-Match")
+    if not header:
+        return
+
+    etags = parse_etags(header)
+    # If-Match uses strong comparison, so weak tags never match
+    if "*" in etags or (etag is not None and etag in etags):
+        return
+    raise PreconditionFailed()
@@ -0,0 +1,226 @@
+"""
+Fast read path for trip and stop responses.
+
+Rows are pulled with ``.values()`` (trips and their stops in two queries)
+and turned into output dicts by per-field accessors compiled once from the
+DRF serializers' field lists, then encoded with orjson when it is
+installed. The result is byte-identical to rendering ``TripListSerializer``,
+``TripDetailSerializer`` or ``StopSerializer`` with DRF's JSONRenderer;
+``tests/test_trips.py`` checks this against the regular serializers.
+"""
+
+import json
+import logging
+from functools import lru_cache
+from operator import itemgetter
+
+from django.db import models
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.routes.geometry import level_for_zoom
+
+from .models import Stop, Trip
+from .serializers import StopSerializer, TripDetailSerializer, TripListSerializer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    logger.info("orjson not installed, fast serializers will use the json module")
+    orjson = None
+
+
+class _StdlibFloat(float):
+    """
+    Float that orjson would format differently from ``repr()``.
+
+    orjson does not serialize float subclasses natively, so one of these in
+    the payload makes ``dumps`` fall back to the ``json`` module.
+    """
+
+
+def _float(value):
+    # Exponent notation (1e-05 vs 1e-5), NaN and infinities
+    if value and not 1e-4 <= abs(value) < 1e16:
+        return _StdlibFloat(value)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, float):
+        return _float(value)
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value
+
+
+def _datetime(value, tz):
+    if not value:
+        return None
+    text = value.astimezone(tz).isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _time(value):
+    return None if value is None else value.isoformat()
+
+
+def _compile(model, fields, computed, tz):
+    """
+    Build ``(name, accessor)`` pairs for a serializer field list.
+
+    Plain columns are read with ``itemgetter``; dates and times are converted
+    the way DRF's fields represent them (datetimes in ``tz``), floats are
+    screened for values orjson would format differently; ``computed``
+    supplies the rest.
+    """
+    accessors = []
+    for name in fields:
+        if name in computed:
+            accessors.append((name, computed[name]))
+            continue
+
+        field = model._meta.get_field(name)
+        key = field.attname
+        if isinstance(field, models.DateTimeField):
+            accessors.append((name, lambda row, key=key: _datetime(row[key], tz)))
+        elif isinstance(field, models.DateField):
+            accessors.append((name, lambda row, key=key: _iso(row[key])))
+        elif isinstance(field, models.TimeField):
+            accessors.append((name, lambda row, key=key: _time(row[key])))
+        elif isinstance(field, models.FloatField):
+            accessors.append((name, lambda row, key=key: _float(row[key])))
+        elif isinstance(field, models.JSONField):
+            accessors.append((name, lambda row, key=key: _json_value(row[key])))
+        else:
+            accessors.append((name, itemgetter(key)))
+    return accessors
+
+
+def _columns(model, fields):
+    """Database columns needed to feed the accessors of ``fields``."""
+    names = {f.name: f.attname for f in model._meta.concrete_fields}
+    return [names[name] for name in fields if name in names]
+
+
+def _duration_days(row):
+    if row["start_date"] and row["end_date"]:
+        return (row["end_date"] - row["start_date"]).days + 1
+    return None
+
+
+STOP_FIELDS = StopSerializer.Meta.fields
+STOP_COLUMNS = ["trip_id", "latitude", "longitude"] + _columns(Stop, STOP_FIELDS)
+STOP_COMPUTED = {
+    "coordinates": lambda row: (_float(row["latitude"]), _float(row["longitude"]))
+}
+
+
+def _overview_geometry(row):
+    levels = (row["route_geometry_levels"] or {}).get("levels", {})
+    return level_for_zoom(levels, row["route_geometry"], Trip.DETAIL_ZOOM)[1]
+
+
+TRIP_COMPUTED = {
+    "user_name": lambda row: f"{row['user__first_name']} {row['user__last_name']}".strip(),
+    "route_geometry": _overview_geometry,
+    "duration_days": _duration_days,
+    "stops": itemgetter("stops"),
+    "stops_count": lambda row: len(row["stops"]),
+}
+TRIP_LIST_FIELDS = TripListSerializer.Meta.fields
+TRIP_DETAIL_FIELDS = TripDetailSerializer.Meta.fields
+TRIP_COLUMNS = sorted(
+    set(_columns(Trip, TRIP_DETAIL_FIELDS))
+    | {"id", "start_date", "end_date", "user__first_name", "user__last_name"}
+    | {"route_geometry_levels"}
+)
+
+
+@lru_cache(maxsize=None)
+def _accessors(tz):
+    """Compile the stop, trip list and trip detail accessors for ``tz``."""
+    return (
+        _compile(Stop, STOP_FIELDS, STOP_COMPUTED, tz),
+        _compile(Trip, TRIP_LIST_FIELDS, TRIP_COMPUTED, tz),
+        _compile(Trip, TRIP_DETAIL_FIELDS, TRIP_COMPUTED, tz),
+    )
+
+
+def _serialize_row(row, accessors):
+    return {name: accessor(row) for name, accessor in accessors}
+
+
+def serialize_stops(queryset):
+    """Serialize a stop queryset like ``StopSerializer(many=True)``."""
+    accessors = _accessors(timezone.get_current_timezone())[0]
+    return [_serialize_row(row, accessors) for row in queryset.values(*STOP_COLUMNS)]
+
+
+def serialize_trips(queryset, detail=False):
+    """
+    Serialize trips and their stops like the list or detail serializer.
+
+    Args:
+        queryset (QuerySet): Trips, already filtered, ordered and sliced
+        detail (bool): Use ``TripDetailSerializer`` fields instead of the list ones
+
+    Returns:
+        list: One dict per trip, in queryset order
+    """
+    rows = list(queryset.values(*TRIP_COLUMNS))
+    if not rows:
+        return []
+
+    stop_accessors, list_accessors, detail_accessors = _accessors(
+        timezone.get_current_timezone()
+    )
+    stops = {row["id"]: [] for row in rows}
+    stop_rows = (
+        Stop.objects.filter(trip_id__in=stops.keys())
+        .order_by("trip_id", "order")
+        .values(*STOP_COLUMNS)
+    )
+    for stop in stop_rows:
+        stops[stop["trip_id"]].append(_serialize_row(stop, stop_accessors))
+
+    accessors = detail_accessors if detail else list_accessors
+    output = []
+    for row in rows:
+        row["stops"] = stops[row["id"]]
+        output.append(_serialize_row(row, accessors))
+    return output
+
+
+def _orjson_default(value):
+    raise TypeError(f"Type is not orjson serializable: {type(value).__name__}")
+
+
+def dumps(data):
+    """Encode ``data`` exactly as DRF's compact JSONRenderer would."""
+    if orjson is not None:
+        try:
+            encoded = orjson.dumps(data, default=_orjson_default)
+        except TypeError:
+            pass
+        else:
+            return encoded.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+
+    text = json.dumps(
+        data,
+        cls=JSONEncoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    )
+    return text.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
@@ -0,0 +1,304 @@
+"""
+Refuelling stops along a trip's route.
+
+Gas stations come from the place cache (``Place`` rows); planning never calls
+an upstream API. Every station near the route's bounding box is projected
+onto the route in one vectorized pass, giving how far along the route it
+sits and how far off it. Stations outside the corridor are dropped.
+
+A dynamic-programming sweep over the remaining stations, in route order,
+finds the fewest stops that keep the usable range (the range less a reserve)
+from running out. Ties go to the smallest total detour. A detour is the
+straight-line trip to the station and back. Every fill-up fills the tank.
+"""
+
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from apps.places.models import Place
+from apps.routes.geometry import decode_polyline
+from apps.routes.graph import EARTH_RADIUS_M, haversine_m
+from apps.routes.matrix import ESTIMATE_SPEED_KMH
+
+from .optimization import METRES_PER_MILE
+
+# Largest stations x route segments block projected at once
+PROJECTION_BLOCK = 2_000_000
+
+# Orders stops before detour when both are folded into one cost
+STOP_COST = 1e12
+
+
+class NoFuelPlan(Exception):
+    """The route has a stretch longer than the vehicle's range without stations."""
+
+    def __init__(self, stranded_at):
+        self.stranded_at = stranded_at  # metres along the route
+        super().__init__(
+            f"No gas station within range after mile "
+            f"{stranded_at / METRES_PER_MILE:.0f} of the route"
+        )
+
+
+@dataclass
+class FuelStop:
+    """A planned fill-up at a cached gas station."""
+
+    place_id: str
+    name: str
+    latitude: float
+    longitude: float
+    route_miles: float  # along the route to where the detour starts
+    detour_miles: float  # there and back
+    detour_minutes: float
+    detour_cost: float  # fuel burnt on the detour, USD
+    gallons: float  # bought to fill the tank
+    fuel_cost: float  # USD
+
+
+@dataclass
+class FuelPlan:
+    """Refuelling stops for a route and what they cost."""
+
+    route_miles: float
+    range_miles: float
+    stations_considered: int
+    stops: list = field(default_factory=list)
+
+    @property
+    def total_detour_miles(self):
+        return sum(stop.detour_miles for stop in self.stops)
+
+    @property
+    def total_detour_cost(self):
+        return sum(stop.detour_cost for stop in self.stops)
+
+
+def trip_route(trip):
+    """
+    A trip's route as ``(lat, lon)`` points.
+
+    Uses the stored route geometry, or straight lines between the stops
+    when the route has not been computed.
+
+    Raises:
+        ValueError: If the stored geometry cannot be decoded
+    """
+    if trip.route_geometry:
+        return decode_polyline(trip.route_geometry)
+    stops = trip.stops.order_by("order").values_list("latitude", "longitude")
+    return np.array(list(stops), dtype=np.float64).reshape(-1, 2)
+
+
+def route_distances(route):
+    """Cumulative distance in metres at each ``(lat, lon)`` point of a route."""
+    steps = haversine_m(route[:-1, 0], route[:-1, 1], route[1:, 0], route[1:, 1])
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+
+def project_onto_route(route, points):
+    """
+    Where ``points`` meet a route, using a local flat projection.
+
+    Args:
+        route (ndarray): ``(n, 2)`` ``(lat, lon)`` points, n >= 2
+        points (ndarray): ``(m, 2)`` ``(lat, lon)`` points
+
+    Returns:
+        tuple: ``(along, offset)`` arrays in metres: distance along the route
+        to the nearest point on it, and straight-line distance from there
+    """
+    scale = math.cos(math.radians(float(route[:, 0].mean())))
+    xy = np.radians(route[:, ::-1]) * EARTH_RADIUS_M * [scale, 1.0]
+    starts = xy[:-1]
+    vectors = xy[1:] - starts
+    lengths = np.maximum((vectors**2).sum(axis=1), 1e-9)
+    cumulative = route_distances(route)
+    segment_lengths = np.diff(cumulative)
+
+    along = np.empty(len(points))
+    offset = np.empty(len(points))
+    block = max(1, PROJECTION_BLOCK // len(starts))
+    for first in range(0, len(points), block):
+        chunk = points[first:first + block]
+        chunk_xy = np.radians(chunk[:, ::-1]) * EARTH_RADIUS_M * [scale, 1.0]
+        dx = chunk_xy[:, :1] - starts[:, 0]
+        dy = chunk_xy[:, 1:] - starts[:, 1]
+        share = np.clip((dx * vectors[:, 0] + dy * vectors[:, 1]) / lengths, 0, 1)
+        dx -= share * vectors[:, 0]
+        dy -= share * vectors[:, 1]
+        nearest = (dx * dx + dy * dy).argmin(axis=1)
+
+        rows = np.arange(len(chunk))
+        t = share[rows, nearest]
+        foot = route[nearest] + t[:, None] * (route[nearest + 1] - route[nearest])
+        along[first:first + block] = (
+            cumulative[nearest] + t * segment_lengths[nearest]
+        )
+        offset[first:first + block] = haversine_m(
+            chunk[:, 0], chunk[:, 1], foot[:, 0], foot[:, 1]
+        )
+    return along, offset
+
+
+def corridor_stations(route, corridor):
+    """
+    Cached gas stations within ``corridor`` metres of the route.
+
+    Returns:
+        tuple: ``(stations, along, offset)``: ``Place`` value rows, and their
+        positions from ``project_onto_route``
+    """
+    margin_lat = corridor / 111_320
+    widest = min(float(np.abs(route[:, 0]).max()), 85.0)
+    margin_lon = margin_lat / math.cos(math.radians(widest))
+    stations = list(
+        Place.objects.filter(
+            place_type="gas_station",
+            permanently_closed=False,
+            latitude__range=(
+                route[:, 0].min() - margin_lat,
+                route[:, 0].max() + margin_lat,
+            ),
+            longitude__range=(
+                route[:, 1].min() - margin_lon,
+                route[:, 1].max() + margin_lon,
+            ),
+        ).values("place_id", "name", "latitude", "longitude")
+    )
+    if not stations:
+        return [], np.zeros(0), np.zeros(0)
+
+    points = np.array([(s["latitude"], s["longitude"]) for s in stations])
+    along, offset = project_onto_route(route, points)
+    inside = np.flatnonzero(offset <= corridor)
+    return [stations[i] for i in inside], along[inside], offset[inside]
+
+
+def choose_stops(along, offset, route_length, usable_range, start_range):
+    """
+    Fewest fill-ups, then least detour, that cover the route.
+
+    Args:
+        along, offset (ndarray): Station positions in metres, as from
+            ``project_onto_route``
+        route_length (float): Metres to the end of the route
+        usable_range (float): Metres a full tank covers, less the reserve
+        start_range (float): Metres the fuel at departure covers, less the reserve
+
+    Returns:
+        list: Indexes into the station arrays, in route order
+
+    Raises:
+        NoFuelPlan: If some stretch cannot be covered
+    """
+    if route_length <= start_range:
+        return []
+
+    order = np.argsort(along, kind="stable")
+    along = along[order]
+    offset = offset[order]
+
+    # cost[i]: fill-ups and detour (folded together) up to and including i
+    cost = np.where(along + offset <= start_range, STOP_COST + 2 * offset, np.inf)
+    parent = np.full(len(along), -1)
+    for i in range(len(along)):
+        reachable = along[i] - along[:i] + offset[:i] + offset[i] <= usable_range
+        candidates = np.where(reachable, cost[:i], np.inf)
+        if not len(candidates):
+            continue
+        best = int(candidates.argmin())
+        via = candidates[best] + STOP_COST + 2 * offset[i]
+        if via < cost[i]:
+            cost[i] = via
+            parent[i] = best
+
+    finishing = np.where(
+        route_length - along + offset <= usable_range, cost, np.inf
+    )
+    if not len(finishing) or np.isinf(finishing.min()):
+        reached = np.isfinite(cost)
+        stranded = max(
+            [start_range, *(along[reached] - offset[reached] + usable_range)]
+        )
+        raise NoFuelPlan(min(stranded, route_length))
+
+    stops = []
+    index = int(finishing.argmin())
+    while index >= 0:
+        stops.append(int(order[index]))
+        index = int(parent[index])
+    return stops[::-1]
+
+
+def plan_fuel_stops(
+    route,
+    range_miles,
+    mpg,
+    price_per_gallon,
+    start_fuel=1.0,
+    reserve=0.1,
+    corridor_miles=3.0,
+):
+    """
+    Plan refuelling stops along a route from cached gas stations.
+
+    Args:
+        route (ndarray): ``(n, 2)`` ``(lat, lon)`` points, n >= 2
+        range_miles (float): Miles a full tank covers
+        mpg (float): Fuel efficiency in miles per gallon
+        price_per_gallon (float): Fuel price in USD
+        start_fuel (float): Share of a full tank at departure
+        reserve (float): Share of the range never planned into
+        corridor_miles (float): Farthest a station may be from the route
+
+    Returns:
+        FuelPlan: The stops, in route order
+
+    Raises:
+        NoFuelPlan: If the route cannot be covered with the cached stations
+    """
+    full_range = range_miles * METRES_PER_MILE
+    usable_range = full_range * (1 - reserve)
+    start_range = full_range * (start_fuel - reserve)
+    route_length = float(route_distances(route)[-1])
+
+    stations, along, offset = corridor_stations(
+        route, corridor_miles * METRES_PER_MILE
+    )
+    chosen = choose_stops(along, offset, route_length, usable_range, start_range)
+
+    plan = FuelPlan(
+        route_miles=route_length / METRES_PER_MILE,
+        range_miles=range_miles,
+        stations_considered=len(stations),
+    )
+    # Fuel left at departure, then after each fill-up, in metres of range
+    left = full_range * start_fuel
+    previous = None
+    for index in chosen:
+        driven = along[index] + offset[index]
+        if previous is not None:
+            driven += offset[previous] - along[previous]
+        gallons = (full_range - left + driven) / METRES_PER_MILE / mpg
+        detour = 2 * offset[index] / METRES_PER_MILE
+        station = stations[index]
+        plan.stops.append(
+            FuelStop(
+                place_id=station["place_id"],
+                name=station["name"],
+                latitude=station["latitude"],
+                longitude=station["longitude"],
+                route_miles=float(along[index]) / METRES_PER_MILE,
+                detour_miles=float(detour),
+                detour_minutes=float(detour * 1.609344 / ESTIMATE_SPEED_KMH * 60),
+                detour_cost=float(detour / mpg * price_per_gallon),
+                gallons=float(gallons),
+                fuel_cost=float(gallons * price_per_gallon),
+            )
+        )
+        left = full_range
+        previous = index
+    return plan
@@ -0,0 +1,176 @@
+"""
+Incremental computation of the leg from each stop to the next.
+
+Every stop stores ``travel_leg_key``: its own position, the next stop's
+position and how the leg was computed. After any stop write the trip is
+queued for ``compute_trip_legs``; the task rebuilds the keys from the
+current stops and only routes the legs whose key no longer matches, so
+moving one stop of a 50-stop trip recomputes two legs, not 49.
+
+Writes within ``TRIP_LEG_COALESCE_SECONDS`` share one queued task per trip, and
+results are only saved for stops whose key is still current when the task
+commits, so an edit that lands mid-computation is never overwritten. The
+queued-task marker is set by the writer and cleared by the Celery worker, so
+writes only coalesce when the cache is shared (``SHARED_CACHE``); otherwise
+every write queues its own task rather than waiting on a marker the worker
+cannot clear.
+"""
+
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.routes.engine import RoutingError
+from apps.routes.graph import haversine_m
+from apps.routes.matrix import ESTIMATE_SPEED_KMH, road_matrix
+
+from .models import Stop, Trip
+
+logger = logging.getLogger(__name__)
+
+METRES_PER_MILE = 1609.344
+
+# Stop fields written when legs are recomputed
+LEG_FIELDS = ["travel_time_to_next", "travel_distance_to_next", "travel_leg_key"]
+
+# Stop fields that decide the legs between stops and the stop times
+TRIGGER_FIELDS = {"latitude", "longitude", "order", "duration_minutes"}
+
+
+def _scheduled_key(trip_id):
+    return f"trip_legs_scheduled:{trip_id}"
+
+
+def leg_key(stop, next_stop, mode):
+    """Describe what a stop's leg depends on; blank for the last stop."""
+    if next_stop is None:
+        return ""
+    return (
+        f"{mode}:{stop.latitude:.6f},{stop.longitude:.6f}:"
+        f"{next_stop.latitude:.6f},{next_stop.longitude:.6f}"
+    )
+
+
+def routing_mode():
+    """``"road"`` when a routing graph is configured, else ``"estimate"``."""
+    return "road" if settings.ROUTING_GRAPH_PATH else "estimate"
+
+
+def _expected_keys(stops, mode):
+    """Map each stop id to the key its leg should have, given stops in order."""
+    return {
+        stop.id: leg_key(stop, next_stop, mode)
+        for stop, next_stop in zip(stops, [*stops[1:], None])
+    }
+
+
+def _leg_values(pairs, mode):
+    """
+    Distance in miles and time in hours for ``(stop, next stop)`` pairs.
+
+    Road legs come from the matrix service, so they share its cell cache;
+    any leg it cannot route falls back to the straight-line estimate.
+    """
+    origins = np.array([(a.latitude, a.longitude) for a, _ in pairs])
+    destinations = np.array([(b.latitude, b.longitude) for _, b in pairs])
+    distance = haversine_m(
+        origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1]
+    )
+    duration = distance / (ESTIMATE_SPEED_KMH / 3.6)
+
+    if mode == "road":
+        for index in range(len(pairs)):
+            leg = slice(index, index + 1)
+            try:
+                matrix = road_matrix(origins[leg], destinations[leg])
+            except RoutingError as exc:
+                logger.warning(f"Falling back to estimated legs: {exc}")
+                break
+            if not np.isnan(matrix.distance[0, 0]):
+                distance[index] = matrix.distance[0, 0]
+                duration[index] = matrix.duration[0, 0]
+
+    return distance / METRES_PER_MILE, duration / 3600
+
+
+def update_trip_legs(trip_id):
+    """
+    Compute the legs of a trip whose stops changed since they were computed.
+
+    Args:
+        trip_id (int): Trip to update
+
+    Returns:
+        int: Number of stops whose leg was written
+    """
+    mode = routing_mode()
+    stops = list(Stop.objects.filter(trip_id=trip_id).order_by("order"))
+    expected = _expected_keys(stops, mode)
+    following = dict(zip([stop.id for stop in stops], stops[1:]))
+    stale = [stop for stop in stops if stop.travel_leg_key != expected[stop.id]]
+    if not stale:
+        return 0
+
+    pairs = [(stop, following[stop.id]) for stop in stale if stop.id in following]
+    if pairs:
+        miles, hours = _leg_values(pairs, mode)
+        computed = {
+            stop.id: (float(hours[index]), float(miles[index]))
+            for index, (stop, _) in enumerate(pairs)
+        }
+    else:
+        computed = {}
+
+    with transaction.atomic():
+        # Re-read under lock and keep only legs that are still current
+        current = list(
+            Stop.objects.select_for_update().filter(trip_id=trip_id).order_by("order")
+        )
+        current_keys = _expected_keys(current, mode)
+        changed = []
+        for stop in current:
+            key = current_keys[stop.id]
+            if stop.travel_leg_key == key or expected.get(stop.id) != key:
+                continue
+            stop.travel_time_to_next, stop.travel_distance_to_next = computed.get(
+                stop.id, (None, None)
+            )
+            stop.travel_leg_key = key
+            changed.append(stop)
+
+        if changed:
+            Stop.objects.bulk_update(changed, LEG_FIELDS)
+            trip = Trip.objects.filter(id=trip_id).first()
+            if trip is not None:
+                trip.calculate_statistics()
+
+    logger.info(f"Updated {len(changed)} of {len(stops)} legs for trip {trip_id}")
+    return len(changed)
+
+
+def _enqueue(trip_id):
+    from .tasks import compute_trip_legs
+
+    # One queued task per trip; the task clears the marker when it starts
+    delay = settings.TRIP_LEG_COALESCE_SECONDS
+    coalesce = settings.SHARED_CACHE
+    if coalesce and not cache.add(_scheduled_key(trip_id), True, delay + 60):
+        return
+    try:
+        compute_trip_legs.apply_async(args=[trip_id], countdown=delay)
+    except Exception as exc:
+        if coalesce:
+            cache.delete(_scheduled_key(trip_id))
+        logger.error(f"Could not queue leg computation for trip {trip_id}: {exc}")
+
+
+def schedule_leg_update(trip_id):
+    """Queue ``compute_trip_legs`` for a trip once the current transaction commits."""
+    transaction.on_commit(lambda: _enqueue(trip_id))
+
+
+def clear_scheduled(trip_id):
+    cache.delete(_scheduled_key(trip_id))
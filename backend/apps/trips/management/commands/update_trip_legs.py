@@ -0,0 +1,36 @@
+"""
+Management command: update_trip_legs
+Computes the travel time and distance between consecutive stops, and the
+stop arrival and departure times, for trips whose legs or times are missing
+or out of date, without going through Celery.
+
+Usage:
+    python manage.py update_trip_legs            # every trip
+    python manage.py update_trip_legs 12 15      # selected trips
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.trips.legs import update_trip_legs
+from apps.trips.models import Trip
+from apps.trips.schedule import update_trip_schedule
+
+
+class Command(BaseCommand):
+    help = "Compute stale travel legs and stop times for trips."
+
+    def add_arguments(self, parser):
+        parser.add_argument("trip_ids", nargs="*", type=int, help="Trips to update.")
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.order_by("id")
+        if options["trip_ids"]:
+            trips = trips.filter(id__in=options["trip_ids"])
+
+        legs = times = 0
+        for trip_id in trips.values_list("id", flat=True).iterator():
+            legs += update_trip_legs(trip_id)
+            times += update_trip_schedule(trip_id)
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {legs} leg(s) and {times} stop time(s)")
+        )
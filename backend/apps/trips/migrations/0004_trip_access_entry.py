@@ -0,0 +1,90 @@
+# Generated by Django 6.0 on 2026-10-19 08:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_access_entries(apps, schema_editor):
+    """Index the owner and every active share of the existing trips."""
+    Trip = apps.get_model("trips", "Trip")
+    TripShare = apps.get_model("trips", "TripShare")
+    TripAccessEntry = apps.get_model("trips", "TripAccessEntry")
+
+    owners = dict(Trip.objects.values_list("id", "user_id"))
+    entries = [
+        TripAccessEntry(user_id=user_id, trip_id=trip_id, permission_level="owner")
+        for trip_id, user_id in owners.items()
+    ]
+    shares = TripShare.objects.filter(is_active=True).values_list(
+        "trip_id", "shared_with_id", "permission_level"
+    )
+    entries.extend(
+        TripAccessEntry(user_id=user_id, trip_id=trip_id, permission_level=level)
+        for trip_id, user_id, level in shares
+        if owners.get(trip_id) != user_id
+    )
+    TripAccessEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0003_fix_start_date_type"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripAccessEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "permission_level",
+                    models.CharField(
+                        choices=[
+                            ("owner", "Owner"),
+                            ("view", "View Only"),
+                            ("edit", "Can Edit"),
+                            ("admin", "Admin Access"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "trip",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="access_entries",
+                        to="trips.trip",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trip_access_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "permission_level"],
+                        name="trips_tripa_user_id_7001f1_idx",
+                    )
+                ],
+                "unique_together": {("user", "trip")},
+            },
+        ),
+        migrations.RunPython(backfill_access_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0004_trip_access_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stop",
+            name="travel_leg_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Positions the travel fields were computed for",
+                max_length=100,
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+def build_route_levels(apps, schema_editor):
+    """Simplify the stored routes of existing trips and fill in their bounds."""
+    from apps.routes.geometry import build_levels, checksum
+
+    Trip = apps.get_model("trips", "Trip")
+    trips = Trip.objects.exclude(route_geometry="").only("id", "route_geometry")
+    for trip in trips.iterator():
+        fields = {"route_geometry_levels": {"checksum": checksum(trip.route_geometry)}}
+        try:
+            levels, bounds = build_levels(trip.route_geometry)
+        except ValueError:
+            levels = {}
+        else:
+            fields["route_bounds"] = bounds
+        fields["route_geometry_levels"]["levels"] = levels
+        Trip.objects.filter(id=trip.id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0005_stop_travel_leg_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trip",
+            name="route_geometry_levels",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Simplified copies of route_geometry by map zoom",
+            ),
+        ),
+        migrations.RunPython(build_route_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 6.0 on 2026-10-19 16:10
+
+import datetime
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0006_trip_route_geometry_levels"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trip",
+            name="start_time",
+            field=models.TimeField(
+                default=datetime.time(9, 0),
+                help_text="When the trip leaves its first stop",
+            ),
+        ),
+        migrations.AddField(
+            model_name="trip",
+            name="daily_driving_hours",
+            field=models.FloatField(
+                blank=True,
+                help_text="Break overnight before a day's driving exceeds this; "
+                "blank for none",
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(1.0),
+                    django.core.validators.MaxValueValidator(24.0),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="stop",
+            name="arrival_day",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Day of the trip the stop is reached, 0 for the first",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stop",
+            name="departure_day",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Day of the trip the stop is left, 0 for the first",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stop",
+            name="is_overnight",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="Whether the trip breaks overnight at this stop",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stop",
+            name="schedule_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Inputs the stop times were computed for",
+                max_length=100,
+            ),
+        ),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+import logging
+from datetime import time
+
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from apps.routes.geometry import build_levels, checksum, level_for_zoom
+
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 
@@ -30,6 +37,15 @@ class Trip(models.Model):
     # Trip dates
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(
+        default=time(9, 0), help_text="When the trip leaves its first stop"
+    )
+    daily_driving_hours = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1.0), MaxValueValidator(24.0)],
+        help_text="Break overnight before a day's driving exceeds this; blank for none",
+    )
 
     # Sharing and visibility
     is_public = models.BooleanField(
@@ -65,6 +81,12 @@ class Trip(models.Model):
     route_bounds = models.JSONField(
         null=True, blank=True, help_text="Route bounding box for map fitting"
     )
+    route_geometry_levels = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Simplified copies of route_geometry by map zoom",
+    )
 
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -80,6 +102,54 @@ class Trip(models.Model):
     def __str__(self):
         return f"{self.name} by {self.user.full_name}"
 
+    # Zoom of the simplified route shipped in trip detail responses
+    DETAIL_ZOOM = 10
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        # Read by the tile signals, which only redraw for a changed route
+        self._route_changed = False
+        if update_fields is None or "route_geometry" in update_fields:
+            self._route_changed = self.refresh_route_levels()
+            if self._route_changed and update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    "route_geometry_levels",
+                    "route_bounds",
+                }
+        super().save(*args, **kwargs)
+
+    def refresh_route_levels(self):
+        """
+        Rebuild the simplified route levels and bounds if the route changed.
+
+        Returns:
+            bool: Whether anything was recomputed
+        """
+        source = checksum(self.route_geometry)
+        if (self.route_geometry_levels or {}).get("checksum") == source:
+            return False
+
+        # A cleared or unreadable route keeps neither levels nor bounds
+        levels, bounds = {}, None
+        if self.route_geometry:
+            try:
+                levels, bounds = build_levels(self.route_geometry)
+            except ValueError as exc:
+                logger.warning(f"Trip {self.pk} has an unreadable route: {exc}")
+        self.route_geometry_levels = {"checksum": source, "levels": levels}
+        self.route_bounds = bounds
+        return True
+
+    def route_geometry_for_zoom(self, zoom=None):
+        """Return ``(level zoom, encoded polyline)`` to draw at ``zoom``."""
+        levels = (self.route_geometry_levels or {}).get("levels", {})
+        return level_for_zoom(levels, self.route_geometry, zoom)
+
+    @property
+    def overview_geometry(self):
+        return self.route_geometry_for_zoom(self.DETAIL_ZOOM)[1]
+
     @property
     def duration_days(self):
         """Calculate trip duration in days."""
@@ -155,12 +225,35 @@ class Stop(models.Model):
     stop_type = models.CharField(max_length=20, choices=STOP_TYPES, default="waypoint")
     order = models.PositiveIntegerField(help_text="Order of this stop in the trip")
 
-    # Timing information
+    # Timing information (arrival and departure are calculated; see schedule.py)
     arrival_time = models.TimeField(null=True, blank=True)
+    arrival_day = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Day of the trip the stop is reached, 0 for the first",
+    )
     departure_time = models.TimeField(null=True, blank=True)
+    departure_day = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Day of the trip the stop is left, 0 for the first",
+    )
     duration_minutes = models.PositiveIntegerField(
         null=True, blank=True, help_text="How long to spend at this stop"
     )
+    is_overnight = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Whether the trip breaks overnight at this stop",
+    )
+    schedule_key = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        help_text="Inputs the stop times were computed for",
+    )
 
     # Travel information to next stop (calculated)
     travel_time_to_next = models.FloatField(
@@ -169,6 +262,12 @@ class Stop(models.Model):
     travel_distance_to_next = models.FloatField(
         null=True, blank=True, help_text="Travel distance to next stop in miles"
     )
+    travel_leg_key = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        help_text="Positions the travel fields were computed for",
+    )
 
     # Additional information
     notes = models.TextField(blank=True)
@@ -235,3 +334,61 @@ class TripShare(models.Model):
 
     def __str__(self):
         return f"{self.trip.name} shared with {self.shared_with.full_name}"
+
+
+class TripAccessEntry(models.Model):
+    """
+    Denormalized index of which users can access which trips.
+
+    One row per (user, trip) for the owner and every active share, kept in
+    sync by the signals in ``signals.py`` so listing a user's accessible
+    trips is a single indexed lookup instead of an owner/share OR + DISTINCT.
+    """
+
+    ACCESS_LEVELS = [("owner", "Owner")] + TripShare.PERMISSION_LEVELS
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="trip_access_entries"
+    )
+    trip = models.ForeignKey(
+        Trip, on_delete=models.CASCADE, related_name="access_entries"
+    )
+    permission_level = models.CharField(max_length=10, choices=ACCESS_LEVELS)
+
+    class Meta:
+        unique_together = ["user", "trip"]
+        indexes = [
+            models.Index(fields=["user", "permission_level"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.trip_id} ({self.permission_level})"
+
+    @classmethod
+    def rebuild_for_trip(cls, trip_id):
+        """Rewrite the index rows for one trip from its owner and active shares."""
+        with transaction.atomic():
+            # Lock the trip so concurrent rebuilds cannot both insert the rows
+            owner_id = (
+                Trip.objects.select_for_update()
+                .filter(id=trip_id)
+                .values_list("user_id", flat=True)
+                .first()
+            )
+            cls.objects.filter(trip_id=trip_id).delete()
+            if owner_id is None:
+                return
+
+            entries = [
+                cls(user_id=owner_id, trip_id=trip_id, permission_level="owner")
+            ]
+            shares = (
+                TripShare.objects.filter(trip_id=trip_id, is_active=True)
+                .exclude(shared_with_id=owner_id)
+                .values_list("shared_with_id", "permission_level")
+            )
+            entries.extend(
+                cls(user_id=user_id, trip_id=trip_id, permission_level=level)
+                for user_id, level in shares
+            )
+            cls.objects.bulk_create(entries)
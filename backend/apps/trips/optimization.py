@@ -0,0 +1,297 @@
+"""
+Stop order optimisation for trips.
+
+The trip's start stop stays first and its destination stays last (by
+``stop_type``); the stops in between are reordered to minimise the total
+driving time between consecutive stops. Durations come from the road graph
+when one is configured, the same source as the trip's legs and schedule, and
+otherwise from straight-line estimates. Up to ``EXACT_LIMIT`` free stops are
+solved exactly with Held-Karp dynamic programming; larger trips start from
+a nearest-neighbour tour and improve it with 2-opt and Or-opt moves until
+no move helps or the time budget runs out.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from apps.routes.engine import RoutingError
+from apps.routes.matrix import Matrix, estimate_matrix, road_matrix
+
+from .legs import routing_mode
+
+logger = logging.getLogger(__name__)
+
+# Free stops solved exactly; Held-Karp does O(2^n * n^2) work
+EXACT_LIMIT = 12
+
+DEFAULT_TIME_BUDGET = 0.5  # seconds
+
+# Longest run of consecutive stops an Or-opt move relocates
+OR_OPT_SEGMENT = 3
+
+METRES_PER_MILE = 1609.344
+
+
+@dataclass
+class OptimizationResult:
+    """Proposed stop order for a trip and what it saves."""
+
+    stop_ids: list  # in the proposed order
+    original_distance: float  # miles
+    optimized_distance: float  # miles
+    original_duration: float  # hours
+    optimized_duration: float  # hours
+    method: str  # "exact", "local_search" or "unchanged"
+    complete: bool  # False if the time budget cut the search short
+    mode: str  # "road" or "estimate"
+
+    @property
+    def distance_saved(self):
+        return max(self.original_distance - self.optimized_distance, 0.0)
+
+    @property
+    def time_saved(self):
+        return max(self.original_duration - self.optimized_duration, 0.0)
+
+
+def path_cost(path, matrix):
+    return float(sum(matrix[a][b] for a, b in zip(path, path[1:])))
+
+
+def _held_karp(matrix, start, free, end):
+    """Exact cheapest path from ``start`` through all of ``free`` (then ``end``)."""
+    n = len(free)
+    full = (1 << n) - 1
+    # cost[mask][i]: cheapest path from start visiting ``mask`` and ending at free[i]
+    cost = [[float("inf")] * n for _ in range(1 << n)]
+    parent = [[-1] * n for _ in range(1 << n)]
+    for i, node in enumerate(free):
+        cost[1 << i][i] = matrix[start][node]
+
+    for mask in range(1, full + 1):
+        row = cost[mask]
+        for i in range(n):
+            if not mask & (1 << i) or row[i] == float("inf"):
+                continue
+            for j in range(n):
+                if mask & (1 << j):
+                    continue
+                nxt = mask | (1 << j)
+                candidate = row[i] + matrix[free[i]][free[j]]
+                if candidate < cost[nxt][j]:
+                    cost[nxt][j] = candidate
+                    parent[nxt][j] = i
+
+    closing = [matrix[free[i]][end] if end is not None else 0.0 for i in range(n)]
+    last = min(range(n), key=lambda i: cost[full][i] + closing[i])
+
+    order = []
+    mask = full
+    while last != -1:
+        order.append(free[last])
+        mask, last = mask & ~(1 << last), parent[mask][last]
+    return order[::-1]
+
+
+def _nearest_neighbour(matrix, start, free):
+    remaining = set(free)
+    order = []
+    current = start
+    while remaining:
+        current = min(remaining, key=lambda node: matrix[current][node])
+        remaining.remove(current)
+        order.append(current)
+    return order
+
+
+def _two_opt(path, matrix, last, deadline):
+    """Reverse segments of ``path[1:last + 1]`` while that shortens it."""
+    improved = False
+    size = len(path)
+    for i in range(1, last):
+        for j in range(i + 1, last + 1):
+            before = matrix[path[i - 1]][path[i]]
+            after = matrix[path[i - 1]][path[j]]
+            if j + 1 < size:
+                before += matrix[path[j]][path[j + 1]]
+                after += matrix[path[i]][path[j + 1]]
+            if after < before - 1e-9:
+                path[i:j + 1] = path[i:j + 1][::-1]
+                improved = True
+        if time.perf_counter() > deadline:
+            break
+    return improved
+
+
+def _or_opt(path, matrix, last, deadline):
+    """Move runs of up to ``OR_OPT_SEGMENT`` stops elsewhere while that helps."""
+    improved = False
+    size = len(path)
+    for length in range(1, OR_OPT_SEGMENT + 1):
+        i = 1
+        while i + length - 1 <= last:
+            j = i + length - 1
+            prev, first, tail = path[i - 1], path[i], path[j]
+            nxt = path[j + 1] if j + 1 < size else None
+            # Saving from cutting the run out and joining its neighbours
+            removed = matrix[prev][first] - (
+                matrix[prev][nxt] - matrix[tail][nxt] if nxt is not None else 0.0
+            )
+
+            # Try reinserting it after every other movable position (or the start)
+            best_delta, best_at = -1e-9, None
+            for k in range(last + 1):
+                if i - 1 <= k <= j:
+                    continue
+                a = path[k]
+                b = path[k + 1] if k + 1 < size else None
+                added = matrix[a][first] + (
+                    matrix[tail][b] - matrix[a][b] if b is not None else 0.0
+                )
+                delta = added - removed
+                if delta < best_delta:
+                    best_delta, best_at = delta, k
+
+            if best_at is not None:
+                run = path[i:j + 1]
+                del path[i:j + 1]
+                at = best_at if best_at < i else best_at - length
+                path[at + 1:at + 1] = run
+                improved = True
+            else:
+                i += 1
+            if time.perf_counter() > deadline:
+                return improved
+    return improved
+
+
+def _local_search(matrix, start, free, end, deadline):
+    path = [start] + _nearest_neighbour(matrix, start, free)
+    if end is not None:
+        path.append(end)
+    last = len(path) - 2 if end is not None else len(path) - 1
+
+    complete = True
+    while True:
+        if time.perf_counter() > deadline:
+            complete = False
+            break
+        improved = _two_opt(path, matrix, last, deadline)
+        improved = _or_opt(path, matrix, last, deadline) or improved
+        if not improved:
+            break
+    return path[1:last + 1], complete
+
+
+def optimize_order(matrix, start, free, end=None, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Order ``free`` nodes between a fixed ``start`` and optional ``end``.
+
+    Args:
+        matrix (array): ``n x n`` cost matrix indexed by node; local search
+            uses its symmetric part
+        start (int): Node the path begins at
+        free (list): Nodes to visit in any order
+        end (int): Node the path must finish at, or None for an open end
+        time_budget (float): Seconds allowed for local search
+
+    Returns:
+        tuple: ``(ordered free nodes, method, complete)``
+    """
+    if len(free) < 2:
+        return list(free), "unchanged", True
+
+    if len(free) <= EXACT_LIMIT:
+        # Nested lists index several times faster than a numpy array here
+        return _held_karp(np.asarray(matrix).tolist(), start, free, end), "exact", True
+
+    # 2-opt reverses runs of stops, which only keeps their cost on a
+    # symmetric matrix; one-way roads make durations slightly asymmetric
+    matrix = np.asarray(matrix, dtype=np.float64)
+    matrix = ((matrix + matrix.T) / 2).tolist()
+    deadline = time.perf_counter() + time_budget
+    order, complete = _local_search(matrix, start, free, end, deadline)
+    return order, "local_search", complete
+
+
+def stop_matrix(points):
+    """
+    Distances and driving times between stops.
+
+    Road values are used when a routing graph is configured. Pairs the graph
+    cannot route fall back to straight-line estimates, like the trip's legs
+    do, and so does every pair if the graph cannot be loaded.
+
+    Args:
+        points (list): ``(lat, lon)`` of each stop
+
+    Returns:
+        tuple: ``(Matrix, mode)`` with ``mode`` ``"road"`` or ``"estimate"``
+    """
+    estimate = estimate_matrix(points)
+    if routing_mode() != "road":
+        return estimate, "estimate"
+    try:
+        road = road_matrix(points)
+    except RoutingError as exc:
+        logger.warning(f"Optimizing stops on estimates: {exc}")
+        return estimate, "estimate"
+
+    unroutable = np.isnan(road.duration) | np.isnan(road.distance)
+    matrix = Matrix(
+        distance=np.where(unroutable, estimate.distance, road.distance),
+        duration=np.where(unroutable, estimate.duration, road.duration),
+    )
+    return matrix, "road"
+
+
+def optimize_stops(stops, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Propose a quicker visiting order for a trip's stops.
+
+    The first ``start`` stop is kept first (or the current first stop when
+    none is marked) and the last ``destination`` stop is kept last; with no
+    destination the trip may end at any stop.
+
+    Args:
+        stops (list): The trip's stops in their current order
+        time_budget (float): Seconds allowed for local search
+
+    Returns:
+        OptimizationResult: Proposed order, distances and durations
+    """
+    stops = list(stops)
+    matrix, mode = stop_matrix([(stop.latitude, stop.longitude) for stop in stops])
+    costs = matrix.duration
+    indices = list(range(len(stops)))
+    original = path_cost(indices, costs)
+    if len(stops) < 3:
+        path, method, complete = indices, "unchanged", True
+    else:
+        starts = [i for i in indices if stops[i].stop_type == "start"]
+        ends = [i for i in indices if stops[i].stop_type == "destination"]
+        start = starts[0] if starts else 0
+        end = ends[-1] if ends and ends[-1] != start else None
+        free = [i for i in indices if i not in (start, end)]
+
+        order, method, complete = optimize_order(costs, start, free, end, time_budget)
+        path = [start] + order + ([end] if end is not None else [])
+
+    optimized = path_cost(path, costs)
+    # Never propose an order that is no quicker than the current one
+    if optimized >= original - 1e-9:
+        path, method, optimized = indices, "unchanged", original
+
+    return OptimizationResult(
+        stop_ids=[stops[i].id for i in path],
+        original_distance=path_cost(indices, matrix.distance) / METRES_PER_MILE,
+        optimized_distance=path_cost(path, matrix.distance) / METRES_PER_MILE,
+        original_duration=original / 3600,
+        optimized_duration=optimized / 3600,
+        method=method,
+        complete=complete,
+        mode=mode,
+    )
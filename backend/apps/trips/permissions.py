@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from .models import Trip, TripShare
+from .access import get_trip_access
 
 
 class TripPermission(permissions.BasePermission):
@@ -7,32 +7,7 @@ class TripPermission(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         """Check if user has permission to access this trip."""
-        user = request.user
-
-        # Trip owner has full access
-        if obj.user == user:
-            return True
-
-        # Check if trip is shared with user
-        try:
-            share = TripShare.objects.get(trip=obj, shared_with=user, is_active=True)
-
-            # Read permissions for all shared users
-            if request.method in permissions.SAFE_METHODS:
-                return True
-
-            # Write permissions only for edit/admin users
-            if share.permission_level in ["edit", "admin"]:
-                return True
-
-            return False
-
-        except TripShare.DoesNotExist:
-            # Check if trip is public (read-only access)
-            if obj.is_public and request.method in permissions.SAFE_METHODS:
-                return True
-
-            return False
+        return get_trip_access(request, obj.id).allows(request.method)
 
 
 class StopPermission(permissions.BasePermission):
@@ -44,39 +19,8 @@ class StopPermission(permissions.BasePermission):
         if not trip_id:
             return False
 
-        try:
-            trip = Trip.objects.get(id=trip_id)
-            user = request.user
-
-            # Trip owner has full access
-            if trip.user == user:
-                return True
-
-            # Check if trip is shared with user
-            try:
-                share = TripShare.objects.get(
-                    trip=trip, shared_with=user, is_active=True
-                )
-
-                # Read permissions for all shared users
-                if request.method in permissions.SAFE_METHODS:
-                    return True
-
-                # Write permissions only for edit/admin users
-                if share.permission_level in ["edit", "admin"]:
-                    return True
-
-                return False
-
-            except TripShare.DoesNotExist:
-                # Check if trip is public (read-only access)
-                if trip.is_public and request.method in permissions.SAFE_METHODS:
-                    return True
-
-                return False
-
-        except Trip.DoesNotExist:
-            return False
+        access = get_trip_access(request, trip_id)
+        return access.exists and access.allows(request.method)
 
     def has_object_permission(self, request, view, obj):
         """Check if user has permission to access this specific stop."""
@@ -92,12 +36,8 @@ class TripSharePermission(permissions.BasePermission):
         if not trip_id:
             return False
 
-        try:
-            trip = Trip.objects.get(id=trip_id)
-            return trip.user == request.user
-        except Trip.DoesNotExist:
-            return False
+        return get_trip_access(request, trip_id).is_owner
 
     def has_object_permission(self, request, view, obj):
         """Only trip owners can manage shares."""
-        return obj.trip.user == request.user
+        return get_trip_access(request, obj.trip_id).is_owner
@@ -0,0 +1,173 @@
+"""
+Rendered-response cache for trip reads.
+
+Trip detail bodies and public-list items are stored as pre-encoded JSON
+bytes keyed by trip id, the trip's ``updated_at`` and a per-trip version
+token. Every trip or stop write moves ``updated_at``, in whichever process
+it runs, so a changed trip always misses. The signals in ``signals.py`` also
+replace the token on writes that leave ``updated_at`` alone, such as shares
+and owner renames. Stale bodies are never addressed again and simply expire.
+A hit skips both the stop queries and serialization.
+
+The token lives in the cache, so this is only safe when every process shares
+it; ``TRIP_RESPONSE_CACHE_TIMEOUT`` defaults to 0 otherwise.
+
+Hits and misses are counted with ``services.cache_stats``; see
+``get_response_cache_stats``.
+"""
+
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from services.cache_stats import HitCounter
+
+from .fast_serializers import dumps
+
+logger = logging.getLogger(__name__)
+
+hit_counter = HitCounter("trip_response_cache")
+
+
+def _version_key(trip_id):
+    return f"trip_version:{trip_id}"
+
+
+def is_enabled():
+    return bool(settings.TRIP_RESPONSE_CACHE_TIMEOUT)
+
+
+def is_compact_json(request):
+    """Whether the response will be rendered as plain compact JSON."""
+    renderer = getattr(request, "accepted_renderer", None)
+    media_type = getattr(request, "accepted_media_type", "") or ""
+    return (
+        renderer is not None
+        and renderer.format == "json"
+        and "indent" not in media_type
+    )
+
+
+def can_serve_cached(request):
+    """Only plain compact JSON responses are served from the cache."""
+    return is_enabled() and is_compact_json(request)
+
+
+def render_json(data):
+    """Encode ``data`` exactly as DRF's JSONRenderer would send it."""
+    return dumps(data)
+
+
+class RenderedJSONResponse(Response):
+    """
+    DRF response whose JSON body was encoded ahead of time.
+
+    Rendering returns the stored bytes as-is; ``data`` is decoded lazily so
+    code that inspects it (tests, middleware) keeps working.
+    """
+
+    def __init__(self, body, status=None, headers=None):
+        self.body = body
+        super().__init__(status=status, headers=headers)
+
+    @property
+    def data(self):
+        return json.loads(self.body)
+
+    @data.setter
+    def data(self, value):
+        # Response.__init__ assigns data; the body is the source of truth
+        pass
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.accepted_renderer.media_type
+        return self.body
+
+
+def get_trip_versions(trip_ids):
+    """Return ``{trip_id: version}``, minting tokens for unversioned trips."""
+    keys = {_version_key(trip_id): trip_id for trip_id in trip_ids}
+    found = cache.get_many(keys.keys())
+    versions = {keys[key]: version for key, version in found.items()}
+
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    for key, version in missing.items():
+        # add() so a concurrent writer's token wins over ours
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+        versions[keys[key]] = version
+
+    return versions
+
+
+def _set_new_versions(trip_ids):
+    cache.set_many(
+        {_version_key(trip_id): uuid.uuid4().hex for trip_id in trip_ids}, None
+    )
+
+
+def bump_trip_versions(trip_ids):
+    """Give each trip a fresh version token so cached bodies are bypassed."""
+    if not is_enabled() or not trip_ids:
+        return
+
+    # Bump now for reads inside this transaction, and again on commit so a
+    # concurrent reader cannot cache pre-commit data under the new token
+    trip_ids = list(trip_ids)
+    _set_new_versions(trip_ids)
+    transaction.on_commit(lambda: _set_new_versions(trip_ids))
+
+
+def get_or_render(namespace, trips, render):
+    """
+    Fetch pre-encoded bodies for ``trips``, rendering only the misses.
+
+    Args:
+        namespace (str): Representation name, e.g. ``"detail"``
+        trips (dict): ``{trip_id: updated_at}`` in the order the bodies are
+            wanted
+        render (callable): ``render(missing_ids) -> {trip_id: data}``
+
+    Returns:
+        tuple: ``(bodies, hits)`` with bodies in ``trips`` order
+    """
+    trip_ids = list(trips)
+    versions = get_trip_versions(trip_ids)
+    keys = {
+        trip_id: (
+            f"trip_response:{namespace}:{trip_id}:"
+            f"{updated_at:%Y%m%d%H%M%S%f}:{versions[trip_id]}"
+        )
+        for trip_id, updated_at in trips.items()
+    }
+    found = cache.get_many(keys.values())
+    bodies = {trip_id: found[key] for trip_id, key in keys.items() if key in found}
+
+    missing = [trip_id for trip_id in trip_ids if trip_id not in bodies]
+    if missing:
+        rendered = {
+            trip_id: render_json(data) for trip_id, data in render(missing).items()
+        }
+        cache.set_many(
+            {keys[trip_id]: body for trip_id, body in rendered.items()},
+            settings.TRIP_RESPONSE_CACHE_TIMEOUT,
+        )
+        bodies.update(rendered)
+
+    hits = len(trip_ids) - len(missing)
+    hit_counter.record(hits, len(missing))
+    logger.debug(
+        f"Trip response cache ({namespace}): {hits} hit(s), {len(missing)} miss(es)"
+    )
+    return [bodies[trip_id] for trip_id in trip_ids if trip_id in bodies], hits
+
+
+def get_response_cache_stats():
+    """Return hit/miss counters and the hit rate across all workers."""
+    return hit_counter.stats()
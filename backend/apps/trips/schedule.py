@@ -0,0 +1,200 @@
+"""
+Arrival and departure times for a trip's stops.
+
+A trip leaves its first stop at ``Trip.start_time`` on day 0. Each later stop
+is reached after the previous stop's leg (``travel_time_to_next``). It is left
+again after its dwell time (``duration_minutes``). With
+``Trip.daily_driving_hours`` set, a stop becomes an overnight break when its
+next leg would push the day's driving past the limit. The trip then leaves
+that stop at ``start_time`` the next morning. Each stop stores a time of day
+and a day of the trip for both arrival and departure.
+
+Every stop records ``schedule_key``: its own dwell time and outgoing leg, plus
+the trip's start settings for the first stop. Times only depend on earlier
+stops, so ``update_trip_schedule`` keeps the stored times of every stop before
+the first stale key. It picks up from the stored departure of the stop before
+that one and propagates forward in a single pass. Changing the dwell time at
+stop 40 of 50 recomputes ten stops. The rows that changed are written with one
+``bulk_update``.
+"""
+
+import logging
+from datetime import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Stop, Trip
+from .response_cache import bump_trip_versions
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+SCHEDULE_FIELDS = [
+    "arrival_time",
+    "arrival_day",
+    "departure_time",
+    "departure_day",
+    "is_overnight",
+    "schedule_key",
+]
+
+
+def _minutes(value):
+    """Minutes since midnight for a time of day."""
+    return value.hour * 60 + value.minute
+
+
+def _clock(minutes):
+    """Split minutes since the trip's first midnight into ``(day, time)``."""
+    if minutes is None:
+        return None, None
+    day, minute = divmod(minutes, MINUTES_PER_DAY)
+    return day, time(minute // 60, minute % 60)
+
+
+def _leg_minutes(stop):
+    if stop.travel_time_to_next is None:
+        return None
+    return round(stop.travel_time_to_next * 60)
+
+
+def schedule_key(trip, stop, first):
+    """Describe what a stop's times depend on, besides the stops before it."""
+    key = f"{stop.duration_minutes}:{_leg_minutes(stop)}"
+    if first:
+        return f"start:{trip.start_time:%H:%M}:{trip.daily_driving_hours}:{key}"
+    return key
+
+
+def first_stale_stop(trip, stops):
+    """Index of the first stop whose schedule key is out of date, or None."""
+    for index, stop in enumerate(stops):
+        if stop.schedule_key != schedule_key(trip, stop, index == 0):
+            return index
+    return None
+
+
+def _resume(stops, start):
+    """Arrival at ``stops[start]`` and that day's driving, from stored times."""
+    if start == 0:
+        return None, 0
+    previous = stops[start - 1]
+    leg = _leg_minutes(previous)
+    if previous.departure_day is None or leg is None:
+        return None, 0
+
+    # Driving since the last overnight break, whose own leg starts the day
+    driven = 0
+    for stop in reversed(stops[:start]):
+        driven += _leg_minutes(stop) or 0
+        if stop.is_overnight:
+            break
+    departure = previous.departure_day * MINUTES_PER_DAY + _minutes(
+        previous.departure_time
+    )
+    return departure + leg, driven
+
+
+def propagate_schedule(trip, stops, start=0):
+    """
+    Recompute the times of ``stops[start:]`` in one pass.
+
+    Stops before ``start`` keep their stored times; the pass continues from
+    the stored departure of the stop before ``start``.
+
+    Args:
+        trip (Trip): Trip the stops belong to
+        stops (list): All of the trip's stops, in order
+        start (int): Index of the first stop to recompute
+
+    Returns:
+        list: Recomputed stops whose stored fields changed
+    """
+    start_minutes = _minutes(trip.start_time)
+    limit = trip.daily_driving_hours
+    limit = None if limit is None else round(limit * 60)
+    arrival, driven = _resume(stops, start)
+
+    changed = []
+    for index in range(start, len(stops)):
+        stop = stops[index]
+        leg = _leg_minutes(stop)
+        if index == 0:
+            ready = start_minutes
+        elif arrival is not None:
+            ready = arrival + (stop.duration_minutes or 0)
+        else:
+            # An earlier leg has not been computed yet
+            ready = None
+
+        departure = ready
+        overnight = bool(
+            ready is not None
+            and limit
+            and leg is not None
+            and driven
+            and driven + leg > limit
+        )
+        if overnight:
+            # Leave at the next start time after the stop's dwell time
+            departure = ready - ready % MINUTES_PER_DAY + start_minutes
+            if departure <= ready:
+                departure += MINUTES_PER_DAY
+            driven = 0
+        elif leg is None and index and not stop.duration_minutes:
+            # Nothing to leave for after the final stop
+            departure = None
+
+        before = [getattr(stop, field) for field in SCHEDULE_FIELDS]
+        stop.arrival_day, stop.arrival_time = _clock(arrival if index else None)
+        stop.departure_day, stop.departure_time = _clock(departure)
+        stop.is_overnight = overnight
+        stop.schedule_key = schedule_key(trip, stop, index == 0)
+        if [getattr(stop, field) for field in SCHEDULE_FIELDS] != before:
+            changed.append(stop)
+
+        if departure is None or leg is None:
+            arrival = None
+        else:
+            arrival = departure + leg
+        driven += leg or 0
+
+    return changed
+
+
+def update_trip_schedule(trip_id):
+    """
+    Bring the stored stop times of a trip up to date.
+
+    Args:
+        trip_id (int): Trip to update
+
+    Returns:
+        int: Number of stops whose times were written
+    """
+    with transaction.atomic():
+        trip = Trip.objects.filter(id=trip_id).first()
+        if trip is None:
+            return 0
+        stops = list(
+            Stop.objects.select_for_update().filter(trip_id=trip_id).order_by("order")
+        )
+        start = first_stale_stop(trip, stops)
+        if start is None:
+            return 0
+
+        changed = propagate_schedule(trip, stops, start)
+        if changed:
+            Stop.objects.bulk_update(changed, SCHEDULE_FIELDS)
+            # Bulk writes send no signals, so move the ETag and retire cached
+            # responses here
+            Trip.objects.filter(id=trip_id).update(updated_at=timezone.now())
+            bump_trip_versions([trip_id])
+
+    logger.info(
+        f"Rescheduled {len(changed)} of {len(stops)} stops from stop {start + 1} "
+        f"for trip {trip_id}"
+    )
+    return len(changed)
@@ -1,10 +1,21 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from apps.routes.geometry import decode_polyline
 from .models import Trip, Stop, TripShare
 
 User = get_user_model()
 
 
+def validate_polyline(value):
+    """Reject route geometry that is not a readable encoded polyline."""
+    if value:
+        try:
+            decode_polyline(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(f"Invalid encoded polyline: {exc}")
+    return value
+
+
 class StopSerializer(serializers.ModelSerializer):
     """Serializer for Stop model."""
 
@@ -23,8 +34,11 @@ class StopSerializer(serializers.ModelSerializer):
             "stop_type",
             "order",
             "arrival_time",
+            "arrival_day",
             "departure_time",
+            "departure_day",
             "duration_minutes",
+            "is_overnight",
             "travel_time_to_next",
             "travel_distance_to_next",
             "notes",
@@ -34,6 +48,8 @@ class StopSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "id",
+            "arrival_time",
+            "departure_time",
             "travel_time_to_next",
             "travel_distance_to_next",
             "created_at",
@@ -68,6 +84,8 @@ class StopCreateSerializer(StopSerializer):
         fields = StopSerializer.Meta.fields
         read_only_fields = [
             "id",
+            "arrival_time",
+            "departure_time",
             "travel_time_to_next",
             "travel_distance_to_next",
             "created_at",
@@ -96,6 +114,8 @@ class TripListSerializer(serializers.ModelSerializer):
             "estimated_fuel_cost",
             "start_date",
             "end_date",
+            "start_time",
+            "daily_driving_hours",
             "duration_days",
             "stops",
             "stops_count",
@@ -117,6 +137,8 @@ class TripDetailSerializer(serializers.ModelSerializer):
     stops = StopSerializer(many=True, read_only=True)
     stops_count = serializers.ReadOnlyField()
     duration_days = serializers.ReadOnlyField()
+    # Simplified for map overviews; the geometry endpoint serves other zooms
+    route_geometry = serializers.CharField(source="overview_geometry", read_only=True)
 
     class Meta:
         model = Trip
@@ -132,6 +154,8 @@ class TripDetailSerializer(serializers.ModelSerializer):
             "estimated_fuel_cost",
             "start_date",
             "end_date",
+            "start_time",
+            "daily_driving_hours",
             "duration_days",
             "stops",
             "stops_count",
@@ -162,6 +186,8 @@ class TripCreateSerializer(serializers.ModelSerializer):
             "route_type",
             "start_date",
             "end_date",
+            "start_time",
+            "daily_driving_hours",
             "is_public",
             "fuel_efficiency",
             "fuel_price_per_gallon",
@@ -176,6 +202,9 @@ class TripCreateSerializer(serializers.ModelSerializer):
             "stops",
         ]
 
+    def validate_route_geometry(self, value):
+        return validate_polyline(value)
+
     def create(self, validated_data):
         """Create trip with current user as owner and nested stops."""
         from django.db import transaction
@@ -209,6 +238,8 @@ class TripUpdateSerializer(serializers.ModelSerializer):
             "route_type",
             "start_date",
             "end_date",
+            "start_time",
+            "daily_driving_hours",
             "is_public",
             "fuel_efficiency",
             "fuel_price_per_gallon",
@@ -219,6 +250,9 @@ class TripUpdateSerializer(serializers.ModelSerializer):
             "route_bounds",
         ]
 
+    def validate_route_geometry(self, value):
+        return validate_polyline(value)
+
 
 class TripShareSerializer(serializers.ModelSerializer):
     """Serializer for trip sharing."""
@@ -296,3 +330,131 @@ class StopReorderSerializer(serializers.Serializer):
             raise serializers.ValidationError("Duplicate orders are not allowed.")
 
         return value
+
+
+class StopBulkCreateSerializer(StopCreateSerializer):
+    """Serializer for stops created through the bulk endpoint."""
+
+    class Meta(StopCreateSerializer.Meta):
+        extra_kwargs = {"order": {"required": False}}
+
+
+class StopBulkSerializer(serializers.Serializer):
+    """Serializer for a batch of stop changes applied in one request."""
+
+    create = StopBulkCreateSerializer(many=True, required=False)
+    update = serializers.ListField(
+        child=serializers.DictField(),
+        required=False,
+        help_text="List of partial stop objects, each with its 'id'",
+    )
+    delete = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        help_text="List of stop ids to delete",
+    )
+    reorder = serializers.ListField(
+        child=serializers.DictField(child=serializers.IntegerField()),
+        required=False,
+        help_text="List of {'id': stop_id, 'order': new_order} objects",
+    )
+
+    def validate_update(self, value):
+        """Validate each partial update against the stop serializer."""
+        validated = []
+        errors = {}
+
+        for index, item in enumerate(value):
+            data = dict(item)
+            stop_id = data.pop("id", None)
+            if not isinstance(stop_id, int):
+                errors[index] = ["Each item must have an integer 'id' field."]
+                continue
+
+            serializer = StopSerializer(data=data, partial=True)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+
+            validated.append({"id": stop_id, **serializer.validated_data})
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        ids = [item["id"] for item in validated]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Duplicate stop ids are not allowed.")
+
+        return validated
+
+    def validate_reorder(self, value):
+        """Validate reorder items the same way as the reorder endpoint."""
+        if not value:
+            return value
+
+        serializer = StopReorderSerializer(data={"stop_orders": value})
+        if not serializer.is_valid():
+            raise serializers.ValidationError(serializer.errors["stop_orders"])
+
+        return serializer.validated_data["stop_orders"]
+
+
+class TripOptimizeSerializer(serializers.Serializer):
+    """Serializer for stop order optimization requests."""
+
+    apply = serializers.BooleanField(
+        default=False, help_text="Save the proposed order instead of only returning it"
+    )
+    time_budget_ms = serializers.IntegerField(
+        default=500,
+        min_value=10,
+        max_value=5000,
+        help_text="Time allowed for the search on large trips, in milliseconds",
+    )
+
+
+class FuelPlanSerializer(serializers.Serializer):
+    """Serializer for fuel stop planning requests."""
+
+    tank_gallons = serializers.FloatField(
+        default=15.0, min_value=1, max_value=300, help_text="Fuel tank size"
+    )
+    range_miles = serializers.FloatField(
+        required=False,
+        min_value=10,
+        max_value=3000,
+        help_text="Miles a full tank covers; defaults to tank size times MPG",
+    )
+    start_fuel = serializers.FloatField(
+        default=1.0,
+        min_value=0,
+        max_value=1,
+        help_text="Share of a full tank at departure",
+    )
+    reserve = serializers.FloatField(
+        default=0.1,
+        min_value=0,
+        max_value=0.5,
+        help_text="Share of the range to keep in the tank",
+    )
+    corridor_miles = serializers.FloatField(
+        default=3.0,
+        min_value=0.1,
+        max_value=25,
+        help_text="Farthest a gas station may be from the route",
+    )
+
+
+class TripGeometrySerializer(serializers.Serializer):
+    """Query parameters for fetching a trip's route geometry."""
+
+    zoom = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=22,
+        help_text="Map zoom to simplify for; omit for the full route",
+    )
+    # Not "format", which DRF reserves for picking a renderer
+    encoding = serializers.ChoiceField(
+        choices=["polyline", "geojson"], default="polyline"
+    )
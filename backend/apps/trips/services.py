@@ -0,0 +1,123 @@
+"""
+Set-based stop mutations shared by the trip views.
+
+Stops are unique per ``(trip, order)``, so any change that shuffles orders
+first parks the moving rows above every order in play and then writes the
+final values in a single ``bulk_update``.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from .legs import TRIGGER_FIELDS, schedule_leg_update
+from .models import Stop
+from .tiles import DRAWN_STOP_FIELDS, bump_tiles_version
+
+
+def _park_and_bulk_update(stops, fields, original_orders, ceiling):
+    """Write ``fields`` for ``stops`` without colliding on ``(trip, order)``.
+
+    Stops whose order changed are first shifted above ``ceiling`` (which must
+    be at least every current and final order) in one UPDATE, so the final
+    ``bulk_update`` never meets a transient duplicate.
+    """
+    if not stops:
+        return
+
+    moved = [stop.id for stop in stops if stop.order != original_orders[stop.id]]
+    if moved:
+        Stop.objects.filter(id__in=moved).update(order=F("order") + ceiling)
+
+    now = timezone.now()
+    for stop in stops:
+        stop.updated_at = now
+
+    Stop.objects.bulk_update(stops, sorted(set(fields) | {"updated_at"}))
+
+
+def apply_stop_diff(trip, create=(), update=(), delete=(), reorder=()):
+    """
+    Apply a batch of stop changes to a trip in one transaction.
+
+    Args:
+        trip (Trip): Trip whose stops are edited
+        create (list): Validated data for new stops; ``order`` is optional
+        update (list): Partial stop data, each item carrying its ``id``
+        delete (list): Ids of stops to remove
+        reorder (list): ``{"id": stop_id, "order": new_order}`` items
+
+    Returns:
+        QuerySet: The trip's stops after the change, in order
+    """
+    with transaction.atomic():
+        stops = {stop.id: stop for stop in trip.stops.select_for_update()}
+        original_orders = {stop_id: stop.order for stop_id, stop in stops.items()}
+
+        deleted = set(delete)
+        edited = {item["id"] for item in update} | {item["id"] for item in reorder}
+        unknown = (deleted | edited) - stops.keys()
+        if unknown:
+            raise serializers.ValidationError(
+                {"non_field_errors": [f"Unknown stop id(s) for this trip: {sorted(unknown)}"]}
+            )
+        if deleted & edited:
+            raise serializers.ValidationError(
+                {"non_field_errors": ["Cannot update or reorder a stop that is being deleted."]}
+            )
+
+        touched = {}
+        fields = set()
+        for item in update:
+            data = dict(item)
+            stop = stops[data.pop("id")]
+            for field, value in data.items():
+                setattr(stop, field, value)
+            fields.update(data)
+            touched[stop.id] = stop
+
+        for item in reorder:
+            stop = stops[item["id"]]
+            stop.order = item["order"]
+            fields.add("order")
+            touched[stop.id] = stop
+
+        survivors = [stop for stop_id, stop in stops.items() if stop_id not in deleted]
+
+        # Stops created without an explicit order are appended at the end
+        next_order = max(
+            [stop.order for stop in survivors]
+            + [data["order"] for data in create if data.get("order")],
+            default=0,
+        )
+        new_stops = []
+        for data in create:
+            data = dict(data)
+            if not data.get("order"):
+                next_order += 1
+                data["order"] = next_order
+            new_stops.append(Stop(trip=trip, **data))
+
+        final_orders = [stop.order for stop in survivors] + [stop.order for stop in new_stops]
+        if len(final_orders) != len(set(final_orders)):
+            raise serializers.ValidationError(
+                {"non_field_errors": ["Duplicate orders are not allowed."]}
+            )
+
+        if deleted:
+            Stop.objects.filter(trip=trip, id__in=deleted).delete()
+
+        ceiling = max(list(original_orders.values()) + final_orders, default=0)
+        _park_and_bulk_update(list(touched.values()), fields, original_orders, ceiling)
+
+        if new_stops:
+            Stop.objects.bulk_create(new_stops)
+
+        # Bulk writes skip Stop.save(), so statistics are recalculated once here
+        trip.calculate_statistics()
+        if new_stops or deleted or fields & TRIGGER_FIELDS:
+            schedule_leg_update(trip.id)
+        if trip.is_public and (new_stops or deleted or fields & DRAWN_STOP_FIELDS):
+            bump_tiles_version()
+
+    return trip.stops.order_by("order")
@@ -0,0 +1,176 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .access import invalidate_trip_access
+from .legs import TRIGGER_FIELDS, schedule_leg_update
+from .models import Stop, Trip, TripAccessEntry, TripShare
+from .response_cache import bump_trip_versions
+from .tiles import DRAWN_STOP_FIELDS, DRAWN_TRIP_FIELDS, bump_tiles_version
+
+User = get_user_model()
+
+# Trip fields that affect who can access a trip
+ACCESS_FIELDS = {"user", "is_public"}
+
+# User fields rendered into trip responses (``user_name``)
+NAME_FIELDS = {"first_name", "last_name"}
+
+# Trip fields that decide the stop times
+SCHEDULE_FIELDS = {"start_time", "daily_driving_hours"}
+
+# Trip fields read before a save: the owner, and what tiles draw except the
+# route, which ``Trip.save`` compares itself
+SAVED_TRIP_FIELDS = {"user_id"} | DRAWN_TRIP_FIELDS - {"route_geometry"}
+
+
+@receiver(post_save, sender=Trip)
+def trip_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    """Keep the access index and cached access in step with the trip."""
+    if created:
+        TripAccessEntry.objects.create(
+            user_id=instance.user_id, trip_id=instance.id, permission_level="owner"
+        )
+        return
+
+    if update_fields is not None and not ACCESS_FIELDS & set(update_fields):
+        return
+
+    invalidate_trip_access(instance.id)
+
+    before = getattr(instance, "_saved_before", None)
+    if before is not None and before["user_id"] != instance.user_id:
+        TripAccessEntry.rebuild_for_trip(instance.id)
+
+
+@receiver(post_delete, sender=Trip)
+def trip_deleted(sender, instance, **kwargs):
+    invalidate_trip_access(instance.id)
+
+
+@receiver(post_save, sender=TripShare)
+def trip_share_saved(sender, instance, **kwargs):
+    """Re-index and invalidate access whenever a share is created or edited."""
+    TripAccessEntry.rebuild_for_trip(instance.trip_id)
+    invalidate_trip_access(instance.trip_id)
+
+
+@receiver(post_delete, sender=TripShare)
+def trip_share_deleted(sender, instance, **kwargs):
+    """Drop the shared user's index row and invalidate access."""
+    # Only deletes, so this stays safe inside a cascade from the trip or user
+    TripAccessEntry.objects.filter(
+        trip_id=instance.trip_id, user_id=instance.shared_with_id
+    ).exclude(permission_level="owner").delete()
+    invalidate_trip_access(instance.trip_id)
+
+
+@receiver([post_save, post_delete], sender=Trip)
+def trip_written(sender, instance, **kwargs):
+    """Retire cached responses for a trip on any write."""
+    bump_trip_versions([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Stop)
+@receiver([post_save, post_delete], sender=TripShare)
+def trip_child_written(sender, instance, **kwargs):
+    """Retire cached responses when a trip's stops or shares change."""
+    bump_trip_versions([instance.trip_id])
+
+
+def _drawn_changed(instance, fields, created):
+    """Whether a save changed what a tile draws of ``instance``."""
+    if created:
+        return True
+    before = getattr(instance, "_saved_before", None)
+    return before is not None and any(
+        before[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(pre_save, sender=Trip)
+def trip_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember the owner and what tiles draw before a save that may change them."""
+    instance._saved_before = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not (
+        (ACCESS_FIELDS | DRAWN_TRIP_FIELDS) & set(update_fields)
+    ):
+        return
+    instance._saved_before = (
+        Trip.objects.filter(id=instance.pk).values(*SAVED_TRIP_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Trip)
+def public_trip_saved(sender, instance, created=False, **kwargs):
+    """Retire public map tiles when what they draw of a trip changes."""
+    before = getattr(instance, "_saved_before", None) or {}
+    if not (instance.is_public or before.get("is_public")):
+        return
+    fields = SAVED_TRIP_FIELDS - {"user_id"}
+    if _drawn_changed(instance, fields, created) or instance._route_changed:
+        bump_tiles_version()
+
+
+@receiver(post_delete, sender=Trip)
+def public_trip_deleted(sender, instance, **kwargs):
+    if instance.is_public:
+        bump_tiles_version()
+
+
+@receiver(pre_save, sender=Stop)
+def stop_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember what tiles draw of a stop before a save that may change it."""
+    instance._saved_before = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not DRAWN_STOP_FIELDS & set(update_fields):
+        return
+    instance._saved_before = (
+        Stop.objects.filter(id=instance.pk).values(*DRAWN_STOP_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Stop)
+def public_stop_saved(sender, instance, created=False, **kwargs):
+    """Retire public map tiles when a public trip's stop is added or redrawn."""
+    if _drawn_changed(instance, DRAWN_STOP_FIELDS, created) and instance.trip.is_public:
+        bump_tiles_version()
+
+
+@receiver(post_delete, sender=Stop)
+def public_stop_deleted(sender, instance, **kwargs):
+    if Trip.objects.filter(id=instance.trip_id, is_public=True).exists():
+        bump_tiles_version()
+
+
+@receiver(post_save, sender=Stop)
+def stop_saved(sender, instance, update_fields=None, **kwargs):
+    """Queue leg computation when a stop may have been added, moved or lengthened."""
+    if update_fields is not None and not TRIGGER_FIELDS & set(update_fields):
+        return
+    schedule_leg_update(instance.trip_id)
+
+
+@receiver(post_save, sender=Trip)
+def trip_start_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    """Queue the stop times for recalculation when the trip's start changes."""
+    if created:
+        return
+    if update_fields is not None and not SCHEDULE_FIELDS & set(update_fields):
+        return
+    schedule_leg_update(instance.id)
+
+
+@receiver(post_delete, sender=Stop)
+def stop_deleted(sender, instance, **kwargs):
+    schedule_leg_update(instance.trip_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Trip responses embed the owner's name, so retire them on a rename."""
+    if update_fields is not None and not NAME_FIELDS & set(update_fields):
+        return
+    bump_trip_versions(list(instance.trips.values_list("id", flat=True)))
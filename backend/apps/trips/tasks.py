@@ -0,0 +1,15 @@
+from celery import shared_task
+
+
+@shared_task
+def compute_trip_legs(trip_id):
+    """Fill in the legs that changed, then the stop times that depend on them."""
+    from .legs import clear_scheduled, update_trip_legs
+    from .schedule import update_trip_schedule
+
+    clear_scheduled(trip_id)
+    updated = update_trip_legs(trip_id)
+    rescheduled = update_trip_schedule(trip_id)
+    return (
+        f"Updated {updated} leg(s) and {rescheduled} stop time(s) for trip {trip_id}"
+    )
@@ -0,0 +1,292 @@
+"""
+Vector tiles of public trip routes and stops.
+
+A tile draws each public route from the simplified level stored for its zoom
+(see ``Trip.route_geometry_levels``), so only tiles zoomed past the finest
+level read a full-resolution line. Routes that may cross a tile are picked
+with one numpy box test over the bounds of every public route, loaded once
+per tile version and process.
+
+Built tiles are cached in the default cache and, when ``TRIP_TILE_CACHE_DIR``
+is set, on local disk. Both are keyed by a version token that any write to
+something a tile draws (``DRAWN_TRIP_FIELDS`` of a public trip, or
+``DRAWN_STOP_FIELDS`` of its stops) replaces, so old tiles are never served
+again; on disk, directories of older versions are removed as soon as a tile
+of the new version is written. Every process must see the same token, so
+tiles are only cached with a shared cache (``SHARED_CACHE``); otherwise each
+request builds its tile and no ETag is sent.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.renderers import BaseRenderer
+
+from apps.routes.geometry import decode_polyline, level_for_zoom
+from apps.routes.mvt import (
+    BUFFER,
+    LINESTRING,
+    POINT,
+    Layer,
+    clip_line,
+    encode_tile,
+    line_commands,
+    point_commands,
+    project,
+    tile_bounds,
+)
+
+from .fast_serializers import dumps
+from .models import Stop, Trip
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+VERSION_KEY = "public_trip_tiles:version"
+
+# Trip and stop fields drawn in tiles; writes to anything else keep the tiles
+DRAWN_TRIP_FIELDS = {"name", "route_type", "route_geometry", "is_public"}
+DRAWN_STOP_FIELDS = {"name", "stop_type", "order", "latitude", "longitude"}
+
+# Stops are left out of tiles below this zoom, where they would only clutter
+STOP_MIN_ZOOM = 6
+
+# Route bounds of public trips for the version they were loaded under
+_route_index = {"version": None}
+
+
+class VectorTileRenderer(BaseRenderer):
+    """Lets clients ask for tiles by media type; errors are still sent as JSON."""
+
+    media_type = CONTENT_TYPE
+    format = "mvt"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or isinstance(data, bytes):
+            return data or b""
+        return dumps(data)
+
+
+def is_cached():
+    """Whether tiles are cached, which needs a cache every process shares."""
+    return settings.SHARED_CACHE
+
+
+def get_tiles_version():
+    """
+    Return the current tile version token, minting one if there is none.
+
+    Returns:
+        str: The token, or ``None`` when tiles are not cached
+    """
+    if not is_cached():
+        return None
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() so a concurrent writer's token wins over ours
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _set_new_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def bump_tiles_version():
+    """Retire every cached tile once the current transaction commits."""
+    if not is_cached():
+        return
+    _set_new_version()
+    transaction.on_commit(_set_new_version)
+
+
+def _load_route_index(version):
+    if version is None or _route_index["version"] != version:
+        rows = [
+            (trip_id, bounds)
+            for trip_id, bounds in Trip.objects.filter(is_public=True)
+            .exclude(route_bounds=None)
+            .values_list("id", "route_bounds")
+            if bounds
+        ]
+        boxes = np.array(
+            [
+                (
+                    bounds["southwest"]["lat"],
+                    bounds["southwest"]["lng"],
+                    bounds["northeast"]["lat"],
+                    bounds["northeast"]["lng"],
+                )
+                for _, bounds in rows
+            ]
+        ).reshape(-1, 4)
+        _route_index.update(
+            version=version,
+            ids=np.array([trip_id for trip_id, _ in rows], dtype=np.int64),
+            boxes=boxes,
+        )
+    return _route_index["ids"], _route_index["boxes"]
+
+
+def _routes_layer(z, x, y, version):
+    west, south, east, north = tile_bounds(z, x, y, BUFFER)
+    ids, boxes = _load_route_index(version)
+    overlaps = (
+        (boxes[:, 0] <= north)
+        & (boxes[:, 2] >= south)
+        & (boxes[:, 1] <= east)
+        & (boxes[:, 3] >= west)
+    )
+    layer = Layer("routes")
+    candidates = ids[overlaps].tolist()
+    if not candidates:
+        return layer
+
+    trips = Trip.objects.filter(id__in=candidates, is_public=True).order_by("id")
+    rows = list(trips.values("id", "name", "route_type", "route_geometry_levels"))
+    # Tiles are drawn 512 pixels wide, so a z tile needs the 256-pixel level
+    # for zoom z + 1
+    lines = {
+        row["id"]: level_for_zoom(
+            (row["route_geometry_levels"] or {}).get("levels", {}), None, z + 1
+        )[1]
+        for row in rows
+    }
+    full = [trip_id for trip_id, line in lines.items() if line is None]
+    if full:
+        lines.update(
+            trips.filter(id__in=full).values_list("id", "route_geometry")
+        )
+
+    for row in rows:
+        try:
+            points = decode_polyline(lines[row["id"]])
+        except ValueError:
+            continue
+        commands = line_commands(clip_line(project(points, z, x, y)))
+        layer.add_feature(
+            LINESTRING,
+            commands,
+            {"name": row["name"], "route_type": row["route_type"]},
+            row["id"],
+        )
+    return layer
+
+
+def _stops_layer(z, x, y):
+    layer = Layer("stops")
+    if z < STOP_MIN_ZOOM:
+        return layer
+
+    west, south, east, north = tile_bounds(z, x, y, BUFFER)
+    stops = (
+        Stop.objects.filter(
+            trip__is_public=True,
+            latitude__range=(south, north),
+            longitude__range=(west, east),
+        )
+        .order_by("trip_id", "order")
+        .values_list(
+            "id", "trip_id", "name", "stop_type", "order", "latitude", "longitude"
+        )
+    )
+    stops = list(stops)
+    if not stops:
+        return layer
+
+    xy = project([(stop[5], stop[6]) for stop in stops], z, x, y)
+    for stop, point in zip(stops, xy):
+        stop_id, trip_id, name, stop_type, order = stop[:5]
+        layer.add_feature(
+            POINT,
+            point_commands(point),
+            {"trip_id": trip_id, "name": name, "stop_type": stop_type, "order": order},
+            stop_id,
+        )
+    return layer
+
+
+def build_tile(z, x, y, version=None):
+    """
+    Encode tile ``z/x/y`` with a ``routes`` and a ``stops`` layer.
+
+    Returns:
+        bytes: The tile; empty when nothing public crosses it
+    """
+    version = version or get_tiles_version()
+    return encode_tile([_routes_layer(z, x, y, version), _stops_layer(z, x, y)])
+
+
+def _tile_path(version, z, x, y):
+    return Path(settings.TRIP_TILE_CACHE_DIR) / version / str(z) / str(x) / f"{y}.mvt"
+
+
+def _read_disk(path):
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _prune_disk(version):
+    """Remove tile directories left by older versions."""
+    root = Path(settings.TRIP_TILE_CACHE_DIR)
+    for entry in root.iterdir():
+        if entry.is_dir() and entry.name != version:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _write_disk(path, version, tile):
+    try:
+        version_dir = Path(settings.TRIP_TILE_CACHE_DIR) / version
+        if not version_dir.is_dir():
+            version_dir.mkdir(parents=True, exist_ok=True)
+            _prune_disk(version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial tile
+        handle, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            file.write(tile)
+        os.replace(temporary, path)
+    except OSError as exc:
+        logger.warning(f"Could not write tile {path}: {exc}")
+
+
+def get_tile(z, x, y, version=None):
+    """
+    Fetch tile ``z/x/y`` from disk or the cache, building it on a miss.
+
+    Returns:
+        bytes: The encoded tile; empty when nothing public crosses it
+    """
+    version = version or get_tiles_version()
+    if version is None:
+        return build_tile(z, x, y)
+
+    path = _tile_path(version, z, x, y) if settings.TRIP_TILE_CACHE_DIR else None
+    if path is not None:
+        tile = _read_disk(path)
+        if tile is not None:
+            return tile
+
+    key = f"public_trip_tile:{version}:{z}:{x}:{y}"
+    tile = cache.get(key)
+    if tile is None:
+        tile = build_tile(z, x, y, version)
+        cache.set(key, tile, settings.TRIP_TILE_CACHE_TIMEOUT)
+        logger.debug(f"Built tile {z}/{x}/{y}: {len(tile)} bytes")
+
+    if path is not None:
+        _write_disk(path, version, tile)
+    return tile
@@ -12,6 +12,13 @@ urlpatterns = [
         views.calculate_trip_statistics,
         name="calculate_trip_statistics",
     ),
+    path(
+        "<int:trip_id>/schedule/",
+        views.calculate_trip_schedule,
+        name="calculate_trip_schedule",
+    ),
+    path("<int:trip_id>/fuel-stops/", views.plan_fuel, name="plan_fuel"),
+    path("<int:trip_id>/geometry/", views.trip_geometry, name="trip_geometry"),
     # Stop endpoints
     path(
         "<int:trip_id>/stops/",
@@ -24,6 +31,12 @@ urlpatterns = [
         name="stop_detail",
     ),
     path("<int:trip_id>/stops/reorder/", views.reorder_stops, name="reorder_stops"),
+    path("<int:trip_id>/stops/bulk/", views.bulk_update_stops, name="bulk_update_stops"),
+    path(
+        "<int:trip_id>/stops/optimize/",
+        views.optimize_stop_order,
+        name="optimize_stop_order",
+    ),
     # Trip sharing endpoints
     path(
         "<int:trip_id>/shares/",
@@ -38,4 +51,10 @@ urlpatterns = [
     # Special endpoints
     path("shared/", views.shared_trips, name="shared_trips"),
     path("public/", views.public_trips, name="public_trips"),
+    path(
+        "public/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        views.public_trip_tile,
+        name="public_trip_tile",
+    ),
+    path("cache-stats/", views.response_cache_stats, name="response_cache_stats"),
 ]
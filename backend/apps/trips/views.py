@@ -1,8 +1,9 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db import transaction, models
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from .models import Trip, Stop, TripShare
@@ -15,8 +16,38 @@ from .serializers import (
     StopCreateSerializer,
     TripShareSerializer,
     StopReorderSerializer,
+    StopBulkSerializer,
+    TripOptimizeSerializer,
+    TripGeometrySerializer,
+    FuelPlanSerializer,
 )
 from .permissions import TripPermission, StopPermission
+from .access import get_trip_access_or_404, get_trip_with_access
+from .services import apply_stop_diff
+from .legs import update_trip_legs
+from .schedule import update_trip_schedule
+from .optimization import METRES_PER_MILE, optimize_stops
+from .fuel import NoFuelPlan, plan_fuel_stops, trip_route
+from .conditional import check_if_match, get_trip_etag, not_modified, trip_etag
+from .response_cache import (
+    can_serve_cached,
+    get_or_render,
+    get_response_cache_stats,
+    is_compact_json,
+    render_json,
+    RenderedJSONResponse,
+)
+from .fast_serializers import serialize_stops, serialize_trips
+from .tiles import CONTENT_TYPE, VectorTileRenderer, get_tile, get_tiles_version
+from apps.routes.geometry import decode_polyline, level_for_zoom
+from apps.routes.mvt import is_valid_tile
+
+
+def read_response(request, data, headers=None):
+    """Send read-only data, pre-encoding it when the client wants plain JSON."""
+    if is_compact_json(request):
+        return RenderedJSONResponse(render_json(data), headers=headers)
+    return Response(data, headers=headers)
 
 
 class TripListCreateView(generics.ListCreateAPIView):
@@ -31,17 +62,17 @@ class TripListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         """Return trips owned by or shared with the current user."""
-        user = self.request.user
-        return Trip.objects.filter(
-            models.Q(user=user)
-            | models.Q(shares__shared_with=user, shares__is_active=True)
-        ).distinct()
+        return Trip.objects.filter(access_entries__user=self.request.user)
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return TripCreateSerializer
         return TripListSerializer
 
+    def list(self, request, *args, **kwargs):
+        trips = serialize_trips(self.filter_queryset(self.get_queryset()))
+        return read_response(request, trips)
+
 
 class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a specific trip."""
@@ -49,17 +80,48 @@ class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, TripPermission]
 
     def get_queryset(self):
-        user = self.request.user
-        return Trip.objects.filter(
-            models.Q(user=user)
-            | models.Q(shares__shared_with=user, shares__is_active=True)
-        ).distinct()
+        return Trip.objects.filter(access_entries__user=self.request.user)
 
     def get_serializer_class(self):
         if self.request.method in ["PUT", "PATCH"]:
             return TripUpdateSerializer
         return TripDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        trip = self.get_object()
+
+        # Answer unchanged polls before stops are loaded or serialized
+        etag = trip_etag(trip)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        def render(trip_ids):
+            trips = serialize_trips(Trip.objects.filter(id__in=trip_ids), detail=True)
+            return {data["id"]: data for data in trips}
+
+        if can_serve_cached(request):
+            bodies, hits = get_or_render("detail", {trip.id: trip.updated_at}, render)
+            return RenderedJSONResponse(
+                bodies[0], headers={"ETag": etag, "X-Cache": "HIT" if hits else "MISS"}
+            )
+
+        return read_response(request, render([trip.id])[trip.id], headers={"ETag": etag})
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response["ETag"] = self.updated_etag
+        return response
+
+    def perform_update(self, serializer):
+        check_if_match(self.request, trip_etag(serializer.instance))
+        trip = serializer.save()
+        self.updated_etag = trip_etag(trip)
+
+    def perform_destroy(self, instance):
+        check_if_match(self.request, trip_etag(instance))
+        instance.delete()
+
 
 class StopListCreateView(generics.ListCreateAPIView):
     """List stops for a trip or create a new stop."""
@@ -67,27 +129,36 @@ class StopListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated, StopPermission]
 
     def get_queryset(self):
-        trip_id = self.kwargs["trip_id"]
-        trip = get_object_or_404(Trip, id=trip_id)
+        access = get_trip_access_or_404(self.request, self.kwargs["trip_id"])
 
         # Check if user has access to this trip
-        user = self.request.user
-        if not (
-            trip.user == user
-            or trip.shares.filter(shared_with=user, is_active=True).exists()
-        ):
+        if not access.is_member:
             return Stop.objects.none()
 
-        return Stop.objects.filter(trip=trip)
+        return Stop.objects.filter(trip_id=access.trip_id)
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return StopCreateSerializer
         return StopSerializer
 
+    def list(self, request, *args, **kwargs):
+        access = get_trip_access_or_404(request, self.kwargs["trip_id"])
+        if not access.is_member:
+            return super().list(request, *args, **kwargs)
+
+        # Answer unchanged polls before stops are loaded or serialized
+        etag = get_trip_etag(access.trip_id)
+        response = not_modified(request, etag)
+        if response is None:
+            stops = serialize_stops(self.filter_queryset(self.get_queryset()))
+            response = read_response(request, stops, headers={"ETag": etag})
+        return response
+
     def perform_create(self, serializer):
         trip_id = self.kwargs["trip_id"]
         trip = get_object_or_404(Trip, id=trip_id)
+        check_if_match(self.request, trip_etag(trip))
 
         # Auto-assign order if not provided
         if "order" not in serializer.validated_data:
@@ -105,72 +176,260 @@ class StopDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, StopPermission]
 
     def get_queryset(self):
-        trip_id = self.kwargs["trip_id"]
-        trip = get_object_or_404(Trip, id=trip_id)
+        access = get_trip_access_or_404(self.request, self.kwargs["trip_id"])
 
         # Check if user has access to this trip
-        user = self.request.user
-        if not (
-            trip.user == user
-            or trip.shares.filter(shared_with=user, is_active=True).exists()
-        ):
+        if not access.is_member:
             return Stop.objects.none()
 
-        return Stop.objects.filter(trip=trip)
+        return Stop.objects.filter(trip_id=access.trip_id)
+
+    def perform_update(self, serializer):
+        check_if_match(self.request, trip_etag(serializer.instance.trip))
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        trip = instance.trip
+        check_if_match(self.request, trip_etag(trip))
+        instance.delete()
+
+        # Recalculate statistics, which also moves the trip's ETag on
+        trip.calculate_statistics()
 
 
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def reorder_stops(request, trip_id):
     """Reorder stops in a trip."""
-    trip = get_object_or_404(Trip, id=trip_id)
+    trip, access = get_trip_with_access(request, trip_id)
 
     # Check permissions
-    user = request.user
-    if not (
-        trip.user == user
-        or trip.shares.filter(
-            shared_with=user, is_active=True, permission_level__in=["edit", "admin"]
-        ).exists()
-    ):
+    if not access.can_edit:
         return Response(
             {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
         )
 
+    check_if_match(request, trip_etag(trip))
+
     serializer = StopReorderSerializer(data=request.data)
     if serializer.is_valid():
-        stop_orders = serializer.validated_data["stop_orders"]
+        # One query for the stops, one bulk write for the new orders and a
+        # single statistics recalculation
+        apply_stop_diff(trip, reorder=serializer.validated_data["stop_orders"])
+        return Response(
+            {"message": "Stops reordered successfully."},
+            headers={"ETag": trip_etag(trip)},
+        )
 
-        try:
-            with transaction.atomic():
-                for item in stop_orders:
-                    stop = get_object_or_404(Stop, id=item["id"], trip=trip)
-                    stop.order = item["order"]
-                    stop.save()
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-                # Recalculate trip statistics
-                trip.calculate_statistics()
 
-            return Response({"message": "Stops reordered successfully."})
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_update_stops(request, trip_id):
+    """Apply stop creates, updates, deletes and reorders in one request."""
+    trip, access = get_trip_with_access(request, trip_id)
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    # Check permissions
+    if not access.can_edit:
+        return Response(
+            {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    check_if_match(request, trip_etag(trip))
+
+    serializer = StopBulkSerializer(data=request.data)
+    if serializer.is_valid():
+        stops = apply_stop_diff(trip, **serializer.validated_data)
+        return Response(
+            StopSerializer(stops, many=True).data, headers={"ETag": trip_etag(trip)}
+        )
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def optimize_stop_order(request, trip_id):
+    """Propose, and optionally apply, a shorter order for a trip's stops."""
+    trip, access = get_trip_with_access(request, trip_id)
+
+    serializer = TripOptimizeSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    apply = serializer.validated_data["apply"]
+
+    # Check permissions
+    if not (access.can_edit if apply else access.is_member):
+        return Response(
+            {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    if apply:
+        check_if_match(request, trip_etag(trip))
+
+    result = optimize_stops(
+        trip.stops.order_by("order"),
+        time_budget=serializer.validated_data["time_budget_ms"] / 1000,
+    )
+    stop_orders = [
+        {"id": stop_id, "order": order}
+        for order, stop_id in enumerate(result.stop_ids, start=1)
+    ]
+
+    applied = apply and result.method != "unchanged"
+    if applied:
+        apply_stop_diff(trip, reorder=stop_orders)
+
+    return Response(
+        {
+            "stop_orders": stop_orders,
+            "original_distance": round(result.original_distance, 2),
+            "optimized_distance": round(result.optimized_distance, 2),
+            "distance_saved": round(result.distance_saved, 2),
+            "original_duration": round(result.original_duration, 2),
+            "optimized_duration": round(result.optimized_duration, 2),
+            "time_saved": round(result.time_saved, 2),
+            "method": result.method,
+            "routing_mode": result.mode,
+            "complete": result.complete,
+            "applied": applied,
+        },
+        headers={"ETag": trip_etag(trip)},
+    )
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def plan_fuel(request, trip_id):
+    """Plan refuelling stops along a trip's route from cached gas stations."""
+    trip, access = get_trip_with_access(request, trip_id)
+    if not access.is_member:
+        return Response(
+            {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    serializer = FuelPlanSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    options = serializer.validated_data
+
+    try:
+        route = trip_route(trip)
+    except ValueError:
+        return Response(
+            {"error": "Stored route geometry could not be decoded"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(route) < 2:
+        return Response(
+            {"error": "Trip needs at least 2 stops to plan fuel stops"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    range_miles = options.get("range_miles") or (
+        options["tank_gallons"] * trip.fuel_efficiency
+    )
+    try:
+        plan = plan_fuel_stops(
+            route,
+            range_miles,
+            trip.fuel_efficiency,
+            trip.fuel_price_per_gallon,
+            start_fuel=options["start_fuel"],
+            reserve=options["reserve"],
+            corridor_miles=options["corridor_miles"],
+        )
+    except NoFuelPlan as e:
+        return Response(
+            {
+                "error": str(e),
+                "stranded_at_mile": round(e.stranded_at / METRES_PER_MILE, 1),
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response(
+        {
+            "stops": [
+                {
+                    "place_id": stop.place_id,
+                    "name": stop.name,
+                    "latitude": stop.latitude,
+                    "longitude": stop.longitude,
+                    "route_miles": round(stop.route_miles, 1),
+                    "detour_miles": round(stop.detour_miles, 2),
+                    "detour_minutes": round(stop.detour_minutes, 1),
+                    "detour_cost": round(stop.detour_cost, 2),
+                    "gallons": round(stop.gallons, 1),
+                    "fuel_cost": round(stop.fuel_cost, 2),
+                }
+                for stop in plan.stops
+            ],
+            "route_miles": round(plan.route_miles, 1),
+            "range_miles": round(plan.range_miles, 1),
+            "stations_considered": plan.stations_considered,
+            "total_detour_miles": round(plan.total_detour_miles, 2),
+            "total_detour_cost": round(plan.total_detour_cost, 2),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def trip_geometry(request, trip_id):
+    """Get a trip's route line, simplified for the requested map zoom."""
+    access = get_trip_access_or_404(request, trip_id)
+    if not access.allows(request.method):
+        return Response(
+            {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    serializer = TripGeometrySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = get_trip_etag(trip_id)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    zoom = serializer.validated_data.get("zoom")
+    route = Trip.objects.filter(id=trip_id).values(
+        "route_geometry_levels", "route_bounds"
+    )[0]
+    levels = (route["route_geometry_levels"] or {}).get("levels", {})
+    level, encoded = level_for_zoom(levels, None, zoom)
+    if encoded is None:
+        # Only read the full-resolution column when no simplified level fits
+        encoded = Trip.objects.values_list("route_geometry", flat=True).get(
+            id=trip_id
+        )
+
+    data = {"zoom": level, "bounds": route["route_bounds"]}
+    if serializer.validated_data["encoding"] == "geojson":
+        try:
+            points = decode_polyline(encoded)
+        except ValueError:
+            return Response(
+                {"error": "Stored route geometry could not be decoded"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        coordinates = points[:, ::-1].tolist()
+        data["geometry"] = {"type": "LineString", "coordinates": coordinates}
+    else:
+        data["geometry"] = encoded
+    return read_response(request, data, headers={"ETag": etag})
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def calculate_trip_statistics(request, trip_id):
     """Manually trigger trip statistics calculation."""
-    trip = get_object_or_404(Trip, id=trip_id)
+    trip, access = get_trip_with_access(request, trip_id)
 
     # Check permissions
-    user = request.user
-    if not (
-        trip.user == user
-        or trip.shares.filter(shared_with=user, is_active=True).exists()
-    ):
+    if not access.is_member:
         return Response(
             {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
         )
@@ -183,6 +442,24 @@ def calculate_trip_statistics(request, trip_id):
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def calculate_trip_schedule(request, trip_id):
+    """Bring the legs and stop arrival/departure times up to date now."""
+    trip, access = get_trip_with_access(request, trip_id)
+
+    if not access.is_member:
+        return Response(
+            {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    # Normally done by the compute_trip_legs task after stop writes
+    update_trip_legs(trip.id)
+    update_trip_schedule(trip.id)
+    trip.refresh_from_db()
+    return Response(TripDetailSerializer(trip).data)
+
+
 class TripShareListCreateView(generics.ListCreateAPIView):
     """List trip shares or create a new share."""
 
@@ -190,21 +467,19 @@ class TripShareListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        trip_id = self.kwargs["trip_id"]
-        trip = get_object_or_404(Trip, id=trip_id)
+        access = get_trip_access_or_404(self.request, self.kwargs["trip_id"])
 
         # Only trip owner can see shares
-        if trip.user != self.request.user:
+        if not access.is_owner:
             return TripShare.objects.none()
 
-        return TripShare.objects.filter(trip=trip, is_active=True)
+        return TripShare.objects.filter(trip_id=access.trip_id, is_active=True)
 
     def perform_create(self, serializer):
-        trip_id = self.kwargs["trip_id"]
-        trip = get_object_or_404(Trip, id=trip_id)
+        trip, access = get_trip_with_access(self.request, self.kwargs["trip_id"])
 
         # Only trip owner can create shares
-        if trip.user != self.request.user:
+        if not access.is_owner:
             raise permissions.PermissionDenied("Only trip owner can share trips.")
 
         serializer.save(trip=trip)
@@ -217,14 +492,13 @@ class TripShareDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        trip_id = self.kwargs["trip_id"]
-        trip = get_object_or_404(Trip, id=trip_id)
+        access = get_trip_access_or_404(self.request, self.kwargs["trip_id"])
 
         # Only trip owner can manage shares
-        if trip.user != self.request.user:
+        if not access.is_owner:
             return TripShare.objects.none()
 
-        return TripShare.objects.filter(trip=trip)
+        return TripShare.objects.filter(trip_id=access.trip_id)
 
 
 @api_view(["GET"])
@@ -233,11 +507,11 @@ def shared_trips(request):
     """Get trips shared with the current user."""
     user = request.user
     shared_trips = Trip.objects.filter(
-        shares__shared_with=user, shares__is_active=True
-    ).distinct()
+        access_entries__user=user,
+        access_entries__permission_level__in=["view", "edit", "admin"],
+    )
 
-    serializer = TripListSerializer(shared_trips, many=True)
-    return Response(serializer.data)
+    return read_response(request, serialize_trips(shared_trips))
 
 
 @api_view(["GET"])
@@ -249,18 +523,64 @@ def public_trips(request):
     # Add pagination
     from django.core.paginator import Paginator
 
+    if can_serve_cached(request):
+        public_trips = public_trips.values_list("id", "updated_at")
+
     paginator = Paginator(public_trips, 20)
     page_number = request.GET.get("page", 1)
     page_obj = paginator.get_page(page_number)
+    page_info = {
+        "count": paginator.count,
+        "num_pages": paginator.num_pages,
+        "current_page": page_obj.number,
+        "has_next": page_obj.has_next(),
+        "has_previous": page_obj.has_previous(),
+    }
+
+    if can_serve_cached(request):
+        # Assemble the page from cached per-trip bodies, serializing misses only
+        def render(trip_ids):
+            trips = serialize_trips(Trip.objects.filter(id__in=trip_ids))
+            return {data["id"]: data for data in trips}
+
+        bodies, hits = get_or_render("list", dict(page_obj), render)
+        body = b'{"results":[' + b",".join(bodies) + b"]," + render_json(page_info)[1:]
+        return RenderedJSONResponse(
+            body, headers={"X-Cache": "HIT" if hits == len(bodies) else "MISS"}
+        )
 
-    serializer = TripListSerializer(page_obj, many=True)
-    return Response(
-        {
-            "results": serializer.data,
-            "count": paginator.count,
-            "num_pages": paginator.num_pages,
-            "current_page": page_obj.number,
-            "has_next": page_obj.has_next(),
-            "has_previous": page_obj.has_previous(),
-        }
+    trips = serialize_trips(page_obj.object_list)
+    return read_response(request, {"results": trips, **page_info})
+
+
+@api_view(["GET"])
+@permission_classes([permissions.AllowAny])
+@renderer_classes([JSONRenderer, VectorTileRenderer])
+def public_trip_tile(request, z, x, y):
+    """Get a Mapbox Vector Tile of public trip routes and stops."""
+    if not is_valid_tile(z, x, y):
+        return Response(
+            {"error": "Tile does not exist."}, status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Tiles only have a version, and so an ETag, when they are cached
+    version = get_tiles_version()
+    etag = f'"{version}"' if version else None
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    tile = get_tile(z, x, y, version)
+    return HttpResponse(
+        tile,
+        content_type=CONTENT_TYPE,
+        status=status.HTTP_200_OK if tile else status.HTTP_204_NO_CONTENT,
+        headers={"ETag": etag} if etag else None,
     )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def response_cache_stats(request):
+    """Get hit/miss counters for the trip response cache."""
+    return Response(get_response_cache_stats())
@@ -0,0 +1,421 @@
+"""
+Weather hazards along trip routes.
+
+Each trip's overview route line (or the straight line through its stops) is
+resampled every ``SAMPLE_M`` metres, and every sample gets the time the
+traveller passes it. That time is interpolated along each leg between the
+scheduled departure from one stop and arrival at the next, with stops placed
+on the route by projection.
+
+Samples from any number of trips are then evaluated together:
+
+1. Round them to forecast cells ``HAZARD_PRECISION`` decimal places across,
+   coarser than point lookups since weather varies over tens of kilometres.
+2. Fetch the distinct cells' packed forecasts in one batch.
+3. Read each sample's reading at its passage time with one
+   ``weather_grid.lookup``.
+4. Flag heavy rain and high wind, and cut runs of flagged samples into
+   segments with array arithmetic.
+
+Only sampling touches trips one at a time. The lookup and the hazard tests
+are a few array operations however many trips are checked, so
+``alert_upcoming_trips`` can scan every upcoming trip in one pass.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from apps.messaging.models import Notification
+from apps.routes.geometry import decode_polyline, level_for_zoom
+from apps.trips.fuel import project_onto_route, route_distances
+from apps.trips.models import Stop, Trip, TripAccessEntry
+from apps.trips.optimization import METRES_PER_MILE
+from services import weather_grid
+from services.weather import weather_service
+from .timeline import REFRESH_DAYS, stop_moment
+
+logger = logging.getLogger(__name__)
+
+# Decimal places of the forecast cells hazards are checked in (1 ~= 11 km)
+HAZARD_PRECISION = 1
+
+# Most metres between route samples
+SAMPLE_M = 5000
+
+# Map zoom of the simplified route line that is sampled
+ROUTE_ZOOM = Trip.DETAIL_ZOOM
+
+# Rain per forecast step (3 hours), with at least this chance, that is heavy
+HEAVY_RAIN_MM = 7.5
+MIN_RAIN_CHANCE = 0.5
+
+# Sustained wind that is hazardous for driving
+HIGH_WIND_MPH = 40
+
+# Users are alerted about a trip at most once in this period
+ALERT_COOLDOWN = timedelta(hours=24)
+
+
+@dataclass
+class RouteSamples:
+    """Passage points of one or more trips, concatenated in trip order."""
+
+    trip_ids: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    along: np.ndarray  # metres from the trip's start
+    times: np.ndarray  # unix seconds
+
+    @classmethod
+    def concatenate(cls, parts):
+        if not parts:
+            empty = np.zeros(0)
+            return cls(empty.astype(np.int64), empty, empty, empty, empty)
+        return cls(*(np.concatenate(arrays) for arrays in zip(*parts)))
+
+
+def _route_line(trip, stops):
+    """A trip's overview route as ``(lat, lon)`` points, or its stops'."""
+    levels = (trip.route_geometry_levels or {}).get("levels", {})
+    _, encoded = level_for_zoom(levels, None, ROUTE_ZOOM)
+    if encoded:
+        try:
+            return decode_polyline(encoded)
+        except ValueError:
+            logger.warning(f"Trip {trip.id} has an undecodable route overview")
+    return np.array([(s.latitude, s.longitude) for s in stops], dtype=np.float64)
+
+
+def _passage_knots(trip, stops):
+    """
+    Unix departure and arrival time of every stop, or ``None`` if any stop
+    the route passes through is unscheduled.
+    """
+    departures, arrivals = [], []
+    start = trip.start_date
+    for i, stop in enumerate(stops):
+        departure = stop_moment(start, stop.departure_day, stop.departure_time)
+        arrival = stop_moment(start, stop.arrival_day, stop.arrival_time)
+        if (i < len(stops) - 1 and departure is None) or (i > 0 and arrival is None):
+            return None
+        departures.append(departure.timestamp() if departure else np.nan)
+        arrivals.append(arrival.timestamp() if arrival else np.nan)
+    return np.array(departures), np.array(arrivals)
+
+
+def sample_trip(trip, stops):
+    """
+    Passage points along one trip.
+
+    Args:
+        trip (Trip): Trip with ``start_date``
+        stops (list): Its stops in order
+
+    Returns:
+        tuple: ``(trip_ids, lat, lon, along, times)`` arrays, or ``None`` if
+        the trip has too few stops or is not fully scheduled
+    """
+    if trip.start_date is None or len(stops) < 2:
+        return None
+    knots = _passage_knots(trip, stops)
+    if knots is None:
+        return None
+    departures, arrivals = knots
+
+    route = _route_line(trip, stops)
+    if len(route) < 2:
+        return None
+    distances = route_distances(route)
+    total = distances[-1]
+    along = np.linspace(0.0, total, max(int(np.ceil(total / SAMPLE_M)), 1) + 1)
+    lat = np.interp(along, distances, route[:, 0])
+    lon = np.interp(along, distances, route[:, 1])
+
+    # Where the route passes each stop, kept in stop order
+    stop_points = np.array([(s.latitude, s.longitude) for s in stops])
+    at_stop, _ = project_onto_route(route, stop_points)
+    at_stop = np.maximum.accumulate(at_stop)
+    at_stop[0], at_stop[-1] = 0.0, total
+
+    leg = np.clip(np.searchsorted(at_stop, along, side="right") - 1, 0, len(stops) - 2)
+    span = at_stop[leg + 1] - at_stop[leg]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(span > 0, (along - at_stop[leg]) / span, 0.0)
+    leg_time = arrivals[leg + 1] - departures[leg]
+    times = departures[leg] + np.clip(share, 0, 1) * leg_time
+    trip_ids = np.full(len(along), trip.id, dtype=np.int64)
+    return trip_ids, lat, lon, along, times
+
+
+def sample_trips(trips):
+    """
+    Passage points of many trips, loading all their stops in one query.
+
+    Args:
+        trips (list): ``Trip`` instances
+
+    Returns:
+        RouteSamples: Samples of every trip that could be sampled
+    """
+    stops = {}
+    for stop in Stop.objects.filter(trip__in=[trip.id for trip in trips]).order_by(
+        "trip_id", "order"
+    ):
+        stops.setdefault(stop.trip_id, []).append(stop)
+
+    parts = []
+    for trip in trips:
+        sampled = sample_trip(trip, stops.get(trip.id, []))
+        if sampled is not None:
+            parts.append(sampled)
+    return RouteSamples.concatenate(parts)
+
+
+def evaluate(samples):
+    """
+    Forecast readings and hazard flags for every sample.
+
+    Args:
+        samples (RouteSamples): Points to check
+
+    Returns:
+        dict: ``heavy_rain``, ``high_wind`` and ``forecast`` (bool arrays),
+        plus ``precipitation_mm``, ``precipitation_chance`` and ``wind_mph``
+        (NaN without a forecast)
+    """
+    count = len(samples.lat)
+    result = {
+        "forecast": np.zeros(count, dtype=bool),
+        "precipitation_mm": np.full(count, np.nan),
+        "wind_mph": np.full(count, np.nan),
+        "precipitation_chance": np.full(count, np.nan),
+    }
+    if count:
+        # One integer per cell, so finding the distinct cells is a flat sort
+        scale = 10**HAZARD_PRECISION
+        rows = np.rint(samples.lat * scale).astype(np.int64)
+        columns = np.rint((samples.lon + 180) * scale).astype(np.int64)
+        width = 360 * scale + 1
+        keys, cell_of = np.unique(rows * width + columns, return_inverse=True)
+        rows, columns = np.divmod(keys, width)
+        cells = np.column_stack([rows / scale, columns / scale - 180])
+        cell_keys = [
+            (round(lat, HAZARD_PRECISION), round(lon, HAZARD_PRECISION))
+            for lat, lon in cells.tolist()
+        ]
+        records = weather_service.get_forecast_records(cell_keys)
+
+        # Index of each cell's record, or -1 for cells without a forecast
+        order = list(records)
+        position = {cell: i for i, cell in enumerate(order)}
+        record_of = np.array([position.get(cell, -1) for cell in cell_keys])
+        which = record_of[cell_of]
+        covered = np.flatnonzero(which >= 0)
+        if len(covered):
+            found = weather_grid.lookup(
+                [records[cell] for cell in order],
+                which[covered],
+                samples.times[covered],
+                labels=False,
+            )
+            result["forecast"][covered] = found["found"]
+            for name in ("precipitation_mm", "wind_mph", "precipitation_chance"):
+                result[name][covered] = found[name]
+
+    with np.errstate(invalid="ignore"):
+        result["heavy_rain"] = (result["precipitation_mm"] >= HEAVY_RAIN_MM) & (
+            result["precipitation_chance"] >= MIN_RAIN_CHANCE
+        )
+        result["high_wind"] = result["wind_mph"] >= HIGH_WIND_MPH
+    return result
+
+
+def hazard_segments(samples, readings):
+    """
+    Runs of hazardous samples within each trip.
+
+    Args:
+        samples (RouteSamples): Evaluated samples
+        readings (dict): Output of ``evaluate``
+
+    Returns:
+        list: Segment dicts in sample order, each with the ``trip_id``,
+        sample ``start``/``end`` indexes (inclusive), ``kinds`` and the worst
+        rain and wind seen
+    """
+    hazardous = readings["heavy_rain"] | readings["high_wind"]
+    if not hazardous.any():
+        return []
+
+    new_trip = np.r_[True, samples.trip_ids[1:] != samples.trip_ids[:-1]]
+    trip_ends = np.r_[new_trip[1:], True]
+    previous = np.r_[False, hazardous[:-1]]
+    following = np.r_[hazardous[1:], False]
+    starts = np.flatnonzero(hazardous & (new_trip | ~previous))
+    ends = np.flatnonzero(hazardous & (trip_ends | ~following))
+
+    # Worst readings per run; samples between runs cannot raise the maximum
+    rain = np.where(hazardous, np.nan_to_num(readings["precipitation_mm"]), -np.inf)
+    wind = np.where(hazardous, np.nan_to_num(readings["wind_mph"]), -np.inf)
+    worst_rain = np.maximum.reduceat(rain, starts)
+    worst_wind = np.maximum.reduceat(wind, starts)
+    any_rain = np.logical_or.reduceat(readings["heavy_rain"] & hazardous, starts)
+    any_wind = np.logical_or.reduceat(readings["high_wind"] & hazardous, starts)
+
+    segments = []
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        kinds = []
+        if any_rain[i]:
+            kinds.append("heavy_rain")
+        if any_wind[i]:
+            kinds.append("high_wind")
+        segments.append(
+            {
+                "trip_id": int(samples.trip_ids[start]),
+                "start": start,
+                "end": end,
+                "kinds": kinds,
+                "max_precipitation_mm": float(worst_rain[i]),
+                "max_wind_mph": float(worst_wind[i]),
+            }
+        )
+    return segments
+
+
+def segment_feature(samples, segment):
+    """A hazard segment as a GeoJSON LineString Feature."""
+    start, end = segment["start"], segment["end"]
+    trip_id = samples.trip_ids[start]
+    # Draw at least to the next sample so single-sample runs still show
+    if end + 1 < len(samples.lat) and samples.trip_ids[end + 1] == trip_id:
+        end += 1
+    elif start > 0 and samples.trip_ids[start - 1] == trip_id:
+        start -= 1
+    coordinates = np.column_stack(
+        [samples.lon[start:end + 1], samples.lat[start:end + 1]]
+    )
+    return {
+        "type": "Feature",
+        "properties": {
+            "kinds": segment["kinds"],
+            "start_mile": round(samples.along[segment["start"]] / METRES_PER_MILE, 1),
+            "end_mile": round(samples.along[segment["end"]] / METRES_PER_MILE, 1),
+            "start_time": _local_time(samples.times[segment["start"]]).isoformat(),
+            "end_time": _local_time(samples.times[segment["end"]]).isoformat(),
+            "max_precipitation_mm": round(segment["max_precipitation_mm"], 1),
+            "max_wind_mph": round(segment["max_wind_mph"], 1),
+        },
+        "geometry": {
+            "type": "LineString",
+            "coordinates": np.round(coordinates, 5).tolist(),
+        },
+    }
+
+
+def _local_time(timestamp):
+    """Unix time as an aware datetime in the current time zone."""
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.get_current_timezone())
+
+
+def trip_hazards(trip):
+    """
+    Hazard overlay for one trip.
+
+    Returns:
+        dict: GeoJSON FeatureCollection of hazardous segments, with how many
+        samples were checked and how many had a forecast
+
+    Raises:
+        WeatherUnavailable: If no weather provider is configured
+    """
+    samples = sample_trips([trip])
+    readings = evaluate(samples)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            segment_feature(samples, segment)
+            for segment in hazard_segments(samples, readings)
+        ],
+        "samples": len(samples.lat),
+        "forecast_samples": int(readings["forecast"].sum()),
+    }
+
+
+def alert_upcoming_trips(days=REFRESH_DAYS, now=None):
+    """
+    Notify members of trips departing soon about hazards on their route.
+
+    Every trip starting between today and ``days`` on is checked in one
+    evaluation. Each affected member gets one ``weather_alert`` notification
+    per trip, unless they got one in the last ``ALERT_COOLDOWN``; all are
+    created with a single ``bulk_create``.
+
+    Returns:
+        int: Notifications created
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    trips = list(
+        Trip.objects.filter(
+            start_date__range=(today, today + timedelta(days=days))
+        ).only("id", "name", "start_date", "route_geometry_levels")
+    )
+    samples = sample_trips(trips)
+    segments = hazard_segments(samples, evaluate(samples))
+
+    # The first hazard on each trip is the one worth leading with
+    first = {}
+    for segment in segments:
+        first.setdefault(segment["trip_id"], segment)
+    if not first:
+        return 0
+
+    already = set(
+        Notification.objects.filter(
+            notification_type="weather_alert",
+            trip_id__in=first,
+            created_at__gte=now - ALERT_COOLDOWN,
+        ).values_list("user_id", "trip_id")
+    )
+    members = TripAccessEntry.objects.filter(trip_id__in=first).values_list(
+        "user_id", "trip_id"
+    )
+    names = {trip.id: trip.name for trip in trips}
+
+    notifications = []
+    for user_id, trip_id in members:
+        if (user_id, trip_id) in already:
+            continue
+        title, message = _alert_text(names[trip_id], samples, first[trip_id])
+        notifications.append(
+            Notification(
+                user_id=user_id,
+                trip_id=trip_id,
+                notification_type="weather_alert",
+                title=title,
+                message=message,
+            )
+        )
+    Notification.objects.bulk_create(notifications, batch_size=1000)
+    return len(notifications)
+
+
+def _alert_text(name, samples, segment):
+    """Title and message for a trip's first hazard."""
+    kinds = " and ".join(
+        {"heavy_rain": "heavy rain", "high_wind": "high wind"}[kind]
+        for kind in segment["kinds"]
+    )
+    mile = samples.along[segment["start"]] / METRES_PER_MILE
+    when = _local_time(samples.times[segment["start"]])
+    title = f'Weather alert: {kinds} on "{name}"'
+    message = (
+        f"Expect {kinds} on your route around mile {mile:.0f}, "
+        f"from about {when.strftime('%B %d, %H:%M')}. "
+        "Check the trip's weather before you set off."
+    )
+    return title, message
@@ -0,0 +1,22 @@
+from celery import shared_task
+
+
+@shared_task
+def refresh_trip_weather():
+    """Keep forecasts cached for the stops of trips departing in the next days."""
+    from .timeline import REFRESH_DAYS, refresh_upcoming_trips
+
+    refreshed = refresh_upcoming_trips()
+    return (
+        f"Refreshed {refreshed} forecast cell(s) for trips in the next "
+        f"{REFRESH_DAYS} days"
+    )
+
+
+@shared_task
+def check_route_weather():
+    """Alert members of trips departing soon about hazards along their route."""
+    from .hazards import alert_upcoming_trips
+
+    created = alert_upcoming_trips()
+    return f"Created {created} weather alert(s)"
@@ -0,0 +1,168 @@
+"""
+Weather along a trip, at the time the traveller reaches each stop.
+
+Stop times come from the trip schedule (``apps.trips.schedule``): the trip's
+``start_date`` plus each stop's arrival day and time, or its departure for the
+first stop. Every stop takes the forecast point nearest that moment from its
+grid cell's forecast, picked for all stops at once from the packed forecasts
+by ``WeatherService.get_forecasts_at``. That fetches one forecast per cell,
+so stops sharing a cell share a download.
+"""
+
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from apps.trips.models import Stop, Trip
+from services.weather import (
+    FORECAST_HOURS,
+    FORECAST_STEP_HOURS,
+    quantize,
+    weather_service,
+)
+
+# Trips departing within this many days have their forecasts kept warm
+REFRESH_DAYS = 5
+
+# Most forecast cells fetched in one batch by the refresher
+REFRESH_BATCH = 200
+
+# Seconds before going stale that the refresher refetches a forecast; run it
+# at least this often
+REFRESH_MARGIN = 1800
+
+
+def stop_moment(start_date, day, at):
+    """
+    Aware datetime of a scheduled stop time.
+
+    Args:
+        start_date (date): Trip start date, or ``None``
+        day (int): Trip day of the time, 0 for the start date
+        at (time): Time of day
+
+    Returns:
+        datetime: The moment, or ``None`` if any part is missing
+    """
+    if start_date is None or day is None or at is None:
+        return None
+    moment = datetime.combine(start_date + timedelta(days=day), at)
+    return timezone.make_aware(moment)
+
+
+def stop_arrivals(trip, stops):
+    """
+    When the traveller reaches each stop.
+
+    Args:
+        trip (Trip): Trip the stops belong to
+        stops (list): Its stops in order
+
+    Returns:
+        list: Aware datetime per stop (departure for the first stop), or
+        ``None`` where the trip has no start date or the stop is unscheduled
+    """
+    arrivals = []
+    for stop in stops:
+        day, at = stop.arrival_day, stop.arrival_time
+        if at is None:
+            day, at = stop.departure_day, stop.departure_time
+        arrivals.append(stop_moment(trip.start_date, day, at))
+    return arrivals
+
+
+def in_forecast_range(when, now):
+    """Whether a forecast fetched at ``now`` could cover ``when``."""
+    earliest = now - timedelta(hours=FORECAST_STEP_HOURS)
+    return earliest <= when <= now + timedelta(hours=FORECAST_HOURS)
+
+
+def trip_weather(trip):
+    """
+    Weather timeline for a trip's stops.
+
+    Only stops whose arrival falls within the forecast range are fetched.
+
+    Args:
+        trip (Trip): Trip to forecast
+
+    Returns:
+        list: Entry per stop in order, with its arrival, forecast point (or
+        ``None``) and a ``status`` of ``"forecast"``, ``"unscheduled"``,
+        ``"out_of_range"`` or ``"unavailable"``
+
+    Raises:
+        WeatherUnavailable: If no weather provider is configured
+    """
+    stops = list(trip.stops.order_by("order"))
+    arrivals = stop_arrivals(trip, stops)
+    now = timezone.now()
+    wanted = [
+        i
+        for i, when in enumerate(arrivals)
+        if when is not None and in_forecast_range(when, now)
+    ]
+    points, available = weather_service.get_forecasts_at(
+        [(stops[i].latitude, stops[i].longitude) for i in wanted],
+        [arrivals[i] for i in wanted],
+    )
+    forecasts = dict(zip(wanted, zip(points, available)))
+
+    timeline = []
+    for i, (stop, when) in enumerate(zip(stops, arrivals)):
+        forecast = None
+        if when is None:
+            state = "unscheduled"
+        elif i not in forecasts:
+            state = "out_of_range"
+        elif not forecasts[i][1]:
+            state = "unavailable"
+        else:
+            forecast = forecasts[i][0]
+            state = "forecast" if forecast else "out_of_range"
+        timeline.append(
+            {
+                "stop_id": stop.id,
+                "name": stop.name,
+                "order": stop.order,
+                "latitude": stop.latitude,
+                "longitude": stop.longitude,
+                "arrival": when.isoformat() if when else None,
+                "status": state,
+                "forecast": forecast,
+            }
+        )
+    return timeline
+
+
+def refresh_upcoming_trips(days=REFRESH_DAYS):
+    """
+    Keep forecasts cached for every stop of trips departing soon.
+
+    Forecasts go stale ``WEATHER_CACHE_TIMEOUT`` seconds after they are
+    fetched. Cells that are missing, or stored but going stale within
+    ``REFRESH_MARGIN`` seconds, are refetched, so running this at least every
+    ``REFRESH_MARGIN`` seconds renews forecasts before they expire.
+
+    Args:
+        days (int): Refresh trips starting between today and this many days on
+
+    Returns:
+        int: Forecast cells fetched
+    """
+    today = timezone.localdate()
+    trip_ids = Trip.objects.filter(
+        start_date__range=(today, today + timedelta(days=days))
+    ).values("id")
+    locations = (
+        Stop.objects.filter(trip_id__in=trip_ids)
+        .values_list("latitude", "longitude")
+        .distinct()
+    )
+    cells = list(dict.fromkeys(quantize(lat, lon) for lat, lon in locations))
+
+    refreshed = 0
+    for first in range(0, len(cells), REFRESH_BATCH):
+        batch = cells[first:first + REFRESH_BATCH]
+        refreshed += weather_service.refresh_forecasts(batch, REFRESH_MARGIN)
+    return refreshed
@@ -6,4 +6,10 @@ app_name = "weather"
 urlpatterns = [
     path("current/", views.CurrentWeatherView.as_view(), name="current_weather"),
     path("forecast/", views.WeatherForecastView.as_view(), name="weather_forecast"),
+    path("trips/<int:trip_id>/", views.TripWeatherView.as_view(), name="trip_weather"),
+    path(
+        "trips/<int:trip_id>/hazards/",
+        views.TripHazardsView.as_view(),
+        name="trip_hazards",
+    ),
 ]
@@ -1,7 +1,26 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-import random
+from apps.trips.access import get_trip_with_access
+from services.weather import WeatherUnavailable, point_date, weather_service
+from .hazards import trip_hazards
+from .timeline import trip_weather
+
+# Most stops forecast in one request
+MAX_FORECAST_STOPS = 100
+
+
+def parse_location(lat, lng):
+    """
+    Parse a latitude and longitude given as text.
+
+    Raises:
+        ValueError: If either is not a number or is out of range
+    """
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("Coordinates out of range")
+    return lat, lng
 
 
 class CurrentWeatherView(generics.GenericAPIView):
@@ -17,15 +36,30 @@ class CurrentWeatherView(generics.GenericAPIView):
                 {"error": "Latitude and longitude parameters are required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        conditions = ["Sunny", "Partly Cloudy", "Light Raing", "Overcast"]
+        try:
+            lat, lng = parse_location(lat, lng)
+        except ValueError:
+            return Response(
+                {"error": "Latitude and longitude must be valid coordinates."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            current = weather_service.get_current(lat, lng)
+        except WeatherUnavailable as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
         weather_data = {
             "location": f"Location ({lat}, {lng})",
             "current": {
-                "temp_f": 65 + random.random() * 25,
-                "condition": {"text": random.choice(conditions), "icon": "sunny"},
-                "humidity": 40 + random.random() * 40,
-                "wind_mph": random.random() * 15,
+                "temp_f": current["temp_f"],
+                "condition": {"text": current["condition"], "icon": current["icon"]},
+                "humidity": current["humidity"],
+                "wind_mph": current["wind_mph"],
+                "precipitation_chance": current["precipitation_chance"],
+                "time": current["time"],
             },
         }
 
@@ -45,25 +79,99 @@ class WeatherForecastView(generics.GenericAPIView):
                 {"error": "Stops parameter is required"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if len(stops) > MAX_FORECAST_STOPS:
+            return Response(
+                {"error": f"At most {MAX_FORECAST_STOPS} stops can be forecast"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        forecasts = []
-        conditions = ["Sunny", "Partly Cloudy", "Light Rain", "Clear", "Overcast"]
-
+        # Parse every stop first so the forecasts can be fetched as one batch
+        locations = {}
         for i, stop in enumerate(stops):
-
             try:
-                lat, lng = stop.split(",")
-                forecast = {
+                locations[i] = parse_location(*stop.split(","))
+            except (TypeError, ValueError):
+                continue
+
+        try:
+            results = weather_service.get_forecasts(list(locations.values()))
+        except WeatherUnavailable as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        if locations and not any(results):
+            return Response(
+                {"error": "Weather provider is unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        forecasts = []
+        for (i, (lat, lng)), points in zip(locations.items(), results):
+            if not points:
+                continue
+
+            # The next forecast point, with the rest for callers that want them
+            point = points[0]
+            forecasts.append(
+                {
                     "location": f"Stop {i+1}",
-                    "temperature": 65 + random.random() * 25,
-                    "condition": random.choice(conditions),
-                    "icon": "sunny",
-                    "humidity": 40 + random.random() * 40,
-                    "wind_speed": random.random() * 15,
-                    "date": f"2024-07-{20+i:02d}",
+                    "latitude": lat,
+                    "longitude": lng,
+                    "temperature": point["temp_f"],
+                    "condition": point["condition"],
+                    "icon": point["icon"],
+                    "humidity": point["humidity"],
+                    "wind_speed": point["wind_mph"],
+                    "precipitation_chance": point["precipitation_chance"],
+                    "date": point_date(point),
+                    "hourly": points,
                 }
-                forecasts.append(forecast)
-            except ValueError:
-                continue
+            )
 
         return Response({"forecasts": forecasts})
+
+
+class TripWeatherView(generics.GenericAPIView):
+    """Get the forecast at each of a trip's stops for when it is reached."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip, access = get_trip_with_access(request, trip_id)
+        if not access.allows(request.method):
+            return Response(
+                {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            timeline = trip_weather(trip)
+        except WeatherUnavailable as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        return Response(
+            {"trip_id": trip.id, "start_date": trip.start_date, "stops": timeline}
+        )
+
+
+class TripHazardsView(generics.GenericAPIView):
+    """Get the stretches of a trip's route forecast to have hazardous weather."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip, access = get_trip_with_access(request, trip_id)
+        if not access.allows(request.method):
+            return Response(
+                {"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            overlay = trip_hazards(trip)
+        except WeatherUnavailable as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        return Response({"trip_id": trip.id, **overlay})
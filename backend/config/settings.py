@@ -210,6 +210,86 @@ ALLOWED_HOSTS = [
 GOOGLE_MAPS_API_KEY = config("GOOGLE_MAPS_API_KEY", default="")
 OPENWEATHER_API_KEY = config("OPENWEATHER_API_KEY", default="")
 
+# Weather provider: "openweather", "stub" (deterministic local data), or empty
+# to use OpenWeather when OPENWEATHER_API_KEY is set and the stub otherwise
+WEATHER_PROVIDER = config("WEATHER_PROVIDER", default="")
+
+# Seconds to wait for the weather provider, and connections kept open to it
+WEATHER_TIMEOUT = config("WEATHER_TIMEOUT", default=5, cast=float)
+WEATHER_POOL_SIZE = config("WEATHER_POOL_SIZE", default=20, cast=int)
+
+# Seconds a multi-stop forecast waits for the provider before answering with
+# the locations it has
+WEATHER_BATCH_DEADLINE = config("WEATHER_BATCH_DEADLINE", default=8, cast=float)
+
+# Seconds to cache current weather (also keyed by the hour), and to keep a
+# forecast after it was fetched
+WEATHER_CACHE_TIMEOUT = config("WEATHER_CACHE_TIMEOUT", default=3600, cast=int)
+
+# Cache Configuration (Redis when REDIS_CACHE_URL is set, local memory otherwise)
+REDIS_CACHE_URL = config("REDIS_CACHE_URL", default="")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+# Whether every web and Celery process sees the same cache. Caches that other
+# processes must invalidate are off by default without it.
+SHARED_CACHE = bool(REDIS_CACHE_URL)
+
+# Seconds to cache resolved trip permissions across requests (0 disables)
+TRIP_ACCESS_CACHE_TIMEOUT = config("TRIP_ACCESS_CACHE_TIMEOUT", default=0, cast=int)
+
+# Seconds to keep rendered trip responses (0 disables; on by default only with a
+# shared cache, as Celery writes must retire the bodies web processes hold)
+TRIP_RESPONSE_CACHE_TIMEOUT = config(
+    "TRIP_RESPONSE_CACHE_TIMEOUT", default=3600 if SHARED_CACHE else 0, cast=int
+)
+
+# Road graph for offline routing: .ch from build_contraction_hierarchy (fastest),
+# .npz from build_road_graph, or an OSM GeoJSON extract
+ROUTING_GRAPH_PATH = config("ROUTING_GRAPH_PATH", default="")
+
+# Waypoints farther than this many metres from any road cannot be routed
+ROUTING_MAX_SNAP_DISTANCE = config(
+    "ROUTING_MAX_SNAP_DISTANCE", default=5000, cast=float
+)
+
+# Seconds to cache road distance/duration matrix cells
+ROUTE_MATRIX_CACHE_TIMEOUT = config(
+    "ROUTE_MATRIX_CACHE_TIMEOUT", default=7 * 24 * 3600, cast=int
+)
+
+# Seconds to cache isochrone polygons
+ISOCHRONE_CACHE_TIMEOUT = config(
+    "ISOCHRONE_CACHE_TIMEOUT", default=7 * 24 * 3600, cast=int
+)
+
+# Stored routes unused for this many days, or beyond this many in total
+# (least recently used first), are deleted by the evict_stale_routes task
+ROUTE_STORE_MAX_AGE_DAYS = config("ROUTE_STORE_MAX_AGE_DAYS", default=90, cast=int)
+ROUTE_STORE_MAX_ROUTES = config("ROUTE_STORE_MAX_ROUTES", default=50000, cast=int)
+
+# Seconds to wait after a stop write before computing legs, so bursts of
+# edits to one trip share a single task (with a shared cache only)
+TRIP_LEG_COALESCE_SECONDS = config("TRIP_LEG_COALESCE_SECONDS", default=5, cast=int)
+
+# Seconds to keep public trip map tiles in the cache, and a directory to also
+# keep them on local disk (empty disables the disk cache). Tiles are only
+# cached with a shared cache.
+TRIP_TILE_CACHE_TIMEOUT = config(
+    "TRIP_TILE_CACHE_TIMEOUT", default=24 * 3600, cast=int
+)
+TRIP_TILE_CACHE_DIR = config("TRIP_TILE_CACHE_DIR", default="")
+
 # Custom User Model
 AUTH_USER_MODEL = "authentication.User"
 
@@ -0,0 +1,50 @@
+"""
+Hit and miss counters kept in the Django cache.
+
+Counting in the shared cache rather than in process memory makes the hit
+rate cover every worker.
+"""
+
+from django.core.cache import cache
+
+
+def incr(key, delta=1):
+    """Add ``delta`` to a counter that never expires, creating it if needed."""
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # The counter was evicted between the add and the increment
+        cache.set(key, delta, None)
+        return delta
+
+
+class HitCounter:
+    """
+    Hits and misses of one cache.
+
+    Args:
+        prefix (str): Cache key prefix of the two counters
+    """
+
+    def __init__(self, prefix):
+        self.hits_key = f"{prefix}:hits"
+        self.misses_key = f"{prefix}:misses"
+
+    def record(self, hits=0, misses=0):
+        if hits:
+            incr(self.hits_key, hits)
+        if misses:
+            incr(self.misses_key, misses)
+
+    def stats(self):
+        """Return the hit/miss counters and the hit rate."""
+        counts = cache.get_many([self.hits_key, self.misses_key])
+        hits = counts.get(self.hits_key, 0)
+        misses = counts.get(self.misses_key, 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
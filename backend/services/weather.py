@@ -0,0 +1,454 @@
+"""
+Weather service for current conditions and forecasts.
+
+Readings come from a provider: OpenWeather when ``OPENWEATHER_API_KEY`` is
+set, or a deterministic local stub otherwise (and in tests). Every reading is
+normalized to the same point shape. Locations are rounded to
+``WEATHER_PRECISION`` decimal places, so nearby lookups share one upstream
+call: current conditions are cached per location and hour, and forecasts are
+kept packed in the ``weather_grid`` store until they are
+``WEATHER_CACHE_TIMEOUT`` seconds old.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import weather_grid
+
+logger = logging.getLogger(__name__)
+
+# Decimal places kept when keying cached readings (2 ~= 1.1 km)
+WEATHER_PRECISION = 2
+
+# Hours covered by a forecast, and the step between its points
+FORECAST_HOURS = 120
+FORECAST_STEP_HOURS = 3
+
+CONDITIONS = [
+    "Clear",
+    "Partly Cloudy",
+    "Overcast",
+    "Light Rain",
+    "Rain",
+    "Thunderstorm",
+]
+ICONS = {
+    "Clear": "01d",
+    "Partly Cloudy": "02d",
+    "Overcast": "04d",
+    "Light Rain": "10d",
+    "Rain": "09d",
+    "Thunderstorm": "11d",
+}
+
+
+class WeatherUnavailable(Exception):
+    """The weather provider could not be reached or gave an unusable answer."""
+
+
+def current_hour(now=None):
+    """Hours since the epoch, for keying readings."""
+    return int((time.time() if now is None else now) // 3600)
+
+
+def quantize(lat, lon):
+    """Round a location to ``WEATHER_PRECISION`` decimal places."""
+    return round(lat, WEATHER_PRECISION), round(lon, WEATHER_PRECISION)
+
+
+def format_location(lat, lon):
+    """A quantized location as text, for keys and seeds."""
+    return f"{lat:.{WEATHER_PRECISION}f},{lon:.{WEATHER_PRECISION}f}"
+
+
+def point_date(point):
+    """ISO date (UTC) of a weather point."""
+    return datetime.fromtimestamp(point["time"], tz=timezone.utc).date().isoformat()
+
+
+class StubWeatherProvider:
+    """
+    Plausible weather derived from the location and hour alone.
+
+    The same location and hour always give the same reading, with a daily
+    temperature cycle, so tests and offline development see stable data.
+    """
+
+    name = "stub"
+
+    def current(self, lat, lon, hour):
+        return self._point(lat, lon, hour)
+
+    def forecast(self, lat, lon, hour):
+        return [
+            self._point(lat, lon, hour + step)
+            for step in range(0, FORECAST_HOURS, FORECAST_STEP_HOURS)
+        ]
+
+    def _point(self, lat, lon, hour):
+        rng = random.Random(f"{format_location(lat, lon)}:{hour}")
+        # Warmest mid-afternoon local solar time, cooler away from the equator
+        local_hour = (hour + lon / 15) % 24
+        daily = math.cos((local_hour - 15) / 24 * 2 * math.pi)
+        temperature = 80 - 0.5 * abs(lat) + 10 * daily + rng.uniform(-3, 3)
+        condition = rng.choices(CONDITIONS, weights=[30, 25, 20, 12, 8, 5])[0]
+        wet = CONDITIONS.index(condition) >= 3
+        return {
+            "time": hour * 3600,
+            "temp_f": round(temperature, 1),
+            "condition": condition,
+            "icon": ICONS[condition],
+            "humidity": round(rng.uniform(60, 95) if wet else rng.uniform(25, 70)),
+            "wind_mph": round(rng.uniform(0, 25 if wet else 15), 1),
+            "precipitation_chance": round(rng.uniform(0.5, 1.0), 2) if wet else 0.0,
+            "precipitation_mm": round(rng.uniform(0.2, 8.0), 1) if wet else 0.0,
+        }
+
+
+class OpenWeatherProvider:
+    """OpenWeather current weather and 5 day / 3 hour forecast."""
+
+    name = "openweather"
+    base_url = "https://api.openweathermap.org/data/2.5"
+
+    def __init__(self, api_key, timeout=5.0, pool_size=20):
+        self.api_key = api_key
+        self.timeout = timeout
+        # One pooled session, so repeat calls reuse kept-alive connections
+        self.session = requests.Session()
+        retries = Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_maxsize=pool_size, max_retries=retries),
+        )
+
+    def current(self, lat, lon, hour):
+        return self._point(self._get("weather", lat, lon))
+
+    def forecast(self, lat, lon, hour):
+        data = self._get("forecast", lat, lon)
+        return [self._point(item) for item in data.get("list", [])]
+
+    def _get(self, path, lat, lon):
+        params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": "imperial"}
+        try:
+            response = self.session.get(
+                f"{self.base_url}/{path}", params=params, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"OpenWeather {path} request failed: {str(e)}")
+            raise WeatherUnavailable("Weather provider is unavailable") from e
+
+    @staticmethod
+    def _point(item):
+        """Normalize a current-weather or forecast item."""
+        try:
+            main = item["main"]
+            weather = (item.get("weather") or [{}])[0]
+            precipitation = sum(
+                (item.get(kind) or {}).get(window, 0)
+                for kind in ("rain", "snow")
+                for window in ("1h", "3h")
+            )
+            return {
+                "time": int(item["dt"]),
+                "temp_f": round(float(main["temp"]), 1),
+                "condition": weather.get("description", "").capitalize()
+                or weather.get("main", ""),
+                "icon": weather.get("icon", ""),
+                "humidity": main.get("humidity"),
+                "wind_mph": round(float((item.get("wind") or {}).get("speed", 0)), 1),
+                "precipitation_chance": float(item.get("pop", 0)),
+                "precipitation_mm": round(float(precipitation), 1),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise WeatherUnavailable("Weather provider sent an unexpected reply") from e
+
+
+_providers = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    The configured weather provider.
+
+    ``WEATHER_PROVIDER`` picks one explicitly; when empty, OpenWeather is used
+    if ``OPENWEATHER_API_KEY`` is set and the stub otherwise. Providers are
+    kept for the life of the process so their connection pools are reused.
+    """
+    name = settings.WEATHER_PROVIDER or (
+        "openweather" if settings.OPENWEATHER_API_KEY else "stub"
+    )
+    if name not in _providers:
+        if name == "openweather":
+            if not settings.OPENWEATHER_API_KEY:
+                raise WeatherUnavailable("OpenWeather API key not configured")
+            _providers[name] = OpenWeatherProvider(
+                settings.OPENWEATHER_API_KEY,
+                timeout=settings.WEATHER_TIMEOUT,
+                pool_size=settings.WEATHER_POOL_SIZE,
+            )
+        elif name == "stub":
+            logger.warning("Using stub weather provider")
+            _providers[name] = StubWeatherProvider()
+        else:
+            raise WeatherUnavailable(f"Unknown weather provider: {name}")
+    return _providers[name]
+
+
+def get_executor():
+    """
+    Threads shared by batch fetches, one per pooled provider connection.
+
+    A process-wide pool bounds concurrent upstream calls across requests and
+    saves starting threads for every batch.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.WEATHER_POOL_SIZE,
+                thread_name_prefix="weather",
+            )
+        return _executor
+
+
+class WeatherService:
+    """Cached access to the configured weather provider."""
+
+    def get_current(self, latitude, longitude):
+        """
+        Current conditions at a location.
+
+        Args:
+            latitude (float): Latitude
+            longitude (float): Longitude
+
+        Returns:
+            dict: Weather point
+
+        Raises:
+            WeatherUnavailable: If the provider fails
+        """
+        return self._cached("current", latitude, longitude)
+
+    def get_forecast(self, latitude, longitude):
+        """
+        Forecast points at a location, earliest first.
+
+        Args:
+            latitude (float): Latitude
+            longitude (float): Longitude
+
+        Returns:
+            list: Weather points about ``FORECAST_STEP_HOURS`` apart
+
+        Raises:
+            WeatherUnavailable: If the provider fails
+        """
+        forecast = self.get_forecasts([(latitude, longitude)])[0]
+        if forecast is None:
+            raise WeatherUnavailable("Weather provider is unavailable")
+        return forecast
+
+    def get_forecasts(self, locations, deadline=None):
+        """
+        Forecasts for many locations with at most one upstream call per cell.
+
+        Locations in the same grid cell (see ``quantize``) share one forecast.
+        The cells missing from the grid store are fetched concurrently, and
+        any still outstanding after ``deadline`` seconds are given up on.
+
+        Args:
+            locations (list): ``(latitude, longitude)`` pairs
+            deadline (float): Seconds to wait for the provider; defaults to
+                ``WEATHER_BATCH_DEADLINE``
+
+        Returns:
+            list: Forecast per location, in order, or ``None`` where the
+            provider failed or ran out of time
+
+        Raises:
+            WeatherUnavailable: If no provider is configured
+        """
+        cells = [quantize(lat, lon) for lat, lon in locations]
+        records = self.get_forecast_records(cells, deadline)
+        decoded = {cell: weather_grid.decode(r) for cell, r in records.items()}
+        return [decoded.get(cell) for cell in cells]
+
+    def get_forecasts_at(self, locations, times, deadline=None):
+        """
+        The forecast point nearest a time at each location.
+
+        Points are picked with one vectorized ``weather_grid.lookup`` over
+        the packed forecasts, without decoding them.
+
+        Args:
+            locations (list): ``(latitude, longitude)`` pairs
+            times (list): Aware datetime for each location
+            deadline (float): As for ``get_forecasts``
+
+        Returns:
+            tuple: ``(points, available)``: the point per location, or
+            ``None`` if its time is outside the forecast or its forecast is
+            unavailable; and whether each location's forecast was available
+
+        Raises:
+            WeatherUnavailable: If no provider is configured
+        """
+        cells = [quantize(lat, lon) for lat, lon in locations]
+        records = self.get_forecast_records(cells, deadline)
+        available = [cell in records for cell in cells]
+        queries = [i for i, ok in enumerate(available) if ok]
+        points = [None] * len(cells)
+        if not queries:
+            return points, available
+
+        order = list(records)
+        index = {cell: i for i, cell in enumerate(order)}
+        found = weather_grid.lookup_points(
+            [records[cell] for cell in order],
+            [index[cells[i]] for i in queries],
+            [times[i].timestamp() for i in queries],
+        )
+        for i, point in zip(queries, found):
+            points[i] = point
+        return points, available
+
+    def get_forecast_records(self, cells, deadline=None):
+        """
+        Packed forecasts (see ``weather_grid``) for grid cells.
+
+        Records are read from the grid store, and cells missing from it are
+        fetched as one concurrent batch and stored.
+
+        Args:
+            cells (list): ``(latitude, longitude)`` cell keys, already rounded
+            deadline (float): As for ``get_forecasts``
+
+        Returns:
+            dict: Record per distinct cell, without cells whose forecast is
+            unavailable
+
+        Raises:
+            WeatherUnavailable: If no provider is configured
+        """
+        provider = get_provider()
+        store = weather_grid.WeatherGridStore(settings.WEATHER_CACHE_TIMEOUT)
+        distinct = list(dict.fromkeys(cells))
+        records = store.get_many(provider.name, distinct)
+
+        missing = [cell for cell in distinct if cell not in records]
+        if missing:
+            records.update(self._fetch_records(provider, store, missing, deadline))
+        return records
+
+    def refresh_forecasts(self, cells, fresh_for, deadline=None):
+        """
+        Refetch the forecasts of cells that are missing or about to go stale.
+
+        Args:
+            cells (list): ``(latitude, longitude)`` cell keys, already rounded
+            fresh_for (float): Seconds a stored forecast must stay usable for
+                to be kept
+            deadline (float): As for ``get_forecasts``
+
+        Returns:
+            int: Cells fetched and stored
+
+        Raises:
+            WeatherUnavailable: If no provider is configured
+        """
+        provider = get_provider()
+        store = weather_grid.WeatherGridStore(settings.WEATHER_CACHE_TIMEOUT)
+        distinct = list(dict.fromkeys(cells))
+        # Records that will be stale by then count as missing
+        lasting = store.get_many(provider.name, distinct, now=time.time() + fresh_for)
+        stale = [cell for cell in distinct if cell not in lasting]
+        if not stale:
+            return 0
+        return len(self._fetch_records(provider, store, stale, deadline))
+
+    def _fetch_records(self, provider, store, cells, deadline):
+        """Fetch, pack and store forecasts for ``cells``; return the records."""
+        issued = time.time()
+        records = {}
+        for cell, points in self._fetch_forecasts(
+            provider, cells, current_hour(issued), deadline
+        ).items():
+            try:
+                records[cell] = weather_grid.encode(points, issued)
+            except ValueError as e:
+                # An irregular reply leaves the cell unavailable, like a failed
+                # fetch
+                logger.warning(f"Unusable {provider.name} forecast for {cell}: {e}")
+        store.set_many(provider.name, records)
+        return records
+
+    def _fetch_forecasts(self, provider, cells, hour, deadline):
+        """Fetch forecasts for ``cells`` in parallel, keeping those that arrive."""
+        if deadline is None:
+            deadline = settings.WEATHER_BATCH_DEADLINE
+        executor = get_executor()
+        futures = {
+            executor.submit(provider.forecast, lat, lon, hour): (lat, lon)
+            for lat, lon in cells
+        }
+        done, pending = wait(futures, timeout=deadline)
+        for future in pending:
+            future.cancel()
+
+        forecasts = {}
+        for future in done:
+            try:
+                forecasts[futures[future]] = future.result()
+            except WeatherUnavailable:
+                pass
+        logger.debug(
+            f"Fetched {len(forecasts)} of {len(cells)} forecast cell(s) from "
+            f"{provider.name}, {len(pending)} timed out"
+        )
+        return forecasts
+
+    def _cached(self, kind, latitude, longitude):
+        provider = get_provider()
+        lat, lon = quantize(latitude, longitude)
+        hour = current_hour()
+        cache_key = self._get_cache_key(provider.name, kind, lat, lon, hour)
+        data = cache.get(cache_key)
+        if data is not None:
+            return data
+
+        data = getattr(provider, kind)(lat, lon, hour)
+        cache.set(cache_key, data, settings.WEATHER_CACHE_TIMEOUT)
+        logger.debug(f"Fetched {kind} weather for {lat},{lon} from {provider.name}")
+        return data
+
+    def _get_cache_key(self, provider, kind, lat, lon, hour):
+        """Generate cache key for a reading."""
+        return f"weather:{provider}:{kind}:{format_location(lat, lon)}:{hour}"
+
+
+# Global instance
+weather_service = WeatherService()
@@ -0,0 +1,248 @@
+"""
+Compact binary storage for per-cell weather forecasts.
+
+A cell's forecast is packed into one ``bytes`` record instead of a list of
+JSON-like dicts, which is over 10 times smaller in the cache:
+
+- ``HEADER``: magic, issue time, first point time and step (unix seconds),
+  point count and the size of the label table
+- label table: distinct ``condition<TAB>icon`` pairs, newline separated
+- values: ``(count, len(FIELDS))`` little-endian int16, scaled per field,
+  ``MISSING`` where a reading is absent
+- codes: one uint8 per point indexing the label table, ``NO_LABEL`` if none
+
+Points sit on a regular time grid, so ``lookup`` answers many
+``(cell, time)`` queries at once with array arithmetic over the records'
+concatenated value blocks. Records carry the time they were issued, and
+``WeatherGridStore`` treats any older than its max age as missing.
+"""
+
+import struct
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+MAGIC = b"WXG1"
+HEADER = struct.Struct("<4sqqIHH")
+
+# (point key, scale) of every stored reading
+FIELDS = (
+    ("temp_f", 10),
+    ("precipitation_mm", 10),
+    ("wind_mph", 10),
+    ("precipitation_chance", 1000),
+    ("humidity", 1),
+)
+MISSING = -32768
+NO_LABEL = 255
+
+VALUE_DTYPE = np.dtype("<i2")
+
+
+def encode(points, issued):
+    """
+    Pack forecast points into a record.
+
+    Args:
+        points (list): Weather points, earliest first and evenly spaced
+        issued (float): Unix time the forecast was fetched
+
+    Returns:
+        bytes: The record
+
+    Raises:
+        ValueError: If the points are not on a regular time grid
+    """
+    times = np.array([point["time"] for point in points], dtype=np.int64)
+    start = int(times[0]) if len(times) else 0
+    step = int(times[1] - times[0]) if len(times) > 1 else 3600
+    if step <= 0 or np.any((times - start) % step):
+        raise ValueError("Forecast points are not evenly spaced")
+    slots = (times - start) // step
+    count = int(slots[-1]) + 1 if len(slots) else 0
+
+    values = np.full((count, len(FIELDS)), MISSING, dtype=VALUE_DTYPE)
+    codes = np.full(count, NO_LABEL, dtype=np.uint8)
+    labels = {}
+    for slot, point in zip(slots, points):
+        for column, (name, scale) in enumerate(FIELDS):
+            if point.get(name) is not None:
+                values[slot, column] = round(point[name] * scale)
+        label = f"{point.get('condition', '')}\t{point.get('icon', '')}"
+        codes[slot] = labels.setdefault(label, len(labels))
+    if len(labels) >= NO_LABEL:
+        raise ValueError("Too many distinct conditions in one forecast")
+
+    table = "\n".join(labels).encode("utf-8")
+    header = HEADER.pack(MAGIC, int(issued), start, step, count, len(table))
+    return header + table + values.tobytes() + codes.tobytes()
+
+
+def _unpack(record):
+    """Header fields, labels, values and codes of a record."""
+    magic, issued, start, step, count, table_size = HEADER.unpack_from(record)
+    if magic != MAGIC:
+        raise ValueError("Not a weather grid record")
+    offset = HEADER.size
+    table = record[offset:offset + table_size].decode("utf-8")
+    labels = [label.split("\t") for label in table.split("\n")] if table else []
+    offset += table_size
+    values = np.frombuffer(
+        record, dtype=VALUE_DTYPE, count=count * len(FIELDS), offset=offset
+    ).reshape(count, len(FIELDS))
+    codes = np.frombuffer(
+        record, dtype=np.uint8, count=count, offset=offset + values.nbytes
+    )
+    return issued, start, step, labels, values, codes
+
+
+def issued_at(record):
+    """Unix time a record's forecast was fetched."""
+    return HEADER.unpack_from(record)[1]
+
+
+def _points(times, readings, labels):
+    """
+    Weather points from times, a row of readings each (NaN if missing) and
+    ``(condition, icon)`` labels.
+    """
+    names = [name for name, _ in FIELDS]
+    points = []
+    for time_, row, (condition, icon) in zip(times, readings.tolist(), labels):
+        point = {"time": int(time_)}
+        # NaN is the only value not equal to itself
+        point.update(
+            (name, value if value == value else None) for name, value in zip(names, row)
+        )
+        if point["humidity"] is not None:
+            point["humidity"] = int(point["humidity"])
+        point["condition"] = condition
+        point["icon"] = icon
+        points.append(point)
+    return points
+
+
+def decode(record):
+    """
+    Unpack a record into weather points, earliest first.
+
+    Grid slots with no reading are left out.
+    """
+    _, start, step, labels, values, codes = _unpack(record)
+    scales = np.array([scale for _, scale in FIELDS], dtype=np.float64)
+    slots = np.flatnonzero(codes != NO_LABEL)
+    readings = np.where(values == MISSING, np.nan, values / scales)[slots]
+    return _points(
+        (start + slots * step).tolist(),
+        readings,
+        [labels[code] for code in codes[slots].tolist()],
+    )
+
+
+def lookup(records, which, times, labels=True):
+    """
+    Readings nearest many times across many records, vectorized.
+
+    Args:
+        records (list): Records from ``encode``
+        which (ndarray): Index into ``records`` for each query
+        times (ndarray): Unix time for each query
+        labels (bool): Whether to resolve ``labels``, a Python-level step
+            that dominates large lookups which only need the readings
+
+    Returns:
+        dict: ``found`` (bool), ``time`` (int64 time of the matched point)
+        and a float array per reading in ``FIELDS`` (NaN where missing) and
+        ``labels`` (``(condition, icon)`` or ``None``; only if asked for),
+        all one per query.
+        A query is found when it is within half a step of a stored point.
+    """
+    which = np.asarray(which, dtype=np.int64)
+    times = np.asarray(times, dtype=np.float64)
+    unpacked = [_unpack(record) for record in records]
+
+    start = np.array([u[1] for u in unpacked], dtype=np.int64)
+    step = np.array([u[2] for u in unpacked], dtype=np.int64)
+    count = np.array([len(u[4]) for u in unpacked], dtype=np.int64)
+    first_row = np.concatenate([[0], np.cumsum(count)[:-1]]).astype(np.int64)
+    values = np.concatenate(
+        [u[4] for u in unpacked] + [np.zeros((1, len(FIELDS)), VALUE_DTYPE)]
+    )
+    codes = np.concatenate([u[5] for u in unpacked] + [np.array([NO_LABEL], np.uint8)])
+
+    slot = np.rint((times - start[which]) / step[which]).astype(np.int64)
+    found = (slot >= 0) & (slot < count[which])
+    # Queries off the grid read the spare row after the last record
+    rows = np.where(found, first_row[which] + slot, len(values) - 1)
+    found &= codes[rows] != NO_LABEL
+
+    result = {"found": found, "time": start[which] + slot * step[which]}
+    picked = values[rows]
+    for column, (name, scale) in enumerate(FIELDS):
+        column_values = picked[:, column]
+        result[name] = np.where(
+            found & (column_values != MISSING), column_values / scale, np.nan
+        )
+    if labels:
+        result["labels"] = [
+            tuple(unpacked[record][3][code]) if ok else None
+            for record, code, ok in zip(which.tolist(), codes[rows].tolist(), found)
+        ]
+    return result
+
+
+def lookup_points(records, which, times):
+    """
+    Like ``lookup``, but as a weather point (or ``None``) per query.
+    """
+    result = lookup(records, which, times)
+    found = np.flatnonzero(result["found"])
+    readings = np.column_stack([result[name][found] for name, _ in FIELDS])
+    points = [None] * len(result["found"])
+    matched = _points(
+        result["time"][found].tolist(),
+        readings,
+        [result["labels"][i] for i in found.tolist()],
+    )
+    for i, point in zip(found.tolist(), matched):
+        points[i] = point
+    return points
+
+
+class WeatherGridStore:
+    """
+    Forecast records in the Django cache, one per provider and grid cell.
+
+    Args:
+        max_age (int): Seconds after issue a forecast stays usable
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+
+    def key(self, provider, cell):
+        lat, lon = cell
+        return f"weather-grid:{provider}:{lat},{lon}"
+
+    def get_many(self, provider, cells, now=None):
+        """Fresh records for ``cells``, keyed by cell; stale ones are left out."""
+        now = time.time() if now is None else now
+        keys = {self.key(provider, cell): cell for cell in cells}
+        found = cache.get_many(list(keys))
+        return {
+            keys[key]: record
+            for key, record in found.items()
+            if now - issued_at(record) < self.max_age
+        }
+
+    def set_many(self, provider, records, now=None):
+        """Store records keyed by cell until their forecasts go stale."""
+        now = time.time() if now is None else now
+        by_expiry = {}
+        for cell, record in records.items():
+            timeout = int(issued_at(record) + self.max_age - now)
+            if timeout > 0:
+                by_expiry.setdefault(timeout, {})[self.key(provider, cell)] = record
+        for timeout, batch in by_expiry.items():
+            cache.set_many(batch, timeout)
@@ -0,0 +1,60 @@
+"""Benchmark: listing accessible trips for a user with 10k shared trips."""
+
+import pytest
+from django.db import models
+
+from apps.trips.models import Trip, TripAccessEntry, TripShare
+
+SHARED_TRIPS = 10_000
+
+
+@pytest.fixture
+def heavily_shared_user(user, second_user):
+    Trip.objects.bulk_create(
+        Trip(user=second_user, name=f"Shared {i}", route_type="fastest")
+        for i in range(SHARED_TRIPS)
+    )
+    trip_ids = list(Trip.objects.filter(user=second_user).values_list("id", flat=True))
+
+    # bulk_create skips signals, so index the rows the same way they would be
+    TripShare.objects.bulk_create(
+        TripShare(trip_id=trip_id, shared_with=user, shared_by=second_user)
+        for trip_id in trip_ids
+    )
+    TripAccessEntry.objects.bulk_create(
+        [
+            TripAccessEntry(user=second_user, trip_id=trip_id, permission_level="owner")
+            for trip_id in trip_ids
+        ]
+        + [
+            TripAccessEntry(user=user, trip_id=trip_id, permission_level="view")
+            for trip_id in trip_ids
+        ],
+        batch_size=1000,
+    )
+    return user
+
+
+@pytest.mark.django_db
+def test_list_accessible_trip_ids(bench, heavily_shared_user):
+    user = heavily_shared_user
+
+    def join_distinct():
+        return list(
+            Trip.objects.filter(
+                models.Q(user=user)
+                | models.Q(shares__shared_with=user, shares__is_active=True)
+            )
+            .distinct()
+            .values_list("id", flat=True)
+        )
+
+    def access_index():
+        return list(
+            Trip.objects.filter(access_entries__user=user).values_list("id", flat=True)
+        )
+
+    before = bench("owner/share OR + DISTINCT", join_distinct)
+    after = bench("access index lookup", access_index)
+    assert sorted(before) == sorted(after)
+    assert len(after) == SHARED_TRIPS
@@ -0,0 +1,78 @@
+"""
+Benchmark: contraction hierarchy preprocessing and random O/D queries.
+
+Compares per-query latency of the memory-mapped hierarchy against A* on a
+plain 100x100 grid, which is close to a worst case for hierarchies, and on
+a 50x50 grid with OSM-like shape nodes along every segment.
+"""
+
+import statistics
+import time
+
+import numpy as np
+import pytest
+
+from apps.routes.ch import ContractionHierarchy, build_hierarchy
+from apps.routes.engine import path_leg, shortest_path
+
+QUERIES = 1000
+
+GRIDS = {
+    "grid 100x100": {"size": 100},
+    "grid 50x50, 3 shape nodes per segment": {"size": 50, "shape_nodes": 3},
+}
+
+
+@pytest.fixture(scope="module", params=list(GRIDS))
+def network(request, make_grid_graph, tmp_path_factory):
+    graph = make_grid_graph(**GRIDS[request.param])
+    started = time.perf_counter()
+    hierarchy = build_hierarchy(graph)
+    print(
+        f"\n{request.param}: built in {time.perf_counter() - started:.1f} s, "
+        f"{graph.num_nodes} nodes, {graph.num_edges} edges -> "
+        f"{hierarchy.num_edges} upward edges"
+    )
+    path = tmp_path_factory.mktemp("ch") / "grid.ch"
+    hierarchy.save(path)
+    return graph, path
+
+
+def _latencies(func, pairs):
+    timings = []
+    for source, target in pairs:
+        start = time.perf_counter()
+        func(source, target)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return (
+        f"median {statistics.median(timings):.3f} ms, "
+        f"p95 {timings[int(len(timings) * 0.95)]:.3f} ms"
+    )
+
+
+def test_random_pairs(network):
+    graph, path = network
+    hierarchy = ContractionHierarchy.load(path)
+    rng = np.random.default_rng(3)
+    pairs = rng.integers(0, graph.num_nodes, size=(QUERIES, 2)).tolist()
+
+    print(f"CH query, cold: {_latencies(hierarchy.route_leg, pairs)}")
+    print(f"CH query (search only): {_latencies(hierarchy._meet, pairs)}")
+    print(f"CH query (with geometry): {_latencies(hierarchy.route_leg, pairs)}")
+    print(
+        "A* query: " + _latencies(lambda s, t: shortest_path(graph, s, t), pairs[:50])
+    )
+
+    # The hierarchy must agree with A* on every sampled pair
+    for source, target in pairs[:50]:
+        expected = path_leg(graph, shortest_path(graph, source, target))
+        leg = hierarchy.route_leg(source, target)
+        assert leg.duration == pytest.approx(expected.duration, rel=1e-4)
+        assert leg.nodes[0] == source and leg.nodes[-1] == target
+
+
+def test_load_time(bench, network):
+    _, path = network
+    hierarchy = bench("memory-map hierarchy", lambda: ContractionHierarchy.load(path))
+    assert hierarchy.num_nodes > 0
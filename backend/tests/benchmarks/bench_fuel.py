@@ -0,0 +1,44 @@
+"""Benchmark: fuel stop planning along a long route with many stations."""
+
+import numpy as np
+import pytest
+
+from apps.trips.fuel import choose_stops, project_onto_route
+
+ROUTE_POINTS = 5000
+STATIONS = 2000
+RANGE_M = 300 * 1609.344
+
+
+@pytest.fixture(scope="module")
+def route():
+    lon = np.linspace(-120.0, -75.0, ROUTE_POINTS)
+    lat = 38.0 + 2.0 * np.sin(np.radians(lon * 8))
+    return np.column_stack([lat, lon])
+
+
+@pytest.fixture(scope="module")
+def stations(route):
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, len(route), STATIONS)
+    return route[picks] + rng.normal(0, 0.02, (STATIONS, 2))
+
+
+def test_projection(bench, route, stations):
+    along, offset = bench(
+        f"project {STATIONS} stations onto {ROUTE_POINTS}-point route",
+        lambda: project_onto_route(route, stations),
+        rounds=3,
+    )
+    print(f"median offset {np.median(offset):.0f} m")
+
+
+def test_stop_choice(bench, route, stations):
+    along, offset = project_onto_route(route, stations)
+    length = along.max() + 1000
+    stops = bench(
+        f"choose stops among {STATIONS} stations",
+        lambda: choose_stops(along, offset, length, RANGE_M * 0.9, RANGE_M * 0.9),
+        rounds=3,
+    )
+    print(f"{len(stops)} stop(s) over {length / 1609.344:.0f} miles")
@@ -0,0 +1,42 @@
+"""
+Benchmark: route geometry levels for a long trip.
+
+Times polyline decoding and level building for a 50,000-point route (about
+what a cross-country Mapbox ``overview=full`` route carries) and compares
+the size of the full line with each stored level.
+"""
+
+import numpy as np
+import pytest
+
+from apps.routes.geometry import build_levels, decode_polyline, encode_polyline
+
+POINTS = 50000
+
+
+@pytest.fixture(scope="module")
+def encoded_route():
+    rng = np.random.default_rng(5)
+    lon = np.linspace(-122.4, -74.0, POINTS)
+    lat = 37.8 + np.cumsum(rng.normal(0, 0.0005, POINTS)) + 2 * np.sin(lon / 3)
+    return encode_polyline(np.column_stack([lat, lon]))
+
+
+def test_decode(bench, encoded_route):
+    points = bench(f"decode {POINTS} points", lambda: decode_polyline(encoded_route))
+    assert len(points) == POINTS
+
+
+def test_build_levels(bench, encoded_route):
+    levels, _ = bench(
+        f"build levels for {POINTS} points",
+        lambda: build_levels(encoded_route),
+        rounds=3,
+    )
+    print(f"full: {len(encoded_route) / 1024:.0f} KiB")
+    for zoom in sorted(levels, key=int):
+        print(
+            f"zoom {zoom}: {len(levels[zoom]) / 1024:.1f} KiB, "
+            f"{len(decode_polyline(levels[zoom]))} points"
+        )
+    assert len(levels["10"]) < len(encoded_route) / 10
@@ -0,0 +1,88 @@
+"""Benchmark: route hazard evaluation across many trips at once and one by one."""
+
+import numpy as np
+import pytest
+
+from apps.weather import hazards
+from services.weather import StubWeatherProvider, weather_service
+from services.weather_grid import encode
+
+TRIPS = 10_000
+SAMPLES_PER_TRIP = 60
+PER_TRIP_SUBSET = 500
+HOUR = 500_000
+
+
+@pytest.fixture(scope="module")
+def samples():
+    """Straight 300 km routes across a 5 degree box, driven at 60 km/h."""
+    rng = np.random.default_rng(3)
+    start = rng.uniform([-3.0, 34.0], [2.0, 39.0], (TRIPS, 2))
+    heading = rng.uniform(0, 2 * np.pi, TRIPS)
+    steps = np.arange(SAMPLES_PER_TRIP) * 0.045
+    lat = start[:, :1] + np.sin(heading)[:, None] * steps
+    lon = start[:, 1:] + np.cos(heading)[:, None] * steps
+    departure = HOUR * 3600 + rng.uniform(0, 72 * 3600, TRIPS)
+    times = departure[:, None] + np.arange(SAMPLES_PER_TRIP) * 300.0
+    return hazards.RouteSamples(
+        trip_ids=np.repeat(np.arange(TRIPS), SAMPLES_PER_TRIP),
+        lat=lat.ravel(),
+        lon=lon.ravel(),
+        along=np.tile(np.arange(SAMPLES_PER_TRIP) * 5000.0, TRIPS),
+        times=times.ravel(),
+    )
+
+
+@pytest.fixture(scope="module")
+def records(samples):
+    cells = np.unique(
+        np.round(np.column_stack([samples.lat, samples.lon]), hazards.HAZARD_PRECISION),
+        axis=0,
+    )
+    stub = StubWeatherProvider()
+    return {
+        (float(lat), float(lon)): encode(stub.forecast(lat, lon, HOUR), 0)
+        for lat, lon in cells
+    }
+
+
+@pytest.fixture
+def warm_cache(monkeypatch, records):
+    """Serve every cell from memory, as after the refresher has run."""
+    monkeypatch.setattr(
+        weather_service,
+        "get_forecast_records",
+        lambda cells, deadline=None: {cell: records[cell] for cell in cells},
+    )
+
+
+def evaluate_all(samples):
+    return hazards.hazard_segments(samples, hazards.evaluate(samples))
+
+
+def test_vectorized(bench, warm_cache, samples, records):
+    segments = bench(
+        f"evaluate {TRIPS} trips ({len(samples.lat)} samples, "
+        f"{len(records)} cells) at once",
+        lambda: evaluate_all(samples),
+        rounds=3,
+    )
+    print(f"{len(segments)} hazard segments")
+
+
+def test_per_trip(bench, warm_cache, samples):
+    count = PER_TRIP_SUBSET * SAMPLES_PER_TRIP
+    trips = [
+        hazards.RouteSamples(
+            *(
+                getattr(samples, name)[first:first + SAMPLES_PER_TRIP]
+                for name in ("trip_ids", "lat", "lon", "along", "times")
+            )
+        )
+        for first in range(0, count, SAMPLES_PER_TRIP)
+    ]
+    bench(
+        f"evaluate {PER_TRIP_SUBSET} trips one at a time",
+        lambda: [evaluate_all(trip) for trip in trips],
+        rounds=3,
+    )
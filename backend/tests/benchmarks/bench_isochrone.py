@@ -0,0 +1,33 @@
+"""Benchmark: isochrones on a synthetic 300x300 road grid."""
+
+import pytest
+
+from apps.routes.isochrone import compute_isochrones, travel_times
+
+GRID_SIZE = 300
+THRESHOLDS = [5, 10, 15]
+
+
+@pytest.fixture(scope="module")
+def grid_graph(make_grid_graph):
+    return make_grid_graph(GRID_SIZE)
+
+
+def test_bounded_search(bench, grid_graph):
+    times = bench(
+        f"search to {THRESHOLDS[-1]} min on {GRID_SIZE}x{GRID_SIZE} grid",
+        lambda: travel_times(grid_graph, 45150, THRESHOLDS[-1] * 60),
+        rounds=3,
+    )
+    print(f"reached {int((times < float('inf')).sum())} nodes")
+
+
+def test_isochrones_in_one_pass(bench, grid_graph):
+    features = bench(
+        f"{len(THRESHOLDS)} isochrones from one search",
+        lambda: compute_isochrones(grid_graph, -1.15, 36.95, THRESHOLDS),
+        rounds=3,
+    )
+    for minutes, feature in features.items():
+        rings = feature["geometry"]["coordinates"]
+        print(f"{minutes} min: {len(rings)} polygon(s), {len(rings[0][0])} points")
@@ -0,0 +1,94 @@
+"""
+Benchmark: 100x100 distance/duration matrices.
+
+Estimates are one vectorized haversine pass. Road matrices are timed on a
+100x100 grid graph, both as a plain graph and as a contraction hierarchy,
+against the per-pair queries they replace (sampled and extrapolated), then
+again with every cell already cached.
+"""
+
+import time
+
+import numpy as np
+import pytest
+from django.core.cache import cache
+
+from apps.routes.ch import build_hierarchy
+from apps.routes.engine import route_leg
+from apps.routes.matrix import compute_matrix, estimate_matrix
+
+SIZE = 100
+GRID_SIZE = 100
+SAMPLED_PAIRS = 200
+
+
+@pytest.fixture(scope="module")
+def graph_files(make_grid_graph, tmp_path_factory):
+    graph = make_grid_graph(GRID_SIZE)
+    directory = tmp_path_factory.mktemp("matrix")
+    graph.save(directory / "grid.npz")
+    hierarchy = build_hierarchy(graph)
+    hierarchy.save(directory / "grid.ch")
+    return {
+        "graph": (directory / "grid.npz", graph),
+        "hierarchy": (directory / "grid.ch", hierarchy),
+    }
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(11)
+    span = (GRID_SIZE - 1) * 0.001
+    lat = -1.3 + rng.random(2 * SIZE) * span
+    lon = 36.8 + rng.random(2 * SIZE) * span
+    points = np.column_stack([lat, lon])
+    return points[:SIZE], points[SIZE:]
+
+
+def test_estimate_matrix(bench, points):
+    origins, destinations = points
+    matrix = bench(
+        f"estimate {SIZE}x{SIZE}", lambda: estimate_matrix(origins, destinations)
+    )
+    assert matrix.distance.shape == (SIZE, SIZE)
+
+
+@pytest.mark.parametrize("kind", ["graph", "hierarchy"])
+def test_road_matrix(bench, graph_files, points, settings, kind):
+    path, graph = graph_files[kind]
+    settings.ROUTING_GRAPH_PATH = str(path)
+    # The default local-memory cache culls past 300 entries
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 4 * SIZE * SIZE},
+        }
+    }
+    origins, destinations = points
+
+    sources = [graph.nearest_node(lat, lon, 500)[0] for lat, lon in origins]
+    targets = [graph.nearest_node(lat, lon, 500)[0] for lat, lon in destinations]
+    started = time.perf_counter()
+    for index in range(SAMPLED_PAIRS):
+        route_leg(graph, sources[index % SIZE], targets[index * 7 % SIZE])
+    per_pair = (time.perf_counter() - started) / SAMPLED_PAIRS
+    print(
+        f"\n{kind}: per-pair queries, extrapolated to {SIZE}x{SIZE}: "
+        f"{per_pair * SIZE * SIZE * 1000:.0f} ms"
+    )
+
+    cold = bench(
+        f"{kind}: road {SIZE}x{SIZE}, cold cache",
+        lambda: compute_matrix(origins, destinations, mode="road"),
+        rounds=3,
+        setup=cache.clear,
+    )
+    assert cold.computed_cells == SIZE * SIZE
+    assert not np.isnan(cold.duration).any()
+
+    warm = bench(
+        f"{kind}: road {SIZE}x{SIZE}, warm cache",
+        lambda: compute_matrix(origins, destinations, mode="road"),
+    )
+    assert warm.cached_cells == SIZE * SIZE
+    np.testing.assert_allclose(warm.duration, cold.duration)
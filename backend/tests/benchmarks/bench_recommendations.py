@@ -0,0 +1,44 @@
+"""Benchmark: scoring and MMR ranking of thousands of candidate places."""
+
+import numpy as np
+import pytest
+
+from apps.recommendations.engine import rank, score_candidates
+
+CANDIDATES = 5000
+ORIGIN = (-1.2921, 36.8219)
+TYPES = ["restaurant", "cafe", "bar", "bakery", "meal_takeaway", "food"]
+
+
+@pytest.fixture(scope="module")
+def places():
+    rng = np.random.default_rng(11)
+    lat = ORIGIN[0] + rng.uniform(-0.05, 0.05, CANDIDATES)
+    lon = ORIGIN[1] + rng.uniform(-0.05, 0.05, CANDIDATES)
+    return [
+        {
+            "place_id": f"p{i}",
+            "latitude": float(lat[i]),
+            "longitude": float(lon[i]),
+            "rating": float(rng.uniform(2.5, 5.0)) if i % 7 else None,
+            "user_ratings_total": int(rng.integers(0, 2000)),
+            "price_level": int(rng.integers(0, 5)) if i % 5 else None,
+            "types": list(rng.choice(TYPES, 2, replace=False)),
+        }
+        for i in range(CANDIDATES)
+    ]
+
+
+def test_score(bench, places):
+    bench(
+        f"score {CANDIDATES} candidates",
+        lambda: score_candidates(places, *ORIGIN, 5000, preferred_price=2),
+    )
+
+
+@pytest.mark.parametrize("count", [5, 50])
+def test_rank(bench, places, count):
+    bench(
+        f"rank top {count} of {CANDIDATES} candidates with MMR",
+        lambda: rank(places, *ORIGIN, 5000, count, preferred_price=2),
+    )
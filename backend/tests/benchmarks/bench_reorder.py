@@ -0,0 +1,51 @@
+"""Benchmark: reordering every stop of a 100-stop trip."""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.trips.models import Stop, Trip
+
+STOP_COUNT = 100
+
+
+@pytest.fixture
+def long_trip(user):
+    trip = Trip.objects.create(user=user, name="Long Haul", route_type="fastest")
+    Stop.objects.bulk_create(
+        Stop(
+            trip=trip,
+            name=f"Stop {i}",
+            address=f"Address {i}",
+            latitude=-1.0 - i * 0.01,
+            longitude=36.0 + i * 0.01,
+            order=i,
+            travel_distance_to_next=10.0,
+            travel_time_to_next=0.2,
+        )
+        for i in range(1, STOP_COUNT + 1)
+    )
+    return trip
+
+
+@pytest.mark.django_db
+def test_reverse_100_stops(bench, auth_client, long_trip):
+    url = f"/api/trips/{long_trip.id}/stops/reorder/"
+    ids = list(long_trip.stops.order_by("order").values_list("id", flat=True))
+    payloads = [
+        {"stop_orders": [{"id": i, "order": STOP_COUNT - n} for n, i in enumerate(ids)]},
+        {"stop_orders": [{"id": i, "order": n + 1} for n, i in enumerate(ids)]},
+    ]
+    state = {"round": 0}
+
+    def reorder():
+        payload = payloads[state["round"] % 2]
+        state["round"] += 1
+        return auth_client.post(url, payload, format="json")
+
+    response = bench("reorder 100 stops", reorder, rounds=10)
+    assert response.status_code == 200
+
+    with CaptureQueriesContext(connection) as ctx:
+        reorder()
+    print(f"queries per reorder: {len(ctx.captured_queries)}")
@@ -0,0 +1,44 @@
+"""
+Benchmark: repeated route requests with stored results.
+
+Routes a five-waypoint trip across a 200x200 grid graph from scratch, then
+reads the same request back from the route store.
+"""
+
+import numpy as np
+import pytest
+
+from apps.routes.engine import route
+from apps.routes.models import Route
+from apps.routes.store import get_or_compute_route
+
+GRID_SIZE = 200
+
+
+@pytest.fixture
+def graph_path(make_grid_graph, tmp_path, settings):
+    path = tmp_path / "grid.npz"
+    make_grid_graph(GRID_SIZE).save(path)
+    settings.ROUTING_GRAPH_PATH = str(path)
+    return path
+
+
+@pytest.mark.django_db
+def test_stored_route(bench, graph_path):
+    rng = np.random.default_rng(2)
+    span = (GRID_SIZE - 1) * 0.001
+    waypoints = [
+        (-1.3 + lat * span, 36.8 + lon * span) for lat, lon in rng.random((5, 2))
+    ]
+
+    legs = bench("route from scratch", lambda: route(waypoints), rounds=3)
+    stored, hit = bench(
+        "first request (route and store)",
+        lambda: get_or_compute_route(waypoints),
+        rounds=1,
+    )
+    assert not hit
+    stored, hit = bench("repeat request", lambda: get_or_compute_route(waypoints))
+    assert hit
+    assert stored.total_duration == pytest.approx(sum(leg.duration for leg in legs))
+    assert Route.objects.count() == 1
@@ -0,0 +1,27 @@
+"""Benchmark: A* point-to-point queries on a synthetic 300x300 road grid."""
+
+import numpy as np
+import pytest
+
+from apps.routes.engine import path_leg, shortest_path
+
+GRID_SIZE = 300
+QUERIES = 20
+
+
+@pytest.fixture(scope="module")
+def grid_graph(make_grid_graph):
+    return make_grid_graph(GRID_SIZE)
+
+
+def test_astar_queries(bench, grid_graph):
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, grid_graph.num_nodes, size=(QUERIES, 2)).tolist()
+
+    def run():
+        return [shortest_path(grid_graph, s, t) for s, t in pairs]
+
+    paths = bench(f"A* x{QUERIES} on {GRID_SIZE}x{GRID_SIZE} grid", run, rounds=3)
+    assert all(paths)
+    leg = path_leg(grid_graph, paths[0])
+    print(f"first leg: {leg.distance / 1000:.1f} km, {leg.duration / 60:.1f} min")
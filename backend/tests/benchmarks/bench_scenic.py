@@ -0,0 +1,63 @@
+"""Benchmark: scenic scoring and scenic A* queries on a 300x300 road grid."""
+
+import numpy as np
+import pytest
+
+from apps.routes.engine import edge_costs, shortest_path
+from apps.routes.scenic import compute_scenic_scores
+
+GRID_SIZE = 300
+PLACES = 5000
+QUERIES = 20
+
+
+@pytest.fixture(scope="module")
+def grid_graph(make_grid_graph):
+    return make_grid_graph(GRID_SIZE)
+
+
+@pytest.fixture(scope="module")
+def places():
+    # Parks and attractions scattered over the ~33 km grid, ratings 1-5
+    rng = np.random.default_rng(3)
+    return np.column_stack(
+        [
+            -1.3 + rng.random(PLACES) * GRID_SIZE * 0.001,
+            36.8 + rng.random(PLACES) * GRID_SIZE * 0.001,
+            rng.uniform(0.2, 1.0, PLACES),
+        ]
+    )
+
+
+def test_score_edges(bench, grid_graph, places):
+    scores = bench(
+        f"score {grid_graph.num_edges} edges against {PLACES} places",
+        lambda: compute_scenic_scores(grid_graph, places),
+        rounds=3,
+    )
+    print(f"mean score {scores.mean():.2f}")
+
+
+def test_scenic_queries(bench, grid_graph, places):
+    grid_graph.scenic = compute_scenic_scores(grid_graph, places)
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, grid_graph.num_nodes, size=(QUERIES, 2)).tolist()
+
+    fastest = bench(
+        f"fastest A* x{QUERIES}",
+        lambda: [shortest_path(grid_graph, s, t) for s, t in pairs],
+        rounds=3,
+    )
+
+    def run():
+        costs = edge_costs(grid_graph, "duration", 0.5)
+        return [shortest_path(grid_graph, s, t, costs=costs) for s, t in pairs]
+
+    scenic = bench(
+        f"scenic A* x{QUERIES} (costs cached)",
+        run,
+        rounds=3,
+        setup=lambda: edge_costs(grid_graph, "duration", 0.5),
+    )
+    grid_graph.cost_cache.clear()
+    assert all(fastest) and all(scenic)
@@ -0,0 +1,51 @@
+"""Benchmark: serializing 1,000 trips with 20 stops each, DRF vs the fast path."""
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from apps.trips.fast_serializers import dumps, serialize_trips
+from apps.trips.models import Stop, Trip
+from apps.trips.serializers import TripListSerializer
+
+TRIP_COUNT = 1000
+STOPS_PER_TRIP = 20
+
+
+@pytest.fixture
+def many_trips(user):
+    trips = Trip.objects.bulk_create(
+        Trip(user=user, name=f"Trip {i}", route_type="fastest")
+        for i in range(TRIP_COUNT)
+    )
+    Stop.objects.bulk_create(
+        (
+            Stop(
+                trip=trip,
+                name=f"Stop {n}",
+                address=f"Address {n}",
+                latitude=40.0 + n * 0.01,
+                longitude=-74.0 - n * 0.01,
+                order=n,
+                travel_distance_to_next=12.5,
+                travel_time_to_next=0.25,
+            )
+            for trip in trips
+            for n in range(1, STOPS_PER_TRIP + 1)
+        ),
+        batch_size=2000,
+    )
+    return Trip.objects.order_by("id")
+
+
+@pytest.mark.django_db
+def test_serialize_1000_trips(bench, many_trips):
+    def drf():
+        trips = many_trips.select_related("user").prefetch_related("stops")
+        return JSONRenderer().render(TripListSerializer(trips, many=True).data)
+
+    def fast():
+        return dumps(serialize_trips(many_trips))
+
+    expected = bench("DRF serializer + JSONRenderer", drf, rounds=3)
+    body = bench("fast serializer + dumps", fast, rounds=3)
+    assert body == expected
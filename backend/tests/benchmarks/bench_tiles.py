@@ -0,0 +1,82 @@
+"""
+Benchmark: public trip map as vector tiles.
+
+Compares downloading every public route (what the map does with
+``public_trips`` today) with fetching the tiles that cover the same area at
+a country-level and a regional zoom, built cold and then served from the
+cache.
+"""
+
+import numpy as np
+import pytest
+from django.core.cache import cache
+
+from apps.routes.geometry import encode_polyline
+from apps.routes.mvt import tile_bounds
+from apps.trips.models import Trip
+from apps.trips.tiles import get_tile
+
+PUBLIC_TRIPS = 500
+POINTS = 5000
+
+
+@pytest.fixture
+def public_trips(user):
+    rng = np.random.default_rng(3)
+    trips = []
+    for index in range(PUBLIC_TRIPS):
+        start = rng.uniform([-4.0, 34.0], [4.0, 40.0])
+        steps = rng.normal(0, 0.002, (POINTS, 2)) + rng.uniform(-1, 1, 2) / POINTS
+        trip = Trip(
+            user=user,
+            name=f"Public {index}",
+            is_public=True,
+            route_geometry=encode_polyline(start + np.cumsum(steps, axis=0)),
+        )
+        # bulk_create skips save(), so build the levels the way it would
+        trip.refresh_route_levels()
+        trips.append(trip)
+    Trip.objects.bulk_create(trips, batch_size=100)
+    return trips
+
+
+def covering_tiles(zoom, west=34.0, south=-5.0, east=41.0, north=5.0):
+    n = 2**zoom
+    tiles = []
+    for x in range(n):
+        for y in range(n):
+            w, s, e, nn = tile_bounds(zoom, x, y)
+            if w < east and e > west and s < north and nn > south:
+                tiles.append((zoom, x, y))
+    return tiles
+
+
+@pytest.mark.django_db
+def test_tiles_against_full_routes(bench, public_trips, settings):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+    # One process here, so the local cache stands in for a shared one
+    settings.SHARED_CACHE = True
+    full = sum(len(trip.route_geometry) for trip in public_trips)
+    print(f"\nall {PUBLIC_TRIPS} full routes: {full / 1024:.0f} KiB")
+
+    for zoom in (5, 8):
+        tiles = covering_tiles(zoom)
+        sizes = bench(
+            f"z{zoom}: build {len(tiles)} tiles, cold cache",
+            lambda: [len(get_tile(*tile)) for tile in tiles],
+            rounds=3,
+            setup=cache.clear,
+        )
+        bench(
+            f"z{zoom}: serve {len(tiles)} tiles, warm cache",
+            lambda: [get_tile(*tile) for tile in tiles],
+        )
+        print(
+            f"z{zoom}: {sum(sizes) / 1024:.0f} KiB over {len(tiles)} tiles, "
+            f"largest {max(sizes) / 1024:.1f} KiB"
+        )
@@ -0,0 +1,46 @@
+"""Benchmark: packed weather grid records against JSON forecasts."""
+
+import json
+
+import numpy as np
+import pytest
+
+from services.weather import StubWeatherProvider
+from services.weather_grid import decode, encode, lookup
+
+CELLS = 2000
+QUERIES = 100_000
+HOUR = 500_000
+
+
+@pytest.fixture(scope="module")
+def forecasts():
+    stub = StubWeatherProvider()
+    return [stub.forecast(-1.0 - i / 100, 36.0 + i / 100, HOUR) for i in range(CELLS)]
+
+
+@pytest.fixture(scope="module")
+def records(forecasts):
+    return [encode(points, 0) for points in forecasts]
+
+
+def test_size(forecasts, records):
+    packed = sum(len(record) for record in records)
+    as_json = sum(len(json.dumps(points)) for points in forecasts)
+    print(f"{CELLS} cells: {packed / 1e6:.2f} MB packed, {as_json / 1e6:.2f} MB JSON")
+
+
+def test_decode(bench, records):
+    bench(f"decode {CELLS} records", lambda: [decode(r) for r in records], rounds=3)
+
+
+def test_lookup(bench, records):
+    rng = np.random.default_rng(7)
+    which = rng.integers(0, CELLS, QUERIES)
+    times = HOUR * 3600 + rng.uniform(0, 120 * 3600, QUERIES)
+    result = bench(
+        f"look up {QUERIES} (cell, time) pairs in {CELLS} records",
+        lambda: lookup(records, which, times),
+        rounds=3,
+    )
+    print(f"found {int(result['found'].sum())} of {QUERIES}")
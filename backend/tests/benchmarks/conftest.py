@@ -0,0 +1,86 @@
+"""
+Fixtures for the benchmark suite.
+
+Benchmark modules are named ``bench_*.py`` so the regular test run skips
+them; run one explicitly and keep stdout visible:
+
+    python -m pytest tests/benchmarks/bench_reorder.py -s
+"""
+
+import statistics
+import time
+
+import numpy as np
+import pytest
+
+from apps.routes.graph import RoadGraph
+
+
+@pytest.fixture
+def bench():
+    """Return a runner that times ``func`` over several rounds."""
+
+    def run(label, func, rounds=5, setup=None):
+        timings = []
+        result = None
+        for _ in range(rounds):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        print(
+            f"\n{label}: median {statistics.median(timings):.2f} ms, "
+            f"min {min(timings):.2f} ms, max {max(timings):.2f} ms "
+            f"({rounds} rounds)"
+        )
+        return result
+
+    return run
+
+
+@pytest.fixture(scope="session")
+def make_grid_graph():
+    """
+    Return a builder for two-way road grids ~110 m apart around Nairobi.
+
+    ``shape_nodes`` inserts that many degree-2 nodes into every segment, the
+    way OSM ways carry geometry between junctions.
+    """
+
+    def build(size, seed=7, shape_nodes=0):
+        rng = np.random.default_rng(seed)
+        rows, cols = np.divmod(np.arange(size * size), size)
+        lat = -1.3 + rows * 0.001
+        lon = 36.8 + cols * 0.001
+
+        right = np.flatnonzero(cols < size - 1)
+        down = np.flatnonzero(rows < size - 1)
+        a = np.concatenate([right, down])
+        b = np.concatenate([right + 1, down + size])
+        # Mixed residential, arterial and highway speeds
+        speeds = rng.choice([25 / 3.6, 50 / 3.6, 80 / 3.6], size=len(a))
+
+        if shape_nodes:
+            steps = np.arange(1, shape_nodes + 1) / (shape_nodes + 1)
+            first = len(lat) + np.arange(len(a)) * shape_nodes
+            shape_lat = (lat[a][:, None] + (lat[b] - lat[a])[:, None] * steps).ravel()
+            shape_lon = (lon[a][:, None] + (lon[b] - lon[a])[:, None] * steps).ravel()
+            chains = np.column_stack(
+                [a, first[:, None] + np.arange(shape_nodes), b]
+            )
+            a, b = chains[:, :-1].ravel(), chains[:, 1:].ravel()
+            speeds = np.repeat(speeds, shape_nodes + 1)
+            lat = np.concatenate([lat, shape_lat])
+            lon = np.concatenate([lon, shape_lon])
+
+        return RoadGraph.from_edges(
+            lat,
+            lon,
+            np.concatenate([a, b]),
+            np.concatenate([b, a]),
+            speeds=np.concatenate([speeds, speeds]),
+        )
+
+    return build
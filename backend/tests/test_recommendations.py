@@ -0,0 +1,220 @@
+import numpy as np
+import pytest
+from rest_framework import status
+
+from apps.places.models import Place
+from apps.recommendations import engine
+
+NAIROBI = (-1.2921, 36.8219)
+
+
+def place(place_id, lat=NAIROBI[0], lon=NAIROBI[1], **fields):
+    """A candidate place dict shaped like a search result."""
+    return {
+        "place_id": place_id,
+        "name": place_id.title(),
+        "latitude": lat,
+        "longitude": lon,
+        "rating": 4.0,
+        "user_ratings_total": 100,
+        "price_level": 2,
+        "types": ["restaurant"],
+        **fields,
+    }
+
+
+def cached_place(place_id, lat=NAIROBI[0], lon=NAIROBI[1], **fields):
+    """A ``Place`` row in the place cache."""
+    defaults = {
+        "name": place_id.title(),
+        "address": "Nairobi",
+        "place_type": "restaurant",
+        "types": ["restaurant"],
+        "rating": 4.0,
+        "user_ratings_total": 100,
+        "price_level": 2,
+    }
+    defaults.update(fields)
+    return Place.objects.create(
+        place_id=place_id, latitude=lat, longitude=lon, **defaults
+    )
+
+
+# ─── Scoring ──────────────────────────────────────────────────────────────────
+
+
+class TestBayesianRating:
+    def test_few_reviews_are_pulled_to_the_mean(self):
+        smoothed = engine.bayesian_rating(
+            np.array([5.0, 4.6, 3.0]), np.array([3.0, 1000.0, 200.0])
+        )
+        assert smoothed[1] > smoothed[0] > smoothed[2]
+        assert smoothed[1] == pytest.approx(4.6, abs=0.05)
+
+    def test_unrated_places_get_the_mean(self):
+        smoothed = engine.bayesian_rating(
+            np.array([4.0, np.nan]), np.array([50.0, np.nan])
+        )
+        assert smoothed[1] == pytest.approx(4.0)
+
+    def test_no_ratings_at_all(self):
+        smoothed = engine.bayesian_rating(np.array([np.nan]), np.array([np.nan]))
+        assert smoothed[0] == engine.DEFAULT_MEAN_RATING
+
+
+class TestScoreCandidates:
+    def test_closer_places_score_higher(self):
+        places = [place("near"), place("far", lat=NAIROBI[0] + 0.03)]
+        scores = engine.score_candidates(places, *NAIROBI, radius=5000)
+        assert scores["distance"][0] == pytest.approx(1.0)
+        assert scores["distance"][1] < 0.2
+        assert scores["relevance"][0] > scores["relevance"][1]
+
+    def test_price_against_the_preference(self):
+        places = [
+            place("cheap", price_level=1),
+            place("dear", price_level=4),
+            place("unpriced", price_level=None),
+        ]
+        scores = engine.score_candidates(places, *NAIROBI, 5000, preferred_price=1)
+        assert scores["price"].tolist() == [1.0, 0.25, engine.UNKNOWN_PRICE_SCORE]
+
+    def test_no_preference_leaves_price_neutral(self):
+        places = [place("cheap", price_level=1), place("dear", price_level=4)]
+        scores = engine.score_candidates(places, *NAIROBI, 5000)
+        assert set(scores["price"].tolist()) == {engine.UNKNOWN_PRICE_SCORE}
+
+
+class TestRank:
+    def test_near_duplicates_give_way_to_variety(self):
+        places = [
+            place("best", rating=4.8, user_ratings_total=900),
+            place("twin", rating=4.7, user_ratings_total=900),
+            place(
+                "museum",
+                lat=NAIROBI[0] + 0.01,
+                rating=4.5,
+                user_ratings_total=900,
+                types=["museum"],
+            ),
+        ]
+        ranked = engine.rank(places, *NAIROBI, radius=10000, count=2)
+        assert [p["place_id"] for p in ranked] == ["best", "museum"]
+
+    def test_pure_relevance_without_diversity(self):
+        places = [place("a", rating=4.8), place("b", rating=4.7), place("c")]
+        relevance = engine.score_candidates(places, *NAIROBI, 5000)["relevance"]
+        picked, penalty = engine.mmr_select(
+            relevance,
+            np.full(3, NAIROBI[0]),
+            np.full(3, NAIROBI[1]),
+            engine._type_matrix(places),
+            count=3,
+            diversity=1.0,
+        )
+        assert picked == [0, 1, 2]
+        assert penalty[0] == 0 and penalty[1] == pytest.approx(1.0)
+
+    def test_breakdown_and_count(self):
+        places = [place(f"p{i}", lat=NAIROBI[0] + i / 1000) for i in range(10)]
+        ranked = engine.rank(places, *NAIROBI, radius=5000, count=3)
+        assert len(ranked) == 3
+        assert set(ranked[0]["score_breakdown"]) == {
+            "rating",
+            "distance",
+            "price",
+            "relevance",
+            "similarity",
+            "smoothed_rating",
+            "distance_m",
+        }
+        assert ranked[0]["score_breakdown"]["similarity"] == 0
+        assert ranked[0]["score"] == pytest.approx(
+            engine.DIVERSITY_LAMBDA * ranked[0]["score_breakdown"]["relevance"],
+            abs=1e-4,
+        )
+
+    def test_no_candidates(self):
+        assert engine.rank([], *NAIROBI, radius=5000, count=3) == []
+
+
+class TestPreferredPriceLevel:
+    @pytest.mark.parametrize(
+        "value, expected",
+        [(None, None), (2, 2), ("3", 3), (9, 4), (-1, 0), ("cheap", None)],
+    )
+    def test_parses_the_preference(self, user, value, expected):
+        user.preferences = {} if value is None else {"price_level": value}
+        assert engine.preferred_price_level(user) == expected
+
+
+# ─── Candidates ───────────────────────────────────────────────────────────────
+
+
+@pytest.mark.django_db
+class TestCandidates:
+    def test_cached_places_within_the_radius(self):
+        cached_place("inside", lat=NAIROBI[0] + 0.02)
+        cached_place("outside", lat=NAIROBI[0] + 0.06)
+        cached_place("closed", permanently_closed=True)
+        cached_place("hotel", place_type="accommodation")
+        restaurants = engine.CATEGORIES[1]
+        found = engine.cached_candidates(restaurants, *NAIROBI)
+        assert [p["place_id"] for p in found] == ["inside"]
+
+    def test_search_results_win_over_cached_copies(self):
+        searched = [place("shared", rating=4.9), place("gone", latitude=None)]
+        cached = [place("shared", rating=3.0), place("cached")]
+        merged = engine.merge_candidates(searched, cached)
+        assert [(p["place_id"], p["rating"]) for p in merged] == [
+            ("shared", 4.9),
+            ("cached", 4.0),
+        ]
+
+    def test_recommend_uses_search_and_cache(self, user):
+        cached_place("cached-diner")
+        calls = []
+
+        def search(**params):
+            calls.append(params["place_type"])
+            if params["place_type"] == "restaurant":
+                return [place("searched-cafe", rating=4.9, user_ratings_total=500)]
+            return []
+
+        result = engine.recommend(user, *NAIROBI, search)
+        assert calls == ["tourist_attraction", "restaurant", "lodging"]
+        assert [p["place_id"] for p in result["restaurants"]] == [
+            "searched-cafe",
+            "cached-diner",
+        ]
+        assert result["attractions"] == [] and result["accommodations"] == []
+
+
+# ─── Views ────────────────────────────────────────────────────────────────────
+
+
+class TestRecommendationsView:
+    url = "/api/recommendations/"
+
+    def test_requires_a_location(self, auth_client):
+        response = auth_client.get(self.url)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_bad_coordinates(self, auth_client):
+        response = auth_client.get(self.url, {"lat": "north", "lng": "36.8"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_ranks_by_the_users_price_preference(self, auth_client, user):
+        user.set_preference("price_level", 1)
+        cached_place("fine-dining", price_level=4)
+        cached_place("street-food", lat=NAIROBI[0] + 0.001, price_level=1)
+        response = auth_client.get(self.url, {"lat": NAIROBI[0], "lng": NAIROBI[1]})
+        assert response.status_code == status.HTTP_200_OK
+        restaurants = response.data["restaurants"]
+        assert [p["place_id"] for p in restaurants] == ["street-food", "fine-dining"]
+        assert restaurants[0]["score_breakdown"]["price"] == 1.0
+        assert set(response.data) == {"attractions", "restaurants", "accommodations"}
+
+    def test_requires_authentication(self, api_client):
+        response = api_client.get(self.url, {"lat": 1, "lng": 1})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,927 @@
+"""Tests for routes app: road graph, routing engine and views."""
+
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+
+from apps.routes.ch import ContractionHierarchy, build_hierarchy
+from apps.routes.engine import (
+    NoRouteFound,
+    RoutingError,
+    RoutingUnavailable,
+    WaypointNotRoutable,
+    get_road_graph,
+    path_leg,
+    route,
+    route_leg,
+    route_matrix,
+    shortest_path,
+)
+from apps.routes.isochrone import compute_isochrones, get_isochrones, travel_times
+from apps.routes.geometry import (
+    build_levels,
+    decode_polyline,
+    encode_polyline,
+    level_for_zoom,
+    pixel_tolerance,
+    simplify,
+)
+from apps.places.models import Place
+from apps.routes.graph import ROAD_CLASSES, RoadGraph, haversine_m, parse_maxspeed
+from apps.routes.matrix import compute_matrix, great_circle_matrix
+from apps.routes.models import Route
+from apps.routes.mvt import (
+    EXTENT,
+    LINESTRING,
+    POINT,
+    Layer,
+    clip_line,
+    decode_tile,
+    encode_tile,
+    line_commands,
+    point_commands,
+    project,
+    tile_bounds,
+)
+from apps.routes.scenic import (
+    compute_scenic_scores,
+    place_proximity,
+    scenic_costs,
+    scenic_places,
+)
+from apps.routes.store import evict_routes, get_or_compute_route
+
+# A slow residential street A-B-C, a longer but faster trunk detour A-D-C,
+# a oneway primary C->E, a footway and a disconnected street F-G
+A = (36.80, -1.30)
+B = (36.85, -1.30)
+C = (36.90, -1.30)
+D = (36.85, -1.33)
+E = (36.95, -1.30)
+F = (37.50, -1.50)
+G = (37.51, -1.50)
+
+
+def way(coordinates, **properties):
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "LineString", "coordinates": [list(c) for c in coordinates]},
+    }
+
+
+ROAD_NETWORK = {
+    "type": "FeatureCollection",
+    "features": [
+        way([A, B, C], highway="residential"),
+        way([A, D, C], highway="trunk"),
+        way([C, E], highway="primary", oneway="yes"),
+        way([B, D], highway="footway"),
+        way([F, G], highway="residential"),
+    ],
+}
+
+
+def node_at(graph, coordinate):
+    node, _ = graph.nearest_node(coordinate[1], coordinate[0], 10)
+    return node
+
+
+@pytest.fixture
+def graph():
+    return RoadGraph.from_geojson(ROAD_NETWORK)
+
+
+@pytest.fixture
+def graph_file(tmp_path, settings):
+    path = tmp_path / "roads.geojson"
+    path.write_text(json.dumps(ROAD_NETWORK))
+    settings.ROUTING_GRAPH_PATH = str(path)
+    return path
+
+
+@pytest.fixture
+def random_graph():
+    # 6x6 grid with random speeds and a few oneway streets
+    rng = np.random.default_rng(0)
+    rows, cols = np.divmod(np.arange(36), 6)
+    pairs = [(n, n + 1) for n in range(36) if cols[n] < 5]
+    pairs += [(n, n + 6) for n in range(30)]
+    sources, targets, speeds = [], [], []
+    for a, b in pairs:
+        speed = rng.choice([7.0, 14.0, 22.0])
+        sources.append(a)
+        targets.append(b)
+        speeds.append(speed)
+        if rng.random() > 0.2:
+            sources.append(b)
+            targets.append(a)
+            speeds.append(speed)
+    return RoadGraph.from_edges(
+        -1.3 + rows * 0.001, 36.8 + cols * 0.001, sources, targets, speeds=speeds
+    )
+
+# ─── Graph ────────────────────────────────────────────────────────────────────
+
+
+class TestRoadGraph:
+    def test_shared_vertices_become_one_node(self, graph):
+        # A, B, C, D, E, F, G; the footway adds nothing
+        assert graph.num_nodes == 7
+
+    def test_two_way_and_oneway_edges(self, graph):
+        # 2 + 2 residential, 2 + 2 trunk, 1 oneway primary, 2 island
+        assert graph.num_edges == 11
+        c, e = node_at(graph, C), node_at(graph, E)
+        assert e in graph.targets[graph.offsets[c]:graph.offsets[c + 1]]
+        assert c not in graph.targets[graph.offsets[e]:graph.offsets[e + 1]]
+
+    def test_reverse_oneway_runs_against_geometry(self):
+        graph = RoadGraph.from_geojson(
+            {"features": [way([A, B], highway="primary", oneway="-1")]}
+        )
+        a, b = node_at(graph, A), node_at(graph, B)
+        assert list(graph.targets[graph.offsets[b]:graph.offsets[b + 1]]) == [a]
+        assert graph.offsets[a] == graph.offsets[a + 1]
+
+    def test_edge_duration_follows_maxspeed(self):
+        graph = RoadGraph.from_geojson(
+            {"features": [way([A, B], highway="primary", maxspeed="50", oneway="yes")]}
+        )
+        assert graph.duration[0] == pytest.approx(graph.distance[0] / (50 / 3.6))
+
+    def test_parse_maxspeed(self):
+        assert parse_maxspeed("80") == 80
+        assert parse_maxspeed("30 mph") == pytest.approx(48.28, abs=0.01)
+        assert parse_maxspeed("KE:urban") is None
+        assert parse_maxspeed(None) is None
+
+    def test_nearest_node(self, graph):
+        node, distance = graph.nearest_node(-1.3001, 36.8501, 1000)
+        assert node == node_at(graph, B)
+        assert distance == pytest.approx(15.7, abs=0.5)
+
+    def test_nearest_node_out_of_range(self, graph):
+        assert graph.nearest_node(0.5, 36.0, 5000) == (None, None)
+
+    def test_save_and_load_round_trip(self, graph, tmp_path):
+        path = tmp_path / "graph.npz"
+        graph.save(path)
+        loaded = RoadGraph.load(str(path))
+        assert loaded.num_nodes == graph.num_nodes
+        assert list(loaded.targets) == list(graph.targets)
+        assert list(loaded.duration) == list(graph.duration)
+
+    def test_build_road_graph_command(self, graph_file, tmp_path):
+        output = tmp_path / "graph.npz"
+        call_command("build_road_graph", str(graph_file), str(output))
+        assert RoadGraph.load(str(output)).num_edges == 11
+
+
+# ─── Engine ───────────────────────────────────────────────────────────────────
+
+
+class TestRoutingEngine:
+    def test_fastest_path_takes_the_trunk(self, graph):
+        path = shortest_path(graph, node_at(graph, A), node_at(graph, C))
+        assert path[1] == node_at(graph, D)
+
+    def test_shortest_path_takes_the_street(self, graph):
+        path = shortest_path(graph, node_at(graph, A), node_at(graph, C), "distance")
+        assert path[1] == node_at(graph, B)
+
+    def test_oneway_is_respected(self, graph):
+        assert shortest_path(graph, node_at(graph, C), node_at(graph, E))
+        path = shortest_path(graph, node_at(graph, E), node_at(graph, C))
+        assert path is None
+
+    def test_route_legs(self, graph):
+        legs = route([(A[1], A[0]), (C[1], C[0]), (E[1], E[0])], graph=graph)
+        assert len(legs) == 2
+        trunk = haversine_m(A[1], A[0], D[1], D[0]) * 2
+        assert legs[0].distance == pytest.approx(trunk, rel=1e-4)
+        assert legs[0].duration == pytest.approx(trunk / (80 / 3.6), rel=1e-4)
+        assert legs[0].geometry == [list(A), list(D), list(C)]
+        assert legs[1].geometry[0] == legs[0].geometry[-1]
+
+    def test_disconnected_waypoints_raise(self, graph):
+        with pytest.raises(NoRouteFound):
+            route([(A[1], A[0]), (F[1], F[0])], graph=graph)
+
+    def test_waypoint_far_from_roads_raises(self, graph):
+        with pytest.raises(WaypointNotRoutable):
+            route([(A[1], A[0]), (0.5, 36.0)], graph=graph)
+
+    def test_unconfigured_graph_raises(self, settings):
+        settings.ROUTING_GRAPH_PATH = ""
+        with pytest.raises(RoutingUnavailable):
+            get_road_graph()
+
+    def test_configured_graph_is_loaded_once(self, graph_file):
+        assert get_road_graph() is get_road_graph()
+
+
+class TestContractionHierarchy:
+    @pytest.fixture
+    def hierarchy_file(self, graph, tmp_path):
+        path = tmp_path / "roads.ch"
+        build_hierarchy(graph).save(path)
+        return path
+
+    def test_matches_astar_on_every_pair(self, random_graph):
+        hierarchy = build_hierarchy(random_graph)
+        for source in range(random_graph.num_nodes):
+            for target in range(random_graph.num_nodes):
+                path = shortest_path(random_graph, source, target)
+                leg = hierarchy.route_leg(source, target)
+                if path is None:
+                    assert leg is None
+                    continue
+                expected = path_leg(random_graph, path)
+                assert leg.duration == pytest.approx(expected.duration, rel=1e-5)
+                # The unpacked nodes must form a real path of the same cost
+                assert path_leg(random_graph, leg.nodes).duration == pytest.approx(
+                    leg.duration, rel=1e-5
+                )
+
+    def test_distance_hierarchy_takes_the_street(self, graph):
+        hierarchy = build_hierarchy(graph, weight="distance")
+        leg = hierarchy.route_leg(node_at(graph, A), node_at(graph, C))
+        assert leg.nodes[1] == node_at(graph, B)
+
+    def test_saved_file_is_memory_mapped(self, graph, hierarchy_file):
+        hierarchy = ContractionHierarchy.load(hierarchy_file)
+        assert isinstance(hierarchy.fwd_targets, np.memmap)
+        leg = hierarchy.route_leg(node_at(graph, A), node_at(graph, C))
+        assert leg.geometry == [list(A), list(D), list(C)]
+        assert hierarchy.route_leg(node_at(graph, E), node_at(graph, C)) is None
+
+    def test_rejects_other_files(self, graph_file):
+        with pytest.raises(ValueError):
+            ContractionHierarchy.load(graph_file)
+
+    def test_engine_routes_over_configured_hierarchy(self, hierarchy_file, settings):
+        settings.ROUTING_GRAPH_PATH = str(hierarchy_file)
+        assert isinstance(get_road_graph(), ContractionHierarchy)
+        legs = route([(A[1], A[0]), (C[1], C[0]), (E[1], E[0])])
+        assert [leg.geometry[-1] for leg in legs] == [list(C), list(E)]
+
+    def test_engine_rejects_other_weights(self, graph, hierarchy_file):
+        hierarchy = ContractionHierarchy.load(hierarchy_file)
+        with pytest.raises(RoutingError):
+            route([(A[1], A[0]), (C[1], C[0])], weight="distance", graph=hierarchy)
+
+    def test_build_contraction_hierarchy_command(self, graph_file, tmp_path):
+        output = tmp_path / "roads.ch"
+        call_command("build_contraction_hierarchy", str(graph_file), str(output))
+        assert ContractionHierarchy.load(output).weight == "duration"
+
+
+class TestRouteMatrix:
+    def _expected(self, graph, source, target):
+        path = shortest_path(graph, source, target)
+        return None if path is None else path_leg(graph, path)
+
+    def test_graph_matrix_matches_astar(self, random_graph):
+        nodes = list(range(0, random_graph.num_nodes, 5))
+        distance, duration = route_matrix(random_graph, nodes, nodes)
+        for row, source in enumerate(nodes):
+            for column, target in enumerate(nodes):
+                leg = self._expected(random_graph, source, target)
+                if leg is None:
+                    assert np.isnan(duration[row, column])
+                    continue
+                assert duration[row, column] == pytest.approx(leg.duration)
+                assert distance[row, column] == pytest.approx(leg.distance)
+
+    def test_hierarchy_matrix_matches_astar(self, random_graph):
+        hierarchy = build_hierarchy(random_graph)
+        nodes = list(range(0, random_graph.num_nodes, 3))
+        distance, duration = route_matrix(hierarchy, nodes, nodes[::-1])
+        for row, source in enumerate(nodes):
+            for column, target in enumerate(nodes[::-1]):
+                leg = self._expected(random_graph, source, target)
+                if leg is None:
+                    assert np.isnan(duration[row, column])
+                    continue
+                assert duration[row, column] == pytest.approx(leg.duration, rel=1e-5)
+                assert distance[row, column] == pytest.approx(leg.distance, rel=1e-5)
+
+    def test_great_circle_matrix(self):
+        points = [(A[1], A[0]), (C[1], C[0]), (F[1], F[0])]
+        matrix = great_circle_matrix(points, points[:2])
+        assert matrix.shape == (3, 2)
+        assert matrix[2, 1] == pytest.approx(haversine_m(F[1], F[0], C[1], C[0]))
+        assert matrix[1, 1] == 0
+
+    def test_road_matrix_caches_cells(self, graph, graph_file):
+        points = [(A[1], A[0]), (C[1], C[0]), (E[1], E[0])]
+        first = compute_matrix(points, mode="road")
+        assert (first.cached_cells, first.computed_cells) == (0, 9)
+        legs = route(points[:2], graph=graph)
+        assert first.distance[0, 1] == pytest.approx(legs[0].distance)
+        # The primary C -> E is oneway
+        assert np.isnan(first.duration[2, 1])
+
+        # A point a few metres away reuses the cached cells
+        nearby = [(A[1] + 0.00001, A[0]), *points[1:]]
+        second = compute_matrix(nearby, mode="road")
+        assert (second.cached_cells, second.computed_cells) == (9, 0)
+        np.testing.assert_array_equal(second.duration, first.duration)
+
+    def test_road_matrix_routes_only_missing_cells(self, graph_file):
+        compute_matrix([(A[1], A[0])], [(C[1], C[0])], mode="road")
+        matrix = compute_matrix([(A[1], A[0])], [(C[1], C[0]), (D[1], D[0])], "road")
+        assert (matrix.cached_cells, matrix.computed_cells) == (1, 1)
+
+    def test_point_off_the_network_is_unreachable(self, graph_file):
+        matrix = compute_matrix([(A[1], A[0]), (0.5, 36.0)], mode="road")
+        assert matrix.distance[0, 0] == 0
+        assert np.isnan(matrix.distance[0, 1])
+        assert np.isnan(matrix.distance[1, 1])
+
+
+# ─── Scenic ───────────────────────────────────────────────────────────────────
+
+
+def scored_graph(graph):
+    """Make the residential street fully scenic and everything else dull."""
+    residential = ROAD_CLASSES.index("residential")
+    graph.scenic = (graph.road_class == residential).astype(np.float32)
+    return graph
+
+
+def park(lng, lat, rating=5.0, **fields):
+    fields.setdefault("place_id", f"park-{lat}-{lng}")
+    return Place.objects.create(
+        name="Park",
+        address="Nairobi",
+        latitude=lat,
+        longitude=lng,
+        place_type="park",
+        rating=rating,
+        **fields,
+    )
+
+
+class TestScenicRouting:
+    def test_edges_keep_their_road_class(self, graph):
+        a, b = node_at(graph, A), node_at(graph, B)
+        neighbours = graph.targets[graph.offsets[a]:graph.offsets[a + 1]]
+        edge = graph.offsets[a] + list(neighbours).index(b)
+        assert ROAD_CLASSES[graph.road_class[edge]] == "residential"
+
+    def test_saved_graph_keeps_classes_and_scores(self, graph, tmp_path):
+        scored_graph(graph).save(tmp_path / "graph.npz")
+        loaded = RoadGraph.load(str(tmp_path / "graph.npz"))
+        assert list(loaded.road_class) == list(graph.road_class)
+        assert list(loaded.scenic) == list(graph.scenic)
+
+    def test_place_proximity_fades_with_distance(self):
+        places = np.array([(-1.3, 36.8, 1.0)])
+        # Roughly 0 m, 1 km and 3 km east of the place
+        lon = 36.8 + np.array([0.0, 0.008983, 0.02695])
+        proximity = place_proximity(np.full(3, -1.3), lon, places)
+        np.testing.assert_allclose(
+            proximity, [1 - np.exp(-1), 1 - np.exp(-0.5), 0], atol=1e-3
+        )
+
+    def test_places_and_quiet_roads_score_higher(self, graph, db):
+        midpoint = ((A[0] + B[0]) / 2, A[1])
+        park(*midpoint)
+        park(*midpoint, rating=4.0, place_id="closed", permanently_closed=True)
+        places = scenic_places()
+        assert places.tolist() == [[midpoint[1], midpoint[0], 1.0]]
+
+        scores = compute_scenic_scores(graph, places)
+        a = node_at(graph, A)
+        edges = range(graph.offsets[a], graph.offsets[a + 1])
+        by_neighbour = {graph.targets[edge]: scores[edge] for edge in edges}
+        assert by_neighbour[node_at(graph, B)] > 0.4
+        assert by_neighbour[node_at(graph, D)] < 0.2
+
+    @pytest.mark.parametrize(
+        "scenery, via", [(0, D), (0.5, D), (1, B)], ids=["fastest", "some", "scenic"]
+    )
+    def test_scenery_trades_travel_time(self, graph, scenery, via):
+        graph = scored_graph(graph)
+        leg = route_leg(graph, node_at(graph, A), node_at(graph, C), scenery=scenery)
+        assert leg.nodes[1] == node_at(graph, via)
+        assert leg.scenic_score == (1.0 if via == B else 0.0)
+
+    def test_scenic_costs_are_cached_on_the_graph(self, graph):
+        graph = scored_graph(graph)
+        costs = scenic_costs(graph, 0.5)
+        assert scenic_costs(graph, 0.5) is costs
+        assert list(graph.cost_cache) == [0.5]
+        assert scenic_costs(graph, 1.0) is not costs
+
+    def test_scenic_route_needs_scores(self, graph):
+        with pytest.raises(RoutingUnavailable):
+            route_leg(graph, node_at(graph, A), node_at(graph, C), scenery=0.5)
+
+    def test_scenic_route_needs_the_duration_weight(self, graph):
+        with pytest.raises(RoutingError):
+            route_leg(
+                scored_graph(graph),
+                node_at(graph, A),
+                node_at(graph, C),
+                "distance",
+                scenery=0.5,
+            )
+
+    def test_build_scenic_scores_command(self, graph, tmp_path, db):
+        path = tmp_path / "graph.npz"
+        graph.save(path)
+        park((A[0] + B[0]) / 2, A[1])
+        call_command("build_scenic_scores", str(path))
+        loaded = RoadGraph.load(str(path))
+        assert loaded.scenic.shape == (graph.num_edges,)
+        assert loaded.scenic.max() > 0.4
+
+
+# ─── Isochrones ───────────────────────────────────────────────────────────────
+
+
+def covers(feature, coordinate):
+    """Whether a (lon, lat) coordinate lies inside an isochrone feature."""
+    x, y = coordinate
+    for polygon in feature["geometry"]["coordinates"]:
+        ring = polygon[0]
+        inside = False
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        if inside:
+            return True
+    return False
+
+
+class TestIsochrones:
+    def test_search_stops_at_the_limit(self, graph):
+        times = travel_times(graph, node_at(graph, A), 600)
+        # D and C over the trunk road, but not B or E
+        assert times[node_at(graph, D)] == pytest.approx(292, abs=1)
+        assert times[node_at(graph, C)] == pytest.approx(583, abs=1)
+        assert np.isinf(times[node_at(graph, B)])
+        assert np.isinf(times[node_at(graph, E)])
+
+    def test_areas_grow_with_each_threshold(self, graph):
+        features = compute_isochrones(graph, A[1], A[0], [5, 10, 15])
+        points = dict(zip("ABCDEF", (A, B, C, D, E, F)))
+        covered = {
+            minutes: [name for name, point in points.items() if covers(feature, point)]
+            for minutes, feature in features.items()
+        }
+        assert covered == {5: ["A", "D"], 10: ["A", "C", "D"], 15: list("ABCDE")}
+        assert features[15]["properties"]["reachable_nodes"] == 5
+
+    def test_part_of_a_road_leaving_the_area_is_reachable(self, graph):
+        feature = compute_isochrones(graph, A[1], A[0], [5])[5]
+        # Five of the thirteen minutes to B along the residential street
+        assert covers(feature, (36.815, -1.30))
+        assert not covers(feature, (36.825, -1.30))
+
+    def test_oneway_roads_are_followed(self, graph):
+        feature = compute_isochrones(graph, E[1], E[0], [30])[30]
+        assert covers(feature, E)
+        assert not covers(feature, C)
+
+    def test_rings_are_closed_and_counter_clockwise(self, graph):
+        feature = compute_isochrones(graph, A[1], A[0], [15])[15]
+        for (ring,) in feature["geometry"]["coordinates"]:
+            assert ring[0] == ring[-1]
+            area = sum(
+                x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:])
+            )
+            assert area > 0
+
+    def test_hierarchy_cannot_answer_isochrones(self, graph):
+        with pytest.raises(RoutingUnavailable):
+            compute_isochrones(build_hierarchy(graph), A[1], A[0], [10])
+
+    def test_off_road_origin(self, graph):
+        with pytest.raises(WaypointNotRoutable):
+            compute_isochrones(graph, 10.0, 10.0, [10])
+
+    def test_thresholds_are_cached_by_rounded_origin(self, graph_file):
+        features, cached = get_isochrones(A[1], A[0], [10])
+        assert cached == 0
+
+        # Within the same ~1 km cell, with one threshold already known
+        nearby, cached = get_isochrones(A[1] + 0.002, A[0] - 0.003, [5, 10])
+        assert cached == 1
+        assert nearby[1] == features[0]
+        assert get_isochrones(A[1], A[0], [5, 10]) == (nearby, 2)
+
+
+# ─── Store ────────────────────────────────────────────────────────────────────
+
+
+def lat_lng(*coordinates):
+    return [(lat, lng) for lng, lat in coordinates]
+
+
+@pytest.mark.django_db
+class TestRouteStore:
+    def test_repeat_request_reads_the_stored_route(
+        self, graph_file, django_assert_num_queries
+    ):
+        stored, hit = get_or_compute_route(lat_lng(A, C, E))
+        assert not hit
+        assert stored.legs.count() == 2
+        with django_assert_num_queries(2):
+            again, hit = get_or_compute_route(lat_lng(A, C, E))
+        assert hit and again.id == stored.id
+        stored.refresh_from_db()
+        assert stored.hits == 1
+
+    def test_nearby_waypoints_share_a_route(self, graph_file):
+        first, _ = get_or_compute_route(lat_lng(A, C))
+        nudged = [(lat + 0.000001, lng - 0.000001) for lat, lng in lat_lng(A, C)]
+        second, hit = get_or_compute_route(nudged)
+        assert hit and second.id == first.id
+
+    def test_weight_is_part_of_the_key(self, graph_file):
+        fastest, _ = get_or_compute_route(lat_lng(A, C))
+        shortest, hit = get_or_compute_route(lat_lng(A, C), "distance")
+        assert not hit and shortest.id != fastest.id
+        assert shortest.total_distance < fastest.total_distance
+
+    def test_rebuilt_graph_misses(self, graph_file):
+        get_or_compute_route(lat_lng(A, C))
+        graph_file.write_text(json.dumps(ROAD_NETWORK) + "\n")
+        os.utime(graph_file, ns=(0, 0))
+        _, hit = get_or_compute_route(lat_lng(A, C))
+        assert not hit
+
+    def test_evicts_routes_from_old_graphs_and_unused(self, graph_file, settings):
+        current, _ = get_or_compute_route(lat_lng(A, C))
+        unused, _ = get_or_compute_route(lat_lng(A, E))
+        Route.objects.filter(id=unused.id).update(
+            last_used_at=timezone.now() - timedelta(days=365)
+        )
+        outdated, _ = get_or_compute_route(lat_lng(C, E))
+        Route.objects.filter(id=outdated.id).update(graph_token="old")
+
+        assert evict_routes() == 2
+        assert list(Route.objects.values_list("id", flat=True)) == [current.id]
+
+    def test_evicts_least_recently_used_over_the_cap(self, graph_file, settings):
+        settings.ROUTE_STORE_MAX_ROUTES = 2
+        first, _ = get_or_compute_route(lat_lng(A, C))
+        second, _ = get_or_compute_route(lat_lng(A, E))
+        third, _ = get_or_compute_route(lat_lng(C, E))
+        get_or_compute_route(lat_lng(A, C))
+
+        assert evict_routes() == 1
+        assert set(Route.objects.values_list("id", flat=True)) == {first.id, third.id}
+
+
+# ─── Geometry ─────────────────────────────────────────────────────────────────
+
+
+def wiggly_line(count=2000):
+    """A road-like line heading east with small curves, as ``(lat, lon)``."""
+    lon = np.linspace(36.8, 37.8, count)
+    lat = -1.3 + 0.05 * np.sin(lon * 40) + 0.0001 * np.sin(lon * 3000)
+    return np.column_stack([lat, lon])
+
+
+class TestGeometry:
+    def test_reference_polyline(self):
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        encoded = encode_polyline(points)
+        assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+        np.testing.assert_allclose(decode_polyline(encoded), points)
+
+    def test_round_trip_keeps_five_decimals(self):
+        line = wiggly_line()
+        decoded = decode_polyline(encode_polyline(line))
+        assert np.abs(decoded - line).max() <= 0.5e-5 + 1e-12
+
+    def test_empty_polyline(self):
+        assert encode_polyline([]) == ""
+        assert decode_polyline("").shape == (0, 2)
+
+    @pytest.mark.parametrize("text", ["_p~iF~ps|", "_p~iF", "abc\x01", "é"])
+    def test_malformed_polyline_raises(self, text):
+        with pytest.raises(ValueError):
+            decode_polyline(text)
+
+    def test_simplify_stays_within_tolerance(self):
+        line = wiggly_line()
+        tolerance = pixel_tolerance(10)
+        simplified = simplify(line, tolerance)
+        assert 2 < len(simplified) < len(line) / 4
+        assert (simplified[0] == line[0]).all() and (simplified[-1] == line[-1]).all()
+        # Every dropped point lies within tolerance of some simplified segment
+        scale = np.cos(np.radians(line[:, 0].mean()))
+        points = line[:, ::-1] * [scale, 1]
+        ends = simplified[:, ::-1] * [scale, 1]
+        start, segment = ends[:-1], np.diff(ends, axis=0)
+        offsets = points[:, None, :] - start[None, :, :]
+        t = np.clip(
+            (offsets * segment).sum(axis=2) / (segment * segment).sum(axis=1), 0, 1
+        )
+        gaps = np.linalg.norm(offsets - t[..., None] * segment, axis=2)
+        assert gaps.min(axis=1).max() <= tolerance * 1.0001
+
+    def test_simplify_keeps_hairpins(self):
+        line = np.array([(0.0, 0.0), (0.0, 1.0), (0.0, 2.0), (0.0, 1.0), (0.0, 0.5)])
+        assert len(simplify(line, 0.1)) == 3
+
+    def test_levels_shrink_with_zoom(self):
+        levels, bounds = build_levels(encode_polyline(wiggly_line()))
+        sizes = [len(decode_polyline(levels[zoom])) for zoom in sorted(levels, key=int)]
+        assert sizes == sorted(sizes)
+        assert bounds["southwest"]["lng"] == pytest.approx(36.8)
+        assert bounds["northeast"]["lng"] == pytest.approx(37.8)
+        assert bounds["northeast"]["lat"] == pytest.approx(-1.25, abs=0.001)
+
+    def test_level_for_zoom(self):
+        levels = {"7": "coarse", "13": "fine"}
+        assert level_for_zoom(levels, "full", 3) == (7, "coarse")
+        assert level_for_zoom(levels, "full", 8) == (13, "fine")
+        assert level_for_zoom(levels, "full", 15) == (None, "full")
+        assert level_for_zoom(levels, "full") == (None, "full")
+
+
+class TestVectorTiles:
+    def test_tile_corners_project_to_extent(self):
+        west, south, east, north = tile_bounds(8, 154, 128)
+        corners = project([(north, west), (south, east)], 8, 154, 128)
+        np.testing.assert_allclose(corners, [(0, 0), (EXTENT, EXTENT)], atol=1e-6)
+
+    def test_clip_line_keeps_inside_line_whole(self):
+        line = np.array([(10.0, 10.0), (100.0, 50.0), (200.0, 10.0)])
+        parts = clip_line(line)
+        assert len(parts) == 1
+        np.testing.assert_array_equal(parts[0], line)
+
+    def test_clip_line_splits_where_it_leaves(self):
+        line = np.array(
+            [(100.0, 100.0), (100.0, -500.0), (300.0, -500.0), (300.0, 100.0)]
+        )
+        parts = clip_line(line, 0, EXTENT)
+        assert len(parts) == 2
+        np.testing.assert_allclose(parts[0], [(100, 100), (100, 0)])
+        np.testing.assert_allclose(parts[1], [(300, 0), (300, 100)])
+
+    def test_clip_line_outside_is_dropped(self):
+        line = np.array([(-500.0, -500.0), (-400.0, 5000.0)])
+        assert clip_line(line, 0, EXTENT) == []
+
+    def test_round_trip(self):
+        routes = Layer("routes")
+        line = [np.array([(10.2, 20.7), (5000.0, 20.0), (10.0, 4000.4)])]
+        routes.add_feature(
+            LINESTRING, line_commands(line), {"name": "Coast", "km": 12.5}, 7
+        )
+        stops = Layer("stops")
+        for index, point in enumerate([(0, 0), (100, -60)]):
+            stops.add_feature(
+                POINT,
+                point_commands(point),
+                {"order": index, "offset": -index, "last": bool(index)},
+                100 + index,
+            )
+
+        decoded = decode_tile(encode_tile([routes, stops, Layer("empty")]))
+        assert set(decoded) == {"routes", "stops"}
+        (route,) = decoded["routes"]
+        assert route["id"] == 7
+        assert route["type"] == LINESTRING
+        assert route["properties"] == {"name": "Coast", "km": 12.5}
+        assert route["geometry"] == [[(10, 21), (5000, 20), (10, 4000)]]
+        assert [stop["properties"] for stop in decoded["stops"]] == [
+            {"order": 0, "offset": 0, "last": False},
+            {"order": 1, "offset": -1, "last": True},
+        ]
+        assert decoded["stops"][1]["geometry"] == [[(100, -60)]]
+
+    def test_collapsed_line_is_skipped(self):
+        layer = Layer("routes")
+        commands = line_commands([np.array([(1.1, 1.1), (1.2, 0.9)])])
+        layer.add_feature(LINESTRING, commands)
+        assert len(layer) == 0
+        assert encode_tile([layer]) == b""
+
+
+# ─── Views ────────────────────────────────────────────────────────────────────
+
+
+class TestCalculateRouteView:
+    url = "/api/routes/calculate/"
+
+    def waypoints(self, *coordinates):
+        return {"waypoints": [{"lat": lat, "lng": lng} for lng, lat in coordinates]}
+
+    def test_requires_authentication(self, api_client):
+        response = api_client.post(self.url, self.waypoints(A, C), format="json")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_rejects_single_waypoint(self, auth_client, graph_file):
+        response = auth_client.post(self.url, self.waypoints(A), format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_malformed_waypoint(self, auth_client, graph_file):
+        payload = {"waypoints": [{"lat": -1.3, "lng": 36.8}, {"lat": "north"}]}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_returns_routed_legs(self, auth_client, graph_file):
+        response = auth_client.post(self.url, self.waypoints(A, C, E), format="json")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.data
+        assert len(data["legs"]) == 2
+        assert data["total_distance"] == pytest.approx(
+            sum(leg["distance"]["value"] for leg in data["legs"]), abs=0.01
+        )
+        assert data["legs"][0]["geometry"]["coordinates"][1] == list(D)
+        assert data["geometry"]["coordinates"] == [list(A), list(D), list(C), list(E)]
+
+    def test_unroutable_waypoint_is_a_bad_request(self, auth_client, graph_file):
+        response = auth_client.post(self.url, self.waypoints(A, F), format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "No route" in response.data["error"]
+
+    def test_missing_graph_is_service_unavailable(self, auth_client, settings):
+        settings.ROUTING_GRAPH_PATH = ""
+        response = auth_client.post(self.url, self.waypoints(A, C), format="json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def test_repeat_request_is_served_from_storage(self, auth_client, graph_file):
+        first = auth_client.post(self.url, self.waypoints(A, C, E), format="json")
+        second = auth_client.post(self.url, self.waypoints(A, C, E), format="json")
+        assert first["X-Cache"] == "MISS"
+        assert second["X-Cache"] == "HIT"
+        assert second.data == first.data
+        assert Route.objects.count() == 1
+
+    def test_shortest_weight(self, auth_client, graph_file):
+        payload = {**self.waypoints(A, C), "weight": "distance"}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.data["weight"] == "distance"
+        assert response.data["geometry"]["coordinates"][1] == list(B)
+
+    def test_scenic_trip_route(self, auth_client, graph, tmp_path, settings):
+        path = tmp_path / "scored.npz"
+        scored_graph(graph).save(path)
+        settings.ROUTING_GRAPH_PATH = str(path)
+
+        payload = {**self.waypoints(A, C), "route_type": "scenic", "scenery": 1}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["geometry"]["coordinates"][1] == list(B)
+        assert response.data["scenery"] == 1
+        assert response.data["scenic_score"] == 1
+
+    def test_scenic_route_without_scores_is_unavailable(self, auth_client, graph_file):
+        payload = {**self.waypoints(A, C), "route_type": "scenic"}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    @pytest.mark.parametrize("scenery", [1.5, "lots"])
+    def test_rejects_invalid_scenery(self, auth_client, graph_file, scenery):
+        payload = {**self.waypoints(A, C), "scenery": scenery}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_unknown_weight(self, auth_client, graph_file):
+        payload = {**self.waypoints(A, C), "weight": "scenic"}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestRouteDetailView:
+    def test_returns_the_stored_route(self, auth_client, graph_file):
+        calculated = auth_client.post(
+            "/api/routes/calculate/",
+            {"waypoints": [{"lat": lat, "lng": lng} for lat, lng in lat_lng(A, C)]},
+            format="json",
+        ).data
+        response = auth_client.get(f"/api/routes/{calculated['id']}/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total_time"] == calculated["total_time"]
+        assert response.data["legs"] == calculated["legs"]
+        assert response.data["waypoints"] == [
+            {"lat": lat, "lng": lng} for lat, lng in lat_lng(A, C)
+        ]
+
+    def test_unknown_route_returns_404(self, auth_client):
+        response = auth_client.get("/api/routes/999999/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_stats_are_admin_only(self, auth_client, user, graph_file):
+        url = "/api/routes/stats/"
+        assert auth_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        for _ in range(3):
+            get_or_compute_route(lat_lng(A, C))
+        stats = auth_client.get(url).data
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == pytest.approx(2 / 3)
+        assert stats["stored_routes"] == 1
+
+
+class TestRouteMatrixView:
+    url = "/api/routes/matrix/"
+
+    def points(self, *coordinates):
+        return [{"lat": lat, "lng": lng} for lng, lat in coordinates]
+
+    def test_estimate_is_the_default_mode(self, auth_client):
+        response = auth_client.post(
+            self.url, {"origins": self.points(A, C)}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        km = haversine_m(A[1], A[0], C[1], C[0]) / 1000
+        assert response.data["mode"] == "estimate"
+        assert response.data["distances"][0][1] == pytest.approx(km, abs=0.001)
+        assert response.data["durations"][0][0] == 0
+
+    def test_road_mode_returns_null_for_unreachable(self, auth_client, graph_file):
+        payload = {
+            "origins": self.points(C, E),
+            "destinations": self.points(E, C),
+            "mode": "road",
+        }
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["durations"][1][1] is None
+        assert response.data["distances"][0][0] > 0
+        assert response.data["computed_cells"] == 4
+
+    def test_rejects_unknown_mode(self, auth_client):
+        payload = {"origins": self.points(A, C), "mode": "teleport"}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_malformed_destinations(self, auth_client):
+        payload = {"origins": self.points(A), "destinations": [{"lat": 1}]}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_oversized_matrix(self, auth_client):
+        payload = {"origins": self.points(*[A] * 101)}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_road_mode_without_graph_is_service_unavailable(
+        self, auth_client, settings
+    ):
+        settings.ROUTING_GRAPH_PATH = ""
+        payload = {"origins": self.points(A, C), "mode": "road"}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class TestIsochroneView:
+    url = "/api/routes/isochrone/"
+
+    def test_returns_a_feature_per_threshold(self, auth_client, graph_file):
+        payload = {"origin": {"lat": A[1] + 0.001, "lng": A[0]}, "minutes": [15, 5]}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["type"] == "FeatureCollection"
+        assert response.data["origin"] == {"lat": A[1], "lng": A[0]}
+        assert [f["properties"]["minutes"] for f in response.data["features"]] == [
+            5,
+            15,
+        ]
+        assert response.data["cached"] == 0
+        again = auth_client.post(self.url, payload, format="json")
+        assert again.data["cached"] == 2
+
+    @pytest.mark.parametrize(
+        "minutes", [[], [0], [60, 721], list(range(1, 8)), ["soon"]]
+    )
+    def test_rejects_invalid_minutes(self, auth_client, graph_file, minutes):
+        payload = {"origin": {"lat": A[1], "lng": A[0]}, "minutes": minutes}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejects_missing_origin(self, auth_client, graph_file):
+        response = auth_client.post(self.url, {"minutes": [10]}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_off_road_origin_is_bad_request(self, auth_client, graph_file):
+        payload = {"origin": {"lat": 10, "lng": 10}}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_without_graph_is_service_unavailable(self, auth_client, settings):
+        settings.ROUTING_GRAPH_PATH = ""
+        payload = {"origin": {"lat": A[1], "lng": A[0]}}
+        response = auth_client.post(self.url, payload, format="json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -1,16 +1,50 @@
 """Tests for trips app: models, serializers, views, permissions."""
 
 import pytest
-from datetime import date
+from datetime import date, time
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import get_user_model
-
-from apps.trips.models import Stop, Trip, TripShare
-from apps.trips.serializers import StopReorderSerializer, StopSerializer
+from django.utils import timezone
+
+from apps.routes.geometry import decode_polyline, encode_polyline
+from apps.routes.graph import haversine_m
+from apps.routes.matrix import great_circle_matrix
+from apps.routes.mvt import decode_tile
+from apps.places.models import Place
+from apps.trips.access import get_trip_access
+from apps.trips import fuel, legs, schedule
+from apps.trips.fast_serializers import dumps, serialize_stops, serialize_trips
+from apps.trips.models import Stop, Trip, TripAccessEntry, TripShare
+from apps.trips.optimization import optimize_order, optimize_stops, path_cost
+from apps.trips.services import apply_stop_diff
+from apps.trips.tasks import compute_trip_legs
+from apps.trips.serializers import (
+    StopReorderSerializer,
+    StopSerializer,
+    TripDetailSerializer,
+    TripListSerializer,
+)
 
 User = get_user_model()
 
 
+def route_polyline(count=2000):
+    """Encoded route heading east from Nairobi with road-like curves."""
+    import numpy as np
+
+    lon = np.linspace(36.8, 37.8, count)
+    lat = -1.3 + 0.05 * np.sin(lon * 40) + 0.0001 * np.sin(lon * 3000)
+    return encode_polyline(np.column_stack([lat, lon]))
+
+
+@pytest.fixture
+def routed_trip(trip):
+    trip.route_geometry = route_polyline()
+    trip.save()
+    return trip
+
+
 # ─── Models ───────────────────────────────────────────────────────────────────
 
 
@@ -115,6 +149,43 @@ class TestStopModel:
         assert trip.total_distance == pytest.approx(75.0)
 
 
+class TestTripRouteGeometry:
+    def test_save_builds_levels_and_bounds(self, routed_trip):
+        levels = routed_trip.route_geometry_levels["levels"]
+        assert set(levels) <= {"4", "7", "10", "13"}
+        assert len(levels["10"]) < len(routed_trip.route_geometry) / 4
+        bounds = routed_trip.route_bounds
+        assert bounds["southwest"]["lng"] == pytest.approx(36.8)
+        assert bounds["northeast"]["lng"] == pytest.approx(37.8)
+
+    def test_unchanged_route_is_not_rebuilt(self, routed_trip):
+        assert routed_trip.refresh_route_levels() is False
+        routed_trip.route_geometry = route_polyline(500)
+        assert routed_trip.refresh_route_levels() is True
+
+    def test_clearing_the_route_clears_levels(self, routed_trip):
+        routed_trip.route_geometry = ""
+        routed_trip.save()
+        routed_trip.refresh_from_db()
+        assert routed_trip.route_geometry_levels["levels"] == {}
+        assert routed_trip.overview_geometry == ""
+        assert routed_trip.route_bounds is None
+
+    def test_update_fields_save_includes_levels(self, routed_trip):
+        routed_trip.route_geometry = route_polyline(300)
+        routed_trip.save(update_fields=["route_geometry"])
+        routed_trip.refresh_from_db()
+        first = decode_polyline(routed_trip.overview_geometry)[0]
+        assert first[1] == pytest.approx(36.8)
+        assert routed_trip.refresh_route_levels() is False
+
+    def test_statistics_saves_skip_the_route(self, routed_trip, monkeypatch):
+        monkeypatch.setattr(
+            Trip, "refresh_route_levels", lambda self: pytest.fail("rebuilt")
+        )
+        routed_trip.calculate_statistics()
+
+
 # ─── Serializers ──────────────────────────────────────────────────────────────
 
 
@@ -223,6 +294,680 @@ class TestStopReorderSerializer:
         assert s.is_valid(), s.errors
 
 
+class TestFastSerializers:
+    """The fast read path must match DRF's output byte for byte."""
+
+    @pytest.fixture
+    def odd_trip(self, trip_with_stops):
+        trip_with_stops.name = "Road trip \u2028 caf\u00e9 \U0001f697"
+        trip_with_stops.route_bounds = {"north": 40.7128, "south": 1e-05, "tags": [1.5]}
+        trip_with_stops.start_date = date(2026, 5, 1)
+        trip_with_stops.end_date = date(2026, 5, 3)
+        trip_with_stops.save()
+        stop = trip_with_stops.stops.order_by("order").first()
+        stop.arrival_time = time(9, 30)
+        stop.notes = "\u2029 line"
+        stop.save()
+        # Stop saves recompute the stats, so set the tiny float afterwards
+        Trip.objects.filter(id=trip_with_stops.id).update(estimated_fuel_cost=1e-05)
+        trip_with_stops.refresh_from_db()
+        return trip_with_stops
+
+    def drf(self, serializer_class, instance, many=False):
+        return JSONRenderer().render(serializer_class(instance, many=many).data)
+
+    def test_trip_list_matches_drf(self, odd_trip):
+        trips = Trip.objects.order_by("id")
+        assert dumps(serialize_trips(trips)) == self.drf(
+            TripListSerializer, trips, many=True
+        )
+
+    def test_trip_detail_matches_drf(self, odd_trip):
+        data = serialize_trips(Trip.objects.filter(id=odd_trip.id), detail=True)[0]
+        assert dumps(data) == self.drf(TripDetailSerializer, odd_trip)
+
+    def test_stops_match_drf(self, odd_trip):
+        stops = odd_trip.stops.order_by("order")
+        assert dumps(serialize_stops(stops)) == self.drf(
+            StopSerializer, stops, many=True
+        )
+
+    def test_trip_without_stops_matches_drf(self, trip):
+        trips = Trip.objects.filter(id=trip.id)
+        assert dumps(serialize_trips(trips)) == self.drf(
+            TripListSerializer, trips, many=True
+        )
+
+    def test_browsable_api_still_uses_drf_rendering(self, auth_client, trip):
+        response = auth_client.get("/api/trips/", HTTP_ACCEPT="text/html")
+        assert response.status_code == status.HTTP_200_OK
+        assert b"<html" in response.content
+
+
+# ─── Access ───────────────────────────────────────────────────────────────────
+
+
+class FakeRequest:
+    def __init__(self, user):
+        self.user = user
+
+
+class TestTripAccess:
+    def test_owner_has_full_access(self, trip, user):
+        access = get_trip_access(FakeRequest(user), trip.id)
+        assert access.is_owner
+        assert access.allows("DELETE")
+
+    def test_view_share_is_read_only(self, trip, second_user, user):
+        TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user, permission_level="view"
+        )
+        access = get_trip_access(FakeRequest(second_user), trip.id)
+        assert access.is_member
+        assert access.allows("GET")
+        assert not access.allows("PATCH")
+
+    def test_edit_share_can_write(self, trip, second_user, user):
+        TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user, permission_level="edit"
+        )
+        assert get_trip_access(FakeRequest(second_user), trip.id).allows("PATCH")
+
+    def test_public_trip_is_readable_by_strangers(self, trip, second_user):
+        trip.is_public = True
+        trip.save()
+        access = get_trip_access(FakeRequest(second_user), trip.id)
+        assert not access.is_member
+        assert access.allows("GET")
+        assert not access.allows("POST")
+
+    def test_unknown_trip_does_not_exist(self, user):
+        assert not get_trip_access(FakeRequest(user), 999999).exists
+
+    def test_resolves_in_one_query_and_memoizes(
+        self, trip, user, django_assert_num_queries
+    ):
+        request = FakeRequest(user)
+        with django_assert_num_queries(1):
+            get_trip_access(request, trip.id)
+            get_trip_access(request, trip.id)
+
+    def test_cached_access_is_invalidated_by_share_change(
+        self, trip, user, second_user, settings, django_assert_num_queries
+    ):
+        settings.TRIP_ACCESS_CACHE_TIMEOUT = 60
+        assert not get_trip_access(FakeRequest(second_user), trip.id).is_member
+        with django_assert_num_queries(0):
+            get_trip_access(FakeRequest(second_user), trip.id)
+
+        TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user, permission_level="edit"
+        )
+        assert get_trip_access(FakeRequest(second_user), trip.id).can_edit
+
+
+class TestTripAccessIndex:
+    def _levels(self, trip):
+        return dict(
+            TripAccessEntry.objects.filter(trip=trip).values_list(
+                "user_id", "permission_level"
+            )
+        )
+
+    def test_new_trip_indexes_owner(self, trip, user):
+        assert self._levels(trip) == {user.id: "owner"}
+
+    def test_share_is_indexed_with_its_level(self, trip, user, second_user):
+        share = TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user, permission_level="view"
+        )
+        assert self._levels(trip)[second_user.id] == "view"
+
+        share.permission_level = "edit"
+        share.save()
+        assert self._levels(trip)[second_user.id] == "edit"
+
+    def test_deactivated_share_is_removed(self, trip, user, second_user):
+        share = TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user
+        )
+        share.is_active = False
+        share.save()
+        assert second_user.id not in self._levels(trip)
+
+    def test_deleted_share_is_removed(self, trip, user, second_user):
+        share = TripShare.objects.create(
+            trip=trip, shared_with=second_user, shared_by=user
+        )
+        share.delete()
+        assert self._levels(trip) == {user.id: "owner"}
+
+    def test_owner_change_is_reindexed(self, trip, user, second_user):
+        TripShare.objects.create(trip=trip, shared_with=second_user, shared_by=user)
+        trip.user = second_user
+        trip.save()
+        assert self._levels(trip) == {second_user.id: "owner"}
+
+    def test_saves_that_keep_the_owner_skip_the_index(self, trip):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        trip.name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            trip.save()
+        assert not [q for q in queries if "tripaccessentry" in q["sql"].lower()]
+
+    def test_deleting_shared_trip_cascades(self, trip, user, second_user):
+        TripShare.objects.create(trip=trip, shared_with=second_user, shared_by=user)
+        trip.delete()
+        assert not TripAccessEntry.objects.exists()
+
+
+# ─── Optimization ─────────────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def zigzag_trip(trip):
+    """Stops along one road, entered out of order between fixed endpoints."""
+    longitudes = [("start", 36.0), ("waypoint", 37.5), ("waypoint", 36.5),
+                  ("waypoint", 38.0), ("waypoint", 37.0), ("destination", 39.0)]
+    for order, (stop_type, lng) in enumerate(longitudes, start=1):
+        Stop.objects.create(
+            trip=trip,
+            name=f"Stop at {lng}",
+            address="Kenya",
+            latitude=-1.5,
+            longitude=lng,
+            stop_type=stop_type,
+            order=order,
+        )
+    return trip
+
+
+def stop_longitudes(trip):
+    return list(trip.stops.order_by("order").values_list("longitude", flat=True))
+
+
+class TestStopOptimization:
+    def test_orders_waypoints_between_fixed_endpoints(self, zigzag_trip):
+        result = optimize_stops(zigzag_trip.stops.order_by("order"))
+        stops = Stop.objects.in_bulk(result.stop_ids)
+        ordered = [stops[i].longitude for i in result.stop_ids]
+        assert ordered == [36.0, 36.5, 37.0, 37.5, 38.0, 39.0]
+        assert result.method == "exact"
+        assert result.optimized_distance < result.original_distance
+        assert result.distance_saved == pytest.approx(
+            result.original_distance - result.optimized_distance
+        )
+
+    def test_optimal_order_is_left_unchanged(self, trip_with_stops):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        result = optimize_stops(stops)
+        assert result.method == "unchanged"
+        assert result.stop_ids == [stop.id for stop in stops]
+        assert result.distance_saved == 0
+
+    def test_uses_road_durations_when_a_graph_is_configured(
+        self, zigzag_trip, settings, monkeypatch
+    ):
+        import numpy as np
+
+        from apps.routes.matrix import Matrix, estimate_matrix
+        from apps.trips import optimization
+
+        def river_between(points):
+            # No quick crossing between the stops at 36.5 and 37.0, and one
+            # pair the graph cannot route at all
+            estimate = estimate_matrix(points)
+            lon = np.array(points)[:, 1]
+            duration = estimate.duration.copy()
+            duration[np.ix_(lon == 36.5, lon == 37.0)] *= 20
+            duration[np.ix_(lon == 37.0, lon == 36.5)] *= 20
+            duration[np.ix_(lon == 36.0, lon == 39.0)] = np.nan
+            return Matrix(distance=estimate.distance, duration=duration)
+
+        settings.ROUTING_GRAPH_PATH = "/srv/roads.ch"
+        monkeypatch.setattr(optimization, "road_matrix", river_between)
+        result = optimize_stops(zigzag_trip.stops.order_by("order"))
+        stops = Stop.objects.in_bulk(result.stop_ids)
+        ordered = [stops[i].longitude for i in result.stop_ids]
+        assert result.mode == "road"
+        assert ordered != [36.0, 36.5, 37.0, 37.5, 38.0, 39.0]
+        assert all({a, b} != {36.5, 37.0} for a, b in zip(ordered, ordered[1:]))
+        assert result.optimized_duration < result.original_duration
+        assert result.time_saved == pytest.approx(
+            result.original_duration - result.optimized_duration
+        )
+
+    def test_unavailable_graph_falls_back_to_estimates(self, zigzag_trip, settings):
+        settings.ROUTING_GRAPH_PATH = "/nonexistent/roads.ch"
+        result = optimize_stops(zigzag_trip.stops.order_by("order"))
+        assert result.mode == "estimate"
+        assert result.method == "exact"
+
+    def test_exact_solver_matches_brute_force(self):
+        from itertools import permutations
+        import random
+
+        rng = random.Random(4)
+        points = [(rng.uniform(-2, 0), rng.uniform(36, 38)) for _ in range(8)]
+        matrix = great_circle_matrix(points)
+        free = list(range(1, 7))
+        best = min(
+            path_cost([0, *order, 7], matrix) for order in permutations(free)
+        )
+        order, method, _ = optimize_order(matrix, 0, free, 7)
+        assert method == "exact"
+        assert path_cost([0, *order, 7], matrix) == pytest.approx(best)
+
+    def test_local_search_visits_every_stop_and_improves(self):
+        import random
+
+        rng = random.Random(5)
+        points = [(rng.uniform(-2, 0), rng.uniform(36, 38)) for _ in range(40)]
+        matrix = great_circle_matrix(points)
+        free = list(range(1, 40))
+        order, method, complete = optimize_order(matrix, 0, free, time_budget=2)
+        assert method == "local_search"
+        assert complete
+        assert sorted(order) == free
+        assert path_cost([0, *order], matrix) < path_cost(range(40), matrix)
+
+
+# ─── Legs ─────────────────────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def queued_legs(monkeypatch):
+    """Record the trips queued for leg computation instead of sending them."""
+    queued = []
+    monkeypatch.setattr(
+        compute_trip_legs,
+        "apply_async",
+        lambda args, countdown: queued.append((args[0], countdown)),
+    )
+    return queued
+
+
+class TestLegComputation:
+    def test_fills_every_leg_and_statistics(self, zigzag_trip):
+        assert legs.update_trip_legs(zigzag_trip.id) == 5
+        stops = list(zigzag_trip.stops.order_by("order"))
+        for stop, next_stop in zip(stops, stops[1:]):
+            miles = (
+                haversine_m(
+                    stop.latitude,
+                    stop.longitude,
+                    next_stop.latitude,
+                    next_stop.longitude,
+                )
+                / 1609.344
+            )
+            assert stop.travel_distance_to_next == pytest.approx(miles)
+            assert stop.travel_time_to_next == pytest.approx(miles * 1.609344 / 60)
+        assert stops[-1].travel_distance_to_next is None
+        zigzag_trip.refresh_from_db()
+        assert zigzag_trip.total_distance == pytest.approx(
+            sum(stop.travel_distance_to_next or 0 for stop in stops)
+        )
+
+    def test_unchanged_trip_computes_nothing(self, zigzag_trip):
+        legs.update_trip_legs(zigzag_trip.id)
+        assert legs.update_trip_legs(zigzag_trip.id) == 0
+
+    def test_moving_a_stop_recomputes_its_two_legs(self, zigzag_trip):
+        legs.update_trip_legs(zigzag_trip.id)
+        stop = zigzag_trip.stops.get(order=3)
+        stop.latitude = -1.0
+        stop.save()
+        assert legs.update_trip_legs(zigzag_trip.id) == 2
+        previous = zigzag_trip.stops.get(order=2)
+        assert previous.travel_leg_key.endswith(f"{-1.0:.6f},{stop.longitude:.6f}")
+
+    def test_insert_and_delete_touch_only_adjacent_legs(self, zigzag_trip):
+        legs.update_trip_legs(zigzag_trip.id)
+        apply_stop_diff(
+            zigzag_trip,
+            create=[
+                {
+                    "name": "Extra",
+                    "address": "Kenya",
+                    "latitude": -1.5,
+                    "longitude": 39.5,
+                }
+            ],
+        )
+        # The old last stop gains a leg and the new last stop has none
+        assert legs.update_trip_legs(zigzag_trip.id) == 1
+
+        middle = zigzag_trip.stops.get(order=4)
+        apply_stop_diff(zigzag_trip, delete=[middle.id])
+        assert legs.update_trip_legs(zigzag_trip.id) == 1
+
+    def test_removing_the_last_stop_clears_the_new_last_leg(self, trip_with_stops):
+        legs.update_trip_legs(trip_with_stops.id)
+        trip_with_stops.stops.get(order=3).delete()
+        assert legs.update_trip_legs(trip_with_stops.id) == 1
+        last = trip_with_stops.stops.get(order=2)
+        assert last.travel_distance_to_next is None
+        assert last.travel_leg_key == ""
+
+    def test_unavailable_graph_falls_back_to_estimates(self, trip_with_stops, settings):
+        settings.ROUTING_GRAPH_PATH = "/nonexistent/roads.ch"
+        assert legs.update_trip_legs(trip_with_stops.id) == 2
+        first = trip_with_stops.stops.get(order=1)
+        assert first.travel_leg_key.startswith("road:")
+        assert first.travel_distance_to_next == pytest.approx(80.5, abs=1)
+
+    def test_stop_moved_during_computation_is_not_overwritten(
+        self, zigzag_trip, monkeypatch
+    ):
+        compute = legs._leg_values
+        moved = zigzag_trip.stops.get(order=4)
+
+        def move_then_compute(pairs, mode):
+            Stop.objects.filter(id=moved.id).update(latitude=-1.2)
+            return compute(pairs, mode)
+
+        monkeypatch.setattr(legs, "_leg_values", move_then_compute)
+        # Legs 3 -> 4 and 4 -> 5 were computed for the old position
+        assert legs.update_trip_legs(zigzag_trip.id) == 3
+        monkeypatch.undo()
+        assert legs.update_trip_legs(zigzag_trip.id) == 2
+
+    def test_stop_writes_queue_one_task_per_trip(
+        self, zigzag_trip, queued_legs, django_capture_on_commit_callbacks, settings
+    ):
+        settings.SHARED_CACHE = True
+        settings.TRIP_LEG_COALESCE_SECONDS = 7
+        with django_capture_on_commit_callbacks(execute=True):
+            for stop in zigzag_trip.stops.all():
+                stop.longitude += 0.01
+                stop.save()
+        assert queued_legs == [(zigzag_trip.id, 7)]
+
+    def test_writes_are_not_coalesced_without_a_shared_cache(
+        self,
+        zigzag_trip,
+        queued_legs,
+        django_capture_on_commit_callbacks,
+        settings,
+        monkeypatch,
+    ):
+        settings.SHARED_CACHE = False
+        # The worker's cache is not ours, so its clear never reaches our marker
+        monkeypatch.setattr(legs, "clear_scheduled", lambda trip_id: None)
+        stop = zigzag_trip.stops.first()
+        with django_capture_on_commit_callbacks(execute=True):
+            stop.longitude += 0.01
+            stop.save()
+        compute_trip_legs(zigzag_trip.id)
+        with django_capture_on_commit_callbacks(execute=True):
+            stop.longitude += 0.01
+            stop.save()
+        assert len(queued_legs) == 2
+
+    def test_unrelated_writes_do_not_queue(
+        self, zigzag_trip, queued_legs, django_capture_on_commit_callbacks
+    ):
+        stop = zigzag_trip.stops.first()
+        with django_capture_on_commit_callbacks(execute=True):
+            stop.notes = "Lunch"
+            stop.save(update_fields=["notes"])
+            apply_stop_diff(zigzag_trip, update=[{"id": stop.id, "notes": "Dinner"}])
+        assert queued_legs == []
+
+    def test_task_clears_the_queue_marker(
+        self, zigzag_trip, queued_legs, django_capture_on_commit_callbacks, settings
+    ):
+        settings.SHARED_CACHE = True
+        with django_capture_on_commit_callbacks(execute=True):
+            apply_stop_diff(zigzag_trip, delete=[zigzag_trip.stops.last().id])
+        assert "Updated 4 leg(s)" in compute_trip_legs(zigzag_trip.id)
+        with django_capture_on_commit_callbacks(execute=True):
+            zigzag_trip.stops.first().delete()
+        assert len(queued_legs) == 2
+
+    def test_update_trip_legs_command(self, zigzag_trip):
+        from django.core.management import call_command
+
+        call_command("update_trip_legs", str(zigzag_trip.id))
+        assert legs.update_trip_legs(zigzag_trip.id) == 0
+        assert zigzag_trip.stops.get(order=1).travel_distance_to_next > 0
+
+
+# ─── Schedule ─────────────────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def timed_trip(zigzag_trip):
+    """Six stops two hours apart, with half an hour spent at each."""
+    zigzag_trip.stops.update(travel_time_to_next=2.0, duration_minutes=30)
+    zigzag_trip.stops.filter(order=6).update(travel_time_to_next=None)
+    return zigzag_trip
+
+
+def stop_times(trip):
+    return [
+        (stop.arrival_day, stop.arrival_time, stop.departure_day, stop.departure_time)
+        for stop in trip.stops.order_by("order")
+    ]
+
+
+class TestTripSchedule:
+    def test_propagates_legs_and_dwell_times(self, timed_trip):
+        assert schedule.update_trip_schedule(timed_trip.id) == 6
+        assert stop_times(timed_trip) == [
+            (None, None, 0, time(9, 0)),
+            (0, time(11, 0), 0, time(11, 30)),
+            (0, time(13, 30), 0, time(14, 0)),
+            (0, time(16, 0), 0, time(16, 30)),
+            (0, time(18, 30), 0, time(19, 0)),
+            (0, time(21, 0), 0, time(21, 30)),
+        ]
+
+    def test_breaks_overnight_at_the_daily_driving_limit(self, timed_trip):
+        timed_trip.start_time = time(20, 0)
+        timed_trip.daily_driving_hours = 5
+        timed_trip.save()
+        schedule.update_trip_schedule(timed_trip.id)
+        stops = list(timed_trip.stops.order_by("order"))
+        overnight = [stop.order for stop in stops if stop.is_overnight]
+        assert overnight == [3, 5]
+        # Two hours of driving after midnight, then a night at the third stop
+        assert stop_times(timed_trip)[1:4] == [
+            (0, time(22, 0), 0, time(22, 30)),
+            (1, time(0, 30), 1, time(20, 0)),
+            (1, time(22, 0), 1, time(22, 30)),
+        ]
+        assert stops[-1].arrival_day == 2
+
+    def test_final_stop_without_dwell_has_no_departure(self, timed_trip):
+        timed_trip.stops.filter(order=6).update(duration_minutes=None)
+        schedule.update_trip_schedule(timed_trip.id)
+        assert stop_times(timed_trip)[-1] == (0, time(21, 0), None, None)
+
+    def test_missing_legs_leave_later_stops_unscheduled(self, timed_trip):
+        timed_trip.stops.filter(order=3).update(travel_time_to_next=None)
+        schedule.update_trip_schedule(timed_trip.id)
+        assert stop_times(timed_trip)[3:] == [(None, None, None, None)] * 3
+
+    def test_unchanged_trip_writes_nothing(self, timed_trip):
+        schedule.update_trip_schedule(timed_trip.id)
+        assert schedule.update_trip_schedule(timed_trip.id) == 0
+
+    def test_repropagates_from_the_first_changed_stop(self, timed_trip):
+        schedule.update_trip_schedule(timed_trip.id)
+        timed_trip.stops.filter(order=4).update(duration_minutes=90)
+        stops = list(timed_trip.stops.order_by("order"))
+        assert schedule.first_stale_stop(timed_trip, stops) == 3
+        changed = schedule.propagate_schedule(timed_trip, stops, 3)
+        assert [stop.order for stop in changed] == [4, 5, 6]
+
+        assert schedule.update_trip_schedule(timed_trip.id) == 3
+        assert stop_times(timed_trip)[3:] == [
+            (0, time(16, 0), 0, time(17, 30)),
+            (0, time(19, 30), 0, time(20, 0)),
+            (0, time(22, 0), 0, time(22, 30)),
+        ]
+
+    def test_resuming_after_an_overnight_matches_a_full_pass(self, timed_trip):
+        timed_trip.daily_driving_hours = 5
+        timed_trip.save()
+        schedule.update_trip_schedule(timed_trip.id)
+        timed_trip.stops.filter(order=5).update(duration_minutes=10)
+        schedule.update_trip_schedule(timed_trip.id)
+        resumed = stop_times(timed_trip)
+
+        timed_trip.stops.update(schedule_key="")
+        schedule.update_trip_schedule(timed_trip.id)
+        assert stop_times(timed_trip) == resumed
+
+    def test_stop_and_start_changes_queue_an_update(
+        self, timed_trip, queued_legs, django_capture_on_commit_callbacks
+    ):
+        stop = timed_trip.stops.get(order=2)
+        with django_capture_on_commit_callbacks(execute=True):
+            stop.duration_minutes = 60
+            stop.save(update_fields=["duration_minutes"])
+        legs.clear_scheduled(timed_trip.id)
+        with django_capture_on_commit_callbacks(execute=True):
+            timed_trip.start_time = time(7, 0)
+            timed_trip.save(update_fields=["start_time"])
+        assert [trip_id for trip_id, _ in queued_legs] == [timed_trip.id] * 2
+
+    def test_schedule_update_changes_the_etag(self, auth_client, timed_trip):
+        schedule.update_trip_schedule(timed_trip.id)
+        url = f"/api/trips/{timed_trip.id}/"
+        etag = auth_client.get(url)["ETag"]
+
+        timed_trip.stops.filter(order=2).update(duration_minutes=150)
+        assert schedule.update_trip_schedule(timed_trip.id) == 5
+        response = auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_cached_detail_shows_new_times(
+        self, auth_client, timed_trip, settings, monkeypatch
+    ):
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 60
+        schedule.update_trip_schedule(timed_trip.id)
+        url = f"/api/trips/{timed_trip.id}/"
+        before = auth_client.get(url).data["stops"]
+
+        # In the Celery worker the version bump never reaches this process
+        monkeypatch.setattr(schedule, "bump_trip_versions", lambda trip_ids: None)
+        timed_trip.stops.filter(order=2).update(duration_minutes=150)
+        assert schedule.update_trip_schedule(timed_trip.id) == 5
+        response = auth_client.get(url)
+        assert response["X-Cache"] == "MISS"
+        assert [s["arrival_time"] for s in response.data["stops"]] != [
+            s["arrival_time"] for s in before
+        ]
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 0
+        assert response.content == auth_client.get(url).content
+
+    def test_task_updates_legs_then_times(self, zigzag_trip):
+        assert "and 6 stop time(s)" in compute_trip_legs(zigzag_trip.id)
+        second = zigzag_trip.stops.get(order=2)
+        assert second.arrival_time is not None
+
+
+# ─── Fuel ─────────────────────────────────────────────────────────────────────
+
+
+def gas_station(name, lat, lon, **fields):
+    return Place.objects.create(
+        place_id=f"gas-{name}",
+        name=name,
+        address="Equator",
+        latitude=lat,
+        longitude=lon,
+        place_type="gas_station",
+        **fields,
+    )
+
+
+def equator_route(west=30.0, east=36.0):
+    """Straight route along the equator (about 69 miles per degree)."""
+    import numpy as np
+
+    lon = np.linspace(west, east, 50)
+    return np.column_stack([np.zeros_like(lon), lon])
+
+
+@pytest.fixture
+def stations(db):
+    gas_station("West", 0.001, 31.0)
+    gas_station("Mid", 0.001, 32.4)
+    gas_station("East", -0.002, 34.8)
+    gas_station("Far", 0.2, 33.5)
+    gas_station("Closed", 0.0, 33.6, permanently_closed=True)
+
+
+class TestFuelPlanning:
+    def _choose(self, along, offset, length=400, usable=200, start=200):
+        import numpy as np
+
+        return fuel.choose_stops(
+            np.array(along, dtype=float),
+            np.array(offset, dtype=float),
+            length,
+            usable,
+            start,
+        )
+
+    def test_fewest_stops_then_least_detour(self):
+        # Any two of the first three stations with the last cover the route
+        assert self._choose([300, 160, 100, 150], [0, 5, 3, 0]) == [3, 0]
+
+    def test_no_stops_when_the_tank_covers_the_route(self):
+        assert self._choose([50], [0], length=150) == []
+
+    def test_detour_counts_against_the_range(self):
+        with pytest.raises(fuel.NoFuelPlan):
+            self._choose([190, 200], [20, 20])
+
+    def test_gap_reports_where_fuel_runs_out(self):
+        with pytest.raises(fuel.NoFuelPlan) as e:
+            self._choose([100, 500], [0, 0], length=600)
+        assert e.value.stranded_at == 300
+
+    def test_projects_points_onto_the_route(self):
+        import numpy as np
+
+        along, offset = fuel.project_onto_route(
+            equator_route(), np.array([[0.01, 33.0], [0.0, 29.0]])
+        )
+        assert along[0] == pytest.approx(haversine_m(0, 30, 0, 33), rel=1e-3)
+        assert offset[0] == pytest.approx(1112, rel=1e-2)
+        # Points before the start meet the route at its start
+        assert along[1] == 0
+        assert offset[1] == pytest.approx(haversine_m(0, 29, 0, 30), rel=1e-6)
+
+    def test_plans_stops_from_cached_stations(self, stations):
+        plan = fuel.plan_fuel_stops(equator_route(), 200, 30, 4.0)
+        assert plan.stations_considered == 3
+        assert [stop.name for stop in plan.stops] == ["Mid", "East"]
+        mid, east = plan.stops
+        assert mid.route_miles == pytest.approx(2.4 * 69.1, rel=1e-2)
+        assert mid.gallons == pytest.approx(mid.route_miles / 30, rel=1e-2)
+        assert east.gallons == pytest.approx(2.4 * 69.1 / 30, rel=1e-2)
+        assert east.detour_miles > mid.detour_miles > 0
+        assert east.detour_cost == pytest.approx(east.detour_miles / 30 * 4.0)
+        assert plan.total_detour_miles == mid.detour_miles + east.detour_miles
+
+    def test_low_start_fuel_adds_an_early_stop(self, stations):
+        plan = fuel.plan_fuel_stops(equator_route(), 200, 30, 4.0, start_fuel=0.6)
+        assert [stop.name for stop in plan.stops] == ["West", "Mid", "East"]
+
+    def test_wider_corridor_reaches_farther_stations(self, stations):
+        plan = fuel.plan_fuel_stops(
+            equator_route(), 200, 30, 4.0, corridor_miles=15
+        )
+        assert plan.stations_considered == 4
+
+
 # ─── Views ────────────────────────────────────────────────────────────────────
 
 
@@ -318,6 +1063,132 @@ class TestTripDetailView:
         assert Trip.objects.filter(id=trip.id).exists()
 
 
+class TestConditionalRequests:
+    def _trip_url(self, pk):
+        return f"/api/trips/{pk}/"
+
+    def _stops_url(self, pk):
+        return f"/api/trips/{pk}/stops/"
+
+    def test_trip_detail_returns_etag(self, auth_client, trip):
+        response = auth_client.get(self._trip_url(trip.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"].startswith(f'"{trip.id}-')
+
+    def test_matching_if_none_match_returns_304(self, auth_client, trip_with_stops):
+        etag = auth_client.get(self._trip_url(trip_with_stops.id))["ETag"]
+        response = auth_client.get(
+            self._trip_url(trip_with_stops.id), HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+
+    def test_stop_change_invalidates_stop_list_etag(
+        self, auth_client, trip_with_stops
+    ):
+        url = self._stops_url(trip_with_stops.id)
+        etag = auth_client.get(url)["ETag"]
+        assert auth_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        stop = trip_with_stops.stops.first()
+        auth_client.delete(f"{url}{stop.id}/")
+        response = auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 2
+
+    def test_stale_if_match_returns_412(self, auth_client, trip):
+        etag = auth_client.get(self._trip_url(trip.id))["ETag"]
+        auth_client.patch(self._trip_url(trip.id), {"name": "First"}, format="json")
+        response = auth_client.patch(
+            self._trip_url(trip.id),
+            {"name": "Second"},
+            format="json",
+            HTTP_IF_MATCH=etag,
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        trip.refresh_from_db()
+        assert trip.name == "First"
+
+    def test_current_if_match_allows_update(self, auth_client, trip):
+        etag = auth_client.get(self._trip_url(trip.id))["ETag"]
+        response = auth_client.patch(
+            self._trip_url(trip.id), {"name": "Renamed"}, format="json", HTTP_IF_MATCH=etag
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+
+class TestResponseCache:
+    @pytest.fixture(autouse=True)
+    def response_cache(self, settings):
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 60
+
+    def test_cached_detail_matches_uncached_bytes(
+        self, auth_client, trip_with_stops, settings
+    ):
+        url = f"/api/trips/{trip_with_stops.id}/"
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 0
+        uncached = auth_client.get(url)
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 60
+        miss = auth_client.get(url)
+        hit = auth_client.get(url)
+        assert miss["X-Cache"] == "MISS"
+        assert hit["X-Cache"] == "HIT"
+        assert hit.content == miss.content == uncached.content
+
+    def test_public_page_matches_uncached_bytes(self, api_client, trip_with_stops, settings):
+        trip_with_stops.is_public = True
+        trip_with_stops.save()
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 0
+        uncached = api_client.get("/api/trips/public/")
+        settings.TRIP_RESPONSE_CACHE_TIMEOUT = 60
+        api_client.get("/api/trips/public/")
+        hit = api_client.get("/api/trips/public/")
+        assert hit["X-Cache"] == "HIT"
+        assert hit.content == uncached.content
+
+    def test_stop_write_invalidates_cached_detail(self, auth_client, trip_with_stops):
+        url = f"/api/trips/{trip_with_stops.id}/"
+        auth_client.get(url)
+        stop = trip_with_stops.stops.first()
+        stop.name = "Renamed Stop"
+        stop.save()
+        response = auth_client.get(url)
+        assert response["X-Cache"] == "MISS"
+        assert "Renamed Stop" in [s["name"] for s in response.data["stops"]]
+
+    def test_write_from_another_process_misses(self, auth_client, trip_with_stops):
+        # A write elsewhere moves updated_at but cannot bump this process's token
+        url = f"/api/trips/{trip_with_stops.id}/"
+        before = auth_client.get(url)
+        Stop.objects.filter(trip=trip_with_stops, order=1).update(name="Renamed Stop")
+        Trip.objects.filter(id=trip_with_stops.id).update(updated_at=timezone.now())
+        response = auth_client.get(url)
+        assert response["ETag"] != before["ETag"]
+        assert response["X-Cache"] == "MISS"
+        assert "Renamed Stop" in [s["name"] for s in response.data["stops"]]
+
+    def test_owner_rename_invalidates_cached_detail(self, auth_client, trip, user):
+        url = f"/api/trips/{trip.id}/"
+        auth_client.get(url)
+        user.first_name = "Alicia"
+        user.save()
+        assert auth_client.get(url).data["user_name"] == "Alicia Test"
+
+    def test_stats_are_admin_only(self, auth_client, user, trip):
+        url = "/api/trips/cache-stats/"
+        assert auth_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        auth_client.get(f"/api/trips/{trip.id}/")
+        auth_client.get(f"/api/trips/{trip.id}/")
+        stats = auth_client.get(url).data
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == pytest.approx(0.5)
+
+
 class TestStopListCreateView:
     def _url(self, trip_id):
         return f"/api/trips/{trip_id}/stops/"
@@ -401,9 +1272,6 @@ class TestReorderStopsView:
         return f"/api/trips/{trip_id}/stops/reorder/"
 
     def test_owner_can_reorder_stops(self, auth_client, trip_with_stops):
-        # The view saves each stop individually, so swapping existing order
-        # values triggers the unique_together constraint mid-transaction.
-        # Move a single stop to an unused order value to avoid this.
         stops = list(trip_with_stops.stops.order_by("order"))
         payload = {"stop_orders": [{"id": stops[2].id, "order": 10}]}
         response = auth_client.post(
@@ -413,6 +1281,51 @@ class TestReorderStopsView:
         stops[2].refresh_from_db()
         assert stops[2].order == 10
 
+    def test_swapping_existing_orders_succeeds(self, auth_client, trip_with_stops):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        payload = {
+            "stop_orders": [
+                {"id": stops[0].id, "order": 2},
+                {"id": stops[1].id, "order": 1},
+            ]
+        }
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        ordered = list(trip_with_stops.stops.order_by("order").values_list("id", flat=True))
+        assert ordered == [stops[1].id, stops[0].id, stops[2].id]
+
+    def test_order_taken_by_unlisted_stop_returns_400(
+        self, auth_client, trip_with_stops
+    ):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        payload = {"stop_orders": [{"id": stops[0].id, "order": 3}]}
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_stop_from_another_trip_returns_400(
+        self, auth_client, trip_with_stops, user
+    ):
+        other = Trip.objects.create(user=user, name="Other", route_type="fastest")
+        foreign = Stop.objects.create(
+            trip=other,
+            name="Elsewhere",
+            address="Elsewhere",
+            latitude=0.0,
+            longitude=0.0,
+            order=1,
+        )
+        payload = {"stop_orders": [{"id": foreign.id, "order": 5}]}
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        foreign.refresh_from_db()
+        assert foreign.order == 1
+
     def test_duplicate_orders_returns_400(self, auth_client, trip_with_stops):
         stops = list(trip_with_stops.stops.order_by("order"))
         payload = {
@@ -433,6 +1346,296 @@ class TestReorderStopsView:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+class TestBulkStopsView:
+    def _url(self, trip_id):
+        return f"/api/trips/{trip_id}/stops/bulk/"
+
+    def test_applies_create_update_and_delete_together(
+        self, auth_client, trip_with_stops
+    ):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        payload = {
+            "create": [
+                {
+                    "name": "Baltimore",
+                    "address": "Baltimore, MD",
+                    "latitude": 39.2904,
+                    "longitude": -76.6122,
+                    "stop_type": "waypoint",
+                }
+            ],
+            "update": [{"id": stops[0].id, "notes": "Leave early"}],
+            "delete": [stops[1].id],
+        }
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [s["name"] for s in response.data] == [
+            "New York",
+            "Washington D.C.",
+            "Baltimore",
+        ]
+        assert response.data[0]["notes"] == "Leave early"
+        assert not Stop.objects.filter(id=stops[1].id).exists()
+
+    def test_swapping_orders_does_not_collide(self, auth_client, trip_with_stops):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        payload = {
+            "reorder": [
+                {"id": stops[0].id, "order": 3},
+                {"id": stops[2].id, "order": 1},
+            ]
+        }
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [s["id"] for s in response.data] == [
+            stops[2].id,
+            stops[1].id,
+            stops[0].id,
+        ]
+
+    def test_statistics_recalculated_after_delete(self, auth_client, trip_with_stops):
+        first = trip_with_stops.stops.order_by("order").first()
+        auth_client.post(
+            self._url(trip_with_stops.id), {"delete": [first.id]}, format="json"
+        )
+        trip_with_stops.refresh_from_db()
+        assert trip_with_stops.total_distance == pytest.approx(140.0)
+
+    def test_conflicting_final_orders_return_400(self, auth_client, trip_with_stops):
+        stops = list(trip_with_stops.stops.order_by("order"))
+        payload = {"update": [{"id": stops[0].id, "order": 2}]}
+        response = auth_client.post(
+            self._url(trip_with_stops.id), payload, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        stops[0].refresh_from_db()
+        assert stops[0].order == 1
+
+    def test_unknown_stop_id_returns_400(self, auth_client, trip_with_stops):
+        response = auth_client.post(
+            self._url(trip_with_stops.id), {"delete": [999999]}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert trip_with_stops.stops.count() == 3
+
+    def test_non_owner_cannot_bulk_edit(self, second_auth_client, trip_with_stops):
+        first = trip_with_stops.stops.first()
+        response = second_auth_client.post(
+            self._url(trip_with_stops.id), {"delete": [first.id]}, format="json"
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert Stop.objects.filter(id=first.id).exists()
+
+
+class TestOptimizeStopOrderView:
+    def _url(self, trip_id):
+        return f"/api/trips/{trip_id}/stops/optimize/"
+
+    def test_returns_proposal_without_applying(self, auth_client, zigzag_trip):
+        before = stop_longitudes(zigzag_trip)
+        response = auth_client.post(self._url(zigzag_trip.id), {}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["applied"] is False
+        assert response.data["distance_saved"] > 0
+        assert [item["order"] for item in response.data["stop_orders"]] == list(
+            range(1, 7)
+        )
+        assert stop_longitudes(zigzag_trip) == before
+
+    def test_apply_saves_the_new_order(self, auth_client, zigzag_trip):
+        response = auth_client.post(
+            self._url(zigzag_trip.id), {"apply": True}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["applied"] is True
+        assert stop_longitudes(zigzag_trip) == [36.0, 36.5, 37.0, 37.5, 38.0, 39.0]
+        etag = auth_client.get(f"/api/trips/{zigzag_trip.id}/")["ETag"]
+        assert response["ETag"] == etag
+
+    def test_viewer_can_preview_but_not_apply(
+        self, second_auth_client, zigzag_trip, user, second_user
+    ):
+        TripShare.objects.create(
+            trip=zigzag_trip,
+            shared_with=second_user,
+            shared_by=user,
+            permission_level="view",
+        )
+        url = self._url(zigzag_trip.id)
+        assert second_auth_client.post(url, {}, format="json").status_code == 200
+        response = second_auth_client.post(url, {"apply": True}, format="json")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_apply_honours_if_match(self, auth_client, zigzag_trip):
+        response = auth_client.post(
+            self._url(zigzag_trip.id),
+            {"apply": True},
+            format="json",
+            HTTP_IF_MATCH='"stale"',
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    def test_invalid_time_budget_returns_400(self, auth_client, zigzag_trip):
+        response = auth_client.post(
+            self._url(zigzag_trip.id), {"time_budget_ms": 0}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestTripScheduleView:
+    def _url(self, trip_id):
+        return f"/api/trips/{trip_id}/schedule/"
+
+    def test_returns_the_trip_with_stop_times(self, auth_client, timed_trip):
+        timed_trip.stops.update(travel_leg_key="")
+        response = auth_client.post(self._url(timed_trip.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["start_time"] == "09:00:00"
+        stops = response.data["stops"]
+        assert stops[0]["departure_time"] == "09:00:00"
+        assert all(stop["arrival_day"] == 0 for stop in stops[1:])
+        assert stops[-1]["arrival_time"] > stops[1]["arrival_time"]
+
+    def test_stop_times_are_read_only(self, auth_client, timed_trip):
+        stop = timed_trip.stops.get(order=2)
+        response = auth_client.patch(
+            f"/api/trips/{timed_trip.id}/stops/{stop.id}/",
+            {"arrival_time": "03:00"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        stop.refresh_from_db()
+        assert stop.arrival_time is None
+
+    def test_non_member_is_forbidden(self, second_auth_client, timed_trip):
+        response = second_auth_client.post(self._url(timed_trip.id))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestFuelPlanView:
+    def _url(self, trip_id):
+        return f"/api/trips/{trip_id}/fuel-stops/"
+
+    @pytest.fixture
+    def equator_trip(self, trip, stations):
+        trip.route_geometry = encode_polyline(equator_route())
+        trip.save()
+        return trip
+
+    def test_returns_planned_stops(self, auth_client, equator_trip):
+        response = auth_client.post(
+            self._url(equator_trip.id), {"range_miles": 200}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [stop["place_id"] for stop in response.data["stops"]] == [
+            "gas-Mid",
+            "gas-East",
+        ]
+        assert response.data["route_miles"] == pytest.approx(414.6, abs=0.5)
+        assert response.data["stations_considered"] == 3
+
+    def test_range_defaults_to_tank_size(self, auth_client, equator_trip):
+        response = auth_client.post(
+            self._url(equator_trip.id), {"tank_gallons": 10}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["range_miles"] == 300
+        assert len(response.data["stops"]) == 1
+
+    def test_uncovered_route_reports_where_fuel_runs_out(
+        self, auth_client, equator_trip
+    ):
+        Place.objects.filter(name="Mid").delete()
+        response = auth_client.post(
+            self._url(equator_trip.id), {"range_miles": 200}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        # West at mile 69 plus 180 usable miles
+        assert response.data["stranded_at_mile"] == pytest.approx(249, abs=1)
+
+    def test_falls_back_to_the_stops(self, auth_client, zigzag_trip):
+        # Straight legs add up to about 483 miles; the station is at the second stop
+        gas_station("Zigzag", -1.5, 37.5)
+        response = auth_client.post(
+            self._url(zigzag_trip.id), {"range_miles": 450}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [stop["name"] for stop in response.data["stops"]] == ["Zigzag"]
+
+    def test_trip_without_a_route(self, auth_client, trip):
+        response = auth_client.post(self._url(trip.id), {}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_non_member_is_forbidden(self, second_auth_client, equator_trip):
+        response = second_auth_client.post(self._url(equator_trip.id))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestTripGeometryView:
+    def _url(self, trip_id):
+        return f"/api/trips/{trip_id}/geometry/"
+
+    def test_detail_ships_the_overview_level(self, auth_client, routed_trip):
+        response = auth_client.get(f"/api/trips/{routed_trip.id}/")
+        assert response.status_code == status.HTTP_200_OK
+        overview = routed_trip.route_geometry_levels["levels"]["10"]
+        assert response.json()["route_geometry"] == overview
+
+    def test_full_route_without_zoom(self, auth_client, routed_trip):
+        response = auth_client.get(self._url(routed_trip.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["zoom"] is None
+        assert response.data["geometry"] == routed_trip.route_geometry
+        assert response.data["bounds"] == routed_trip.route_bounds
+
+    def test_zoom_selects_a_level(self, auth_client, routed_trip):
+        response = auth_client.get(self._url(routed_trip.id), {"zoom": 6})
+        assert response.data["zoom"] == 7
+        assert response.data["geometry"] == (
+            routed_trip.route_geometry_levels["levels"]["7"]
+        )
+
+    def test_geojson_format(self, auth_client, routed_trip):
+        response = auth_client.get(
+            self._url(routed_trip.id), {"zoom": 10, "encoding": "geojson"}
+        )
+        geometry = response.data["geometry"]
+        points = decode_polyline(routed_trip.route_geometry_levels["levels"]["10"])
+        assert geometry["type"] == "LineString"
+        assert geometry["coordinates"] == points[:, ::-1].tolist()
+
+    def test_invalid_zoom_returns_400(self, auth_client, routed_trip):
+        response = auth_client.get(self._url(routed_trip.id), {"zoom": 30})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_unchanged_route_returns_304(self, auth_client, routed_trip):
+        etag = auth_client.get(self._url(routed_trip.id))["ETag"]
+        response = auth_client.get(self._url(routed_trip.id), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_private_trip_is_forbidden_to_others(
+        self, second_auth_client, routed_trip
+    ):
+        response = second_auth_client.get(self._url(routed_trip.id))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_public_trip_is_readable(self, second_auth_client, routed_trip):
+        routed_trip.is_public = True
+        routed_trip.save()
+        response = second_auth_client.get(self._url(routed_trip.id), {"zoom": 4})
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_invalid_polyline_is_rejected_on_update(self, auth_client, trip):
+        response = auth_client.patch(
+            f"/api/trips/{trip.id}/", {"route_geometry": "_p~iF~ps|"}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 class TestPublicTripsView:
     url = "/api/trips/public/"
 
@@ -461,6 +1664,158 @@ class TestPublicTripsView:
         assert "results" in response.data
 
 
+def tile_for(lat, lon, zoom):
+    """Address of the web map tile containing a point."""
+    import math
+
+    n = 2**zoom
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return zoom, int((lon + 180) / 360 * n), int(y)
+
+
+@pytest.fixture
+def public_route(routed_trip):
+    routed_trip.is_public = True
+    routed_trip.save()
+    Stop.objects.create(
+        trip=routed_trip,
+        name="Thika",
+        address="Thika, Kenya",
+        latitude=-1.3,
+        longitude=37.0,
+        order=1,
+    )
+    return routed_trip
+
+
+class TestPublicTripTileView:
+    @pytest.fixture(autouse=True)
+    def shared_cache(self, settings):
+        settings.SHARED_CACHE = True
+
+    def _url(self, z, x, y):
+        return f"/api/trips/public/tiles/{z}/{x}/{y}.mvt"
+
+    def test_public_route_is_drawn(self, api_client, public_route):
+        response = api_client.get(self._url(*tile_for(-1.3, 37.0, 8)))
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/vnd.mapbox-vector-tile"
+        layers = decode_tile(response.content)
+        (route,) = layers["routes"]
+        assert route["id"] == public_route.id
+        assert route["properties"]["name"] == public_route.name
+        (stop,) = layers["stops"]
+        assert stop["properties"]["trip_id"] == public_route.id
+
+    def test_low_zoom_uses_a_simplified_level_without_stops(
+        self, api_client, public_route
+    ):
+        response = api_client.get(self._url(*tile_for(-1.3, 37.0, 4)))
+        layers = decode_tile(response.content)
+        assert "stops" not in layers
+        points = sum(len(part) for part in layers["routes"][0]["geometry"])
+        assert points < len(decode_polyline(public_route.route_geometry)) / 10
+
+    def test_deep_zoom_reads_the_full_route(self, api_client, public_route):
+        lat, lon = decode_polyline(public_route.route_geometry)[1000]
+        response = api_client.get(self._url(*tile_for(lat, lon, 16)))
+        assert response.status_code == status.HTTP_200_OK
+        assert decode_tile(response.content)["routes"]
+
+    def test_private_trip_is_not_drawn(self, api_client, routed_trip):
+        response = api_client.get(self._url(*tile_for(-1.3, 37.0, 8)))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    def test_tile_outside_the_world_returns_404(self, api_client, db):
+        response = api_client.get(self._url(3, 8, 0))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_cached_tile_needs_no_queries(
+        self, api_client, public_route, django_assert_num_queries
+    ):
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        first = api_client.get(url)
+        with django_assert_num_queries(0):
+            second = api_client.get(url)
+        assert second.content == first.content
+
+    def test_unpublishing_retires_tiles(self, api_client, public_route):
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        etag = api_client.get(url)["ETag"]
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == (
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        public_route.is_public = False
+        public_route.save(update_fields=["is_public"])
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response["ETag"] != etag
+
+    def test_private_trip_writes_keep_tiles(self, api_client, public_route, user):
+        private = Trip.objects.create(user=user, name="Private")
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        etag = api_client.get(url)["ETag"]
+        private.name = "Renamed"
+        private.save()
+        assert api_client.get(url)["ETag"] == etag
+
+    def test_undrawn_writes_keep_tiles(self, api_client, public_route):
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        etag = api_client.get(url)["ETag"]
+        stop = public_route.stops.get()
+        stop.notes = "Fuel up"
+        stop.save()
+        public_route.description = "Updated"
+        public_route.save()
+        apply_stop_diff(public_route, update=[{"id": stop.id, "notes": "Lunch"}])
+        assert api_client.get(url)["ETag"] == etag
+
+    def test_moving_a_stop_retires_tiles(self, api_client, public_route):
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        etag = api_client.get(url)["ETag"]
+        stop = public_route.stops.get()
+        apply_stop_diff(public_route, update=[{"id": stop.id, "latitude": -1.31}])
+        moved = api_client.get(url)["ETag"]
+        assert moved != etag
+        stop.refresh_from_db()
+        stop.name = "Thika Town"
+        stop.save()
+        assert api_client.get(url)["ETag"] != moved
+
+    def test_tiles_are_not_cached_without_a_shared_cache(
+        self, api_client, public_route, settings, tmp_path
+    ):
+        settings.SHARED_CACHE = False
+        settings.TRIP_TILE_CACHE_DIR = str(tmp_path)
+        url = self._url(*tile_for(-1.3, 37.0, 8))
+        first = api_client.get(url)
+        assert "ETag" not in first
+        public_route.name = "Renamed"
+        public_route.save()
+        layers = decode_tile(api_client.get(url).content)
+        assert layers["routes"][0]["properties"]["name"] == "Renamed"
+        assert list(tmp_path.iterdir()) == []
+
+    def test_disk_cache(self, api_client, public_route, settings, tmp_path):
+        settings.TRIP_TILE_CACHE_DIR = str(tmp_path)
+        z, x, y = tile_for(-1.3, 37.0, 8)
+        response = api_client.get(self._url(z, x, y))
+        version = response["ETag"].strip('"')
+        path = tmp_path / version / str(z) / str(x) / f"{y}.mvt"
+        assert path.read_bytes() == response.content
+
+        public_route.name = "Renamed"
+        public_route.save()
+        response = api_client.get(self._url(z, x, y))
+        assert decode_tile(response.content)["routes"][0]["properties"]["name"] == (
+            "Renamed"
+        )
+        assert [entry.name for entry in tmp_path.iterdir()] == [
+            response["ETag"].strip('"')
+        ]
+
+
 class TestSharedTripsView:
     url = "/api/trips/shared/"
 
@@ -0,0 +1,670 @@
+"""Tests for weather app: providers, cached service and views."""
+
+import time
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import requests
+from django.utils import timezone
+from rest_framework import status
+
+from apps.messaging.models import Notification
+from apps.trips.models import Stop, Trip, TripShare
+from apps.trips.schedule import update_trip_schedule
+from apps.weather import hazards
+from apps.weather.tasks import check_route_weather, refresh_trip_weather
+from apps.weather.timeline import (
+    REFRESH_MARGIN,
+    refresh_upcoming_trips,
+    stop_arrivals,
+    trip_weather,
+)
+from services import weather, weather_grid
+from services.weather import (
+    OpenWeatherProvider,
+    StubWeatherProvider,
+    WeatherUnavailable,
+    weather_service,
+)
+
+
+class CountingProvider(StubWeatherProvider):
+    """Stub provider that records the locations it was asked about."""
+
+    def __init__(self):
+        self.calls = []
+
+    def current(self, lat, lon, hour):
+        self.calls.append(("current", lat, lon))
+        return super().current(lat, lon, hour)
+
+    def forecast(self, lat, lon, hour):
+        self.calls.append(("forecast", lat, lon))
+        return super().forecast(lat, lon, hour)
+
+
+class SlowProvider(CountingProvider):
+    """Stub provider whose forecasts take a while, or fail, like a remote one."""
+
+    def __init__(self, delay, failing=()):
+        super().__init__()
+        self.delay = delay
+        self.failing = failing
+
+    def forecast(self, lat, lon, hour):
+        time.sleep(self.delay)
+        if (lat, lon) in self.failing:
+            self.calls.append(("forecast", lat, lon))
+            raise WeatherUnavailable("Weather provider is unavailable")
+        return super().forecast(lat, lon, hour)
+
+
+class StormProvider(CountingProvider):
+    """Stub provider with a gale west of ``storm_lon`` and calm weather elsewhere."""
+
+    def __init__(self, storm_lon=35.5):
+        super().__init__()
+        self.storm_lon = storm_lon
+
+    def forecast(self, lat, lon, hour):
+        points = super().forecast(lat, lon, hour)
+        for point in points:
+            stormy = lon < self.storm_lon
+            point.update(
+                wind_mph=55.0 if stormy else 5.0,
+                precipitation_mm=0.0,
+                precipitation_chance=0.0,
+            )
+        return points
+
+
+@pytest.fixture
+def use_provider(settings, monkeypatch):
+    settings.WEATHER_PROVIDER = "stub"
+
+    def use(provider):
+        monkeypatch.setitem(weather._providers, "stub", provider)
+        return provider
+
+    return use
+
+
+@pytest.fixture
+def provider(use_provider):
+    return use_provider(CountingProvider())
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def json(self):
+        return self.data
+
+
+OPENWEATHER_ITEM = {
+    "dt": 1_790_000_000,
+    "main": {"temp": 71.26, "humidity": 64},
+    "weather": [{"main": "Rain", "description": "light rain", "icon": "10d"}],
+    "wind": {"speed": 9.17},
+    "rain": {"3h": 1.2},
+    "pop": 0.4,
+}
+
+
+# ─── Providers ────────────────────────────────────────────────────────────────
+
+
+class TestStubProvider:
+    def test_same_location_and_hour_give_the_same_reading(self):
+        stub = StubWeatherProvider()
+        reading = stub.current(-1.29, 36.82, 500_000)
+        assert stub.current(-1.29, 36.82, 500_000) == reading
+        assert stub.current(-1.29, 36.82, 500_001) != reading
+
+    def test_forecast_steps_through_the_coming_days(self):
+        points = StubWeatherProvider().forecast(-1.29, 36.82, 500_000)
+        assert len(points) == weather.FORECAST_HOURS // weather.FORECAST_STEP_HOURS
+        assert points[0]["time"] == 500_000 * 3600
+        assert points[1]["time"] - points[0]["time"] == 3 * 3600
+        assert all(point["condition"] in weather.CONDITIONS for point in points)
+
+
+class TestOpenWeatherProvider:
+    def test_normalizes_forecast_items(self, monkeypatch):
+        provider = OpenWeatherProvider("key", timeout=2)
+        requested = []
+
+        def get(url, params, timeout):
+            requested.append((url, params, timeout))
+            return FakeResponse({"list": [OPENWEATHER_ITEM]})
+
+        monkeypatch.setattr(provider.session, "get", get)
+        assert provider.forecast(-1.29, 36.82, 0) == [
+            {
+                "time": 1_790_000_000,
+                "temp_f": 71.3,
+                "condition": "Light rain",
+                "icon": "10d",
+                "humidity": 64,
+                "wind_mph": 9.2,
+                "precipitation_chance": 0.4,
+                "precipitation_mm": 1.2,
+            }
+        ]
+        url, params, timeout = requested[0]
+        assert url.endswith("/forecast")
+        assert params["units"] == "imperial" and timeout == 2
+
+    def test_failures_raise_unavailable(self, monkeypatch):
+        provider = OpenWeatherProvider("key")
+        monkeypatch.setattr(
+            provider.session, "get", lambda *args, **kwargs: FakeResponse({}, 401)
+        )
+        with pytest.raises(WeatherUnavailable):
+            provider.current(-1.29, 36.82, 0)
+
+    def test_unexpected_replies_raise_unavailable(self, monkeypatch):
+        provider = OpenWeatherProvider("key")
+        monkeypatch.setattr(
+            provider.session, "get", lambda *args, **kwargs: FakeResponse({"dt": 1})
+        )
+        with pytest.raises(WeatherUnavailable):
+            provider.current(-1.29, 36.82, 0)
+
+    def test_provider_needs_a_key(self, settings):
+        settings.WEATHER_PROVIDER = "openweather"
+        settings.OPENWEATHER_API_KEY = ""
+        with pytest.raises(WeatherUnavailable):
+            weather.get_provider()
+
+
+# ─── Service ──────────────────────────────────────────────────────────────────
+
+
+class TestWeatherService:
+    def test_nearby_lookups_share_a_cached_reading(self, provider):
+        first = weather_service.get_current(-1.2921, 36.8219)
+        assert weather_service.get_current(-1.2899, 36.8201) == first
+        assert provider.calls == [("current", -1.29, 36.82)]
+
+    def test_current_and_forecast_are_cached_apart(self, provider):
+        weather_service.get_current(-1.29, 36.82)
+        weather_service.get_forecast(-1.29, 36.82)
+        weather_service.get_forecast(-1.29, 36.82)
+        assert [kind for kind, *_ in provider.calls] == ["current", "forecast"]
+
+    def test_new_hour_fetches_again(self, provider, monkeypatch):
+        weather_service.get_current(-1.29, 36.82)
+        monkeypatch.setattr(weather, "current_hour", lambda: 10**6)
+        weather_service.get_current(-1.29, 36.82)
+        assert len(provider.calls) == 2
+
+
+class TestBatchForecasts:
+    def test_stops_in_one_cell_share_a_call(self, provider):
+        locations = [(-1.2921, 36.8219), (-1.2899, 36.8201), (-0.09, 34.77)]
+        forecasts = weather_service.get_forecasts(locations)
+        assert forecasts[0] == forecasts[1] != forecasts[2]
+        assert sorted(provider.calls) == [
+            ("forecast", -1.29, 36.82),
+            ("forecast", -0.09, 34.77),
+        ]
+
+    def test_cached_cells_are_not_fetched_again(self, provider):
+        weather_service.get_forecast(-1.29, 36.82)
+        weather_service.get_forecasts([(-1.29, 36.82), (-0.09, 34.77)])
+        assert provider.calls[1:] == [("forecast", -0.09, 34.77)]
+
+    def test_cells_are_fetched_concurrently(self, use_provider):
+        provider = use_provider(SlowProvider(0.2))
+        locations = [(-1.0 - i / 10, 36.0 + i / 10) for i in range(20)]
+        started = time.perf_counter()
+        forecasts = weather_service.get_forecasts(locations)
+        assert time.perf_counter() - started < 1.0
+        assert len(provider.calls) == 20
+        # Results map back to their locations, in order
+        assert forecasts == [weather_service.get_forecast(*loc) for loc in locations]
+
+    def test_deadline_leaves_slow_cells_empty(self, use_provider):
+        use_provider(SlowProvider(1.0))
+        started = time.perf_counter()
+        assert weather_service.get_forecasts([(-1.29, 36.82)], deadline=0.1) == [None]
+        assert time.perf_counter() - started < 0.5
+
+    def test_failed_cells_are_empty_and_not_cached(self, use_provider):
+        provider = use_provider(SlowProvider(0, failing=[(-1.29, 36.82)]))
+        locations = [(-1.29, 36.82), (-0.09, 34.77)]
+        first, second = weather_service.get_forecasts(locations)
+        assert first is None and second
+        weather_service.get_forecasts(locations)
+        assert [call[1:] for call in provider.calls].count((-1.29, 36.82)) == 2
+
+    def test_irregular_forecasts_are_unavailable(self, use_provider, upcoming_trip):
+        class IrregularProvider(CountingProvider):
+            def forecast(self, lat, lon, hour):
+                points = super().forecast(lat, lon, hour)
+                if lat > -1:
+                    points[1]["time"] += 600
+                return points
+
+        use_provider(IrregularProvider())
+        first, last = weather_service.get_forecasts([(-1.29, 36.82), (-0.09, 34.77)])
+        assert first and last is None
+        statuses = [entry["status"] for entry in trip_weather(upcoming_trip)]
+        assert statuses == ["forecast", "forecast", "unavailable"]
+
+
+# ─── Grid store ───────────────────────────────────────────────────────────────
+
+
+def stub_forecast(lat=-1.29, lon=36.82, hour=500_000):
+    return StubWeatherProvider().forecast(lat, lon, hour)
+
+
+class TestWeatherGrid:
+    def test_round_trips_forecast_points(self):
+        points = stub_forecast()
+        assert weather_grid.decode(weather_grid.encode(points, 0)) == points
+
+    def test_records_are_much_smaller_than_json(self):
+        points = stub_forecast()
+        record = weather_grid.encode(points, 0)
+        assert len(record) * 10 < len(json.dumps(points))
+
+    def test_missing_readings_and_gaps(self):
+        points = stub_forecast()[:3]
+        points[0]["humidity"] = None
+        del points[1]
+        decoded = weather_grid.decode(weather_grid.encode(points, 0))
+        assert decoded == points
+
+    def test_uneven_points_are_rejected(self):
+        points = stub_forecast()[:3]
+        points[2]["time"] += 60
+        with pytest.raises(ValueError):
+            weather_grid.encode(points, 0)
+
+    def test_lookup_matches_nearest_points(self):
+        forecasts = [stub_forecast(), stub_forecast(-0.09, 34.77, 500_001)]
+        records = [weather_grid.encode(points, 0) for points in forecasts]
+        start = 500_000 * 3600
+        which = [0, 1, 1, 0, 1]
+        times = [start + 3600, start + 4 * 3600, start - 2 * 3600, start + 10**7, start]
+        assert weather_grid.lookup_points(records, which, times) == [
+            forecasts[0][0],
+            forecasts[1][1],
+            None,
+            None,
+            forecasts[1][0],
+        ]
+        result = weather_grid.lookup(records, which, times)
+        assert result["found"].tolist() == [True, True, False, False, True]
+        assert result["temp_f"][0] == forecasts[0][0]["temp_f"]
+
+    def test_store_drops_stale_forecasts(self):
+        store = weather_grid.WeatherGridStore(max_age=3600)
+        record = weather_grid.encode(stub_forecast(), issued=1000)
+        store.set_many("stub", {(-1.29, 36.82): record}, now=1000)
+        cells = [(-1.29, 36.82), (-0.09, 34.77)]
+        assert store.get_many("stub", cells, now=2000) == {(-1.29, 36.82): record}
+        assert store.get_many("stub", cells, now=5000) == {}
+
+    def test_service_picks_points_from_the_grid(self, provider):
+        locations = [(-1.29, 36.82), (-1.2899, 36.8201), (-0.09, 34.77)]
+        forecasts = weather_service.get_forecasts(locations)
+        times = [
+            datetime.fromtimestamp(forecasts[0][2]["time"] + 1200).astimezone(),
+            datetime.fromtimestamp(forecasts[1][0]["time"]).astimezone(),
+            datetime.fromtimestamp(forecasts[2][-1]["time"] + 10**6).astimezone(),
+        ]
+        points, available = weather_service.get_forecasts_at(locations, times)
+        assert points == [forecasts[0][2], forecasts[1][0], None]
+        assert available == [True, True, True]
+        assert len(provider.calls) == 2
+
+
+# ─── Trip timeline ────────────────────────────────────────────────────────────
+
+
+def add_stops(trip, *locations):
+    """Stops two hours apart with half an hour at each, then the schedule."""
+    for order, (lat, lon) in enumerate(locations, start=1):
+        Stop.objects.create(
+            trip=trip,
+            name=f"Stop {order}",
+            address="Kenya",
+            latitude=lat,
+            longitude=lon,
+            order=order,
+            duration_minutes=30,
+            travel_time_to_next=2.0 if order < len(locations) else None,
+        )
+    update_trip_schedule(trip.id)
+    return trip
+
+
+@pytest.fixture
+def upcoming_trip(trip):
+    trip.start_date = timezone.localdate() + timedelta(days=1)
+    trip.save()
+    # The first two stops share a weather cell
+    return add_stops(trip, (-1.2921, 36.8219), (-1.2899, 36.8201), (-0.09, 34.77))
+
+
+class TestTripWeather:
+    def test_forecast_for_each_arrival(self, provider, upcoming_trip):
+        timeline = trip_weather(upcoming_trip)
+        assert [entry["status"] for entry in timeline] == ["forecast"] * 3
+        assert timeline[0]["arrival"].endswith("09:00:00+00:00")
+        for entry in timeline:
+            arrival = datetime.fromisoformat(entry["arrival"])
+            assert abs(entry["forecast"]["time"] - arrival.timestamp()) <= 1.5 * 3600
+        assert len(provider.calls) == 2
+
+    def test_later_arrivals_get_later_points(self, provider, upcoming_trip):
+        times = [entry["forecast"]["time"] for entry in trip_weather(upcoming_trip)]
+        assert times == sorted(times) and times[0] < times[-1]
+
+    def test_trip_without_start_date_is_unscheduled(self, provider, upcoming_trip):
+        upcoming_trip.start_date = None
+        timeline = trip_weather(upcoming_trip)
+        assert {entry["status"] for entry in timeline} == {"unscheduled"}
+        assert provider.calls == []
+
+    def test_distant_trip_is_out_of_range(self, provider, upcoming_trip):
+        upcoming_trip.start_date += timedelta(days=10)
+        timeline = trip_weather(upcoming_trip)
+        assert {entry["status"] for entry in timeline} == {"out_of_range"}
+        assert provider.calls == []
+
+    def test_failed_cells_are_unavailable(self, use_provider, upcoming_trip):
+        use_provider(SlowProvider(0, failing=[(-0.09, 34.77)]))
+        timeline = trip_weather(upcoming_trip)
+        assert [entry["status"] for entry in timeline] == [
+            "forecast",
+            "forecast",
+            "unavailable",
+        ]
+
+
+class TestTripWeatherRefresh:
+    def test_warms_cells_of_trips_departing_soon(self, provider, upcoming_trip):
+        assert refresh_upcoming_trips() == 2
+        calls = len(provider.calls)
+        trip_weather(upcoming_trip)
+        assert len(provider.calls) == calls
+
+    def test_fresh_cells_are_not_counted_or_fetched(self, provider, upcoming_trip):
+        trip_weather(upcoming_trip)
+        calls = len(provider.calls)
+        assert refresh_upcoming_trips() == 0
+        assert len(provider.calls) == calls
+
+    def test_renews_cells_about_to_go_stale(
+        self, settings, provider, upcoming_trip
+    ):
+        settings.WEATHER_CACHE_TIMEOUT = REFRESH_MARGIN - 60
+        assert refresh_upcoming_trips() == 2
+        # Still cached, but stale within the margin
+        assert refresh_upcoming_trips() == 2
+        assert len(provider.calls) == 4
+
+    def test_skips_later_trips(self, provider, upcoming_trip):
+        upcoming_trip.start_date += timedelta(days=10)
+        upcoming_trip.save()
+        assert refresh_upcoming_trips() == 0
+        assert provider.calls == []
+
+    def test_task_reports_cells(self, provider, upcoming_trip):
+        assert refresh_trip_weather() == (
+            "Refreshed 2 forecast cell(s) for trips in the next 5 days"
+        )
+
+
+# ─── Route hazards ────────────────────────────────────────────────────────────
+
+
+def route_samples(trip_ids, wind):
+    """Samples 5 km apart with the given trip ids, and readings with ``wind``."""
+    count = len(trip_ids)
+    samples = hazards.RouteSamples(
+        trip_ids=np.array(trip_ids, dtype=np.int64),
+        lat=np.zeros(count),
+        lon=np.arange(count) * 0.045,
+        along=np.arange(count) * 5000.0,
+        times=np.arange(count) * 300.0,
+    )
+    readings = {
+        "precipitation_mm": np.zeros(count),
+        "precipitation_chance": np.zeros(count),
+        "wind_mph": np.array(wind, dtype=np.float64),
+        "heavy_rain": np.zeros(count, dtype=bool),
+        "high_wind": np.array(wind) >= hazards.HIGH_WIND_MPH,
+    }
+    return samples, readings
+
+
+class TestRouteSampling:
+    def test_samples_follow_the_schedule(self, upcoming_trip):
+        stops = list(upcoming_trip.stops.order_by("order"))
+        trip_ids, lat, lon, along, times = hazards.sample_trip(upcoming_trip, stops)
+        assert set(trip_ids) == {upcoming_trip.id}
+        assert np.diff(along).max() <= hazards.SAMPLE_M
+        assert np.all(np.diff(times) >= 0)
+        assert (lat[0], lon[0]) == (stops[0].latitude, stops[0].longitude)
+        assert (lat[-1], lon[-1]) == (stops[-1].latitude, stops[-1].longitude)
+
+        arrivals = stop_arrivals(upcoming_trip, stops)
+        assert times[0] == arrivals[0].timestamp()
+        assert times[-1] == arrivals[-1].timestamp()
+
+    def test_unscheduled_trip_is_skipped(self, upcoming_trip):
+        upcoming_trip.start_date = None
+        stops = list(upcoming_trip.stops.order_by("order"))
+        assert hazards.sample_trip(upcoming_trip, stops) is None
+
+    def test_samples_many_trips_together(self, upcoming_trip, second_user):
+        later = Trip.objects.create(
+            user=second_user, name="Later", start_date=upcoming_trip.start_date
+        )
+        add_stops(later, (-0.09, 34.77), (-0.1, 34.9))
+        unscheduled = Trip.objects.create(user=second_user, name="Someday")
+        add_stops(unscheduled, (-0.09, 34.77), (-0.1, 34.9))
+
+        samples = hazards.sample_trips([upcoming_trip, later, unscheduled])
+        ids = samples.trip_ids.tolist()
+        assert ids == sorted(ids, key=[upcoming_trip.id, later.id].index)
+        assert set(ids) == {upcoming_trip.id, later.id}
+
+
+class TestHazardSegments:
+    def test_runs_become_segments(self):
+        samples, readings = route_samples([1] * 6, [5, 45, 50, 5, 60, 5])
+        segments = hazards.hazard_segments(samples, readings)
+        assert [(s["start"], s["end"]) for s in segments] == [(1, 2), (4, 4)]
+        assert [s["max_wind_mph"] for s in segments] == [50, 60]
+        assert segments[0]["kinds"] == ["high_wind"]
+
+    def test_runs_break_between_trips(self):
+        samples, readings = route_samples([1, 1, 2, 2], [5, 45, 45, 5])
+        segments = hazards.hazard_segments(samples, readings)
+        assert [(s["trip_id"], s["start"], s["end"]) for s in segments] == [
+            (1, 1, 1),
+            (2, 2, 2),
+        ]
+
+    def test_calm_route_has_no_segments(self):
+        samples, readings = route_samples([1, 1, 1], [5, 5, 5])
+        assert hazards.hazard_segments(samples, readings) == []
+
+
+class TestTripHazards:
+    def test_storm_at_the_end_of_the_route(self, use_provider, upcoming_trip):
+        use_provider(StormProvider())
+        overlay = hazards.trip_hazards(upcoming_trip)
+        assert overlay["forecast_samples"] == overlay["samples"] > 0
+        [feature] = overlay["features"]
+        assert feature["properties"]["kinds"] == ["high_wind"]
+        assert feature["properties"]["max_wind_mph"] == 55.0
+        assert feature["properties"]["start_mile"] > 0
+        assert all(lon < 35.6 for lon, _ in feature["geometry"]["coordinates"])
+
+    def test_calm_route(self, use_provider, upcoming_trip):
+        use_provider(StormProvider(storm_lon=-180))
+        assert hazards.trip_hazards(upcoming_trip)["features"] == []
+
+    def test_cells_are_fetched_once(self, use_provider, upcoming_trip):
+        provider = use_provider(StormProvider())
+        overlay = hazards.trip_hazards(upcoming_trip)
+        assert len(provider.calls) == len(set(provider.calls)) < overlay["samples"]
+
+
+class TestWeatherAlerts:
+    @pytest.fixture
+    def storm(self, use_provider):
+        return use_provider(StormProvider())
+
+    def test_alerts_every_member_once(
+        self, storm, upcoming_trip, user, second_user
+    ):
+        TripShare.objects.create(
+            trip=upcoming_trip,
+            shared_with=second_user,
+            shared_by=user,
+            permission_level="view",
+        )
+        assert hazards.alert_upcoming_trips() == 2
+        alerts = Notification.objects.filter(notification_type="weather_alert")
+        assert {alert.user_id for alert in alerts} == {user.id, second_user.id}
+        assert "high wind" in alerts[0].title
+        # Within the cooldown nobody is alerted again
+        assert hazards.alert_upcoming_trips() == 0
+
+    def test_alerts_again_after_the_cooldown(self, storm, upcoming_trip):
+        assert hazards.alert_upcoming_trips() == 1
+        later = timezone.now() + hazards.ALERT_COOLDOWN + timedelta(minutes=1)
+        assert hazards.alert_upcoming_trips(now=later) == 1
+
+    def test_skips_later_trips(self, storm, upcoming_trip):
+        upcoming_trip.start_date += timedelta(days=10)
+        upcoming_trip.save()
+        assert hazards.alert_upcoming_trips() == 0
+        assert storm.calls == []
+
+    def test_task_reports_alerts(self, storm, upcoming_trip):
+        assert check_route_weather() == "Created 1 weather alert(s)"
+
+
+# ─── Views ────────────────────────────────────────────────────────────────────
+
+
+class TestCurrentWeatherView:
+    url = "/api/weather/current/"
+
+    def test_returns_current_conditions(self, auth_client, provider):
+        response = auth_client.get(self.url, {"lat": "-1.29", "lng": "36.82"})
+        assert response.status_code == status.HTTP_200_OK
+        current = response.data["current"]
+        assert current["condition"]["text"] in weather.CONDITIONS
+        # Deterministic, so a second request sees the same reading
+        assert auth_client.get(self.url, {"lat": "-1.29", "lng": "36.82"}).data == (
+            response.data
+        )
+
+    def test_invalid_coordinates(self, auth_client, provider):
+        response = auth_client.get(self.url, {"lat": "north", "lng": "36.82"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = auth_client.get(self.url, {"lat": "-1.29"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_provider_failure_is_503(self, auth_client, settings):
+        settings.WEATHER_PROVIDER = "nowhere"
+        response = auth_client.get(self.url, {"lat": "-1.29", "lng": "36.82"})
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def test_requires_authentication(self, api_client):
+        response = api_client.get(self.url, {"lat": "-1.29", "lng": "36.82"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestWeatherForecastView:
+    url = "/api/weather/forecast/"
+
+    def test_forecasts_each_valid_stop(self, auth_client, provider):
+        response = auth_client.get(
+            self.url, {"stops": ["-1.29,36.82", "bad", "-0.09,34.77"]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        forecasts = response.data["forecasts"]
+        assert [forecast["location"] for forecast in forecasts] == ["Stop 1", "Stop 3"]
+        assert forecasts[0]["temperature"] == forecasts[0]["hourly"][0]["temp_f"]
+        assert len(forecasts[0]["date"]) == 10
+
+    def test_stops_are_required(self, auth_client):
+        response = auth_client.get(self.url)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_too_many_stops(self, auth_client, provider):
+        response = auth_client.get(self.url, {"stops": ["-1.29,36.82"] * 101})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_skips_stops_without_a_forecast(self, auth_client, use_provider):
+        use_provider(SlowProvider(0, failing=[(-1.29, 36.82)]))
+        response = auth_client.get(self.url, {"stops": ["-1.29,36.82", "-0.09,34.77"]})
+        assert [f["location"] for f in response.data["forecasts"]] == ["Stop 2"]
+
+    def test_no_forecasts_is_503(self, auth_client, use_provider):
+        use_provider(SlowProvider(0, failing=[(-1.29, 36.82)]))
+        response = auth_client.get(self.url, {"stops": ["-1.29,36.82"]})
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class TestTripWeatherView:
+    def _url(self, trip_id):
+        return f"/api/weather/trips/{trip_id}/"
+
+    def test_returns_the_timeline(self, auth_client, provider, upcoming_trip):
+        response = auth_client.get(self._url(upcoming_trip.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["start_date"] == upcoming_trip.start_date
+        assert [stop["name"] for stop in response.data["stops"]] == [
+            "Stop 1",
+            "Stop 2",
+            "Stop 3",
+        ]
+
+    def test_non_member_is_forbidden(self, second_auth_client, upcoming_trip):
+        response = second_auth_client.get(self._url(upcoming_trip.id))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unknown_trip(self, auth_client):
+        response = auth_client.get(self._url(999))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestTripHazardsView:
+    def _url(self, trip_id):
+        return f"/api/weather/trips/{trip_id}/hazards/"
+
+    def test_returns_the_overlay(self, auth_client, use_provider, upcoming_trip):
+        use_provider(StormProvider())
+        response = auth_client.get(self._url(upcoming_trip.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["type"] == "FeatureCollection"
+        assert len(response.data["features"]) == 1
+
+    def test_non_member_is_forbidden(self, second_auth_client, upcoming_trip):
+        response = second_auth_client.get(self._url(upcoming_trip.id))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unknown_trip(self, auth_client):
+        response = auth_client.get(self._url(999))
+        assert response.status_code == status.HTTP_404_NOT_FOUND